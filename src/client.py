@@ -470,14 +470,14 @@ def usage(
     adv_usage["search"] = _("[-HIaflpr] [-o attribute ...] [-s repo_uri] query")
 
     adv_usage["verify"] = _(
-        "[-Hqv] [-p path]... [--parsable version]\n"
+        "[-Hqv] [-p path]... [--deep] [--parsable version]\n"
         "            [--unpackaged] [--unpackaged-only] [pkg_fmri_pattern ...]"
     )
     adv_usage["fix"] = _(
         "[-nvq]\n"
         + beopts
-        + "            [--accept] [--licenses] [--parsable version] [--unpackaged]\n"
-        "            [pkg_fmri_pattern ...]"
+        + "            [--accept] [--deep] [--licenses] [--parsable version]\n"
+        "            [--unpackaged] [pkg_fmri_pattern ...]"
     )
     adv_usage["revert"] = _(
         "[-nv]\n"
@@ -3669,6 +3669,7 @@ def verify(
     unpackaged,
     unpackaged_only,
     verify_paths,
+    deep,
 ):
     """Determine if installed packages match manifests."""
 
@@ -3685,6 +3686,7 @@ def verify(
         display_plan_cb=display_plan_cb,
         logger=logger,
         verify_paths=verify_paths,
+        deep=deep,
     )
 
     # Print error messages.
@@ -3779,6 +3781,7 @@ def fix(
     show_licenses,
     verbose,
     unpackaged,
+    deep,
 ):
     """Fix packaging errors found in the image."""
 
@@ -3801,6 +3804,7 @@ def fix(
         unpackaged,
         display_plan_cb=display_plan_cb,
         logger=logger,
+        deep=deep,
     )
 
     # Print error messages.
@@ -7367,6 +7371,8 @@ opts_mapping = {
 
     "concurrency" :       ("C", "concurrency"),
 
+    "deep" :              ("",  "deep"),
+
     "force" :             ("f", ""),
 
     "ignore_missing" :    ("", "ignore-missing"),
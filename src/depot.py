@@ -912,6 +912,7 @@ if __name__ == "__main__":
 
         repo = sr.Repository(
             cfgpathname=repo_config_file,
+            defer_catalog=not readonly,
             log_obj=cherrypy,
             mirror=mirror,
             properties=repo_props,
@@ -224,42 +224,20 @@ class FileAction(generic.Action):
                     # this happens on Windows
                     raise
 
-        # XXX This needs to be modularized.
         if do_content and self.needsdata(orig, pkgplan):
-            tfilefd, temp = tempfile.mkstemp(dir=os.path.dirname(final_path))
-            if not self.data:
-                # The state of the filesystem changed after the
-                # plan was prepared; attempt a one-off
-                # retrieval of the data.
-                self.data = self.__set_data(pkgplan)
-            stream = self.data()
-            tfile = os.fdopen(tfilefd, "wb")
-            try:
-                # Always verify using the most preferred hash
-                hash_attr, hash_val, hash_func = digest.get_preferred_hash(self)
-                shasum = misc.gunzip_from_stream(stream, tfile, hash_func)
-            except zlib.error as e:
-                raise ActionExecutionError(
-                    self,
-                    details=_("Error decompressing payload: {0}").format(
-                        " ".join([str(a) for a in e.args])
-                    ),
-                    error=e,
-                )
-            finally:
-                tfile.close()
-                stream.close()
-
-            if shasum != hash_val:
-                raise ActionExecutionError(
-                    self,
-                    details=_(
-                        "Action data hash verification "
-                        "failure: expected: {expected} computed: "
-                        "{actual} action: {action}"
-                    ).format(expected=hash_val, actual=shasum, action=self),
-                )
-
+            # The content may already have been written by the
+            # plan's content pipeline.
+            pipeline = getattr(
+                pkgplan.image.imageplan, "content_pipeline", None
+            )
+            temp = pipeline.take(self) if pipeline else None
+            if temp is None:
+                if not self.data:
+                    # The state of the filesystem changed after
+                    # the plan was prepared; attempt a one-off
+                    # retrieval of the data.
+                    self.data = self.__set_data(pkgplan)
+                temp = self.write_content(os.path.dirname(final_path))
         else:
             temp = final_path
 
@@ -353,6 +331,53 @@ class FileAction(generic.Action):
                     warn,
                 )
 
+    def write_content(self, dirpath):
+        """Decompress the payload of the action to a new temporary file
+        in the directory 'dirpath', verify it, and return the path of
+        the file.  The file is removed if an error is raised.  This
+        may be called from any thread."""
+
+        tfilefd, temp = tempfile.mkstemp(dir=dirpath)
+        tfile = os.fdopen(tfilefd, "wb")
+        try:
+            try:
+                stream = self.data()
+            except:
+                tfile.close()
+                raise
+            try:
+                # Always verify using the most preferred hash
+                hash_attr, hash_val, hash_func = digest.get_preferred_hash(self)
+                shasum = misc.gunzip_from_stream(stream, tfile, hash_func)
+            except zlib.error as e:
+                raise ActionExecutionError(
+                    self,
+                    details=_("Error decompressing payload: {0}").format(
+                        " ".join([str(a) for a in e.args])
+                    ),
+                    error=e,
+                )
+            finally:
+                tfile.close()
+                stream.close()
+
+            if shasum != hash_val:
+                raise ActionExecutionError(
+                    self,
+                    details=_(
+                        "Action data hash verification "
+                        "failure: expected: {expected} computed: "
+                        "{actual} action: {action}"
+                    ).format(expected=hash_val, actual=shasum, action=self),
+                )
+        except:
+            try:
+                portable.remove(temp)
+            except OSError:
+                pass
+            raise
+        return temp
+
     def verify(self, img, **args):
         """Returns a tuple of lists of the form (errors, warnings,
         info).  The error list will be empty if the action has been
@@ -360,7 +385,12 @@ class FileAction(generic.Action):
 
         In detail, this verifies that the file is present, and if
         the preserve attribute is not present, that the hashes
-        and other attributes of the file match."""
+        and other attributes of the file match.
+
+        If a pkg.client.verifycache.VerifyCache is passed as the
+        'verify_cache' argument, reading the file's content is skipped
+        if the cache shows it was verified and is unchanged since, and
+        successful content verification is recorded in it."""
 
         if self.attrs.get("preserve") == "abandon":
             return [], [], []
@@ -437,12 +467,19 @@ class FileAction(generic.Action):
             is_mtpt = self.attrs.get("mountpoint", "").lower() == "true"
             elfhash = None
             elferror = None
+            hash_attr, hash_val, hash_func = digest.get_preferred_hash(self)
+            vcache = args.get("verify_cache")
+            # If the content was previously verified and the file
+            # has not changed since, there is no need to read it.
+            verified = vcache is not None and vcache.lookup(
+                self.attrs["path"], lstat, hash_attr, hash_val
+            )
             (
                 elf_hash_attr,
                 elf_hash_val,
                 elf_hash_func,
             ) = digest.get_preferred_hash(self, hash_type=pkg.digest.HASH_GELF)
-            if elf_hash_attr and haveelf and not is_mtpt:
+            if elf_hash_attr and haveelf and not is_mtpt and not verified:
                 #
                 # It's possible for the elf module to
                 # throw while computing the hash,
@@ -489,10 +526,14 @@ class FileAction(generic.Action):
             # Always check on the file hash because the ELF hash
             # check only checks on the ELF parts and does not
             # check for some other file integrity issues.
-            if not is_mtpt:
-                hash_attr, hash_val, hash_func = digest.get_preferred_hash(self)
+            if not is_mtpt and not verified:
                 sha_hash, data = misc.get_data_digest(path, hash_func=hash_func)
-                if sha_hash != hash_val:
+                if sha_hash == hash_val:
+                    if vcache is not None:
+                        vcache.record(
+                            self.attrs["path"], lstat, hash_attr, hash_val, path
+                        )
+                else:
                     # Prefer the ELF content hash error message.
                     if preserve is not None:
                         info.append(_("editable file has been changed"))
@@ -33,10 +33,13 @@ import errno
 import fnmatch
 import hashlib
 import os
+import re
 import stat
 import threading
 
 from collections import OrderedDict
+from collections.abc import Mapping
+from json.decoder import JSONDecoder
 from operator import itemgetter
 
 import pkg.actions
@@ -52,6 +55,11 @@ from pkg.misc import EmptyDict, EmptyI
 
 FEATURE_UTF8 = "ooce:utf8"
 
+# The version of the format used for catalog part index files.
+PART_INDEX_VERSION = 1
+
+_JSON_WS = re.compile(r"[ \t\n\r]*")
+
 
 class _JSONWriter(object):
     """Private helper class used to serialize catalog data and generate
@@ -370,22 +378,256 @@ class CatalogPartBase(object):
     meta_root = property(__get_meta_root, __set_meta_root)
 
 
+def _scan_part(text):
+    """Returns a tuple of (stems, extra) describing the serialized catalog
+    part 'text'.  'stems' is a dict mapping each publisher prefix to a dict
+    mapping each of its package stems to a list of the byte offsets of the
+    start and end of the stem's entries and the number of entries; 'extra'
+    is a dict of the part's reserved members (such as "_SIGNATURE").  Only
+    the entries of one stem are held in memory at a time.  Raises
+    ValueError if 'text' isn't a valid catalog part."""
+
+    decode = JSONDecoder().raw_decode
+    skip = _JSON_WS.match
+    ascii = text.isascii()
+    last = [0, 0]
+
+    def byte_offset(pos):
+        # Offsets are requested in ascending order, so only the text
+        # since the last one needs to be encoded to find the next.
+        if ascii:
+            return pos
+        last[1] += len(text[last[0] : pos].encode("utf-8"))
+        last[0] = pos
+        return last[1]
+
+    def expect(pos, token):
+        pos = skip(text, pos).end()
+        if text[pos : pos + 1] != token:
+            raise ValueError("expected '{0}' at {1:d}".format(token, pos))
+        return skip(text, pos + 1).end()
+
+    def next_member(pos):
+        # Returns the position of the next member of an object or of
+        # its closing brace.
+        pos = skip(text, pos).end()
+        if text[pos : pos + 1] == ",":
+            return skip(text, pos + 1).end()
+        if text[pos : pos + 1] != "}":
+            raise ValueError("expected ',' or '}}' at {0:d}".format(pos))
+        return pos
+
+    def key(pos):
+        name, pos = decode(text, pos)
+        if not isinstance(name, str):
+            raise ValueError("expected member name at {0:d}".format(pos))
+        return name, expect(pos, ":")
+
+    stems = {}
+    extra = {}
+    pos = expect(0, "{")
+    while text[pos : pos + 1] != "}":
+        pub, pos = key(pos)
+        if pub.startswith("_"):
+            extra[pub], pos = decode(text, pos)
+            pos = next_member(pos)
+            continue
+
+        pstems = stems[pub] = {}
+        pos = expect(pos, "{")
+        while text[pos : pos + 1] != "}":
+            stem, pos = key(pos)
+            start = byte_offset(pos)
+            entries, pos = decode(text, pos)
+            if not isinstance(entries, list):
+                raise ValueError("expected entry list at {0:d}".format(pos))
+            pstems[stem] = [start, byte_offset(pos), len(entries)]
+            pos = next_member(pos)
+        pos = next_member(pos + 1)
+    return stems, extra
+
+
+class _IndexedStems(Mapping):
+    """Private helper class that maps the package stems of one publisher
+    in an indexed catalog part to their lists of entries, which are read
+    from the part file as they are requested."""
+
+    def __init__(self, index, pub, stems):
+        self.__index = index
+        self.__pub = pub
+        self.__stems = stems
+
+    def __contains__(self, stem):
+        return stem in self.__stems
+
+    def __getitem__(self, stem):
+        return self.__index.read(self.__pub, stem, self.__stems[stem])
+
+    def __iter__(self):
+        return iter(self.__stems)
+
+    def __len__(self):
+        return len(self.__stems)
+
+    def version_count(self):
+        """Returns the number of entries for all of the stems."""
+
+        return sum(loc[2] for loc in self.__stems.values())
+
+    def digest(self, stem):
+        """Returns a tuple of (digest, count) for the serialized
+        entries of 'stem'; see CatalogPart.stem_digests."""
+
+        loc = self.__stems[stem]
+        return self.__index.digest(loc), loc[2]
+
+
+class _PartIndex(object):
+    """Private helper class that provides read-only access to the entries
+    of a catalog part on disk without loading the whole part, using an
+    index of the location of each package stem's entries in the file.
+
+    The index is stored in a companion file (<part>.idx) that is rebuilt
+    whenever the part file has changed; if it can't be written (e.g. for
+    unprivileged users) it is only kept in memory.  The part file is kept
+    open so that entries are read from the version that was indexed even
+    if the file is replaced."""
+
+    def __init__(self, pathname):
+        self.__last = (None, None)
+        self.__fobj = open(pathname, "rb")
+        try:
+            self.__open(pathname)
+        except:
+            self.__fobj.close()
+            raise
+
+    def __open(self, pathname):
+        st = os.fstat(self.__fobj.fileno())
+        sig = [st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+        ipath = pathname + ".idx"
+
+        stems = None
+        try:
+            with open(ipath, "rb") as f:
+                version, isig, extra, stems = json.load(f)
+            if version != PART_INDEX_VERSION or isig != sig:
+                stems = None
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        except (TypeError, ValueError):
+            # The index is only a cache; ignore anything unusable.
+            stems = None
+
+        if stems is None:
+            text = self.__fobj.read().decode("utf-8")
+            stems, extra = _scan_part(text)
+            del text
+            self.__save(ipath, [PART_INDEX_VERSION, sig, extra, stems])
+
+        self.extra = extra
+        self.pubs = dict(
+            (pub, _IndexedStems(self, pub, pstems))
+            for pub, pstems in stems.items()
+        )
+
+    @staticmethod
+    def __save(ipath, data):
+        tmp_file = ipath + ".new"
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(data, f)
+            os.chmod(tmp_file, misc.PKG_FILE_MODE)
+            portable.rename(tmp_file, ipath)
+        except EnvironmentError as e:
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise
+
+    def close(self):
+        self.__fobj.close()
+        self.__last = (None, None)
+
+    def read(self, pub, stem, loc):
+        """Returns the list of entries for 'stem' of publisher 'pub',
+        whose location in the part file is 'loc'."""
+
+        # Entries are usually requested a stem at a time, so the most
+        # recently read list is kept.
+        last = self.__last
+        if last[0] == (pub, stem):
+            return last[1]
+
+        start, end, count = loc
+        data = os.pread(self.__fobj.fileno(), end - start, start)
+        try:
+            entries = json.loads(data.decode("utf-8"))
+        except ValueError:
+            raise api_errors.InvalidCatalogFile(self.__fobj.name)
+        self.__last = ((pub, stem), entries)
+        return entries
+
+    def digest(self, loc):
+        """Returns the SHA-1 digest of the entries at location 'loc' in
+        the part file, as they were serialized."""
+
+        start, end, count = loc
+        return hashlib.sha1(
+            os.pread(self.__fobj.fileno(), end - start, start)
+        ).hexdigest()
+
+
 class CatalogPart(CatalogPartBase):
     """A CatalogPart object is the representation of a subset of the package
     FMRIs available from a package repository."""
 
     __data = None
+    __index = None
     ordered = None
 
-    def __init__(self, name, meta_root=None, ordered=True, sign=True):
-        """Initializes a CatalogPart object."""
+    def __init__(
+        self, name, meta_root=None, ordered=True, sign=True, indexed=False
+    ):
+        """Initializes a CatalogPart object.
+
+        'indexed' is an optional boolean value that indicates that
+        operations which only read the part's entries may use an index
+        of the part file instead of loading all of it.  Operations that
+        modify the part always load it first."""
 
         self.__data = {}
+        self.__indexed = indexed
         self.ordered = ordered
         if not name.startswith("catalog."):
             raise UnrecognizedCatalogPart(name)
         CatalogPartBase.__init__(self, name, meta_root=meta_root, sign=sign)
 
+    def __close_index(self):
+        if self.__index:
+            self.__index.close()
+        self.__index = None
+
+    def __get_data(self):
+        """Returns the part's data for read-only use.  For an indexed
+        part that hasn't been loaded, this is a mapping of publisher
+        prefix to a mapping of stem to entries backed by the index."""
+
+        if self.loaded:
+            return self.__data
+        if self.__indexed and self.__index is None:
+            try:
+                self.__index = _PartIndex(self.pathname)
+            except (EnvironmentError, ValueError):
+                # Let a full load report the problem, if any.
+                self.__index = False
+            else:
+                self.signatures = self.__index.extra.get("_SIGNATURE", {})
+                self.features = self.__index.extra.get("_FEATURE", [])
+        if self.__index:
+            return self.__index.pubs
+        self.load()
+        return self.__data
+
     def __iter_entries(self, last=False, ordered=False, pubs=EmptyI):
         """Private generator function to iterate over catalog entries.
 
@@ -404,31 +646,29 @@ class CatalogPart(CatalogPartBase):
         'pubs' is an optional list of publisher prefixes to restrict
         the results to."""
 
-        self.load()
+        data = self.__get_data()
         if ordered:
             stems = self.pkg_names(pubs=pubs)
         else:
             stems = (
                 (pub, stem)
                 for pub in self.publishers(pubs=pubs)
-                for stem in self.__data[pub]
+                for stem in data[pub]
             )
 
         if last:
-            return (
-                (pub, stem, self.__data[pub][stem][-1]) for pub, stem in stems
-            )
+            return ((pub, stem, data[pub][stem][-1]) for pub, stem in stems)
 
         if ordered:
             return (
                 (pub, stem, entry)
                 for pub, stem in stems
-                for entry in reversed(self.__data[pub][stem])
+                for entry in reversed(data[pub][stem])
             )
         return (
             (pub, stem, entry)
             for pub, stem in stems
-            for entry in self.__data[pub][stem]
+            for entry in data[pub][stem]
         )
 
     def add(
@@ -501,6 +741,13 @@ class CatalogPart(CatalogPartBase):
         discards all content."""
 
         self.__data = {}
+        self.__close_index()
+        if self.pathname:
+            try:
+                portable.remove(self.pathname + ".idx")
+            except EnvironmentError as e:
+                if e.errno != errno.ENOENT:
+                    raise
         return CatalogPartBase.destroy(self)
 
     def entries(self, cb=None, last=False, ordered=False, pubs=EmptyI):
@@ -550,12 +797,12 @@ class CatalogPart(CatalogPartBase):
         'pubs' is an optional list of publisher prefixes to restrict
         the results to."""
 
-        self.load()
+        data = self.__get_data()
 
         versions = {}
         entries = {}
         for pub in self.publishers(pubs=pubs):
-            ver_list = self.__data[pub].get(name, ())
+            ver_list = data[pub].get(name, ())
             for entry in ver_list:
                 sver = entry["version"]
                 pfmri = fmri.PkgFmri(name=name, publisher=pub, version=sver)
@@ -615,12 +862,12 @@ class CatalogPart(CatalogPartBase):
         'pubs' is an optional list of publisher prefixes to restrict
         the results to."""
 
-        self.load()
+        data = self.__get_data()
 
         versions = {}
         entries = {}
         for pub in self.publishers(pubs=pubs):
-            ver_list = self.__data[pub].get(name, None)
+            ver_list = data[pub].get(name, None)
             if not ver_list:
                 continue
 
@@ -645,14 +892,16 @@ class CatalogPart(CatalogPartBase):
 
         # Since this is a hot path, this function checks for loaded
         # status before attempting to call the load function.
-        if not self.loaded:
-            self.load()
+        if self.loaded:
+            data = self.__data
+        else:
+            data = self.__get_data()
 
         if pfmri:
             pub, stem, ver = pfmri.tuple()
             ver = str(ver)
 
-        pkg_list = self.__data.get(pub, None)
+        pkg_list = data.get(pub, None)
         if not pkg_list:
             return
 
@@ -666,10 +915,12 @@ class CatalogPart(CatalogPartBase):
         package stem, in part order; an empty list if there are none.
         The returned list must not be modified."""
 
-        if not self.loaded:
-            self.load()
+        if self.loaded:
+            data = self.__data
+        else:
+            data = self.__get_data()
 
-        pkg_list = self.__data.get(pub, None)
+        pkg_list = data.get(pub, None)
         if not pkg_list:
             return []
         return pkg_list.get(stem, [])
@@ -681,13 +932,11 @@ class CatalogPart(CatalogPartBase):
         number of unique package versions (per-publisher and
         stem)."""
 
-        self.load()
         package_count = 0
         package_version_count = 0
-        for pub in self.publishers():
-            for stem in self.__data[pub]:
-                package_count += 1
-                package_version_count += len(self.__data[pub][stem])
+        for pub, pkgs, vers in self.get_package_counts_by_pub():
+            package_count += pkgs
+            package_version_count += vers
         return (package_count, package_version_count)
 
     def get_package_counts_by_pub(self, pubs=EmptyI):
@@ -698,13 +947,16 @@ class CatalogPart(CatalogPartBase):
         package versions for the publisher.
         """
 
-        self.load()
+        data = self.__get_data()
         for pub in self.publishers(pubs=pubs):
-            package_count = 0
-            package_version_count = 0
-            for stem in self.__data[pub]:
-                package_count += 1
-                package_version_count += len(self.__data[pub][stem])
+            pkg_list = data[pub]
+            package_count = len(pkg_list)
+            if isinstance(pkg_list, _IndexedStems):
+                package_version_count = pkg_list.version_count()
+            else:
+                package_version_count = sum(
+                    len(ver_list) for ver_list in pkg_list.values()
+                )
             yield pub, package_count, package_version_count
 
     def load(self):
@@ -715,6 +967,34 @@ class CatalogPart(CatalogPartBase):
             # Already loaded, or only in-memory.
             return
         self.__data = CatalogPartBase.load(self)
+        self.__close_index()
+
+    def stem_digests(self, pub):
+        """A generator function that produces tuples of the form
+        (stem, digest, count) for each package stem of publisher 'pub'
+        in the CatalogPart, sorted by stem.  'digest' is the SHA-1 hash
+        of the serialized entries for the stem and 'count' is the number
+        of entries.
+
+        For an indexed part, the entries are hashed as they appear in
+        the part file without being loaded.  Parts with the same entries
+        for a stem have the same digest for it if they were written the
+        same way, so the entries of two parts only need to be compared
+        for stems whose digests differ."""
+
+        pkg_list = self.__get_data().get(pub)
+        if not pkg_list:
+            return
+        for stem in sorted(pkg_list):
+            if isinstance(pkg_list, _IndexedStems):
+                digest, count = pkg_list.digest(stem)
+            else:
+                entries = pkg_list[stem]
+                digest = hashlib.sha1(
+                    json.dumps(entries, sort_keys=True).encode("utf-8")
+                ).hexdigest()
+                count = len(entries)
+            yield stem, digest, count
 
     def names(self, pubs=EmptyI):
         """Returns a set containing the names of all the packages in
@@ -723,13 +1003,9 @@ class CatalogPart(CatalogPartBase):
         'pubs' is an optional list of publisher prefixes to restrict
         the results to."""
 
-        self.load()
+        data = self.__get_data()
         return set(
-            (
-                stem
-                for pub in self.publishers(pubs=pubs)
-                for stem in self.__data[pub]
-            )
+            (stem for pub in self.publishers(pubs=pubs) for stem in data[pub])
         )
 
     def pkg_names(self, pubs=EmptyI):
@@ -743,14 +1019,14 @@ class CatalogPart(CatalogPartBase):
         Results are always returned sorted by stem and then by
         publisher."""
 
-        self.load()
+        data = self.__get_data()
 
         # Results have to be sorted by stem first, and by
         # publisher prefix second.
         pkg_list = [
             "{0}!{1}".format(stem, pub)
             for pub in self.publishers(pubs=pubs)
-            for stem in self.__data[pub]
+            for stem in data[pub]
         ]
 
         pub_sort = None
@@ -774,8 +1050,7 @@ class CatalogPart(CatalogPartBase):
         'pubs' is an optional list that contains the prefixes of the
         publishers to restrict the results to."""
 
-        self.load()
-        for pub in self.__data:
+        for pub in self.__get_data():
             # Any entries starting with "_" are part of the
             # reserved catalog namespace.
             if not pub[0] == "_" and (not pubs or pub in pubs):
@@ -2318,7 +2593,12 @@ class Catalog(object):
         """Apply any CatalogUpdates available to the catalog based on
         the list returned by get_updates_needed.  The caller must
         retrieve all of the resources indicated by get_updates_needed
-        and place them in the directory indicated by 'path'."""
+        and place them in the directory indicated by 'path'.
+
+        Returns a list of the updates that were applied, as tuples of
+        the form returned by CatalogUpdate.updates() limited to the
+        parts they were applied to, or None if any catalog part was
+        replaced in full instead."""
 
         if not self.meta_root:
             raise api_errors.CatalogUpdateRequirements()
@@ -2327,12 +2607,14 @@ class Catalog(object):
         # as a basis for determining whether to apply specific
         # updates.
         old_parts = self._attrs.parts
+        applied = []
 
         def apply_incremental(name):
             # Load the CatalogUpdate from the path specified.
             # (Which is why __get_update is not used.)
             ulog = CatalogUpdate(name, meta_root=path)
             for pfmri, op_type, op_time, metadata in ulog.updates():
+                done = {}
                 for pname, pdata in metadata.items():
                     part = self.get_part(pname, must_exist=True)
                     if part is None:
@@ -2353,6 +2635,10 @@ class Catalog(object):
                         part.remove(pfmri, op_time=op_time)
                     else:
                         raise api_errors.UnknownUpdateType(op_type)
+                    done[pname] = pdata
+
+                if done and applied is not None:
+                    applied.append((pfmri, op_type, op_time, done))
 
         def apply_full(name):
             src = os.path.join(path, name)
@@ -2367,7 +2653,11 @@ class Catalog(object):
             updates = self.get_updates_needed(path)
             if updates is None:
                 # Nothing has changed, so nothing to do.
-                return
+                return applied
+
+            if not all(name.startswith("update.") for name in updates):
+                # At least one part will be replaced in full.
+                applied = None
 
             for name in updates:
                 if name.startswith("update."):
@@ -2404,6 +2694,7 @@ class Catalog(object):
 
             self._attrs = CatalogAttrs(meta_root=self.meta_root)
             self.__set_perms()
+            return applied
         finally:
             self.batch_mode = old_batch_mode
             self.__unlock_catalog()
@@ -3340,6 +3631,18 @@ class Catalog(object):
         allowed to match multiple packages.
         """
 
+        return self.match_fmris(self, patterns)
+
+    @staticmethod
+    def match_fmris(source, patterns, strict=True):
+        """Returns the result of get_matching_fmris() for 'source', which
+        may be any object providing names() and entries_by_version()
+        methods that behave as those of a Catalog do (such as a
+        repository's catalog database).
+
+        If 'strict' is False, patterns without wildcards may also match
+        multiple packages instead of raising PackageMatchErrors."""
+
         # problems we check for
         illegals = []
         unmatched = set()
@@ -3353,7 +3656,9 @@ class Catalog(object):
         latest_pats = set()
         seen = set()
         npatterns = set()
-        for pat, error, pfmri, matcher in self.__parse_fmri_patterns(patterns):
+        for pat, error, pfmri, matcher in Catalog.__parse_fmri_patterns(
+            patterns
+        ):
             if error:
                 illegals.append(error)
                 continue
@@ -3387,13 +3692,13 @@ class Catalog(object):
         # dictionary of pkg names & fmris that match that pattern.
         ret = dict(zip(patterns, [dict() for i in patterns]))
 
-        for name in self.names():
+        for name in source.names():
             for pat, matcher, pfmri in pat_data:
                 pub = pfmri.publisher
                 version = pfmri.version
                 if not matcher(name, pfmri.pkg_name):
                     continue  # name doesn't match
-                for ver, entries in self.entries_by_version(name):
+                for ver, entries in source.entries_by_version(name):
                     if version and not ver.is_successor(
                         version, pkg.version.CONSTRAINT_AUTO
                     ):
@@ -3444,7 +3749,7 @@ class Catalog(object):
             l = len(ret[p])
             if l == 0:  # no matches at all
                 unmatched.add(p)
-            elif l > 1 and p not in wildcard_patterns:
+            elif l > 1 and strict and p not in wildcard_patterns:
                 # multiple matches
                 multimatch.append(
                     (p, [ret[p][n][0].get_pkg_stem() for n in ret[p]])
@@ -3524,6 +3829,7 @@ class Catalog(object):
             meta_root=self.meta_root,
             ordered=not self.__batch_mode,
             sign=self.__sign,
+            indexed=self.read_only,
         )
         if must_exist and self.meta_root and not part.exists:
             # This is a double-check for the client case where
@@ -99,6 +99,49 @@ class GlobalSettings(object):
         except ValueError:
             pass
 
+        # concurrency value used for content verification; None
+        # means that the image's verify-concurrency property is used.
+        self.client_verify_concurrency = None
+        try:
+            if "PKG_VERIFY_CONCURRENCY" in os.environ:
+                self.client_verify_concurrency = int(
+                    os.environ["PKG_VERIFY_CONCURRENCY"]
+                )
+        except ValueError:
+            pass
+
+        # concurrency value used for writing file content during
+        # plan execution; None means that the image's
+        # install-concurrency property is used.
+        self.client_install_concurrency = None
+        try:
+            if "PKG_INSTALL_CONCURRENCY" in os.environ:
+                self.client_install_concurrency = int(
+                    os.environ["PKG_INSTALL_CONCURRENCY"]
+                )
+        except ValueError:
+            pass
+
+        # number of files read, hashed and compressed at once while
+        # publishing; None means one per online CPU.
+        self.client_publish_concurrency = None
+        try:
+            if "PKG_PUBLISH_CONCURRENCY" in os.environ:
+                self.client_publish_concurrency = int(
+                    os.environ["PKG_PUBLISH_CONCURRENCY"]
+                )
+        except ValueError:
+            pass
+
+        # image directory of the parent image when operating on a
+        # linked image child on behalf of its parent; manifests the
+        # parent has already retrieved are copied from it instead of
+        # being downloaded again.
+        self.client_parent_imgdir = os.environ.get("PKG_PARENT_IMGDIR")
+        # remove PKG_PARENT_IMGDIR from the environment so grandchild
+        # processes don't inherit it.
+        os.environ.pop("PKG_PARENT_IMGDIR", None)
+
         self.client_name = None
         self.client_args = sys.argv[:]
         # Default maximum number of redirects received before
@@ -2821,6 +2821,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         unpackaged=False,
         unpackaged_only=False,
         verify_paths=misc.EmptyI,
+        deep=False,
     ):
         """This is a generator function that yields a PlanDescription
         object.
@@ -2830,7 +2831,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         and then execute_plan().  After execution of a plan, or to
         abandon a plan, reset() should be called.
 
-        For parameters, refer to the 'gen_plan_install'
+        'deep' indicates whether the content of all files should be
+        checked, rather than only that of files which have changed
+        since they were last verified.
+
+        For all other parameters, refer to the 'gen_plan_install'
         function for an explanation of their usage and effects."""
 
         op = API_OP_VERIFY
@@ -2844,6 +2849,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
             unpackaged=unpackaged,
             unpackaged_only=unpackaged_only,
             verify_paths=verify_paths,
+            deep=deep,
         )
 
     def gen_plan_fix(
@@ -2856,6 +2862,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         new_be=None,
         noexecute=True,
         unpackaged=False,
+        deep=False,
     ):
         """This is a generator function that yields a PlanDescription
         object.
@@ -2865,8 +2872,9 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         and then execute_plan().  After execution of a plan, or to
         abandon a plan, reset() should be called.
 
-        For parameters, refer to the 'gen_plan_install'
-        function for an explanation of their usage and effects."""
+        For parameters, refer to the 'gen_plan_verify' and
+        'gen_plan_install' functions for an explanation of their usage
+        and effects."""
 
         op = API_OP_FIX
         return self.__plan_op(
@@ -2881,6 +2889,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
             _refresh_catalogs=False,
             _update_index=False,
             unpackaged=unpackaged,
+            deep=deep,
         )
 
     def attach_linked_child(
@@ -5469,6 +5478,17 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         l.build()
         qp = query_p.QueryParser(l)
         ssu = None
+
+        # Checking that the search database is consistent with the
+        # installed packages means reading all of them, so it's only
+        # done once per search, however many terms use the database.
+        search_db = []
+
+        def get_search_db():
+            if not search_db:
+                search_db.append(self._img.get_search_db())
+            return search_db[0]
+
         for i, q in enumerate(query_lst):
             try:
                 query = qp.parse(q.text)
@@ -5490,6 +5510,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                     index_dir=self._img.index_dir,
                     get_manifest_path=self._img.get_manifest_path,
                     gen_installed_pkg_names=self._img.gen_installed_pkg_names,
+                    get_search_db=get_search_db,
                     case_sensitive=q.case_sensitive,
                 )
                 res = query.search(
@@ -5779,6 +5800,20 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 self._img.list_excludes(),
             )
             ind.rebuild_index_from_scratch(self._img.gen_installed_pkgs())
+            # The search database is only written with the image
+            # locked; if it's in use, the operation using it brings
+            # the database up to date instead.
+            try:
+                self._img.lock()
+            except apx.ImageLockedError:
+                pass
+            else:
+                try:
+                    self._img._sync_search_db(
+                        progtrack=self.__progresstracker, rebuild=True
+                    )
+                finally:
+                    self._img.unlock()
         except search_errors.ProblematicPermissionsIndexException as e:
             error = apx.ProblematicPermissionsIndexException(e)
             self.log_operation_end(error=error)
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The solver clause cache.
+
+This module maintains a per-image store of the base clause sets generated
+by the dependency solver: the clauses which allow only one version of each
+possible package and those which implement the dependencies of each
+possible package.  Generating these requires every dependency of every
+possible package to be parsed and matched against the catalog, yet the
+result is usually the same from one plan to the next.
+
+An entry is keyed by the catalog it was generated from (its last-modified
+time), the variants and facets in effect, the ordered list of possible
+packages, and the sets of avoided and rejected packages; the solver
+variable numbers used in the clauses are derived from the list of
+possible packages, so the clauses can be added to a new solver as-is.
+Avoided and rejected packages remain possible, but group dependencies on
+them are ignored.  Anything else which influences the clauses (publisher
+ranking, freezes, parent image constraints and so on) only does so by
+changing the set of possible packages.
+
+"""
+
+import array
+import errno
+import hashlib
+import os
+
+import pkg.json_wrapper as json
+import pkg.misc as misc
+import pkg.portable as portable
+
+CACHE_VERSION = 2
+
+# The number of clause sets kept; each is specific to a combination of
+# catalog, variants, facets and possible packages, so only recent ones
+# are likely to be reused.
+MAX_ENTRIES = 4
+
+
+class ClauseCache(object):
+    """Manages the solver clause cache for an image.
+
+    'cache_dir' is the directory the clause sets are stored in, and
+    'context' a JSON-serialisable description of the catalog, variants
+    and facets the solver will use.  If the cache cannot be written (e.g.
+    for unprivileged users), existing entries are still used."""
+
+    def __init__(self, cache_dir, context):
+        self.__dir = cache_dir
+        self.__context = context
+
+    def __pathname(self, fmris, avoids, rejects):
+        key = json.dumps(
+            [
+                CACHE_VERSION,
+                self.__context,
+                [str(f) for f in fmris],
+                sorted(avoids),
+                sorted(rejects),
+            ]
+        )
+        return os.path.join(
+            self.__dir, hashlib.sha256(key.encode("utf-8")).hexdigest()
+        )
+
+    def get(self, fmris, avoids=frozenset(), rejects=frozenset()):
+        """Return a tuple of (clauses, known_incs, depend_ts) recorded
+        for the solver variables 'fmris' (the possible package FMRIs in
+        variable order) and the sets of avoided and rejected package
+        stems 'avoids' and 'rejects', or None if there is no such
+        entry."""
+
+        path = self.__pathname(fmris, avoids, rejects)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline().decode("utf-8"))
+                data = f.read()
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        except ValueError:
+            return None
+
+        try:
+            version, count, known_incs, depend_ts = header
+        except (TypeError, ValueError):
+            return None
+        vals = array.array("i")
+        if version != CACHE_VERSION or len(data) % vals.itemsize:
+            return None
+        vals.frombytes(data)
+
+        # Clauses are stored one after the other, each terminated by a
+        # zero (which is never a valid literal).
+        clauses = []
+        clause = []
+        for v in vals:
+            if v:
+                clause.append(v)
+            else:
+                clauses.append(clause)
+                clause = []
+        if clause or len(clauses) != count:
+            return None
+        return clauses, known_incs, depend_ts
+
+    def put(
+        self,
+        fmris,
+        clauses,
+        known_incs,
+        depend_ts,
+        avoids=frozenset(),
+        rejects=frozenset(),
+    ):
+        """Record the list of clauses 'clauses' generated for the solver
+        variables 'fmris' and the sets of avoided and rejected package
+        stems 'avoids' and 'rejects', along with the set of stems
+        'known_incs' found to deliver incorporate dependencies and
+        whether any dependencies had timestamps, 'depend_ts'."""
+
+        path = self.__pathname(fmris, avoids, rejects)
+        vals = array.array("i")
+        for c in clauses:
+            vals.extend(c)
+            vals.append(0)
+
+        tmp_file = path + ".new"
+        try:
+            if not os.path.exists(self.__dir):
+                os.makedirs(self.__dir)
+            with open(tmp_file, "wb") as f:
+                header = [
+                    CACHE_VERSION,
+                    len(clauses),
+                    sorted(known_incs),
+                    depend_ts,
+                ]
+                f.write(json.dumps(header).encode("utf-8"))
+                f.write(b"\n")
+                f.write(vals.tobytes())
+            os.chmod(tmp_file, misc.PKG_FILE_MODE)
+            portable.rename(tmp_file, path)
+            self.__prune(path)
+        except EnvironmentError as e:
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise
+
+    def __prune(self, keep):
+        """Remove all but the MAX_ENTRIES most recently written
+        entries, always keeping the entry at 'keep'."""
+
+        entries = []
+        with os.scandir(self.__dir) as it:
+            for entry in it:
+                if entry.name.endswith(".new") or entry.path == keep:
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except EnvironmentError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+        entries.sort(reverse=True)
+        for _mtime, path in entries[MAX_ENTRIES - 1 :]:
+            try:
+                portable.remove(path)
+            except EnvironmentError as e:
+                if e.errno != errno.ENOENT:
+                    raise
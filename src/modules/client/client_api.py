@@ -3108,6 +3108,7 @@ def _verify(
     verify_paths,
     display_plan_cb=None,
     logger=None,
+    deep=False,
 ):
     """Determine if installed packages match manifests."""
 
@@ -3137,6 +3138,7 @@ def _verify(
         _verify_paths=verify_paths,
         display_plan_cb=display_plan_cb,
         logger=logger,
+        deep=deep,
     )
 
 
@@ -3159,6 +3161,7 @@ def _fix(
     unpackaged,
     display_plan_cb=None,
     logger=None,
+    deep=False,
 ):
     """Fix packaging errors found in the image."""
 
@@ -3181,6 +3184,7 @@ def _fix(
         _unpackaged=unpackaged,
         display_plan_cb=display_plan_cb,
         logger=logger,
+        deep=deep,
     )
 
 
@@ -35,6 +35,7 @@ import hashlib
 import os
 import platform
 import shutil
+import sqlite3
 import subprocess
 import tempfile
 import time
@@ -56,8 +57,12 @@ import pkg.client.linkedimage as li
 import pkg.client.pkgdefs as pkgdefs
 import pkg.client.progress as progress
 import pkg.client.publisher as publisher
+import pkg.client.searchdb as searchdb
 import pkg.client.sigpolicy as sigpolicy
 import pkg.client.transport.transport as transport
+import pkg.client.clausecache as clausecache
+import pkg.client.sizeledger as sizeledger
+import pkg.client.verifycache as verifycache
 import pkg.config as cfg
 import pkg.file_layout.layout as fl
 import pkg.fmri
@@ -233,6 +238,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         # Memoized installed-action cache handle; see
         # get_action_cache().
         self.__actioncache = None
+        # The verified-content cache; see get_verify_cache().
+        self.__verifycache = None
+        # The local search database; see get_search_db().
+        self.__searchdb = None
+        self.__sizeledger = None
 
         # True while update_format is rewriting the image, to stop
         # find_root/__set_dirs re-entering it recursively.
@@ -1392,6 +1402,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         orig_state_root = self.salvage(self._statedir, full_path=True)
         portable.rename(tmp_state_root, self._statedir)
         shutil.rmtree(orig_state_root, True)
+        self.get_size_ledger().record(self._statedir)
 
         self.cfg.set_property("image", "version", self.CURRENT_VERSION)
         self.save_config()
@@ -2446,6 +2457,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         verifypaths=None,
         overlaypaths=None,
         single_act=None,
+        executor=None,
         **kwargs,
     ):
         """Generator that returns a tuple of the form (action, errors,
@@ -2466,10 +2478,24 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         'single_act' is the only action of the specified fmri to
          verify.
 
+        'executor' is an optional misc.BoundedExecutor.  If provided,
+        action verification is performed by the executor's threads and
+        the generator instead returns, in manifest order, Futures whose
+        results are the tuples described above or None if there was
+        nothing to report for the action.  It may not be combined with
+        'verifypaths', 'overlaypaths' or 'single_act'.
+
         'kwargs' is a dict of additional keyword arguments to be passed
         to each action verification routine."""
 
         path_only = bool(verifypaths or overlaypaths)
+        assert executor is None or not (path_only or single_act)
+        if executor is not None:
+            # Results generated inline must be wrapped so that
+            # the caller sees a uniform stream of Futures.
+            wrap = executor.completed
+        else:
+            wrap = lambda rv: rv
         # pkg verify only looks at actions that have not been dehydrated.
         excludes = self.list_excludes()
         vardrate_excludes = [self.cfg.variants.allow_action]
@@ -2539,9 +2565,9 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 )
             except apx.SigningException as e:
                 e.pfmri = fmri
-                yield e.sig, [e], [], [], None
+                yield wrap((e.sig, [e], [], [], None))
             except apx.InvalidResourceLocation as e:
-                yield None, [e], [], [], None
+                yield wrap((None, [e], [], [], None))
 
         def mediation_allowed(act):
             """Helper function to determine if the mediation
@@ -2573,10 +2599,10 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
             # attribute = 'allow'.
             if not path_only:
                 if act.attrs.get("overlay") == "true":
-                    yield act, [], [], [], "overlaying"
+                    yield wrap((act, [], [], [], "overlaying"))
                     continue
                 elif act.attrs.get("overlay"):
-                    yield act, [], [], [], "overlaid"
+                    yield wrap((act, [], [], [], "overlaid"))
                     continue
 
             progresstracker.plan_add_progress(
@@ -2590,6 +2616,21 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 # mediation, so shouldn't be verified.
                 continue
 
+            if executor is not None:
+                # Without paths, __process_verify() doesn't touch
+                # the progress tracker, so it's safe to run it
+                # outside of this thread.
+                yield executor.submit(
+                    self.__verify_action,
+                    act,
+                    fmri,
+                    excludes,
+                    vardrate_excludes,
+                    progresstracker,
+                    **kwargs,
+                )
+                continue
+
             errors, warnings, info, ignore = self.__process_verify(
                 act,
                 path,
@@ -2605,6 +2646,106 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
             if (errors or warnings or info) and not ignore:
                 yield act, errors, warnings, info, None
 
+    def __verify_action(
+        self, act, fmri, excludes, vardrate_excludes, progresstracker, **kwargs
+    ):
+        """Verify a single action on behalf of verify() when an
+        executor is in use; returns the tuple verify() would have
+        yielded for the action or None."""
+
+        errors, warnings, info, ignore = self.__process_verify(
+            act,
+            act.attrs.get("path"),
+            False,
+            fmri,
+            excludes,
+            vardrate_excludes,
+            progresstracker,
+            **kwargs,
+        )
+        if (errors or warnings or info) and not ignore:
+            return act, errors, warnings, info, None
+        return None
+
+    def get_verify_concurrency(self):
+        """Return the number of threads that should be used to verify
+        package content.  PKG_VERIFY_CONCURRENCY overrides the image's
+        verify-concurrency property; a value of 0 or less means one
+        thread per online CPU."""
+
+        concurrency = global_settings.client_verify_concurrency
+        if concurrency is None:
+            concurrency = self.get_property(imageconfig.VERIFY_CONCURRENCY)
+        if concurrency <= 0:
+            concurrency = os.cpu_count() or 1
+        return concurrency
+
+    def get_install_concurrency(self):
+        """Return the number of threads that should be used to write
+        file content during plan execution.  PKG_INSTALL_CONCURRENCY
+        overrides the image's install-concurrency property; a value of
+        0 or less means one thread per online CPU."""
+
+        concurrency = global_settings.client_install_concurrency
+        if concurrency is None:
+            concurrency = self.get_property(imageconfig.INSTALL_CONCURRENCY)
+        if concurrency <= 0:
+            concurrency = os.cpu_count() or 1
+        return concurrency
+
+    def gen_verify(self, fmris, progresstracker, concurrency=None, **kwargs):
+        """Generator that verifies each of the packages in 'fmris' and
+        returns a tuple of the form (fmri, results) for each, in the
+        order given, where 'results' is the list of tuples verify()
+        would yield for that package.
+
+        'concurrency' is the number of threads used to verify package
+        content; if not provided, get_verify_concurrency() is used.
+        When greater than one, the content of subsequent packages is
+        verified while results for earlier ones are being returned,
+        with the amount of outstanding work bounded so that the I/O
+        in flight does not grow with the size of the image.
+
+        'kwargs' is a dict of additional keyword arguments to be passed
+        to verify()."""
+
+        if concurrency is None:
+            concurrency = self.get_verify_concurrency()
+
+        if concurrency <= 1:
+            for pfmri in fmris:
+                yield pfmri, list(self.verify(pfmri, progresstracker, **kwargs))
+            return
+
+        with misc.BoundedExecutor(concurrency) as executor:
+            pending = collections.deque()
+            for pfmri in fmris:
+                pending.append(
+                    (
+                        pfmri,
+                        list(
+                            self.verify(
+                                pfmri,
+                                progresstracker,
+                                executor=executor,
+                                **kwargs,
+                            )
+                        ),
+                    )
+                )
+
+                # Return results for any packages at the head of
+                # the queue that have already been verified.
+                while pending and all(f.done() for f in pending[0][1]):
+                    pfmri, futures = pending.popleft()
+                    yield pfmri, [
+                        rv for rv in (f.result() for f in futures) if rv
+                    ]
+
+            while pending:
+                pfmri, futures = pending.popleft()
+                yield pfmri, [rv for rv in (f.result() for f in futures) if rv]
+
     def image_config_update(self, new_variants, new_facets, new_mediators):
         """update variants in image config"""
 
@@ -2628,6 +2769,51 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         except InvalidContentException:
             return False
 
+    def copy_parent_manifest(self, pfmri, alt_pub=None):
+        """If this image is being operated on by its parent image (as
+        happens for linked image children), and the parent has already
+        retrieved the manifest for pfmri, copy it into this image's
+        manifest cache and return True.  The copy is only used if it
+        verifies against this image's catalogue."""
+
+        mfstpath = self.get_manifest_path(pfmri)
+        pimgdir = global_settings.client_parent_imgdir
+        if not pimgdir or self.version < 4 or not pfmri.publisher:
+            return False
+
+        src = os.path.join(
+            pimgdir, IMG_PUB_DIR, pfmri.publisher, "pkg", pfmri.get_dir_path()
+        )
+        try:
+            with open(src) as f:
+                content = f.read()
+        except EnvironmentError:
+            return False
+
+        try:
+            if not self.transport._verify_manifest(
+                pfmri, content=content, pub=alt_pub
+            ):
+                return False
+        except InvalidContentException:
+            return False
+
+        # Unprivileged callers simply retrieve the manifest as usual.
+        tmp_file = "{0}.{1:d}".format(mfstpath, os.getpid())
+        try:
+            misc.makedirs(os.path.dirname(mfstpath))
+            with open(tmp_file, "w") as f:
+                f.write(content)
+            os.chmod(tmp_file, misc.PKG_FILE_MODE)
+            portable.rename(tmp_file, mfstpath)
+        except (apx.PermissionsException, apx.ReadOnlyFileSystemException):
+            return False
+        except EnvironmentError as e:
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise
+            return False
+        return True
+
     def has_manifest(self, pfmri, alt_pub=None):
         """Check to see if the manifest for pfmri is present on disk and
         has the correct hash."""
@@ -2698,7 +2884,10 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         object.... grab from server if needed"""
 
         try:
-            if not self.has_manifest(fmri, alt_pub=alt_pub):
+            if not (
+                self.has_manifest(fmri, alt_pub=alt_pub)
+                or self.copy_parent_manifest(fmri, alt_pub=alt_pub)
+            ):
                 raise KeyError
             ret = manifest.FactoredManifest(
                 fmri,
@@ -2859,6 +3048,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
             progtrack.job_add_progress(progtrack.JOB_IMAGE_STATE)
             shutil.rmtree(orig_state_root, True)
+            self.get_size_ledger().record(self._statedir)
 
             progtrack.job_add_progress(progtrack.JOB_IMAGE_STATE)
         except EnvironmentError as e:
@@ -3156,6 +3346,35 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
             return imagecatalog.SolverCatalog(db)
         return self.get_catalog(self.IMG_CATALOG_KNOWN)
 
+    def get_clause_cache(self, new_variants=None, new_facets=None):
+        """Return a ClauseCache for the dependency solver to use with
+        the image's known catalog and the current variants and facets,
+        or an updated set if new_variants or new_facets are specified.
+        None is returned if alternate package sources are in effect."""
+
+        if self.__alt_pkg_pub_map:
+            return None
+        db = self.get_state_db()
+        if db is not None:
+            lm = db.last_modified()
+            db.close()
+        else:
+            lm = self.get_catalog(self.IMG_CATALOG_KNOWN).last_modified
+            if lm is not None:
+                lm = pkg.catalog.datetime_to_basic_ts(lm)
+        if lm is None:
+            return None
+
+        variants = self.cfg.variants.copy()
+        if new_variants:
+            variants.update(new_variants)
+        if new_facets is None:
+            new_facets = self.cfg.facets
+        return clausecache.ClauseCache(
+            os.path.join(self.__action_cache_dir, "solver"),
+            [lm, sorted(variants.items()), sorted(new_facets.items())],
+        )
+
     def get_list_catalog(self, name):
         """Return the catalogue object package listing operations
         should use for the given image catalogue name: a ListCatalog
@@ -3390,9 +3609,140 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 raise apx.ReadOnlyFileSystemException(e.filename)
             raise
 
-    def __rebuild_image_catalogs(self, progtrack=None):
+    @staticmethod
+    def __dependency_states(acts, excludes, pub):
+        """Returns a list of the package states (obsolete, renamed or
+        legacy) indicated by the dependency action strings 'acts' of a
+        package from publisher 'pub'."""
+
+        states = []
+        for a in acts:
+            # Constructing action objects for every action would
+            # be a lot slower, so a simple string match is done
+            # first so that only interesting actions get
+            # constructed.
+            if not a.startswith("set"):
+                continue
+            if not (
+                "pkg.obsolete" in a or "pkg.renamed" in a or "pkg.legacy" in a
+            ):
+                continue
+
+            try:
+                act = pkg.actions.fromstr(a)
+            except pkg.actions.ActionError:
+                # If the action can't be parsed or is not yet
+                # supported, continue.
+                continue
+
+            if act.attrs["value"].lower() != "true":
+                continue
+
+            if act.attrs["name"] == "pkg.obsolete":
+                states.append(pkgdefs.PKG_STATE_OBSOLETE)
+            elif act.attrs["name"] == "pkg.renamed":
+                if not act.include_this(excludes, publisher=pub):
+                    continue
+                states.append(pkgdefs.PKG_STATE_RENAMED)
+            elif act.attrs["name"] == "pkg.legacy":
+                states.append(pkgdefs.PKG_STATE_LEGACY)
+        return states
+
+    @staticmethod
+    def __catalog_stamps(publist):
+        """Returns a dict mapping the prefix of each publisher in
+        'publist' to the last-modified time of its catalog in the form
+        recorded in the image state database."""
+
+        stamps = {}
+        for pub in publist:
+            lm = pub.catalog.last_modified
+            if lm is not None:
+                lm = pkg.catalog.datetime_to_basic_ts(lm)
+            stamps[pub.prefix] = lm or ""
+        return stamps
+
+    def __apply_catalog_updates(self, dbpath, publist, updates):
+        """Applies the changes to the publisher catalogs recorded in
+        'updates' to the image state database at 'dbpath'.  Returns
+        False without doing so if the changes made since the database
+        was built aren't all known, in which case the image catalogs
+        must be rebuilt.
+
+        'updates' is as for __rebuild_image_catalogs."""
+
+        if self.version < 5:
+            return False
+
+        db = imagecatalog.ImageCatalog(dbpath)
+        try:
+            stamps = db.usable() and db.catalog_stamps()
+        finally:
+            db.close()
+        if not stamps or set(stamps) != set(p.prefix for p in publist):
+            # The set of publishers has changed.
+            return False
+
+        new_stamps = self.__catalog_stamps(publist)
+        changes = []
+        for pub in publist:
+            if pub.prefix not in updates:
+                if stamps[pub.prefix] != new_stamps[pub.prefix]:
+                    return False
+                continue
+            if updates[pub.prefix] is None:
+                return False
+            old_lm, applied = updates[pub.prefix]
+            if stamps[pub.prefix] != pkg.catalog.datetime_to_basic_ts(old_lm):
+                return False
+            changes.extend(u for u in applied if u[0].publisher == pub.prefix)
+
+        excludes = self.list_excludes()
+        frozen_pkgs = dict(
+            [(p[0].pkg_name, p[0]) for p in self.get_frozen_list()]
+        )
+
+        def entry_cb(pfmri, entry, acts, old):
+            # This mirrors the determination of package state in
+            # __rebuild_image_catalogs.
+            pub, stem, ver = pfmri.tuple()
+            ver = str(ver)
+            mdata = entry["metadata"] = dict(entry.get("metadata", {}))
+            states = mdata["states"] = list(mdata.get("states", []))
+            states.append(pkgdefs.PKG_STATE_KNOWN)
+            states.append(pkgdefs.PKG_STATE_V1)
+
+            if old is not None:
+                states.append(pkgdefs.PKG_STATE_INSTALLED)
+                md = old.get("metadata", {})
+                for key in ["last-install", "last-update"]:
+                    if key in md:
+                        mdata[key] = md[key]
+                if pkgdefs.PKG_STATE_MANUAL in md.get("states", EmptyI):
+                    states.append(pkgdefs.PKG_STATE_MANUAL)
+
+            if stem in frozen_pkgs:
+                f_ver = frozen_pkgs[stem].version
+                if f_ver == ver or pkg.version.Version(ver).is_successor(
+                    f_ver, constraint=pkg.version.CONSTRAINT_AUTO
+                ):
+                    states.append(pkgdefs.PKG_STATE_FROZEN)
+
+            states.extend(self.__dependency_states(acts, excludes, pub))
+            return entry
+
+        imagecatalog.apply_updates(dbpath, changes, entry_cb, new_stamps)
+        return True
+
+    def __rebuild_image_catalogs(self, progtrack=None, updates=None):
         """Rebuilds the image catalogs based on the available publisher
-        catalogs."""
+        catalogs.
+
+        'updates' is an optional dict mapping publisher prefixes to the
+        catalog_updates of the publishers following a refresh.  If the
+        changes to the catalogs of all of the publishers since the image
+        catalogs were last built are known, only those changes are
+        applied to the image catalogs."""
 
         if self.version < 3:
             raise apx.ImageFormatUpdateNeeded(self.root)
@@ -3412,6 +3762,19 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         # Mark all operations as occurring at this time.
         op_time = datetime.datetime.now(datetime.UTC)
 
+        # If all of the changes to the publisher catalogs are known,
+        # they're applied to the image state database in place, in a
+        # single transaction, so nothing else needs to be staged.
+        if updates is not None and self.__apply_catalog_updates(
+            os.path.join(self._statedir, imagecatalog.DB_BASENAME),
+            publist,
+            updates,
+        ):
+            self.__end_state_update()
+            self.get_size_ledger().record(self._statedir)
+            self.__finish_catalog_rebuild(progtrack)
+            return
+
         # The image catalogs need to be updated, but this is a bit
         # tricky as previously known packages must remain known even
         # if PKG_STATE_KNOWN is no longer true if any other state
@@ -3615,41 +3978,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         )
                     dpent = dp_idx.get(ver)
                 if dpent is not None:
-                    for a in dpent["actions"]:
-                        # Constructing action objects
-                        # for every action would be a
-                        # lot slower, so a simple string
-                        # match is done first so that
-                        # only interesting actions get
-                        # constructed.
-                        if not a.startswith("set"):
-                            continue
-                        if not (
-                            "pkg.obsolete" in a
-                            or "pkg.renamed" in a
-                            or "pkg.legacy" in a
-                        ):
-                            continue
-
-                        try:
-                            act = pkg.actions.fromstr(a)
-                        except pkg.actions.ActionError:
-                            # If the action can't be
-                            # parsed or is not yet
-                            # supported, continue.
-                            continue
-
-                        if act.attrs["value"].lower() != "true":
-                            continue
-
-                        if act.attrs["name"] == "pkg.obsolete":
-                            states.append(pkgdefs.PKG_STATE_OBSOLETE)
-                        elif act.attrs["name"] == "pkg.renamed":
-                            if not act.include_this(excludes, publisher=pub):
-                                continue
-                            states.append(pkgdefs.PKG_STATE_RENAMED)
-                        elif act.attrs["name"] == "pkg.legacy":
-                            states.append(pkgdefs.PKG_STATE_LEGACY)
+                    states.extend(
+                        self.__dependency_states(
+                            dpent["actions"], excludes, pub
+                        )
+                    )
 
                 mdata["states"] = states
 
@@ -3749,6 +4082,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                     pkg.fmri.PkgFmri(name=stem, publisher=pub, version=ver)
                 )
 
+        stamps = self.__catalog_stamps(publist)
         if self.version >= 5:
             # The database is the only store for the image state
             # catalogs.
@@ -3756,6 +4090,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 os.path.join(tmp_state_root, imagecatalog.DB_BASENAME),
                 kcat,
                 icat,
+                stamps=stamps,
             )
         else:
             # Save the new catalogs.
@@ -3772,13 +4107,26 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                     os.path.join(tmp_state_root, imagecatalog.DB_BASENAME),
                     kcat,
                     icat,
+                    stamps=stamps,
                 )
 
-        # Next, preserve the old installed state dir, rename the
-        # new one into place, and then remove the old one.
+        self.__replace_state_root(tmp_state_root, progtrack)
+
+    def __replace_state_root(self, tmp_state_root, progtrack):
+        """Moves the rebuilt image catalogs in 'tmp_state_root' into
+        place, completing __rebuild_image_catalogs."""
+
+        # Preserve the old installed state dir, rename the new one
+        # into place, and then remove the old one.
         orig_state_root = self.salvage(self._statedir, full_path=True)
         portable.rename(tmp_state_root, self._statedir)
         shutil.rmtree(orig_state_root, True)
+        self.get_size_ledger().record(self._statedir)
+        self.__finish_catalog_rebuild(progtrack)
+
+    def __finish_catalog_rebuild(self, progtrack):
+        """Completes __rebuild_image_catalogs once the image catalogs
+        in the state directory have been updated."""
 
         # Ensure in-memory catalogs get reloaded.
         self.__init_catalogs()
@@ -3870,42 +4218,79 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
         progtrack.refresh_start(len(pubs_to_refresh), full_refresh=full_refresh)
 
-        failed = []
-        total = 0
-        succeeded = set()
-        updated = self.__start_state_update()
-        for pub in pubs_to_refresh:
-            total += 1
-            progtrack.refresh_start_pub(pub)
-            try:
-                changed, e = pub.refresh(
-                    full_refresh=full_refresh,
-                    immediate=immediate,
-                    progtrack=progtrack,
+        # Check all of the origins of the publishers for catalog updates
+        # at once, rather than waiting for each in turn.
+        staged = {}
+        try:
+            targets = []
+            for pub in pubs_to_refresh:
+                try:
+                    staged[pub.prefix] = pub.prepare_refresh(
+                        full_refresh=full_refresh, immediate=immediate
+                    )
+                except apx.ApiException:
+                    # Reported when the publisher is refreshed.
+                    continue
+                targets.extend(
+                    (pub, origin, staged[pub.prefix][origin.uri])
+                    for origin in pub.repository.origins
+                    if origin.uri in staged[pub.prefix]
                 )
-                if changed:
-                    updated = True
+            if targets:
+                try:
+                    self.transport.prefetch_catalog_attrs(
+                        targets, redownload=full_refresh
+                    )
+                except apx.ApiException:
+                    # Any origins that couldn't be checked are retried
+                    # when their publisher is refreshed.
+                    pass
 
-                if not ignore_unreachable and e:
+            failed = []
+            total = 0
+            succeeded = set()
+            updates = {}
+            updated = self.__start_state_update()
+            for pub in pubs_to_refresh:
+                total += 1
+                progtrack.refresh_start_pub(pub)
+                try:
+                    changed, e = pub.refresh(
+                        full_refresh=full_refresh,
+                        immediate=immediate,
+                        progtrack=progtrack,
+                        staged=staged.get(pub.prefix, EmptyDict),
+                    )
+                    if changed:
+                        updated = True
+                        updates[pub.prefix] = pub.catalog_updates
+
+                    if not ignore_unreachable and e:
+                        failed.append((pub, e))
+                        continue
+
+                except apx.PermissionsException as e:
+                    failed.append((pub, e))
+                    # No point in continuing since no data can
+                    # be written.
+                    break
+                except apx.ApiException as e:
                     failed.append((pub, e))
                     continue
-
-            except apx.PermissionsException as e:
-                failed.append((pub, e))
-                # No point in continuing since no data can
-                # be written.
-                break
-            except apx.ApiException as e:
-                failed.append((pub, e))
-                continue
-            finally:
-                progtrack.refresh_end_pub(pub)
-            succeeded.add(pub.prefix)
+                finally:
+                    progtrack.refresh_end_pub(pub)
+                succeeded.add(pub.prefix)
+        finally:
+            # The catalogs staged for each publisher are discarded
+            # whether or not it could be refreshed.
+            for dirs in staged.values():
+                for tempdir in dirs.values():
+                    shutil.rmtree(tempdir, True)
 
         progtrack.refresh_done()
 
         if updated:
-            self.__rebuild_image_catalogs(progtrack=progtrack)
+            self.__rebuild_image_catalogs(progtrack=progtrack, updates=updates)
             # Ensure any configuration or metadata changes made
             # during refresh are reflected in on-disk state.
             self.save_config()
@@ -4094,6 +4479,91 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         self.__actioncache = cache
         return cache
 
+    def get_verify_cache(self):
+        """Return the VerifyCache recording the content of installed
+        files that has already been verified; it is kept beside the
+        installed-action cache."""
+
+        if self.__verifycache is None:
+            self.__verifycache = verifycache.VerifyCache(
+                self.__action_cache_dir
+            )
+        return self.__verifycache
+
+    def get_search_db(self):
+        """Return a SearchDB consistent with the installed packages, or
+        None if there is no such database or the no-search-db debug
+        value is set.  The database is only read; it's kept up to date
+        by _sync_search_db(), beside the installed-action cache."""
+
+        if DebugValues["no-search-db"]:
+            return None
+
+        if self.__searchdb is None:
+            self.__searchdb = searchdb.SearchDB(self, self.__action_cache_dir)
+        db = self.__searchdb
+
+        if db.is_fresh():
+            return db
+        return None
+
+    def _sync_search_db(self, progtrack=None, rebuild=False):
+        """Bring the local search database into line with the installed
+        packages following an image-modifying operation, or rebuild it
+        from scratch if 'rebuild' is True.  This is done while the
+        search index is updated, so failures are logged rather than
+        raised; they mustn't cause the index to be rebuilt."""
+
+        if DebugValues["no-search-db"]:
+            return
+
+        if rebuild or self.__searchdb is None:
+            if self.__searchdb is not None:
+                # A rebuild replaces the database file, so any
+                # connection to the old one must be dropped.
+                self.__searchdb.close()
+            self.__searchdb = searchdb.SearchDB(self, self.__action_cache_dir)
+        db = self.__searchdb
+        try:
+            if rebuild:
+                db.rebuild(progtrack=progtrack)
+            elif not db.is_fresh():
+                db.update(progtrack=progtrack)
+        except searchdb.ReadOnlyDBError:
+            pass
+        except EnvironmentError as e:
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                self.__search_db_failed(e)
+        except (sqlite3.Error, searchdb.SearchDBError) as e:
+            self.__search_db_failed(e)
+
+    def __search_db_failed(self, e):
+        """Report that the local search database couldn't be updated.
+        Search falls back to reading the installed manifests until it
+        is, so this doesn't cause the operation to fail."""
+
+        if self.__searchdb is not None:
+            self.__searchdb.close()
+            self.__searchdb = None
+        logger.warning(
+            "WARNING: the local search database could not be "
+            "updated: {0}".format(e)
+        )
+
+    def get_size_ledger(self):
+        """Return the SizeLedger recording the size of the image's state
+        directory; it is kept beside the installed-action cache."""
+
+        if self.__sizeledger is None:
+            self.__sizeledger = sizeledger.SizeLedger(self.__action_cache_dir)
+        return self.__sizeledger
+
+    def get_state_size(self):
+        """Return the total size in bytes of the image's state
+        directory."""
+
+        return self.get_size_ledger().get(self._statedir)
+
     def _create_fast_lookups(self, progtrack=None):
         """Rebuild the installed-action cache database from scratch.
         Most callers should use get_action_cache() instead, which
@@ -5072,6 +5542,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         unpackaged=False,
         unpackaged_only=False,
         verify_paths=EmptyI,
+        deep=False,
     ):
         """Create an image plan to fix the image. Note: verify shares
         the same routine."""
@@ -5086,6 +5557,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
             unpackaged=unpackaged,
             unpackaged_only=unpackaged_only,
             verify_paths=verify_paths,
+            deep=deep,
         )
         progtrack.plan_all_done()
 
@@ -5231,6 +5703,21 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
     __AVOID_SET_VERSION = 1
 
+    def __replace_state_file(self, tmp_file, state_file):
+        """Rename 'tmp_file' to 'state_file' in the image's state
+        directory, updating the size ledger accordingly."""
+
+        try:
+            old_size = os.stat(state_file).st_size
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            old_size = 0
+        portable.rename(tmp_file, state_file)
+        self.get_size_ledger().adjust(
+            self._statedir, os.stat(state_file).st_size - old_size
+        )
+
     def avoid_set_get(self, implicit=False):
         """Return copy of avoid set"""
         if implicit:
@@ -5307,7 +5794,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         try:
             json.dump((self.__AVOID_SET_VERSION, d), tf)
             tf.close()
-            portable.rename(tmp_file, state_file)
+            self.__replace_state_file(tmp_file, state_file)
         except Exception as e:
             logger.warning("Cannot save avoid list: {0}".format(str(e)))
             return
@@ -5363,7 +5850,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
         try:
             with open(tmp_file, "w") as tf:
                 json.dump((self.__FROZEN_DICT_VERSION, new_dict), tf)
-            portable.rename(tmp_file, state_file)
+            self.__replace_state_file(tmp_file, state_file)
             self.update_last_modified()
         except EnvironmentError as e:
             raise apx._convert_error(e)
@@ -91,6 +91,9 @@ _INDEXES = [
     "CREATE INDEX pkg_installed ON packages (stem) WHERE installed = 1",
 ]
 
+# Prefix of the meta names recording publisher catalogue timestamps.
+_STAMP_PFX = "catalog-last-modified:"
+
 # Batch size for row inserts.
 _INSERT_BATCH = 5000
 
@@ -111,10 +114,16 @@ def summary_locales(cat):
     )
 
 
-def build_db(pathname, kcat, icat):
+def build_db(pathname, kcat, icat, stamps=None):
     """Create an image state database at 'pathname' from the 'known'
     catalogue 'kcat' and the 'installed' catalogue 'icat'.
 
+    'stamps' is an optional dict mapping the prefix of each publisher
+    whose catalogue the known catalogue was built from to the last
+    modified time (basic_ts format) of that catalogue; it is recorded
+    so that later catalogue changes can be applied incrementally (see
+    apply_updates).
+
     The caller provides crash-safety: the database is expected to be
     created inside a temporary state directory which is renamed into
     place as a whole, so no journal is used here."""
@@ -206,6 +215,11 @@ def build_db(pathname, kcat, icat):
         if lm is not None:
             lm = pkg.catalog.datetime_to_basic_ts(lm)
         cur.execute("INSERT INTO meta VALUES ('last-modified', ?)", (lm or "",))
+        if stamps is not None:
+            cur.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [(_STAMP_PFX + pfx, ts) for pfx, ts in stamps.items()],
+            )
         cur.execute("INSERT INTO meta VALUES ('complete', '1')")
         con.execute("PRAGMA user_version = {0:d}".format(SCHEMA_VERSION))
         con.execute("COMMIT")
@@ -329,6 +343,164 @@ def sync_entries(pathname, kcat, icat, pfmris):
         con.close()
 
 
+def apply_updates(pathname, updates, entry_cb, stamps):
+    """Apply the changes 'updates' made to publisher catalogues to the
+    database at 'pathname' in place, instead of rebuilding it, so that
+    the cost is proportional to the size of the change.  Unlike the
+    other functions here, the database is the one in use by the image,
+    so the changes are made in a single journalled transaction.
+
+    'updates' is a list of tuples of the form (pfmri, op_type, op_time,
+    metadata) as returned by pkg.catalog.Catalog.apply_updates(), in
+    the order they were applied.
+
+    'entry_cb' is called as entry_cb(pfmri, entry, acts, old) for each
+    package added, where 'entry' is a copy of its base catalogue entry,
+    'acts' is the list of its dependency action strings, and 'old' is
+    the base entry of the package if it is installed, or None.  It must
+    return the base entry to record with the package state information
+    apart from PKG_STATE_UPGRADABLE, which is recomputed here for the
+    stems of all of the changed packages.
+
+    'stamps' is as for build_db and replaces the recorded publisher
+    catalogue timestamps."""
+
+    # Only the last operation for each package matters.
+    ops = {}
+    for pfmri, op_type, op_time, metadata in updates:
+        t = (pfmri.publisher, pfmri.pkg_name, str(pfmri.version))
+        ops.pop(t, None)
+        ops[t] = (pfmri, op_type, metadata)
+
+    con = sqlite3.connect(
+        pathname, isolation_level=None, check_same_thread=False
+    )
+    try:
+        con.execute("BEGIN IMMEDIATE")
+
+        for t, (pfmri, op_type, metadata) in ops.items():
+            row = con.execute(
+                "SELECT id, installed, base FROM packages"
+                " WHERE pub = ? AND stem = ? AND version = ?",
+                t,
+            ).fetchone()
+            old = None
+            if row and row[1]:
+                old = json.loads(row[2])
+
+            if op_type == pkg.catalog.CatalogUpdate.REMOVE:
+                if not row:
+                    continue
+                if old is None:
+                    con.execute("DELETE FROM actions WHERE pkg = ?", (row[0],))
+                    con.execute("DELETE FROM packages WHERE id = ?", (row[0],))
+                    continue
+
+                # Installed packages remain known to the image even
+                # if the publisher no longer offers them.
+                mdata = old.setdefault("metadata", {})
+                mdata["states"] = [
+                    s
+                    for s in mdata.get("states", EmptyI)
+                    if s != pkgdefs.PKG_STATE_KNOWN
+                ]
+                con.execute(
+                    "UPDATE packages SET base = ? WHERE id = ?",
+                    (json.dumps(old), row[0]),
+                )
+                continue
+
+            if _BASE_PART not in metadata:
+                # No corresponding base entry; ignore, as build_db
+                # does.
+                continue
+
+            arows = []
+            dacts = EmptyI
+            for pname, pdata in metadata.items():
+                acts = pdata.get("actions", EmptyI)
+                if pname == _DEPS_PART:
+                    dacts = acts
+                    ptype, locale = DEPENDENCY, "C"
+                elif pname.startswith(_SUMM_PART_PFX):
+                    ptype = SUMMARY
+                    locale = pname[len(_SUMM_PART_PFX) :]
+                else:
+                    continue
+                if acts:
+                    arows.append((ptype, locale, "\n".join(acts)))
+
+            entry = dict(
+                (k, v)
+                for k, v in metadata[_BASE_PART].items()
+                if k != "version"
+            )
+            bjson = json.dumps(entry_cb(pfmri, entry, dacts, old))
+            if row:
+                pkg_id = row[0]
+                con.execute(
+                    "UPDATE packages SET base = ? WHERE id = ?",
+                    (bjson, pkg_id),
+                )
+                con.execute("DELETE FROM actions WHERE pkg = ?", (pkg_id,))
+            else:
+                cur = con.execute(
+                    "INSERT INTO packages"
+                    " (pub, stem, version, sortkey, base)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    t + (pkg.version.version_sortkey(t[2]), bjson),
+                )
+                pkg_id = cur.lastrowid
+            con.executemany(
+                "INSERT INTO actions VALUES (?,?,?,?)",
+                [(pkg_id,) + r for r in arows],
+            )
+
+        # Upgradability is determined by whether a package is the
+        # newest version of its stem across all publishers, so only
+        # the stems of the changed packages need to be revisited.
+        for stem in set(t[1] for t in ops):
+            rows = con.execute(
+                "SELECT id, version, base FROM packages"
+                " WHERE stem = ? ORDER BY sortkey DESC",
+                (stem,),
+            ).fetchall()
+            if not rows:
+                continue
+            newest = rows[0][1]
+            for pkg_id, ver, base in rows:
+                entry = json.loads(base)
+                mdata = entry.setdefault("metadata", {})
+                states = mdata.get("states", [])
+                upgradable = pkgdefs.PKG_STATE_UPGRADABLE in states
+                if upgradable == (ver != newest):
+                    continue
+                if upgradable:
+                    states = [
+                        s for s in states if s != pkgdefs.PKG_STATE_UPGRADABLE
+                    ]
+                else:
+                    states = states + [pkgdefs.PKG_STATE_UPGRADABLE]
+                mdata["states"] = states
+                con.execute(
+                    "UPDATE packages SET base = ? WHERE id = ?",
+                    (json.dumps(entry), pkg_id),
+                )
+
+        con.execute(
+            "UPDATE meta SET value = ? WHERE name = 'last-modified'",
+            (pkg.catalog.now_to_basic_ts(),),
+        )
+        con.execute("DELETE FROM meta WHERE name LIKE ?", (_STAMP_PFX + "%",))
+        con.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [(_STAMP_PFX + pfx, ts) for pfx, ts in stamps.items()],
+        )
+        con.execute("COMMIT")
+    finally:
+        con.close()
+
+
 class ImageCatalog(object):
     """Read-only view over an image state database.
 
@@ -430,6 +602,25 @@ class ImageCatalog(object):
             return None
         return row[0]
 
+    def catalog_stamps(self):
+        """A dict mapping the prefix of each publisher whose catalogue
+        the database reflects to that catalogue's last-modified time
+        (basic_ts format), or None if they were not recorded."""
+
+        try:
+            con = self.__open()
+            if con is None:
+                return None
+            rows = con.execute(
+                "SELECT name, value FROM meta WHERE name LIKE ?",
+                (_STAMP_PFX + "%",),
+            ).fetchall()
+        except (sqlite3.Error, EnvironmentError):
+            return None
+        if not rows:
+            return None
+        return dict((name[len(_STAMP_PFX) :], ts) for name, ts in rows)
+
     def __where(self, pubs, prefix="WHERE", stems=None):
         """Return (sql-fragment, params) applying the view's installed
         restriction and optional publisher and stem restrictions."""
@@ -68,6 +68,8 @@ EXCLUDE_POLICY = "exclude-policy"
 KEY_FILES = "key-files"
 DEFAULT_RECURSE = "default-recurse"
 DEFAULT_CONCURRENCY = "recursion-concurrency"
+VERIFY_CONCURRENCY = "verify-concurrency"
+INSTALL_CONCURRENCY = "install-concurrency"
 AUTO_BE_NAME = "auto-be-name"
 
 default_policies = {
@@ -96,6 +98,8 @@ default_properties = {
     # Path default is intentionally relative for this case.
     "trust-anchor-directory": os.path.join("etc", "ssl", "pkg"),
     DEFAULT_CONCURRENCY: 1,
+    VERIFY_CONCURRENCY: 1,
+    INSTALL_CONCURRENCY: 1,
     AUTO_BE_NAME: "omnios-r%r",
 }
 
@@ -264,6 +268,16 @@ class ImageConfig(cfg.FileConfig):
                         minimum=0,
                         default=default_properties[DEFAULT_CONCURRENCY],
                     ),
+                    cfg.PropInt(
+                        VERIFY_CONCURRENCY,
+                        minimum=0,
+                        default=default_properties[VERIFY_CONCURRENCY],
+                    ),
+                    cfg.PropInt(
+                        INSTALL_CONCURRENCY,
+                        minimum=0,
+                        default=default_properties[INSTALL_CONCURRENCY],
+                    ),
                     cfg.Property(
                         AUTO_BE_NAME,
                         default=default_properties[AUTO_BE_NAME],
@@ -37,7 +37,6 @@ import sys
 import tempfile
 import time
 import traceback
-import weakref
 import re as relib
 
 from functools import cmp_to_key, reduce
@@ -113,6 +112,89 @@ def _reorder_hardlinks(hardlinks):
     return reordered
 
 
+class _ContentPipeline(object):
+    """Writes the content of file actions using a pool of threads ahead
+    of their installation by ImagePlan.execute(), so that decompressing
+    and writing the payloads of many files proceeds in parallel while
+    the actions themselves are still executed one at a time, in order.
+
+    Only the content is written early, to a temporary file in the
+    directory that will contain the file; FileAction.install() collects
+    it using take() and then sets its attributes and moves it into place
+    as usual.  Content is only written early for actions whose parent
+    directory already exists and which don't involve preserved or saved
+    files; all others are handled entirely by FileAction.install()."""
+
+    def __init__(self, workers):
+        self.__executor = misc.BoundedExecutor(workers)
+        # The number of actions ahead of the one being executed for
+        # which content may be written.
+        self.__window = workers * 4
+        self.__pending = {}
+
+    def __prepare(self, pkgplan, src, dest):
+        """Begin writing the content of the action 'dest' if it is
+        eligible."""
+
+        if (
+            dest.name != "file"
+            or not dest.data
+            or "preserve" in dest.attrs
+            or "save_file" in dest.attrs
+            or id(dest) in self.__pending
+        ):
+            return
+
+        parent = os.path.dirname(
+            dest.get_installed_path(pkgplan.image.get_root())
+        )
+        # Content must never be written through a link.
+        if not os.path.isdir(parent) or os.path.realpath(parent) != parent:
+            return
+        if not dest.needsdata(src, pkgplan):
+            return
+
+        self.__pending[id(dest)] = self.__executor.submit(
+            dest.write_content, parent
+        )
+
+    def gen_actions(self, actions):
+        """Generator that returns each of the _ActionPlans in 'actions'
+        in turn, having begun writing the content of those that follow
+        it."""
+
+        ahead = 0
+        for i, ap in enumerate(actions):
+            while ahead < len(actions) and ahead <= i + self.__window:
+                self.__prepare(*actions[ahead])
+                ahead += 1
+            yield ap
+
+    def take(self, action):
+        """Return the path of the temporary file containing the content
+        of 'action', or None if it wasn't written early.  Any error
+        encountered while writing the content is raised."""
+
+        fut = self.__pending.pop(id(action), None)
+        if fut is None:
+            return None
+        return fut.result()
+
+    def close(self):
+        """Stop writing content and remove any which was written but
+        not used, as happens if execution fails."""
+
+        self.__executor.shutdown(cancel=True)
+        for fut in self.__pending.values():
+            if fut.cancelled() or fut.exception() is not None:
+                continue
+            try:
+                portable.remove(fut.result())
+            except OSError:
+                pass
+        self.__pending = {}
+
+
 class ImagePlan(object):
     """ImagePlan object contains the plan for changing the image...
     there are separate routines for planning the various types of
@@ -167,6 +249,8 @@ class ImagePlan(object):
 
         self.__pkg_actuators = set()
         self._retrieved = set()
+        # The _ContentPipeline used during execution, if any.
+        self.content_pipeline = None
 
         self.pd = None
         if pd is None:
@@ -764,6 +848,9 @@ class ImagePlan(object):
                 avoid_set,
                 self.image.linked.parent_fmris(),
                 self.__progtrack,
+                clause_cache=self.image.get_clause_cache(
+                    self.pd._new_variants, self.pd._new_facets
+                ),
             )
 
             if reject_list:
@@ -1371,6 +1458,9 @@ class ImagePlan(object):
                 self.image.avoid_set_get(),
                 self.image.linked.parent_fmris(),
                 self.__progtrack,
+                clause_cache=self.image.get_clause_cache(
+                    self.pd._new_variants, self.pd._new_facets
+                ),
             )
 
             # check for triggered ops
@@ -1452,6 +1542,9 @@ class ImagePlan(object):
                 self.image.avoid_set_get(),
                 self.image.linked.parent_fmris(),
                 self.__progtrack,
+                clause_cache=self.image.get_clause_cache(
+                    self.pd._new_variants, self.pd._new_facets
+                ),
             )
 
             if reject_list:
@@ -2251,15 +2344,55 @@ class ImagePlan(object):
             )
 
     def __verify_fmris(
-        self, repairs, args, proposed_fmris, pt, verifypaths, overlaypaths
+        self,
+        repairs,
+        args,
+        proposed_fmris,
+        pt,
+        verifypaths,
+        overlaypaths,
+        verify_cache=None,
     ):
-        """Verify FRMIs."""
+        """Verify FRMIs.
+
+        'verify_cache' is an optional VerifyCache used to avoid reading
+        the content of files which were verified previously and have
+        not changed since."""
 
         path_only = bool(verifypaths or overlaypaths)
         overlay_entries = {}
         def_pkgs = {}  # deferred packages
         def_acts = {}  # deferred actions
-        for pfmri in proposed_fmris:
+
+        if path_only:
+            # Path verification consumes 'verifypaths' and
+            # 'overlaypaths' as matches are found, so each package
+            # must be verified in turn.
+            verified = (
+                (
+                    pfmri,
+                    self.image.verify(
+                        pfmri,
+                        pt,
+                        verifypaths=verifypaths,
+                        overlaypaths=overlaypaths,
+                        verbose=True,
+                        forever=True,
+                        verify_cache=verify_cache,
+                    ),
+                )
+                for pfmri in proposed_fmris
+            )
+        else:
+            verified = self.image.gen_verify(
+                proposed_fmris,
+                pt,
+                verbose=True,
+                forever=True,
+                verify_cache=verify_cache,
+            )
+
+        for pfmri, results in verified:
             entries = []
             needs_fix = []
             result = "OK"
@@ -2273,14 +2406,7 @@ class ImagePlan(object):
             # related messages output for it.
             verify_path_count = len(verifypaths)
             overlay_path_count = len(overlaypaths)
-            for act, errors, warnings, pinfo, overlay in self.image.verify(
-                pfmri,
-                pt,
-                verifypaths=verifypaths,
-                overlaypaths=overlaypaths,
-                verbose=True,
-                forever=True,
-            ):
+            for act, errors, warnings, pinfo, overlay in results:
                 if not path_only and overlay:
                     path = act.attrs.get("path")
                     if path not in overlay_entries:
@@ -2395,8 +2521,13 @@ class ImagePlan(object):
         unpackaged=False,
         unpackaged_only=False,
         verify_paths=misc.EmptyI,
+        deep=False,
     ):
-        """Determine the changes needed to fix the image."""
+        """Determine the changes needed to fix the image.
+
+        If 'deep' is True, the content of every file is read and
+        checked even if it was previously verified and has not changed
+        since."""
 
         self.__plan_op()
         self.__evaluate_excludes()
@@ -2421,6 +2552,10 @@ class ImagePlan(object):
         overlaypaths = set()
         verifypaths = set(a.lstrip(os.path.sep) for a in verify_paths)
 
+        vcache = None
+        if not deep:
+            vcache = self.image.get_verify_cache()
+
         if not verify_paths:
             pt.plan_start(pt.PLAN_PKG_VERIFY, goal=len(proposed_fixes))
 
@@ -2442,13 +2577,25 @@ class ImagePlan(object):
                 # contents.
                 pt.plan_start(pt.PLAN_PKG_VERIFY, goal=len(proposed_fixes))
             self.__verify_fmris(
-                repairs, args, proposed_fixes, pt, verifypaths, overlaypaths
+                repairs,
+                args,
+                proposed_fixes,
+                pt,
+                verifypaths,
+                overlaypaths,
+                verify_cache=vcache,
             )
         else:
             pt.plan_start(pt.PLAN_PKG_VERIFY, goal=len(verifypaths))
 
             self.__verify_fmris(
-                repairs, args, proposed_fixes, pt, verifypaths, overlaypaths
+                repairs,
+                args,
+                proposed_fixes,
+                pt,
+                verifypaths,
+                overlaypaths,
+                verify_cache=vcache,
             )
 
             timestamp = misc.time_to_timestamp(time.time())
@@ -2475,10 +2622,18 @@ class ImagePlan(object):
                     if f not in pfixes
                 ]
                 self.__verify_fmris(
-                    repairs, args, path_fmri, pt, set(), overlaypaths
+                    repairs,
+                    args,
+                    path_fmri,
+                    pt,
+                    set(),
+                    overlaypaths,
+                    verify_cache=vcache,
                 )
 
         pt.plan_done(pt.PLAN_PKG_VERIFY)
+        if vcache is not None:
+            vcache.flush()
         # If no repairs, finish the plan.
         if not repairs:
             self.__finish_plan(plandesc.EVALUATED_PKGS)
@@ -3235,7 +3390,6 @@ class ImagePlan(object):
         cache,
         action_classes,
         skip_fmris,
-        fmri_dict,
     ):
         """Update 'tgt' with action/fmri pairs from the installed
         action cache that are associated with the specified action
@@ -3254,9 +3408,8 @@ class ImagePlan(object):
         representing the packages which we should not process actions
         for.
 
-        The 'fmri_dict' parameter is a cache of previously built PkgFmri
-        objects which is used so the same string isn't translated into
-        the same PkgFmri object multiple times."""
+        The PkgFmri objects are interned, so the same string isn't
+        translated into a PkgFmri object multiple times."""
 
         anames = [klass.name for klass in action_classes]
         pns = None
@@ -3277,11 +3430,7 @@ class ImagePlan(object):
             assert pns is None or act.namespace_group == pns
             pns = act.namespace_group
 
-            try:
-                pfmri = fmri_dict[fmristr]
-            except KeyError:
-                pfmri = pkg.fmri.PkgFmri(fmristr)
-                fmri_dict[fmristr] = pfmri
+            pfmri = pkg.fmri.intern_fmri(fmristr)
             if skip_dups and self.__act_dup_check(tgt, key, actstr, fmristr):
                 continue
             tgt.setdefault(key, []).append((act, pfmri))
@@ -3614,7 +3763,6 @@ class ImagePlan(object):
 
         conflict_clean_image = not cache.has_conflicts()
 
-        fmri_dict = weakref.WeakValueDictionary()
         # Iterate over action types in namespace groups first; our first
         # check should be for action type consistency.
         for ns, action_classes in namespace_dict.items():
@@ -3657,7 +3805,6 @@ class ImagePlan(object):
                 cache,
                 action_classes,
                 gone_fmris,
-                fmri_dict,
             )
 
             # Now update 'new' with all actions from the
@@ -3672,12 +3819,10 @@ class ImagePlan(object):
                 cache,
                 action_classes,
                 gone_fmris | changing_fmris,
-                fmri_dict,
             )
 
             self.__check_conflicts(new, old, action_classes, ns, errs)
 
-        del fmri_dict
         self.__clear_pkg_plans()
         self.__evaluate_fixups()
         pt.plan_done(pt.PLAN_ACTION_CONFLICT)
@@ -4096,7 +4241,7 @@ class ImagePlan(object):
         # closest to where the download cache is stored.  (Twice the
         # amount is used because image state update involves using
         # a complete copy of existing state.)
-        pd._cbytes_added += misc.get_dir_size(self.image._statedir) * 2
+        pd._cbytes_added += self.image.get_state_size() * 2
 
         # Our slop factor is 25%; overestimating is safer than under-
         # estimating.  This attempts to approximate how much overhead
@@ -4311,11 +4456,17 @@ class ImagePlan(object):
                 oldfmri, newfmri, enabled_publishers
             )
             if oldfmri:
-                if not self.image.has_manifest(oldfmri):
+                if not (
+                    self.image.has_manifest(oldfmri)
+                    or self.image.copy_parent_manifest(oldfmri)
+                ):
                     prefetch_mfsts.append((oldfmri, old_in))
                     old_in = None  # so we don't send it twice
             if newfmri:
-                if not self.image.has_manifest(newfmri):
+                if not (
+                    self.image.has_manifest(newfmri)
+                    or self.image.copy_parent_manifest(newfmri)
+                ):
                     prefetch_mfsts.append((newfmri, new_in))
                     new_in = None
             eval_list.append((oldfmri, old_in, newfmri, new_in))
@@ -5769,6 +5920,19 @@ image (there are configured exclusions):""")
             # client isn't left with invalid state.
             self.image._remove_fast_lookups()
 
+        # Forget any previous verification of the files this operation
+        # is about to modify.
+        self.image.get_verify_cache().invalidate(
+            a.attrs["path"]
+            for ap in itertools.chain(
+                self.pd.removal_actions,
+                self.pd.install_actions,
+                self.pd.update_actions,
+            )
+            for a in (ap.src, ap.dst)
+            if a is not None and a.name == "file"
+        )
+
         if not self.image.is_liveroot():
             # Check if the child is a running zone. If so run the
             # actuator in the zone.
@@ -5823,47 +5987,60 @@ image (there are configured exclusions):""")
                 # be re-used.
                 self.pd.removal_actions = []
 
-                # execute installs; if action throws a retry
-                # exception try it again afterwards.
-                retries = []
-                for p, src, dest in self.pd.install_actions:
-                    try:
-                        p.execute_install(src, dest)
+                # The content of file actions may be written by a
+                # pool of threads ahead of their installation.
+                concurrency = self.image.get_install_concurrency()
+                if concurrency > 1:
+                    self.content_pipeline = _ContentPipeline(concurrency)
+                    gen_actions = self.content_pipeline.gen_actions
+                else:
+                    gen_actions = iter
+                try:
+                    # execute installs; if action throws a retry
+                    # exception try it again afterwards.
+                    retries = []
+                    for p, src, dest in gen_actions(self.pd.install_actions):
+                        try:
+                            p.execute_install(src, dest)
+                            pt.actions_add_progress(pt.ACTION_INSTALL)
+                        except pkg.actions.ActionRetry:
+                            retries.append((p, src, dest))
+                    for p, src, dest in retries:
+                        p.execute_retry(src, dest)
                         pt.actions_add_progress(pt.ACTION_INSTALL)
-                    except pkg.actions.ActionRetry:
-                        retries.append((p, src, dest))
-                for p, src, dest in retries:
-                    p.execute_retry(src, dest)
-                    pt.actions_add_progress(pt.ACTION_INSTALL)
-                retries = []
-                pt.actions_done(pt.ACTION_INSTALL)
-
-                # Done with installs, so discard them so memory
-                # can be re-used.
-                self.pd.install_actions = []
-
-                # execute updates; in some cases there may be
-                # a retryable exception, so capture those and
-                # retry after running through all the
-                # actions(which might address the reason for
-                # the retryable exception).
-                # An example is a user action that depends
-                # upon a file existing (ie ftpusers).
-                retries = []
-                for p, src, dest in self.pd.update_actions:
-                    try:
-                        p.execute_update(src, dest)
+                    retries = []
+                    pt.actions_done(pt.ACTION_INSTALL)
+
+                    # Done with installs, so discard them so memory
+                    # can be re-used.
+                    self.pd.install_actions = []
+
+                    # execute updates; in some cases there may be
+                    # a retryable exception, so capture those and
+                    # retry after running through all the
+                    # actions(which might address the reason for
+                    # the retryable exception).
+                    # An example is a user action that depends
+                    # upon a file existing (ie ftpusers).
+                    retries = []
+                    for p, src, dest in gen_actions(self.pd.update_actions):
+                        try:
+                            p.execute_update(src, dest)
+                            pt.actions_add_progress(pt.ACTION_UPDATE)
+                        except pkg.actions.ActionRetry:
+                            retries.append((p, src, dest))
+
+                    for p, src, dest in retries:
+                        p.execute_retry(src, dest)
                         pt.actions_add_progress(pt.ACTION_UPDATE)
-                    except pkg.actions.ActionRetry:
-                        retries.append((p, src, dest))
-
-                for p, src, dest in retries:
-                    p.execute_retry(src, dest)
-                    pt.actions_add_progress(pt.ACTION_UPDATE)
-                retries = []
+                    retries = []
 
-                pt.actions_done(pt.ACTION_UPDATE)
-                pt.actions_all_done()
+                    pt.actions_done(pt.ACTION_UPDATE)
+                    pt.actions_all_done()
+                finally:
+                    if self.content_pipeline:
+                        self.content_pipeline.close()
+                        self.content_pipeline = None
                 pt.set_major_phase(pt.PHASE_FINALIZE)
 
                 # Done with updates, so discard them so memory
@@ -5985,6 +6162,10 @@ image (there are configured exclusions):""")
                     ind.setup()
                 if empty_image or ind.check_index_existence():
                     ind.client_update_index(([], executed_pp), self.image)
+                else:
+                    # There's no index to update, but local search
+                    # can still use the search database.
+                    self.image._sync_search_db(progtrack=self.__progtrack)
             except KeyboardInterrupt:
                 raise
             except se.ProblematicPermissionsIndexException:
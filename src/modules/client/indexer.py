@@ -65,6 +65,16 @@ class Indexer(indexer.Indexer):
         self._data_full_fmri_hash.set_hash(self._data_full_fmri.get_set())
         indexer.Indexer._write_assistant_dicts(self, out_dir)
 
+    def client_update_index(self, pkgplan_list, image, tmp_index_dir=None):
+        """Updates the index for the changed packages, then brings the
+        image's local search database, which is used when the index
+        can't be, into line with the installed packages."""
+
+        indexer.Indexer.client_update_index(
+            self, pkgplan_list, image, tmp_index_dir=tmp_index_dir
+        )
+        self.image._sync_search_db(progtrack=self._progtrack)
+
     def check_index_has_exactly_fmris(self, fmri_names):
         """Checks to see if the fmris given are the ones indexed."""
         try:
@@ -2842,7 +2842,9 @@ class LinkedImageChild(object):
             self
         )
 
-        self.__pkg_remote = pkg.client.pkgremote.PkgRemote()
+        self.__pkg_remote = pkg.client.pkgremote.PkgRemote(
+            parent_imgdir=self.__img.imgdir
+        )
         self.__child_op_rvtuple = None
         self.__child_op = None
 
@@ -52,6 +52,7 @@ BE_ACTIVATE           = "be_activate"
 BE_TEMP_ACTIVATE      = "be_temp_activate"
 BE_NAME               = "be_name"
 CONCURRENCY           = "concurrency"
+DEEP                  = "deep"
 DENY_NEW_BE           = "deny_new_be"
 FORCE                 = "force"
 IGNORE_MISSING        = "ignore_missing"
@@ -1283,6 +1284,10 @@ opts_table_publishers = [
 opts_table_unpackaged = [
     (UNPACKAGED,       False, [], {"type": "boolean"}),
 ]
+
+opts_table_deep = [
+    (DEEP,             False, [], {"type": "boolean"}),
+]
 #
 # Options for pkg(1) subcommands.  Built by combining the option tables above,
 # with some optional subcommand unique options defined below.
@@ -1467,6 +1472,7 @@ opts_fix = \
     opts_table_no_headers + \
     opts_table_parsable + \
     opts_table_unpackaged + \
+    opts_table_deep + \
     []
 
 opts_verify = \
@@ -1475,6 +1481,7 @@ opts_verify = \
     opts_table_no_headers + \
     opts_table_parsable + \
     opts_table_unpackaged + \
+    opts_table_deep + \
     [
     opts_table_cb_nqv,
     opts_table_cb_unpackaged,
@@ -128,6 +128,7 @@ class PkgSolver(object):
         avoids,
         parent_pkgs,
         progtrack,
+        clause_cache=None,
     ):
         """Create a PkgSolver instance; catalog should contain all
         known pkgs, installed fmris should be a dict of fmris indexed
@@ -135,7 +136,9 @@ class PkgSolver(object):
         Pub_ranks dict contains (rank, stickiness, enabled) for each
         publisher.  variants are the current image variants; avoids is
         the set of pkg stems being avoided in the image due to
-        administrator action (e.g. --reject, uninstall)."""
+        administrator action (e.g. --reject, uninstall).  clause_cache
+        is an optional pkg.client.clausecache.ClauseCache used to reuse
+        the clauses generated for the possible packages."""
 
         # Value 'DebugValues' is unsubscriptable;
         # pylint: disable=E1136
@@ -180,6 +183,8 @@ class PkgSolver(object):
         self.__progitem = None  # progress tracker plan item
 
         self.__addclause_failure = False
+        self.__clause_cache = clause_cache
+        self.__cached_clauses = 0  # clauses taken from clause_cache
 
         self.__variant_dict = {}  # fmris -> variant cache
         self.__variants = variants  # variants supported by image
@@ -252,8 +257,14 @@ class PkgSolver(object):
     def __str__(self):
         s = "Solver: ["
         if self.__state in [SOLVER_FAIL, SOLVER_SUCCESS]:
-            s += (" Variables: {0:d} Clauses: {1:d} Iterations: {2:d}").format(
-                self.__variables, self.__clauses, self.__iterations
+            s += (
+                " Variables: {0:d} Clauses: {1:d} ({2:d} cached)"
+                " Iterations: {3:d}"
+            ).format(
+                self.__variables,
+                self.__clauses,
+                self.__cached_clauses,
+                self.__iterations,
             )
         s += " State: {0}]".format(self.__state)
 
@@ -290,6 +301,7 @@ class PkgSolver(object):
         self.__solver = None
         self.__progtrack = None
         self.__addclause_failure = False
+        self.__clause_cache = None
         self.__variant_dict = None
         self.__variants = None
         self.__cache = None
@@ -756,21 +768,57 @@ class PkgSolver(object):
         each package can be installed and generate dependency clauses
         for possible packages."""
 
+        # These clauses depend only on the possible fmris (and the
+        # catalog, variants and facets they were chosen from) and the
+        # avoided and rejected packages, so are likely to be the same
+        # as those generated for a previous plan.
+        fmris = None
+        if self.__clause_cache is not None:
+            fmris = [self.__id2fmri[i] for i in range(1, self.__variables + 1)]
+            cached = self.__clause_cache.get(
+                fmris, avoids=self.__avoid_set, rejects=self.__reject_set
+            )
+            if cached is not None:
+                clauses, known_incs, depend_ts = cached
+                self.__progress()
+                self.__addclauses(clauses)
+                self.__cached_clauses = len(clauses)
+                self.__known_incs.update(known_incs)
+                self.__depend_ts = self.__depend_ts or depend_ts
+                return
+
         # Generate clauses for only one version of each package, and
         # for dependencies for each package.  Do so for all possible
         # fmris.
+        generated = []
+        trimmed = len(self.__trim_dict)
         for name in self.__possible_dict:
             self.__progress()
             # Ensure only one version of a package is installed
-            self.__addclauses(
-                self.__gen_highlander_clauses(self.__possible_dict[name])
-            )
+            clauses = self.__gen_highlander_clauses(self.__possible_dict[name])
+            self.__addclauses(clauses)
+            generated.extend(clauses)
             # generate dependency clauses for each pkg
             for fmri in self.__possible_dict[name]:
                 for da in self.__get_dependency_actions(
                     fmri, excludes=excludes
                 ):
-                    self.__addclauses(self.__gen_dependency_clauses(fmri, da))
+                    clauses = self.__gen_dependency_clauses(fmri, da)
+                    self.__addclauses(clauses)
+                    generated.extend(clauses)
+
+        # Packages trimmed while generating the clauses (for having
+        # invalid actions) must be trimmed again when the clauses are
+        # reused, so only record the clauses if there were none.
+        if fmris is not None and len(self.__trim_dict) == trimmed:
+            self.__clause_cache.put(
+                fmris,
+                generated,
+                self.__known_incs,
+                self.__depend_ts,
+                avoids=self.__avoid_set,
+                rejects=self.__reject_set,
+            )
 
     def __generate_operation_clauses(self, proposed=None, proposed_dict=None):
         """Generate initial solver clauses for the proposed packages (if
@@ -1883,7 +1931,11 @@ class PkgSolver(object):
         older=True"""
         solution_vector = []
         self.__state = SOLVER_FAIL
+        # ids of fmris already excluded, and of those whose newer (or
+        # older) versions have been; the excluded set for a given fmri
+        # doesn't change, so each is only considered once.
         eliminated = set()
+        combed = set()
         while not self.__addclause_failure and self.__solver.solve([]):
             self.__progress()
             self.__iterations += 1
@@ -1897,7 +1949,8 @@ class PkgSolver(object):
 
             # prevent the selection of any older pkgs except for
             # those that are part of the set of allowed downgrades;
-            for fid in solution_vector:
+            remove_ids = set()
+            for fid in solution_vector - combed:
                 pfmri = self.__getfmri(fid)
                 matching, remaining = self.__comb_newer_fmris(pfmri)
                 if not older:
@@ -1908,9 +1961,12 @@ class PkgSolver(object):
                     # packages
                     remove = remaining - self.__allowed_downgrades
                 else:
-                    remove = matching - set([pfmri]) - eliminated
-                for f in remove:
-                    self.__addclauses([[-self.__getid(f)]])
+                    remove = matching - set([pfmri])
+                remove_ids.update(self.__getid(f) for f in remove)
+            combed |= solution_vector
+            remove_ids -= eliminated
+            eliminated |= remove_ids
+            self.__addclauses([[-i] for i in sorted(remove_ids)])
 
             # prevent the selection of this exact combo;
             # permit [] solution
@@ -67,7 +67,10 @@ class PkgRemote(object):
     __SETUP = "call-setup"
     __STARTED = "call-started"
 
-    def __init__(self):
+    def __init__(self, parent_imgdir=None):
+        # image directory of the image on whose behalf we operate
+        self.__parent_imgdir = parent_imgdir
+
         # initialize RPC server process state
         self.__rpc_server_proc = None
         self.__rpc_server_fstdout = None
@@ -135,12 +138,18 @@ class PkgRemote(object):
         fstdout = tempfile.TemporaryFile()
         fstderr = tempfile.TemporaryFile()
 
+        # let the server reuse data from the parent image.
+        env = None
+        if self.__parent_imgdir:
+            env = dict(os.environ, PKG_PARENT_IMGDIR=self.__parent_imgdir)
+
         try:
             p = subprocess.Popen(
                 pkg_cmd,
                 stdout=fstdout,
                 stderr=fstderr,
                 pass_fds=(server_cmd_pipe, server_prog_pipe_fobj.fileno()),
+                env=env,
             )
 
         except OSError as e:
@@ -1383,6 +1383,7 @@ class Publisher(object):
     # found near the end of the class definition.
     _catalog = None
     __alias = None
+    __catalog_updates = None
     __client_uuid = None
     __client_uuid_time = None
     __disabled = False
@@ -1861,6 +1862,18 @@ pkg unset-publisher {0}
         if self.meta_root:
             return os.path.join(self.meta_root, "catalog")
 
+    @property
+    def catalog_updates(self):
+        """The changes made to the publisher's catalog by the last
+        refresh, as a tuple of (last_modified, updates) where
+        'last_modified' is the time the catalog was last modified
+        before the refresh and 'updates' is the list returned by
+        pkg.catalog.Catalog.apply_updates(), or None if they are not
+        known (for example, because the catalog was retrieved in
+        full)."""
+
+        return self.__catalog_updates
+
     def create_meta_root(self):
         """Create the publisher's meta_root."""
 
@@ -2326,6 +2339,7 @@ pkg unset-publisher {0}
         repo,
         progtrack=None,
         include_updates=False,
+        prefetched=False,
     ):
         """The method to refresh the publisher's metadata against
         a catalog/1 source.  If the more recent catalog/1 version
@@ -2333,7 +2347,10 @@ pkg unset-publisher {0}
         Returns a tuple of (changed, refreshed) where 'changed'
         indicates whether new catalog data was found and 'refreshed'
         indicates that catalog data was actually retrieved to determine
-        if there were any updates."""
+        if there were any updates.
+
+        If 'prefetched' is True, the catalog.attrs file has already
+        been retrieved into 'tempdir'."""
 
         # If full_refresh is True, then redownload should be True to
         # ensure a non-cached version of the catalog is retrieved.
@@ -2346,15 +2363,16 @@ pkg unset-publisher {0}
 
         v1_cat = pkg.catalog.Catalog(meta_root=croot)
         try:
-            self.transport.get_catalog1(
-                self,
-                ["catalog.attrs"],
-                path=tempdir,
-                redownload=redownload,
-                revalidate=revalidate,
-                alt_repo=repo,
-                progtrack=progtrack,
-            )
+            if not prefetched:
+                self.transport.get_catalog1(
+                    self,
+                    ["catalog.attrs"],
+                    path=tempdir,
+                    redownload=redownload,
+                    revalidate=revalidate,
+                    alt_repo=repo,
+                    progtrack=progtrack,
+                )
         except api_errors.UnsupportedRepositoryOperation:
             # No v1 catalogs available.
             if v1_cat.exists:
@@ -2420,7 +2438,7 @@ pkg unset-publisher {0}
         # move the files to the appropriate location.
         validate = False
         if not full_refresh and v1_cat.exists:
-            v1_cat.apply_updates(tempdir)
+            self.__catalog_updates = v1_cat.apply_updates(tempdir)
         else:
             if v1_cat.exists:
                 # This is a full refresh.  Destroy
@@ -2462,12 +2480,16 @@ pkg unset-publisher {0}
         origin,
         progtrack=None,
         include_updates=False,
+        tempdir=None,
     ):
         """Private helper method used to refresh catalog data for each
         origin.  Returns a tuple of (changed, refreshed) where 'changed'
         indicates whether new catalog data was found and 'refreshed'
         indicates that catalog data was actually retrieved to determine
-        if there were any updates."""
+        if there were any updates.
+
+        'tempdir' is an optional directory, returned by
+        prepare_refresh(), to use for assembly of catalog pieces."""
 
         # Create a copy of the current repository object that only
         # contains the origin specified.
@@ -2477,7 +2499,8 @@ pkg unset-publisher {0}
         # Create temporary directory for assembly of catalog pieces.
         try:
             misc.makedirs(croot)
-            tempdir = tempfile.mkdtemp(dir=croot)
+            if not tempdir:
+                tempdir = tempfile.mkdtemp(dir=croot)
         except EnvironmentError as e:
             if e.errno == errno.EACCES:
                 raise api_errors.PermissionsException(e.filename)
@@ -2485,12 +2508,17 @@ pkg unset-publisher {0}
                 raise api_errors.ReadOnlyFileSystemException(e.filename)
             raise
 
-        # Make a test contact to the repo to see if it is responding.
-        # We need to pass in a publisher object which only has one
-        # origin so create one from our current publisher.
-        test_pub = copy.copy(self)
-        test_pub.repository = repo
-        self.transport.version_check(test_pub)
+        # If the catalog attributes were retrieved ahead of time, the
+        # repo has already been shown to be responding.
+        prefetched = os.path.exists(os.path.join(tempdir, "catalog.attrs"))
+        if not prefetched:
+            # Make a test contact to the repo to see if it is
+            # responding.  We need to pass in a publisher object
+            # which only has one origin so create one from our
+            # current publisher.
+            test_pub = copy.copy(self)
+            test_pub.repository = repo
+            self.transport.version_check(test_pub)
 
         # Ensure that the temporary directory gets removed regardless
         # of success or failure.
@@ -2504,6 +2532,7 @@ pkg unset-publisher {0}
                 repo,
                 progtrack=progtrack,
                 include_updates=include_updates,
+                prefetched=prefetched,
             )
 
             # Perform publisher metadata sanity checks.
@@ -2522,6 +2551,7 @@ pkg unset-publisher {0}
         progtrack=None,
         include_updates=False,
         ignore_errors=False,
+        staged=EmptyDict,
     ):
         """The method to handle the overall refresh process.  It
         determines if a refresh is actually needed, and then calls
@@ -2529,34 +2559,22 @@ pkg unset-publisher {0}
 
         assert self.transport
 
-        if full_refresh:
-            immediate = True
-
-        for origin, opath in self.__gen_origin_paths():
-            misc.makedirs(opath)
-            cat = pkg.catalog.Catalog(meta_root=opath, read_only=True)
-            if not cat.exists:
-                # If a catalog hasn't been retrieved for
-                # any of the origins, then a refresh is
-                # needed now.
-                immediate = True
-                break
+        self.__catalog_updates = None
+        if not self.__refresh_needed(full_refresh, immediate):
+            return False, None
 
-        # Ensure consistent directory structure.
-        self.create_meta_root()
-
-        # Check if we already have a v1 catalog on disk.
-        if not full_refresh and self.catalog.exists:
-            # If catalog is on disk, check if refresh is necessary.
-            if not immediate and not self.needs_refresh:
-                # No refresh needed.
-                return False, None
+        # The changes to the catalog are only known if it is updated
+        # incrementally from a single origin; __refresh_v1 records them
+        # in that case.
+        old_lm = self.catalog.last_modified
+        applied = None
+        origins = list(self.__gen_origin_paths())
 
         any_changed = False
         any_refreshed = False
         failed = []
         total = 0
-        for origin, opath in self.__gen_origin_paths():
+        for origin, opath in origins:
             total += 1
             try:
                 changed, refreshed = self.__refresh_origin(
@@ -2567,6 +2585,7 @@ pkg unset-publisher {0}
                     origin,
                     progtrack=progtrack,
                     include_updates=include_updates,
+                    tempdir=staged.get(origin.uri),
                 )
             except api_errors.InvalidDepotResponseException as e:
                 failed.append((origin, e))
@@ -2575,6 +2594,7 @@ pkg unset-publisher {0}
                     any_changed = True
                 if refreshed:
                     any_refreshed = True
+            applied, self.__catalog_updates = self.__catalog_updates, None
 
         if any_refreshed:
             # Update refresh time.
@@ -2584,6 +2604,8 @@ pkg unset-publisher {0}
         # composite of the catalogs from all origins.
         if self.__rebuild_catalog():
             any_changed = True
+        elif len(origins) == 1 and old_lm is not None and applied is not None:
+            self.__catalog_updates = (old_lm, applied)
 
         errors = None
         if failed:
@@ -2591,12 +2613,74 @@ pkg unset-publisher {0}
 
         return any_changed, errors
 
+    def __refresh_needed(self, full_refresh, immediate):
+        """Returns a boolean indicating whether the publisher's metadata
+        should be refreshed now, ensuring that the directories for it
+        exist."""
+
+        if full_refresh:
+            immediate = True
+
+        for origin, opath in self.__gen_origin_paths():
+            misc.makedirs(opath)
+            cat = pkg.catalog.Catalog(meta_root=opath, read_only=True)
+            if not cat.exists:
+                # If a catalog hasn't been retrieved for
+                # any of the origins, then a refresh is
+                # needed now.
+                immediate = True
+                break
+
+        # Ensure consistent directory structure.
+        self.create_meta_root()
+
+        # Check if we already have a v1 catalog on disk.
+        if not full_refresh and self.catalog.exists:
+            # If catalog is on disk, check if refresh is necessary.
+            if not immediate and not self.needs_refresh:
+                # No refresh needed.
+                return False
+        return True
+
+    def prepare_refresh(self, full_refresh=False, immediate=False):
+        """Prepares for a refresh of the publisher's metadata, so that
+        the catalog attributes of the origins of several publishers can
+        be retrieved at once using the transport's
+        prefetch_catalog_attrs() method before each is refreshed.
+
+        Returns a dictionary mapping the URI of each origin to be
+        refreshed to a temporary directory to retrieve its catalog.attrs
+        file into, which is empty if no refresh is needed now.  The
+        dictionary should be passed to refresh() as 'staged'; the
+        caller is responsible for removing any directories that remain
+        afterwards.
+
+        'full_refresh' and 'immediate' are as for refresh()."""
+
+        if not self.__refresh_needed(full_refresh, immediate):
+            return {}
+
+        staged = {}
+        try:
+            for origin, opath in self.__gen_origin_paths():
+                staged[origin.uri] = tempfile.mkdtemp(dir=opath)
+        except EnvironmentError as e:
+            for tempdir in staged.values():
+                shutil.rmtree(tempdir, True)
+            if e.errno == errno.EACCES:
+                raise api_errors.PermissionsException(e.filename)
+            if e.errno == errno.EROFS:
+                raise api_errors.ReadOnlyFileSystemException(e.filename)
+            raise
+        return staged
+
     def refresh(
         self,
         full_refresh=False,
         immediate=False,
         progtrack=None,
         include_updates=False,
+        staged=EmptyDict,
     ):
         """Refreshes the publisher's metadata, returning a tuple
         containing a boolean value indicating whether any updates to the
@@ -2616,7 +2700,10 @@ pkg unset-publisher {0}
 
         'include_updates' is an optional boolean value indicating
         whether all catalog updates should be retrieved additionally to
-        the catalog."""
+        the catalog.
+
+        'staged' is an optional dictionary returned by
+        prepare_refresh()."""
 
         try:
             return self.__refresh(
@@ -2624,6 +2711,7 @@ pkg unset-publisher {0}
                 immediate,
                 progtrack=progtrack,
                 include_updates=include_updates,
+                staged=staged,
             )
         except (
             api_errors.BadCatalogUpdateIdentity,
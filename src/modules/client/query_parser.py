@@ -187,6 +187,8 @@ class TermQuery(qp.TermQuery):
         self._data_fast_remove = None
         self.full_fmri_hash = None
         self._data_fast_add = None
+        self._get_search_db = None
+        self._search_db = None
 
     def __init_gdd(self, path):
         gdd = self._global_data_dict
@@ -221,6 +223,7 @@ class TermQuery(qp.TermQuery):
         gen_installed_pkg_names,
         get_use_slow_search,
         set_use_slow_search,
+        get_search_db=None,
         **kwargs,
     ):
         """This function provides the necessary information to the AST
@@ -234,9 +237,16 @@ class TermQuery(qp.TermQuery):
         whether slow search has been used.
 
         The "set_use_slow_search" parameter is a function that sets
-        whether slow search was used."""
+        whether slow search was used.
+
+        The "get_search_db" parameter is a function that returns the
+        image's local search database, or None if it can't be used.
+        It's used instead of slow search when the index is missing,
+        out of date or can't be read."""
 
         self.get_use_slow_search = get_use_slow_search
+        self._get_search_db = get_search_db
+        self._search_db = None
         self._efn = gen_installed_pkg_names()
         index_dir = kwargs["index_dir"]
         self._lock_client_gdd(index_dir)
@@ -259,9 +269,14 @@ class TermQuery(qp.TermQuery):
                 self.full_fmri_hash = tq_gdd["fmri_hash"]
                 set_use_slow_search(False)
             except se.NoIndexException:
-                # If no index was found, the slower version of
-                # search will be used.
-                set_use_slow_search(True)
+                # If no index was found, the search database or
+                # failing that, the slower version of search will
+                # be used.
+                if not self._use_search_db():
+                    set_use_slow_search(True)
+            except se.InconsistentIndexException:
+                if not self._use_search_db():
+                    raise
         finally:
             self._unlock_client_gdd(index_dir)
 
@@ -285,10 +300,15 @@ class TermQuery(qp.TermQuery):
 
         if restriction:
             return self._restricted_search_internal(restriction)
+        elif self._search_db is not None:
+            return self._search_db_internal()
         elif not self.get_use_slow_search():
             try:
                 self.full_fmri_hash.check_against_file(self._efn)
             except se.IncorrectIndexFileHash:
+                if self._use_search_db():
+                    self._data_main_dict.close_file_handle()
+                    return self._search_db_internal()
                 raise api_errors.IncorrectIndexFileHash()
             base_res = self._search_internal(fmris)
             client_res = self._search_fast_update(manifest_func, excludes)
@@ -300,6 +320,29 @@ class TermQuery(qp.TermQuery):
         else:
             return self.slow_search(fmris, manifest_func, excludes)
 
+    def _use_search_db(self):
+        """Arrange for the image's local search database to be used
+        instead of the index, returning whether it can be."""
+
+        if self._get_search_db:
+            self._search_db = self._get_search_db()
+        return self._search_db is not None
+
+    def _search_db_internal(self):
+        """This function searches the image's local search database,
+        producing results in the same form as slow_search."""
+
+        return self._search_db.search(
+            self._term,
+            self._case_sensitive,
+            self._glob or not self._case_sensitive,
+            action_type=None if self.action_type_wildcard else self.action_type,
+            key=None if self.key_wildcard else self.key,
+            pkg_name_match=(
+                None if self.pkg_name_wildcard else self.pkg_name_match
+            ),
+        )
+
     def _check_fast_remove(self, res):
         """This function removes any results from the generator "res"
         (the search results) that are actions from packages known to
@@ -0,0 +1,485 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The local search database.
+
+This module maintains a per-image sqlite3 database recording, for every
+installed package, each of the tokens which its actions are indexed
+under (as produced by pkg.manifest.Manifest.search_dict()), together
+with the action type, key and value that the token matched and the
+manifest line of the action.
+
+Local search uses the database when the image's search index is
+missing, out of date or can't be read, rather than reading the manifest
+of every installed package for each search term.  Like the installed-
+action cache, it is kept up to date with the installed packages
+incrementally as the image is modified.
+
+"""
+
+import errno
+import fnmatch
+import os
+import re
+import sqlite3
+import tempfile
+from urllib.parse import quote
+
+import pkg.client.actioncache as actioncache
+import pkg.client.progress as progress
+import pkg.manifest as manifest
+import pkg.misc as misc
+import pkg.portable as portable
+
+DB_BASENAME = "search.sqlite"
+
+SCHEMA_VERSION = 1
+
+# Batch size for token row inserts.
+_INSERT_BATCH = 5000
+
+_SCHEMA = [
+    """CREATE TABLE meta (
+        name  TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE packages (
+        pkg_id INTEGER PRIMARY KEY,
+        fmri   TEXT NOT NULL UNIQUE,
+        sfmri  TEXT NOT NULL
+    )""",
+    """CREATE TABLE lines (
+        line_id INTEGER PRIMARY KEY,
+        pkg_id  INTEGER NOT NULL,
+        line    TEXT NOT NULL
+    )""",
+    """CREATE TABLE tokens (
+        pkg_id  INTEGER NOT NULL,
+        ftok    TEXT NOT NULL,
+        tok     TEXT NOT NULL,
+        aname   TEXT NOT NULL,
+        subtype TEXT,
+        value   TEXT,
+        line_id INTEGER NOT NULL
+    )""",
+]
+
+_INDICES = [
+    "CREATE INDEX tokens_ix_ftok ON tokens (ftok)",
+    "CREATE INDEX tokens_ix_pkg ON tokens (pkg_id)",
+    "CREATE INDEX lines_ix_pkg ON lines (pkg_id)",
+]
+
+# Characters which re.IGNORECASE matches against an ASCII letter, but
+# which casefold() doesn't map to it.
+_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i"})
+
+
+class SearchDBError(Exception):
+    """Base exception for local search database errors."""
+
+
+class ReadOnlyDBError(SearchDBError):
+    """Raised when the database cannot be opened for writing."""
+
+
+def _fold(s):
+    """Return the form of the token 's' under which it is indexed.  Any
+    token which matches a pattern case-insensitively starts with the
+    folded form of the literal prefix of the pattern."""
+
+    return s.translate(_FOLD).casefold()
+
+
+def _literal_prefix(pattern):
+    """Return the part of the fnmatch-style 'pattern' preceding its first
+    wildcard."""
+
+    return re.split(r"[*?[]", pattern, maxsplit=1)[0]
+
+
+class SearchDB(object):
+    """Manages the local search database for an image.
+
+    All write operations assume the caller holds the image lock; search
+    only ever reads the database.  The only concurrency handled here is
+    readers observing a database replaced by rename, which is safe
+    because an open file descriptor keeps the old copy alive."""
+
+    def __init__(self, image, cache_dir):
+        self.__image = image
+        self.__dir = cache_dir
+        self.__path = os.path.join(cache_dir, DB_BASENAME)
+        self.__con = None
+        self.__rw = False
+        self.__conid = None
+
+    @property
+    def pathname(self):
+        return self.__path
+
+    def close(self):
+        if self.__con:
+            try:
+                self.__con.close()
+            except sqlite3.Error:
+                pass
+            self.__con = None
+            self.__rw = False
+            self.__conid = None
+
+    def __fileid(self):
+        """Return an identity token for the file currently at the
+        database path, or None if it does not exist."""
+
+        try:
+            st = os.stat(self.__path)
+            return (st.st_dev, st.st_ino)
+        except EnvironmentError:
+            return None
+
+    def __check_replaced(self):
+        """Drop the cached connection if the file at the database
+        path is no longer the file the connection was opened on (a
+        full rebuild replaces the database by rename)."""
+
+        if self.__con and self.__conid != self.__fileid():
+            self.close()
+
+    def __connect(self, mode):
+        con = sqlite3.connect(
+            "file:{0}?mode={1}".format(quote(self.__path), mode),
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        con.execute("PRAGMA temp_store = MEMORY")
+        return con
+
+    def __open_ro(self):
+        """Return a read-only connection to the database, or None if
+        it does not exist or cannot be opened."""
+
+        self.__check_replaced()
+        if self.__con:
+            return self.__con
+        try:
+            self.__con = self.__connect("ro")
+        except sqlite3.OperationalError:
+            return None
+        self.__rw = False
+        self.__conid = self.__fileid()
+        return self.__con
+
+    def __open_rw(self):
+        """Return a read-write connection to the database, raising
+        ReadOnlyDBError if it exists but cannot be written."""
+
+        self.__check_replaced()
+        if self.__con and self.__rw:
+            return self.__con
+        self.close()
+        # Check that both the database and its directory (needed for
+        # the rollback journal) can be written up front, as sqlite
+        # otherwise only reports failures at the first write.
+        try:
+            fd = os.open(self.__path, os.O_WRONLY)
+            os.close(fd)
+            # The probe is given a name of its own so that it can't
+            # be mistaken for a database being rebuilt.
+            fd, probe = tempfile.mkstemp(dir=self.__dir)
+            os.close(fd)
+            os.unlink(probe)
+        except EnvironmentError as e:
+            if e.errno in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise ReadOnlyDBError(str(e))
+            raise
+        try:
+            con = self.__connect("rw")
+        except sqlite3.OperationalError as e:
+            raise ReadOnlyDBError(str(e))
+        con.execute("PRAGMA synchronous = NORMAL")
+        self.__con = con
+        self.__rw = True
+        self.__conid = self.__fileid()
+        return con
+
+    def __installed_pfmris(self):
+        """Return a dictionary mapping installed package fmri strings
+        to their PkgFmri objects according to the image's installed
+        catalog."""
+
+        return dict(
+            (str(pfmri), pfmri) for pfmri in self.__image.gen_installed_pkgs()
+        )
+
+    def __usable(self, con):
+        """Return True if the database was completely built by a
+        compatible version of this code for the image's current
+        variants and facets."""
+
+        try:
+            uv = con.execute("PRAGMA user_version").fetchone()[0]
+            if uv != SCHEMA_VERSION:
+                return False
+            meta = dict(con.execute("SELECT name, value FROM meta"))
+        except sqlite3.DatabaseError:
+            return False
+        if meta.get("complete") != "1":
+            return False
+        return meta.get("excludes") == actioncache._excludes_signature(
+            self.__image
+        )
+
+    def is_fresh(self):
+        """Return True if the database exists, is usable, and is
+        consistent with the image's installed catalog."""
+
+        con = self.__open_ro()
+        if con is None:
+            return False
+        try:
+            if not self.__usable(con):
+                return False
+            dbf = set(r[0] for r in con.execute("SELECT fmri FROM packages"))
+        except sqlite3.DatabaseError:
+            return False
+        return dbf == set(self.__installed_pfmris())
+
+    def __add_package(self, cur, f, pfmri, excludes):
+        """Record the tokens of the installed package 'pfmri', whose
+        fmri string is 'f', using the cursor 'cur'."""
+
+        cur.execute(
+            "INSERT INTO packages (fmri, sfmri) VALUES (?, ?)",
+            (f, pfmri.get_fmri(anarchy=True, include_scheme=False)),
+        )
+        pkg_id = cur.lastrowid
+        sd = manifest.Manifest.search_dict(
+            self.__image.get_manifest_path(pfmri),
+            excludes,
+            return_line=True,
+        )
+        line_ids = {}
+        batch = []
+        for (tok, aname, subtype, value), lines in sd.items():
+            ftok = _fold(tok)
+            for l in lines:
+                line_id = line_ids.get(l)
+                if line_id is None:
+                    cur.execute(
+                        "INSERT INTO lines (pkg_id, line) VALUES (?, ?)",
+                        (pkg_id, l),
+                    )
+                    line_id = line_ids[l] = cur.lastrowid
+                batch.append(
+                    (pkg_id, ftok, tok, aname, subtype, value, line_id)
+                )
+                if len(batch) >= _INSERT_BATCH:
+                    cur.executemany(
+                        "INSERT INTO tokens VALUES (?,?,?,?,?,?,?)", batch
+                    )
+                    batch = []
+        if batch:
+            cur.executemany("INSERT INTO tokens VALUES (?,?,?,?,?,?,?)", batch)
+
+    def update(self, progtrack=None):
+        """Bring the database into line with the installed catalog,
+        incrementally where possible, rebuilding otherwise. Raises
+        ReadOnlyDBError or EnvironmentError (EACCES/EROFS/EPERM) when the
+        database is not writable."""
+
+        if not progtrack:
+            progtrack = progress.NullProgressTracker()
+
+        if not os.path.exists(self.__path):
+            self.rebuild(progtrack=progtrack)
+            return
+
+        try:
+            con = self.__open_rw()
+            if not self.__usable(con):
+                self.rebuild(progtrack=progtrack)
+                return
+            dbf = dict(con.execute("SELECT fmri, pkg_id FROM packages"))
+        except sqlite3.DatabaseError:
+            # Corrupt database; replace it.
+            self.rebuild(progtrack=progtrack)
+            return
+
+        inst = self.__installed_pfmris()
+        extra = [pkg_id for f, pkg_id in dbf.items() if f not in inst]
+        missing = [f for f in inst if f not in dbf]
+        if not extra and not missing:
+            return
+
+        excludes = self.__image.list_excludes()
+        cur = con.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        progtrack.job_start(progtrack.JOB_UPDATE_SEARCH, goal=len(missing))
+        try:
+            for table in ("tokens", "lines", "packages"):
+                for sql, args in misc.SQLiteDB.delete_statements(
+                    table, "pkg_id", extra
+                ):
+                    cur.execute(sql, args)
+
+            for f in missing:
+                self.__add_package(cur, f, inst[f], excludes)
+                progtrack.job_add_progress(progtrack.JOB_UPDATE_SEARCH)
+            cur.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        finally:
+            progtrack.job_done(progtrack.JOB_UPDATE_SEARCH)
+
+    def rebuild(self, progtrack=None):
+        """Rebuild the database from scratch from the manifests of the
+        installed packages, atomically replacing any existing
+        database. Raises EnvironmentError with EACCES/EROFS/EPERM when the
+        cache directory is not writable."""
+
+        if not progtrack:
+            progtrack = progress.NullProgressTracker()
+
+        self.close()
+
+        if not os.path.exists(self.__dir):
+            os.makedirs(self.__dir)
+
+        tmp_path = self.__path + ".tmp"
+        # Probe writability with a plain open so that permission
+        # problems surface as EnvironmentError, and remove any
+        # temporary database left by an interrupted build.
+        fd = os.open(
+            tmp_path,
+            os.O_CREAT | os.O_WRONLY | os.O_TRUNC,
+            misc.PKG_FILE_MODE,
+        )
+        os.close(fd)
+
+        inst = self.__installed_pfmris()
+        excludes = self.__image.list_excludes()
+        progtrack.job_start(progtrack.JOB_REBUILD_SEARCH, goal=len(inst))
+        con = sqlite3.connect(
+            tmp_path, check_same_thread=False, isolation_level=None
+        )
+        try:
+            # Durability is provided by the rename into place below; a
+            # partially-written temporary file is never visible.
+            con.execute("PRAGMA journal_mode = OFF")
+            con.execute("PRAGMA synchronous = OFF")
+            con.execute("PRAGMA temp_store = MEMORY")
+            con.execute("BEGIN")
+            for ddl in _SCHEMA:
+                con.execute(ddl)
+
+            cur = con.cursor()
+            for f, pfmri in inst.items():
+                self.__add_package(cur, f, pfmri, excludes)
+                progtrack.job_add_progress(progtrack.JOB_REBUILD_SEARCH)
+
+            for ddl in _INDICES:
+                con.execute(ddl)
+
+            con.execute(
+                "INSERT INTO meta VALUES ('excludes', ?)",
+                (actioncache._excludes_signature(self.__image),),
+            )
+            con.execute("INSERT INTO meta VALUES ('complete', '1')")
+            con.execute("PRAGMA user_version = {0:d}".format(SCHEMA_VERSION))
+            con.execute("COMMIT")
+            con.close()
+            con = None
+            os.chmod(tmp_path, misc.PKG_FILE_MODE)
+            portable.rename(tmp_path, self.__path)
+        except BaseException:
+            if con:
+                con.close()
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            progtrack.job_done(progtrack.JOB_REBUILD_SEARCH)
+
+    def search(
+        self,
+        term,
+        case_sensitive,
+        glob,
+        action_type=None,
+        key=None,
+        pkg_name_match=None,
+    ):
+        """Yield (action type, key, fmri string, value, manifest line)
+        tuples for each installed action indexed under a token matching
+        'term', in the form pkg.client.query_parser.TermQuery returns
+        them.
+
+        If 'glob' is True, 'term' is an fnmatch-style pattern rather
+        than a token.  Results are restricted to actions of type
+        'action_type' and to tokens of 'key', unless they are None, and
+        to packages whose fmri string 'pkg_name_match' matches, unless
+        it is None."""
+
+        con = self.__open_ro()
+        if con is None:
+            raise SearchDBError(
+                "local search database disappeared: {0}".format(self.__path)
+            )
+
+        where = []
+        args = []
+        if glob:
+            match = re.compile(
+                fnmatch.translate(term), 0 if case_sensitive else re.I
+            ).match
+            prefix = _fold(_literal_prefix(term))
+            if prefix:
+                where.append("t.ftok >= ?")
+                args.append(prefix)
+                if ord(prefix[-1]) < 0x10FFFF:
+                    where.append("t.ftok < ?")
+                    args.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        else:
+            match = None
+            where.append("t.ftok = ? AND t.tok = ?")
+            args.extend((_fold(term), term))
+        if action_type is not None:
+            where.append("t.aname = ?")
+            args.append(action_type)
+        if key is not None:
+            where.append("t.subtype = ?")
+            args.append(key)
+
+        sql = (
+            "SELECT t.tok, t.aname, t.subtype, p.sfmri, t.value, l.line"
+            " FROM tokens t"
+            " JOIN packages p ON p.pkg_id = t.pkg_id"
+            " JOIN lines l ON l.line_id = t.line_id"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        for tok, at, st, sfmri, fv, l in con.execute(sql, args):
+            if match and not match(tok):
+                continue
+            if pkg_name_match and not pkg_name_match(sfmri):
+                continue
+            yield at, st, sfmri, fv, l
@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The image size ledger.
+
+This module maintains a per-image record of the total size of the
+directories whose size is needed when planning operations (such as the
+image state directory, which is included in the space required by every
+plan), so that they don't have to be walked each time.
+
+Each entry includes a stamp made from the stat information of the
+directory and of the entries immediately within it.  Files in these
+directories are replaced using rename or, in the case of the state
+database, modified in place, so the stamp no longer matches once the
+directory has changed and the size is then found by walking it again.
+Code which changes a directory can instead record its new size using
+record() or adjust() so that the next plan doesn't have to.  Entries
+are also reconciled with the directory once they are older than
+RECONCILE_INTERVAL, in case of changes deeper in the tree that don't
+alter the stamp.
+
+"""
+
+import errno
+import os
+import threading
+import time
+
+import pkg.json_wrapper as json
+import pkg.misc as misc
+import pkg.portable as portable
+
+LEDGER_BASENAME = "sizes.json"
+
+LEDGER_VERSION = 1
+
+# The number of seconds after which an entry is checked against the
+# directory even if its stamp still matches.
+RECONCILE_INTERVAL = 86400
+
+
+def _stamp(path):
+    """Return the stamp for the directory 'path': a list of its inode
+    number and modification time followed by the name, size and
+    modification time of each entry within it."""
+
+    st = os.stat(path)
+    stamp = [st.st_ino, st.st_mtime_ns]
+    with os.scandir(path) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            est = entry.stat(follow_symlinks=False)
+            stamp.append([entry.name, est.st_size, est.st_mtime_ns])
+    return stamp
+
+
+class SizeLedger(object):
+    """Manages the size ledger for an image.
+
+    If the ledger cannot be written (e.g. for unprivileged users), sizes
+    are still recorded in memory for the life of the object."""
+
+    def __init__(self, cache_dir):
+        self.__dir = cache_dir
+        self.__path = os.path.join(cache_dir, LEDGER_BASENAME)
+        self.__lock = threading.Lock()
+        self.__entries = None
+
+    @property
+    def pathname(self):
+        return self.__path
+
+    def __load(self):
+        """Load the ledger if it hasn't been already.  The caller must
+        hold the lock."""
+
+        if self.__entries is not None:
+            return
+        self.__entries = {}
+        try:
+            with open(self.__path) as f:
+                version, entries = json.load(f)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return
+        except ValueError:
+            # The ledger is only a cache; ignore anything unusable.
+            return
+        if version == LEDGER_VERSION and isinstance(entries, dict):
+            self.__entries = entries
+
+    def __save(self):
+        """Write the ledger, if possible.  The caller must hold the
+        lock."""
+
+        tmp_file = self.__path + ".new"
+        try:
+            if not os.path.exists(self.__dir):
+                os.makedirs(self.__dir)
+            with open(tmp_file, "w") as f:
+                json.dump((LEDGER_VERSION, self.__entries), f)
+            os.chmod(tmp_file, misc.PKG_FILE_MODE)
+            portable.rename(tmp_file, self.__path)
+        except EnvironmentError as e:
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise
+
+    def __record(self, path, size):
+        """Record 'size' as the size of the directory 'path' and return
+        it.  The caller must hold the lock."""
+
+        try:
+            stamp = _stamp(path)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            self.__entries.pop(path, None)
+            self.__save()
+            return 0
+        self.__entries[path] = {
+            "size": size,
+            "stamp": stamp,
+            "time": int(time.time()),
+        }
+        self.__save()
+        return size
+
+    def get(self, path):
+        """Return the total size in bytes of the files within the
+        directory 'path', walking it only if the ledger has no valid
+        entry for it."""
+
+        with self.__lock:
+            self.__load()
+            entry = self.__entries.get(path)
+            if (
+                entry is not None
+                and time.time() - entry["time"] < RECONCILE_INTERVAL
+            ):
+                try:
+                    if _stamp(path) == entry["stamp"]:
+                        return entry["size"]
+                except EnvironmentError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    return 0
+            if not os.path.isdir(path):
+                return 0
+            return self.__record(path, misc.get_dir_size(path))
+
+    def record(self, path):
+        """Walk the directory 'path' and record its size; called once
+        the directory has been rewritten."""
+
+        with self.__lock:
+            self.__load()
+            if not os.path.isdir(path):
+                return self.__record(path, 0)
+            return self.__record(path, misc.get_dir_size(path))
+
+    def adjust(self, path, delta):
+        """Note that the total size of the files within the directory
+        'path' has changed by 'delta' bytes.  If the ledger has no entry
+        for the directory, its size is found when it is next needed."""
+
+        with self.__lock:
+            self.__load()
+            entry = self.__entries.get(path)
+            if entry is None:
+                return
+            self.__record(path, max(entry["size"] + delta, 0))
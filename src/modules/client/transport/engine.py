@@ -53,6 +53,32 @@ from pkg.client.debugvalues import DebugValues
 pipelined_protocols = ()
 response_protocols = ("ftp", "http", "https")
 
+# Whether libcurl is able to use HTTP/2 for https requests.  If it is,
+# HTTP/2 is offered during the TLS handshake and, if the server accepts
+# it, requests to the same server are multiplexed over one connection.
+http2_supported = bool(
+    hasattr(pycurl, "CURL_HTTP_VERSION_2TLS")
+    and hasattr(pycurl, "PIPEWAIT")
+    and pycurl.version_info()[4] & getattr(pycurl, "VERSION_HTTP2", 0)
+)
+
+
+def _multiplexed(hdl, proto):
+    """Return True if the request made using the curl handle 'hdl' over
+    protocol 'proto' may have shared its connection with other requests
+    in flight at the same time."""
+
+    if proto in pipelined_protocols:
+        return True
+    if not http2_supported or proto != "https":
+        return False
+    try:
+        return hdl.getinfo(pycurl.INFO_HTTP_VERSION) == (
+            pycurl.CURL_HTTP_VERSION_2_0
+        )
+    except (AttributeError, pycurl.error):
+        return False
+
 
 class TransportEngine(object):
     """This is an abstract class.  It shouldn't implement any
@@ -264,7 +290,7 @@ class CurlTransportEngine(TransportEngine):
             # the total time must be obtained by subtracting the
             # time the transfer of the individual request started
             # from the total time.
-            if conn_time == 0 and proto in pipelined_protocols:
+            if conn_time == 0 and _multiplexed(h, proto):
                 # Only performing this subtraction when the
                 # conn_time is 0 allows the first request in
                 # the pipeline to properly include connection
@@ -368,7 +394,7 @@ class CurlTransportEngine(TransportEngine):
             # the total time must be obtained by subtracting the
             # time the transfer of the individual request started
             # from the total time.
-            if conn_time == 0 and proto in pipelined_protocols:
+            if conn_time == 0 and _multiplexed(h, proto):
                 # Only performing this subtraction when the
                 # conn_time is 0 allows the first request in
                 # the pipeline to properly include connection
@@ -904,8 +930,17 @@ class CurlTransportEngine(TransportEngine):
         # Set limit on maximum number of redirects
         hdl.setopt(pycurl.MAXREDIRS, global_settings.PKG_CLIENT_MAX_REDIRECT)
 
-        # Use HTTP/1.1
-        hdl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_1_1)
+        # Use HTTP/2 for https if possible, so that requests to the
+        # same server share a connection instead of each needing a
+        # handle and connection of their own; otherwise, HTTP/1.1.
+        if http2_supported and treq.url.startswith("https:"):
+            hdl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+            # Wait for an existing connection to the server to
+            # confirm whether it can multiplex before opening
+            # another one.
+            hdl.setopt(pycurl.PIPEWAIT, 1)
+        else:
+            hdl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_1_1)
 
         # Store the proxy in the handle so it can be used to retrieve
         # transport statistics later.
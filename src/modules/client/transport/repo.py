@@ -32,6 +32,7 @@ import itertools
 import os
 import shutil
 import sys
+import tarfile
 import tempfile
 
 from email.utils import formatdate
@@ -57,6 +58,10 @@ import pkg.server.query_parser as sqp
 
 from pkg.misc import N_, compute_compressed_attrs, EmptyDict
 
+# The maximum number of files requested at once using the filelist
+# operation; this matches the limit imposed by the depot.
+FILELIST_MAX = 1024
+
 
 class TransportRepo(object):
     """The TransportRepo class handles transport requests.
@@ -99,6 +104,25 @@ class TransportRepo(object):
 
         raise NotImplementedError
 
+    def add_catalog1_requests(
+        self,
+        filelist,
+        destloc,
+        header=None,
+        ts=None,
+        progtrack=None,
+        pub=None,
+        revalidate=False,
+        redownload=False,
+    ):
+        """Queue requests for the catalog files listed in 'filelist'
+        with the transport engine, without waiting for them to
+        complete, so that requests to several repositories can be
+        performed at once.  The arguments are as for get_catalog1.
+        Returns the list of URLs requested."""
+
+        raise NotImplementedError
+
     def get_datastream(
         self, fhash, version, header=None, ccancel=None, pub=None
     ):
@@ -159,6 +183,13 @@ class TransportRepo(object):
 
         raise NotImplementedError
 
+    def add_versions_request(self, filepath, header=None):
+        """Queue a request for the repo's versions information, to be
+        written to 'filepath', with the transport engine without
+        waiting for it to complete.  Returns the URL requested."""
+
+        raise NotImplementedError
+
     def publish_add(self, action, header=None, progtrack=None, trans_id=None):
         """The publish operation that adds content to a repository.
         The action must be populated with a data property.
@@ -407,6 +438,7 @@ class HTTPRepo(TransportRepo):
         The convenience function new_repo() can be used to create
         the correct repo."""
         self._url = repostats.url
+        self._repostats = repostats
         self._repouri = repouri
         self._engine = engine
         self._verdata = None
@@ -586,7 +618,7 @@ class HTTPRepo(TransportRepo):
             requesturl, header, compress=True, ccancel=ccancel
         )
 
-    def get_catalog1(
+    def add_catalog1_requests(
         self,
         filelist,
         destloc,
@@ -597,18 +629,9 @@ class HTTPRepo(TransportRepo):
         revalidate=False,
         redownload=False,
     ):
-        """Get the files that make up the catalog components
-        that are listed in 'filelist'.  Download the files to
-        the directory specified in 'destloc'.  The caller
-        may optionally specify a dictionary with header
-        elements in 'header'.  If a conditional get is
-        to be performed, 'ts' should contain a floating point
-        value of seconds since the epoch.
-
-        If 'redownload' or 'revalidate' is set, cache control
-        headers are appended to the request.  Re-download
-        uses http's no-cache header, while revalidate uses
-        max-age=0."""
+        """Queue requests for the catalog files listed in 'filelist'
+        with the transport engine, without waiting for them to
+        complete.  Returns the list of URLs requested."""
 
         baseurl = self.__get_request_url("catalog/1/", pub=pub)
         urllist = []
@@ -646,6 +669,43 @@ class HTTPRepo(TransportRepo):
                 progclass=progclass,
             )
 
+        return urllist
+
+    def get_catalog1(
+        self,
+        filelist,
+        destloc,
+        header=None,
+        ts=None,
+        progtrack=None,
+        pub=None,
+        revalidate=False,
+        redownload=False,
+    ):
+        """Get the files that make up the catalog components
+        that are listed in 'filelist'.  Download the files to
+        the directory specified in 'destloc'.  The caller
+        may optionally specify a dictionary with header
+        elements in 'header'.  If a conditional get is
+        to be performed, 'ts' should contain a floating point
+        value of seconds since the epoch.
+
+        If 'redownload' or 'revalidate' is set, cache control
+        headers are appended to the request.  Re-download
+        uses http's no-cache header, while revalidate uses
+        max-age=0."""
+
+        urllist = self.add_catalog1_requests(
+            filelist,
+            destloc,
+            header=header,
+            ts=ts,
+            progtrack=progtrack,
+            pub=pub,
+            revalidate=revalidate,
+            redownload=redownload,
+        )
+
         try:
             while self._engine.pending:
                 self._engine.run()
@@ -794,6 +854,24 @@ class HTTPRepo(TransportRepo):
         it contains a ProgressTracker object for the
         downloads."""
 
+        if (
+            len(filelist) > 1
+            and self._repouri.runtime_proxy in (None, "-")
+            and self.supports_version("filelist", [0]) > -1
+        ):
+            # Retrieve as many of the files as possible using as
+            # few requests as possible; any that couldn't be are
+            # retrieved individually below.  This isn't done when
+            # a proxy is used, as the responses to the individual
+            # requests may be cached by it, unlike the response to
+            # a filelist request.
+            fetched = self.__get_filelist(
+                filelist, dest, progtrack, header, pub
+            )
+            filelist = [f for f in filelist if f not in fetched]
+            if not filelist:
+                return []
+
         baseurl = self.__get_request_url("file/{0}/".format(version), pub=pub)
         urllist = []
         progclass = None
@@ -842,6 +920,79 @@ class HTTPRepo(TransportRepo):
 
         return self._annotate_exceptions(errors)
 
+    def __get_filelist(self, filelist, dest, progtrack, header, pub):
+        """Retrieve the files named by hash in 'filelist' to the
+        directory 'dest' using the filelist operation, which returns
+        many files in a single tar stream.  Returns the set of files
+        that were retrieved; those which the repository didn't include
+        in the stream, or which weren't received because the request
+        failed, are left for the caller to retrieve individually."""
+
+        requesturl = self.__get_request_url("filelist/0/", pub=pub)
+        ccancel = getattr(progtrack, "check_cancelation", None)
+        wanted = set(filelist)
+        fetched = set()
+        nreqs = 0
+
+        for i in range(0, len(filelist), FILELIST_MAX):
+            if ccancel and ccancel():
+                raise apx.CanceledException()
+            chunk = filelist[i : i + FILELIST_MAX]
+            request_data = urlencode(
+                [("File-Name-{0:d}".format(n), f) for n, f in enumerate(chunk)]
+            )
+            nreqs += 1
+            fobj = self._post_url(
+                requesturl, request_data, header, ccancel=ccancel
+            )
+            try:
+                with tarfile.open(mode="r|", fileobj=fobj) as tar:
+                    for ti in tar:
+                        # The transfer itself is only aborted while
+                        # data is arriving; check between members too.
+                        if ccancel and ccancel():
+                            raise apx.CanceledException()
+                        if (
+                            not ti.isfile()
+                            or ti.name not in wanted
+                            or ti.name in fetched
+                        ):
+                            continue
+                        self.__extract_file(tar, ti, dest)
+                        fetched.add(ti.name)
+                        if progtrack:
+                            progtrack.download_add_progress(1, ti.size)
+            except (tx.TransportException, tarfile.TarError):
+                # Anything received intact is kept; the rest is
+                # retrieved individually.
+                break
+            finally:
+                fobj.close()
+
+        if len(fetched) > nreqs:
+            self._repostats.record_saved_requests(len(fetched) - nreqs)
+        return fetched
+
+    @staticmethod
+    def __extract_file(tar, ti, dest):
+        """Write the content of the member 'ti' of the tar stream 'tar'
+        to the file named by the member in the directory 'dest'."""
+
+        src = tar.extractfile(ti)
+        dl_path = os.path.join(dest, ti.name)
+        try:
+            with open(dl_path, "wb") as f:
+                shutil.copyfileobj(src, f)
+            os.utime(dl_path, (ti.mtime, ti.mtime))
+        except EnvironmentError as e:
+            if e.errno == errno.EACCES:
+                raise apx.PermissionsException(e.filename)
+            if e.errno == errno.EROFS:
+                raise apx.ReadOnlyFileSystemException(e.filename)
+            raise tx.TransportOperationError(
+                "Unable to write file: {0}".format(e)
+            )
+
     def get_url(self):
         """Returns the repo's url."""
 
@@ -882,6 +1033,15 @@ class HTTPRepo(TransportRepo):
             raise
         return fobj
 
+    def add_versions_request(self, filepath, header=None):
+        """Queue a request for the repo's versions information, to be
+        written to 'filepath', with the transport engine without
+        waiting for it to complete.  Returns the URL requested."""
+
+        requesturl = self.__get_request_url("versions/0/")
+        self._add_file_url(requesturl, filepath=filepath, header=header)
+        return requesturl
+
     def has_version_data(self):
         """Returns true if this repo knows its version information."""
 
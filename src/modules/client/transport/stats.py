@@ -72,10 +72,12 @@ class RepoChooser(object):
         """Write the repo statistics to stdout."""
 
         hfmt = (
-            "{0:41.41} {1:30} {2:6} {3:4} {4:4} {5:8} {6:10} {7:5} {8:7} {9:4}"
+            "{0:41.41} {1:30} {2:6} {3:4} {4:4} {5:8} {6:10} {7:5} {8:7} "
+            "{9:4} {10:5}"
         )
         dfmt = (
-            "{0:41.41} {1:30} {2:6} {3:4} {4:4} {5:8} {6:10} {7:5} {8:6f} {9:4}"
+            "{0:41.41} {1:30} {2:6} {3:4} {4:4} {5:8} {6:10} {7:5} {8:6f} "
+            "{9:4} {10:5}"
         )
         misc.msg(
             hfmt.format(
@@ -89,6 +91,7 @@ class RepoChooser(object):
                 "Used",
                 "CSpeed",
                 "Qual",
+                "Saved",
             )
         )
 
@@ -111,6 +114,7 @@ class RepoChooser(object):
                     ds.used,
                     ds.connect_time,
                     ds.quality,
+                    ds.saved_requests,
                 )
             )
 
@@ -257,6 +261,7 @@ class RepoStats(object):
 
         self.__connections = 0
         self.__connect_time = 0.0
+        self.__saved_requests = 0
 
         self.__used = False
 
@@ -323,6 +328,13 @@ class RepoStats(object):
         self.__bytes_xfr += bytes
         self.__seconds_xfr += seconds
 
+    def record_saved_requests(self, count):
+        """Record that 'count' fewer requests were made to the URI
+        represented by this RepoStats object than would have been
+        needed to retrieve the same content one file at a time."""
+
+        self.__saved_requests += count
+
     def record_tx(self):
         """Record that an operation to the URI represented
         by this RepoStats object was initiated."""
@@ -347,6 +359,7 @@ class RepoStats(object):
         self._err_decay = 0
         self.__total_tx = 0
         self.__consecutive_errors = 0
+        self.__saved_requests = 0
         self.origin_speed = 0.0
 
     @property
@@ -406,6 +419,13 @@ class RepoStats(object):
 
         return self.__priority
 
+    @property
+    def saved_requests(self):
+        """Return the number of requests that were avoided by
+        retrieving multiple files from this host at once."""
+
+        return self.__saved_requests
+
     @property
     def scheme(self):
         """Return the scheme of the RepoURI. (e.g. http, file.)"""
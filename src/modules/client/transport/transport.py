@@ -1093,6 +1093,136 @@ class Transport(object):
                 tfailurex.append(f)
             raise tfailurex
 
+    @LockedTransport()
+    def prefetch_catalog_attrs(self, targets, redownload=False):
+        """Retrieve the catalog.attrs file from several origins at once,
+        so that checking the origins of a number of publishers for
+        catalog updates costs a couple of round trips in total instead
+        of several for each origin.
+
+        'targets' is a list of (pub, origin, path) tuples, where
+        'origin' is one of the origins of the Publisher object 'pub'
+        and 'path' is the directory to place the retrieved file in.
+
+        'redownload' is as for get_catalog1.
+
+        A single attempt is made for each origin, and failures are not
+        reported.  On return, each path contains either a verified
+        catalog.attrs file or none at all; callers are expected to use
+        get_catalog1 to retrieve any that are missing, which retries
+        and reports errors as usual.  Returns the set of paths that the
+        file was retrieved into."""
+
+        repos = []
+        for pub, origin, path in targets:
+            repo = copy.copy(pub.repository)
+            repo.origins = [origin]
+            try:
+                d, retries = next(
+                    self.__gen_repo(pub, 1, origin_only=True, alt_repo=repo)
+                )
+            except (StopIteration, apx.ApiException, tx.TransportException):
+                continue
+            header = Transport.__get_request_header(
+                self.__build_header(
+                    uuid=self.__get_uuid(pub), variant=self.__get_variant(pub)
+                ),
+                self.stats[d.get_repouri_key()],
+                retries,
+                d,
+            )
+            repos.append((pub, d, header, path))
+
+        # Which catalog URL to use depends on the operations the origin
+        # supports, so first retrieve the versions information for any
+        # origins that haven't been contacted yet.
+        requests = []
+        for pub, d, header, path in repos:
+            if d.has_version_data() or d in (r[1] for r in requests):
+                continue
+            vpath = os.path.join(path, "versions")
+            try:
+                url = d.add_versions_request(vpath, header=header)
+            except NotImplementedError:
+                # Local sources gain nothing from being
+                # queried at once.
+                continue
+            requests.append((url, d, vpath))
+
+        success = self.__run_prefetch([r[0] for r in requests])
+        for url, d, vpath in requests:
+            if url in success:
+                try:
+                    with open(vpath) as f:
+                        vers = dict(
+                            s.split(None, 1) for s in (l.strip() for l in f)
+                        )
+                    self.__fill_repo_vers(d, vers)
+                except (EnvironmentError, ValueError, tx.TransportException):
+                    pass
+            try:
+                portable.remove(vpath)
+            except EnvironmentError:
+                pass
+
+        requests = []
+        for pub, d, header, path in repos:
+            if d.supports_version("catalog", [1]) < 0:
+                continue
+            try:
+                urllist = d.add_catalog1_requests(
+                    ["catalog.attrs"],
+                    path,
+                    header=header,
+                    pub=pub,
+                    redownload=redownload,
+                )
+            except NotImplementedError:
+                continue
+            requests.append((urllist[0], pub, path))
+
+        success = self.__run_prefetch([r[0] for r in requests])
+        fetched = set()
+        for url, pub, path in requests:
+            if url not in success:
+                try:
+                    portable.remove(os.path.join(path, "catalog.attrs"))
+                except EnvironmentError:
+                    pass
+                continue
+
+            try:
+                self._verify_catalog("catalog.attrs", path)
+            except tx.InvalidContentException:
+                continue
+            fetched.add(path)
+
+            # Callers don't test origins which have responded, so
+            # account for the contact as version_check() would.
+            status = self.repo_status.setdefault(pub.prefix, {})
+            status["total"] = status.get("total", 0) + 1
+        return fetched
+
+    def __run_prefetch(self, urllist):
+        """Perform the requests for the URLs in 'urllist' that have been
+        queued with the transport engine, and return the list of those
+        that were successful."""
+
+        if not urllist:
+            return []
+
+        try:
+            while self.__engine.pending:
+                self.__engine.run()
+        except tx.TransportException:
+            # Permanent failures are reported when the caller
+            # retries the request.
+            errors, success = self.__engine.check_status(urllist, True)
+            self.__engine.reset()
+        else:
+            errors, success = self.__engine.check_status(urllist, True)
+        return success
+
     @LockedTransport()
     def get_publisherdata(self, pub, ccancel=None):
         """Given a publisher pub, return the publisher/0
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The verified-content cache.
+
+This module maintains a per-image sqlite3 database recording, for every
+delivered file whose content has been successfully verified, the stat
+signature of the file at the time (device, inode, size, modification and
+change times) together with the content hash it was verified against, so
+that verifying the file again while it remains unchanged does not require
+reading and hashing it.
+
+The change time covers any modification made to a file through the
+filesystem, including changes to its metadata, so a matching signature is
+taken as proof that the content is unchanged.  Files touched by package
+operations are removed from the cache before the operation modifies them.
+
+"""
+
+import errno
+import os
+import sqlite3
+
+import pkg.misc as misc
+
+CACHE_BASENAME = "verify.sqlite"
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = [
+    """CREATE TABLE verified (
+        path     TEXT PRIMARY KEY,
+        dev      INTEGER NOT NULL,
+        ino      INTEGER NOT NULL,
+        size     INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        ctime_ns INTEGER NOT NULL,
+        hash     TEXT NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+
+class VerifyCache(misc.SQLiteDB):
+    """Manages the verified-content cache database for an image.
+
+    Lookups and records may be made from any thread, as happens when
+    package content is verified using a thread pool; records are
+    buffered in memory until flush() is called.  If the database cannot
+    be written (e.g. for unprivileged users), any existing content is
+    still used for lookups and new records are discarded."""
+
+    schema = _SCHEMA
+    schema_version = SCHEMA_VERSION
+    description = "verify cache"
+    synchronous = "NORMAL"
+
+    def __init__(self, cache_dir):
+        misc.SQLiteDB.__init__(self, os.path.join(cache_dir, CACHE_BASENAME))
+        self.__pending = {}
+
+    def lookup(self, path, st, hash_attr, hash_val):
+        """Return True if the file delivered to 'path' (relative to
+        the image root) was previously verified to have the content
+        hash 'hash_val' of type 'hash_attr' and its stat information,
+        'st', shows that it has not changed since."""
+
+        with self._lock:
+            con = self._open()
+            if con is None:
+                return False
+            try:
+                row = con.execute(
+                    "SELECT dev, ino, size, mtime_ns, ctime_ns, hash"
+                    " FROM verified WHERE path = ?",
+                    (path,),
+                ).fetchone()
+            except sqlite3.DatabaseError:
+                return False
+        if row is None:
+            return False
+        return tuple(row[:5]) == misc.stat_signature(st) and (
+            row[5] == "{0}:{1}".format(hash_attr, hash_val)
+        )
+
+    def record(self, path, st, hash_attr, hash_val, fullpath):
+        """Note that the file delivered to 'path' (relative to the
+        image root), found at 'fullpath', has been verified to have
+        the content hash 'hash_val' of type 'hash_attr'.  'st' is the
+        stat information obtained before the content was read; if the
+        file has changed since, nothing is recorded."""
+
+        sig = misc.stat_signature(st)
+        try:
+            if misc.stat_signature(os.lstat(fullpath)) != sig:
+                return
+        except EnvironmentError:
+            return
+        with self._lock:
+            self.__pending[path] = sig + (
+                "{0}:{1}".format(hash_attr, hash_val),
+            )
+
+    def flush(self):
+        """Write any buffered records to the database."""
+
+        with self._lock:
+            pending = self.__pending
+            self.__pending = {}
+            if not pending or not self._can_write():
+                return
+            try:
+                self._execute(
+                    [
+                        (
+                            "INSERT OR REPLACE INTO verified"
+                            " VALUES (?,?,?,?,?,?,?)",
+                            [(p,) + v for p, v in pending.items()],
+                        )
+                    ]
+                )
+            except sqlite3.DatabaseError:
+                # The cache is purely an optimisation; failing to
+                # write to it only means content is hashed again.
+                pass
+
+    def invalidate(self, paths):
+        """Forget any verification results for 'paths' (relative to the
+        image root).  Called before a package operation modifies the
+        files delivered to them."""
+
+        paths = sorted(set(paths))
+        with self._lock:
+            for p in paths:
+                self.__pending.pop(p, None)
+            if not paths or not os.path.exists(self._path):
+                return
+            if not self._can_write():
+                return
+            try:
+                self._execute(self.delete_statements("verified", "path", paths))
+            except sqlite3.DatabaseError:
+                # Entries that can't be removed can't be trusted.
+                self._close()
+                self.__remove()
+
+    def clear(self):
+        """Remove the database entirely."""
+
+        with self._lock:
+            self.__pending = {}
+            self._close()
+            self.__remove()
+
+    def __remove(self):
+        try:
+            os.unlink(self._path)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
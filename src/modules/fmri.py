@@ -26,6 +26,8 @@
 
 import fnmatch
 import re
+import sys
+import weakref
 from urllib.parse import quote
 
 from pkg.version import Version, VersionError
@@ -147,8 +149,10 @@ class PkgFmri(object):
                 self.version = None
 
         # Ensure publisher is always None if one was not specified.
+        # There are only ever a few publishers, so they are interned
+        # rather than held by every FMRI.
         if publisher:
-            self.publisher = publisher
+            self.publisher = sys.intern(publisher)
         else:
             self.publisher = None
 
@@ -179,6 +183,19 @@ class PkgFmri(object):
     def copy(self):
         return PkgFmri(str(self))
 
+    def __getstate__(self):
+        # The cached hash isn't pickled, since it is only valid for the
+        # current process.
+        return (
+            None,
+            {
+                "version": self.version,
+                "publisher": self.publisher,
+                "pkg_name": self.pkg_name,
+                "_hash": None,
+            },
+        )
+
     @staticmethod
     def _gen_fmri_indexes(fmri):
         """Return a tuple of offsets, used to extract different
@@ -588,6 +605,38 @@ class MatchingPkgFmri(PkgFmri):
             )
 
 
+#
+# FMRIs shared through intern_fmri(), by string representation.  Entries are
+# dropped as soon as no one else holds a reference to the FMRI.
+#
+_interned_fmris = weakref.WeakValueDictionary()
+
+
+def intern_fmri(fmri):
+    """Returns a PkgFmri object for 'fmri', which may be an FMRI string or
+    a PkgFmri object, that is shared with every other caller interning the
+    same FMRI for as long as any of them references it.  Callers holding
+    many FMRIs (such as when planning operations across many packages)
+    can use this to avoid keeping duplicate PkgFmri and Version objects.
+
+    Interned FMRIs must be treated as immutable; callers that need to
+    change an FMRI must copy() it first.  A PkgFmri object passed in is
+    copied rather than shared, so the caller remains free to change it."""
+
+    if isinstance(fmri, PkgFmri):
+        key = str(fmri)
+    else:
+        key = fmri
+    pfmri = _interned_fmris.get(key)
+    if pfmri is None:
+        if isinstance(fmri, PkgFmri):
+            pfmri = fmri.copy()
+        else:
+            pfmri = PkgFmri(fmri)
+        _interned_fmris[key] = pfmri
+    return pfmri
+
+
 def fmri_match(pkg_name, pattern):
     """Returns true if 'pattern' is a proper subset of 'pkg_name'."""
     return ("/" + pkg_name).endswith("/" + pattern)
@@ -25,9 +25,16 @@
 # Copyright (c) 2007, 2021, Oracle and/or its affiliates.
 #
 
+import concurrent.futures
 import errno
+import gettext
+import heapq
+import itertools
+import multiprocessing
+import operator
 import os
 import shutil
+import time
 from urllib.parse import unquote
 
 import pkg.fmri as fmri
@@ -55,6 +62,99 @@ SORT_FILE_PREFIX = "sort."
 
 SORT_FILE_MAX_SIZE = 128 * 1024 * 1024
 
+# Prefix of the sorted runs written by worker processes.
+SHARD_FILE_PREFIX = "shard."
+
+# The minimum number of packages to index for worker processes to be used.
+MIN_SHARDED_PKGS = 500
+
+# The number of shards into which the packages are split per worker.
+SHARDS_PER_WORKER = 4
+
+
+def _get_default_workers():
+    """Returns the number of worker processes to use when rebuilding an
+    index, from $PKG_INDEX_WORKERS if set, otherwise one per CPU."""
+
+    try:
+        workers = int(os.environ.get("PKG_INDEX_WORKERS", 0))
+    except ValueError:
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _gen_main_dict_lines(p_id, new_dict):
+    """Yields the main dictionary lines, in the form used by the
+    temporary sort files, for the package with id 'p_id' whose manifest
+    produced the search dictionary 'new_dict'."""
+
+    for tok_tup in new_dict.keys():
+        tok, action_type, subtype, fv = tok_tup
+        lst = [
+            (
+                action_type,
+                [(subtype, [(fv, [(p_id, list(new_dict[tok_tup]))])])],
+            )
+        ]
+        yield ss.IndexStoreMainDict.transform_main_dict_line(tok, lst)
+
+
+def _init_shard_worker():
+    """Initializer for the worker processes used by _index_shard."""
+
+    import builtins
+
+    if not hasattr(builtins, "_"):
+        gettext.install("pkg", "/usr/share/locale")
+
+
+def _index_shard(tmp_dir, shard, manifests, sort_file_max_size):
+    """Tokenizes the manifests for one shard of a sharded index rebuild
+    into one or more sorted runs in 'tmp_dir', each holding no more than
+    'sort_file_max_size' bytes.  This is run in a worker process.
+
+    'shard' is the number of the shard.
+
+    'manifests' is a list of tuples of (package id, manifest path).
+
+    Returns a tuple of the list of paths of the runs written and the list
+    of any messages logged while reading the manifests."""
+
+    msgs = []
+    runs = []
+    lines = []
+    nbytes = 0
+
+    def write_run():
+        path = os.path.join(
+            tmp_dir,
+            "{0}{1:d}.{2:d}".format(SHARD_FILE_PREFIX, shard, len(runs)),
+        )
+        lines.sort()
+        with open(path, "w", buffering=PKG_FILE_BUFSIZ) as fh:
+            fh.writelines(line for tok, line in lines)
+        runs.append(path)
+        del lines[:]
+
+    for p_id, mpath in manifests:
+        new_dict = manifest.Manifest.search_dict(mpath, EmptyI, log=msgs.append)
+        for line in _gen_main_dict_lines(p_id, new_dict):
+            if lines and nbytes + len(line) >= sort_file_max_size:
+                write_run()
+                nbytes = 0
+            lines.append(
+                (
+                    ss.IndexStoreMainDict.parse_main_dict_line_for_token(line),
+                    line,
+                )
+            )
+            nbytes += len(line)
+    if lines or not runs:
+        write_run()
+    return runs, msgs
+
 
 def makedirs(pathname):
     """Create a directory at the specified location if it does not
@@ -90,6 +190,7 @@ class Indexer(object):
         excludes=EmptyI,
         log=None,
         sort_file_max_size=SORT_FILE_MAX_SIZE,
+        workers=None,
     ):
         self._num_keys = 0
         self._num_manifests = 0
@@ -103,6 +204,11 @@ class Indexer(object):
             raise search_errors.IndexingException(
                 _("sort_file_max_size must be greater than 0")
             )
+        # The number of worker processes used to tokenize manifests
+        # when indexing a large number of packages.
+        if workers is None:
+            workers = _get_default_workers()
+        self.workers = workers
 
         # This structure was used to gather all index files into one
         # location. If a new index structure is needed, the files can
@@ -120,7 +226,7 @@ class Indexer(object):
             ),
             "full_fmri": ss.IndexStoreSet(ss.FULL_FMRI_FILE),
             "main_dict": ss.IndexStoreMainDict(ss.MAIN_FILE),
-            "token_byte_offset": ss.IndexStoreDictMutable(ss.BYTE_OFFSET_FILE),
+            "token_byte_offset": ss.IndexStoreTokenOffsets(ss.BYTE_OFFSET_FILE),
         }
 
         self._data_fast_add = self._data_dict["fast_add"]
@@ -201,6 +307,7 @@ class Indexer(object):
         of them into memory except the main dictionary file to avoid
         inefficient memory usage."""
 
+        self._upgrade_token_offsets(locked=True)
         res = ss.consistent_open(
             self._data_dict.values(), directory, self._file_timeout_secs
         )
@@ -233,6 +340,51 @@ class Indexer(object):
                 d.close_file_handle()
             pt.job_done(pt.JOB_READ_SEARCH)
 
+    def _upgrade_token_offsets(self, locked=False):
+        """Converts the token byte offset file of an index written
+        before the sorted format was introduced, so that the index
+        doesn't need to be rebuilt.  If 'locked' is False, the index is
+        left unchanged if it cannot be locked."""
+
+        old_path = os.path.join(self._index_dir, ss.BYTE_OFFSET_FILE_V1)
+        name = self._data_token_offset.get_file_name()
+        if not os.path.exists(old_path) or os.path.exists(
+            os.path.join(self._index_dir, name)
+        ):
+            return
+
+        if not locked:
+            try:
+                self.lock()
+            except (
+                search_errors.IndexLockedException,
+                search_errors.ProblematicPermissionsIndexException,
+            ):
+                return
+        try:
+            old = ss.IndexStoreDictMutable(ss.BYTE_OFFSET_FILE_V1)
+            try:
+                version = old.open(self._index_dir)
+                if version is None:
+                    return
+                old.read_dict_file()
+            finally:
+                old.close_file_handle()
+
+            new = ss.IndexStoreTokenOffsets(name + ".tmp")
+            new.open_out_file(self._index_dir, version)
+            for token, offset in old.get_dict().items():
+                new.write_entity(token, offset)
+            new.close_file_handle()
+            portable.rename(
+                os.path.join(self._index_dir, new.get_file_name()),
+                os.path.join(self._index_dir, name),
+            )
+            portable.remove(old_path)
+        finally:
+            if not locked:
+                self.unlock()
+
     def __close_sort_fh(self):
         """Utility function used to close and sort the temporary
         files used to produce a sorted main_dict file."""
@@ -264,17 +416,8 @@ class Indexer(object):
         the action."""
 
         p_id = self._data_manf.get_id_and_add(pfmri)
-        pfmri = p_id
 
-        for tok_tup in new_dict.keys():
-            tok, action_type, subtype, fv = tok_tup
-            lst = [
-                (
-                    action_type,
-                    [(subtype, [(fv, [(pfmri, list(new_dict[tok_tup]))])])],
-                )
-            ]
-            s = ss.IndexStoreMainDict.transform_main_dict_line(tok, lst)
+        for s in _gen_main_dict_lines(p_id, new_dict):
             if len(s) + self._sort_file_bytes >= self.sort_file_max_size:
                 self.__close_sort_fh()
                 self._sort_fh = open(
@@ -378,6 +521,26 @@ class Indexer(object):
 
         return True
 
+    def _remove_fmris(self, fmris):
+        """Takes a list of fmris which have been removed and updates the
+        internal storage to reflect their removal.  Returns the set of
+        those fmris which were indexed, in the form in which they are
+        recorded in the index, so that their entries can be dropped
+        from the main dictionary."""
+
+        removed = set()
+        for removed_fmri in fmris:
+            f_tmp = removed_fmri.get_fmri(anarchy=True)
+            if not self._data_full_fmri.has_entity(f_tmp):
+                continue
+            self._data_full_fmri.remove_entity(f_tmp)
+            removed.add(
+                fmri.PkgFmri(
+                    removed_fmri.get_fmri(anarchy=True, include_scheme=False)
+                )
+            )
+        return removed
+
     def _process_fmris(self, fmris):
         """Takes a list of fmris and updates the internal storage to
         reflect the new packages."""
@@ -396,6 +559,74 @@ class Indexer(object):
             self._progtrack.job_add_progress(self._progtrack.JOB_REBUILD_SEARCH)
         return removed_paths
 
+    def _process_fmris_sharded(self, fmris):
+        """Takes a list of fmris and updates the internal storage to
+        reflect the new packages, as _process_fmris does, but splits
+        the fmris into shards which are tokenized into sorted runs by
+        a pool of worker processes.  The runs are merged by
+        _gen_new_toks_from_files."""
+
+        removed_paths = []
+
+        nshards = min(len(fmris), self.workers * SHARDS_PER_WORKER)
+        shard_size = -(-len(fmris) // nshards)
+        shards = []
+        for i in range(0, len(fmris), shard_size):
+            shard = []
+            for added_fmri in fmris[i : i + shard_size]:
+                self._data_full_fmri.add_entity(
+                    added_fmri.get_fmri(anarchy=True)
+                )
+                p_id = self._data_manf.get_id_and_add(added_fmri)
+                shard.append((p_id, self.get_manifest_path_func(added_fmri)))
+            shards.append(shard)
+
+        makedirs(self._tmp_dir)
+        # The index may be rebuilt by the depot server, which runs many
+        # threads; forking it could leave locks held by other threads
+        # locked in the workers, so they're started by a server process
+        # instead.
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_init_shard_worker,
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _index_shard,
+                    self._tmp_dir,
+                    n,
+                    shard,
+                    self.sort_file_max_size,
+                )
+                for n, shard in enumerate(shards)
+            ]
+            try:
+                # Results are collected in order so that the merged
+                # index doesn't depend on which worker finished first.
+                for shard, f in zip(shards, futures):
+                    runs, msgs = f.result()
+                    if self.__log:
+                        for msg in msgs:
+                            self.__log(msg)
+                    for run in runs:
+                        portable.rename(
+                            run,
+                            os.path.join(
+                                self._tmp_dir,
+                                SORT_FILE_PREFIX + str(self._sort_file_num),
+                            ),
+                        )
+                        self._sort_file_num += 1
+                    self._progtrack.job_add_progress(
+                        self._progtrack.JOB_REBUILD_SEARCH, nitems=len(shard)
+                    )
+            except:
+                for f in futures:
+                    f.cancel()
+                raise
+        return removed_paths
+
     def _write_main_dict_line(self, token, fv_fmri_pos_list_list, out_dir):
         """Writes out the new main dictionary file and also adds the
         token offsets to _data_token_offset. token is the token
@@ -478,103 +709,54 @@ class Indexer(object):
     def _gen_new_toks_from_files(self):
         """Produces a stream of ordered tokens and the associated
         information for those tokens from the sorted temporary files
-        produced by _add_terms. In short, this is the merge part of the
-        merge sort being done on the tokens to be indexed."""
-
-        def get_line(fh):
-            """Helper function to make the initialization of the
-            fh_dict easier to understand."""
-
-            try:
-                return ss.IndexStoreMainDict.parse_main_dict_line(next(fh))
-            except StopIteration:
-                return None
-
-        # Build a mapping from numbers to the file handle for the
-        # temporary sort file with that number.
-        fh_dict = dict(
-            [
-                (
-                    i,
-                    open(
-                        os.path.join(self._tmp_dir, SORT_FILE_PREFIX + str(i)),
-                        "r",
-                        buffering=PKG_FILE_BUFSIZ,
-                    ),
-                )
-                for i in range(self._sort_file_num)
-            ]
-        )
+        produced by _add_terms or _index_shard. In short, this is the
+        merge part of the merge sort being done on the tokens to be
+        indexed."""
+
+        def gen_lines(fh):
+            for line in fh:
+                yield ss.IndexStoreMainDict.parse_main_dict_line(line)
+
+        fhs = [
+            open(
+                os.path.join(self._tmp_dir, SORT_FILE_PREFIX + str(i)),
+                "r",
+                buffering=PKG_FILE_BUFSIZ,
+            )
+            for i in range(self._sort_file_num)
+        ]
 
-        cur_toks = {}
-        # Seed cur_toks with the first token from each temporary file.
-        # The line may not exist since, for a empty repo, an empty file
-        # is created.
-        for i in list(fh_dict.keys()):
-            line = get_line(fh_dict[i])
-            if line is None:
-                del fh_dict[i]
-            else:
-                cur_toks[i] = line
-
-        old_min_token = None
-        # cur_toks will have items deleted from it as files no longer
-        # have tokens to provide. When no files have tokens, the merge
-        # is done.
-        while cur_toks:
-            min_token = None
-            matches = []
-            # Find smallest available token and the temporary files
-            # which contain that token.
-            for i in fh_dict.keys():
-                cur_tok, info = cur_toks[i]
-                if cur_tok is None:
-                    continue
-                if min_token is None or cur_tok < min_token:
-                    min_token = cur_tok
-                    matches = [i]
-                elif cur_tok == min_token:
-                    matches.append(i)
-            assert min_token is not None
-            assert len(matches) > 0
-            res = None
-            for i in matches:
-                new_tok, new_info = cur_toks[i]
-                assert new_tok == min_token
-                try:
-                    # Continue pulling the next tokens from
-                    # and adding them to the result list as
-                    # long as the token matches min_token.
-                    while new_tok == min_token:
-                        if res is None:
-                            res = new_info
-                        else:
-                            self.__splice(res, new_info)
-                        (
-                            new_tok,
-                            new_info,
-                        ) = ss.IndexStoreMainDict.parse_main_dict_line(
-                            next(fh_dict[i])
+        try:
+            # Merge the lines from all of the files, and then combine
+            # the information from consecutive lines for the same
+            # token.  The merge is stable, so information is combined
+            # in the order of the files.
+            merged = heapq.merge(
+                *[gen_lines(fh) for fh in fhs], key=operator.itemgetter(0)
+            )
+            old_min_token = None
+            for min_token, matches in itertools.groupby(
+                merged, key=operator.itemgetter(0)
+            ):
+                res = None
+                for new_tok, new_info in matches:
+                    if res is None:
+                        res = new_info
+                    else:
+                        self.__splice(res, new_info)
+                if old_min_token is not None and old_min_token >= min_token:
+                    raise RuntimeError(
+                        "Got min token:{0} greater "
+                        "than old_min_token:{1}".format(
+                            min_token, old_min_token
                         )
-                    cur_toks[i] = new_tok, new_info
-                except StopIteration:
-                    # When a StopIteration happens, the
-                    # last line in the file has been read
-                    # and processed. Delete all the
-                    # information associated with that file
-                    # so that we no longer check that file.
-                    fh_dict[i].close()
-                    del fh_dict[i]
-                    del cur_toks[i]
-            assert res is not None
-            if old_min_token is not None and old_min_token >= min_token:
-                raise RuntimeError(
-                    "Got min token:{0} greater "
-                    "than old_min_token:{1}".format(min_token, old_min_token)
-                )
-            old_min_token = min_token
-            if min_token != "":
-                yield min_token, res
+                    )
+                old_min_token = min_token
+                if min_token != "":
+                    yield min_token, res
+        finally:
+            for fh in fhs:
+                fh.close()
         return
 
     def _update_index(self, dicts, out_dir):
@@ -712,7 +894,7 @@ class Indexer(object):
             d.write_dict_file(out_dir, self.file_version_number)
 
     def _generic_update_index(
-        self, inputs, input_type, tmp_index_dir=None, image=None
+        self, inputs, input_type, tmp_index_dir=None, image=None, removed=EmptyI
     ):
         """Performs all the steps needed to update the indexes.
 
@@ -728,7 +910,10 @@ class Indexer(object):
         The "image" parameter must be set if "input_type" is pkgplans.
         It allows the index to automatically be rebuilt if the number
         of packages added since last index rebuild is greater than
-        MAX_ADDED_NUMBER_PACKAGES."""
+        MAX_ADDED_NUMBER_PACKAGES.
+
+        The "removed" parameter may be used if "input_type" is fmris to
+        list the fmris which have been removed."""
 
         self.lock()
         try:
@@ -781,25 +966,46 @@ class Indexer(object):
                     )
 
             elif input_type == IDX_INPUT_TYPE_FMRI:
-                assert not self._sort_fh
-                self._sort_fh = open(
-                    os.path.join(
-                        self._tmp_dir,
-                        SORT_FILE_PREFIX + str(self._sort_file_num),
-                    ),
-                    "w",
-                )
-                self._sort_file_num += 1
-
+                start_time = time.time()
                 self._progtrack.job_start(
                     self._progtrack.JOB_REBUILD_SEARCH, goal=len(inputs)
                 )
-                dicts = self._process_fmris(inputs)
+                if (
+                    self.workers > 1
+                    and not self.excludes
+                    and len(inputs) >= MIN_SHARDED_PKGS
+                ):
+                    dicts = self._process_fmris_sharded(inputs)
+                else:
+                    assert not self._sort_fh
+                    self._sort_fh = open(
+                        os.path.join(
+                            self._tmp_dir,
+                            SORT_FILE_PREFIX + str(self._sort_file_num),
+                        ),
+                        "w",
+                    )
+                    self._sort_file_num += 1
+                    dicts = self._process_fmris(inputs)
+                    self.__close_sort_fh()
+                if removed:
+                    dicts = set(dicts)
+                    dicts.update(self._remove_fmris(removed))
                 # Update the main dictionary file
-                self.__close_sort_fh()
                 self._update_index(dicts, tmp_index_dir)
                 self._progtrack.job_done(self._progtrack.JOB_REBUILD_SEARCH)
 
+                elapsed = time.time() - start_time
+                if self.__log and inputs:
+                    self.__log(
+                        "Indexed {0:d} packages in {1:.1f} seconds "
+                        "({2:.1f} manifests/sec)".format(
+                            len(inputs),
+                            elapsed,
+                            len(inputs) / max(elapsed, 0.001),
+                        )
+                    )
+
                 self.empty_index = False
             else:
                 raise RuntimeError(f"Got unknown input_type: {input_type}")
@@ -835,23 +1041,27 @@ class Indexer(object):
             image=image,
         )
 
-    def server_update_index(self, fmris, tmp_index_dir=None):
+    def server_update_index(self, fmris, tmp_index_dir=None, removed=EmptyI):
         """This version of update index is designed to work with the
-        server side of things. Specifically, since we don't currently
-        support removal of a package from a repo, this function simply
-        takes a list of FMRIs to be added to the repot.  Currently, the
-        only way to remove a package from the index is to remove it
-        from the depot and reindex.  Note: if tmp_index_dir is
-        specified, it must NOT exist in the current directory structure.
-        This prevents the indexer from accidentally removing files."""
+        server side of things. Specifically, it takes a list of FMRIs
+        to be added to the repo, and optionally a list of FMRIs which
+        have been removed from it in 'removed'.  The entries for removed
+        packages are dropped while the main dictionary is rewritten, so
+        the remaining packages don't need to be indexed again.  Note: if
+        tmp_index_dir is specified, it must NOT exist in the current
+        directory structure.  This prevents the indexer from
+        accidentally removing files."""
 
-        self._generic_update_index(fmris, IDX_INPUT_TYPE_FMRI, tmp_index_dir)
+        self._generic_update_index(
+            fmris, IDX_INPUT_TYPE_FMRI, tmp_index_dir, removed=removed
+        )
 
     def check_index_existence(self):
         """Returns a boolean value indicating whether a consistent
         index exists. If an index exists but is inconsistent, an
         exception is raised."""
 
+        self._upgrade_token_offsets()
         try:
             try:
                 res = ss.consistent_open(
@@ -919,6 +1129,7 @@ class Indexer(object):
         present = False
 
         makedirs(self._index_dir)
+        self._upgrade_token_offsets()
         for d in self._data_dict.values():
             file_path = os.path.join(self._index_dir, d.get_file_name())
             if os.path.exists(file_path):
@@ -1006,6 +1217,12 @@ class Indexer(object):
                 raise
             except Exception:
                 pass
+            # Likewise for the unsorted token byte offset file.
+            try:
+                portable.remove(os.path.join(dest_dir, ss.BYTE_OFFSET_FILE_V1))
+            except EnvironmentError as e:
+                if e.errno != errno.ENOENT:
+                    raise
 
             for at, fh in self.at_fh.items():
                 shutil.move(
@@ -31,8 +31,11 @@ from functools import reduce
 import errno
 import fnmatch
 import hashlib
+import mmap
 import os
 import re
+import struct
+import sys
 import tempfile
 from itertools import groupby, chain, product, repeat
 from operator import itemgetter
@@ -1579,6 +1582,237 @@ class Manifest(object):
 null = Manifest()
 
 
+# The version of the format used for compiled manifest cache files.
+COMPILED_VERSION = 1
+
+_COMPILED_MAGIC = b"pkg5mfc\0"
+
+# Header: magic, version, number of strings, number of action types, offset
+# of the string data.
+_COMPILED_HDR = struct.Struct("<8sIIII")
+
+# Action type table entry: type name, number of actions, offset and length
+# (in words) of the type's action records.
+_COMPILED_TYPE = struct.Struct("<IIII")
+
+# Key attribute value kinds in action records.
+_KEY_NONE = 0
+_KEY_STR = 1
+_KEY_LIST = 2
+
+# Marks a string index as absent, or an attribute as single-valued.
+_NO_STR = 0xFFFFFFFF
+_SCALAR = 0xFFFFFFFF
+
+
+def _compile_actions(bytype):
+    """Private helper function that returns the compiled form (bytes) of
+    the actions in 'bytype', a dict mapping action type names to lists of
+    Action objects.
+
+    The compiled form is a table of the distinct strings (attribute names
+    and values) used by the actions, followed by a table of the action
+    types giving the location of each type's action records.  Each record
+    is a sequence of 32-bit words: the kind and string index of the key
+    attribute value, the string index of the action's hash, the number of
+    attributes, and then for each attribute the string index of its name,
+    its number of values (or _SCALAR) and the string indices of its
+    value(s).  A record for a type is preceded by its length in words, so
+    that the records of a type can be read with a single unpack."""
+
+    strings = {}
+
+    def sid(value):
+        try:
+            return strings[value]
+        except KeyError:
+            strings[value] = n = len(strings)
+            return n
+
+    types = []
+    records = []
+    for atype, acts in bytype.items():
+        start = len(records)
+        key_attr = actions.types[atype].key_attr
+        for a in acts:
+            attrs = a.attrs
+            kval = attrs.get(key_attr)
+            if kval is None:
+                kind, ksid = _KEY_NONE, _NO_STR
+            elif isinstance(kval, list):
+                kind, ksid = _KEY_LIST, _NO_STR
+            else:
+                kind, ksid = _KEY_STR, sid(kval)
+            ahash = getattr(a, "hash", None)
+            rec = [kind, ksid, _NO_STR if ahash is None else sid(ahash)]
+            rec.append(len(attrs))
+            for k, v in attrs.items():
+                rec.append(sid(k))
+                if isinstance(v, str):
+                    rec.append(_SCALAR)
+                    rec.append(sid(v))
+                else:
+                    rec.append(len(v))
+                    rec.extend(sid(e) for e in v)
+            records.append(len(rec))
+            records.extend(rec)
+        types.append((sid(atype), len(acts), start, len(records) - start))
+
+    data = [s.encode("utf-8") for s in strings]
+    soffs = [0]
+    for d in data:
+        soffs.append(soffs[-1] + len(d))
+
+    rstart = (
+        _COMPILED_HDR.size + 4 * len(soffs) + _COMPILED_TYPE.size * len(types)
+    )
+    sstart = rstart + 4 * len(records)
+    out = [
+        _COMPILED_HDR.pack(
+            _COMPILED_MAGIC, COMPILED_VERSION, len(data), len(types), sstart
+        ),
+        struct.pack("<{0:d}I".format(len(soffs)), *soffs),
+    ]
+    out.extend(
+        _COMPILED_TYPE.pack(tsid, count, rstart + 4 * start, nwords)
+        for tsid, count, start, nwords in types
+    )
+    out.append(struct.pack("<{0:d}I".format(len(records)), *records))
+    out.extend(data)
+    return b"".join(out)
+
+
+class _CompiledManifest(object):
+    """Private helper class that provides access to the actions in a
+    compiled manifest cache file (see _compile_actions) through mmap,
+    creating Action objects from the records as they are requested
+    instead of parsing action strings.  Strings are only decoded once and
+    attribute names and values are interned, as actions.fromstr() does, so
+    that actions share them with those of other manifests.
+
+    Raises EnvironmentError if the file can't be read, and ValueError if it
+    isn't a valid compiled manifest."""
+
+    def __init__(self, pathname):
+        with open(pathname, "rb") as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.__open()
+        except (struct.error, ValueError):
+            self.close()
+            raise ValueError("invalid compiled manifest: {0}".format(pathname))
+
+    def __open(self):
+        m = self.__map
+        magic, ver, nstrs, ntypes, sstart = _COMPILED_HDR.unpack_from(m, 0)
+        if magic != _COMPILED_MAGIC or ver != COMPILED_VERSION:
+            raise ValueError()
+        pos = _COMPILED_HDR.size
+        self.__soffs = struct.unpack_from("<{0:d}I".format(nstrs + 1), m, pos)
+        if sstart + self.__soffs[-1] > len(m):
+            raise ValueError()
+        self.__sstart = sstart
+        self.__strs = [None] * nstrs
+
+        pos += 4 * (nstrs + 1)
+        self.__types = {}
+        for i in range(ntypes):
+            tsid, count, start, nwords = _COMPILED_TYPE.unpack_from(m, pos)
+            if start + 4 * nwords > sstart:
+                raise ValueError()
+            self.__types[self.__str(tsid)] = (start, nwords)
+            pos += _COMPILED_TYPE.size
+
+    def close(self):
+        self.__map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __str(self, i):
+        # Every string is interned as it is decoded, so that the same
+        # object is returned however it was first looked up.
+        s = self.__strs[i]
+        if s is None:
+            start = self.__sstart + self.__soffs[i]
+            end = self.__sstart + self.__soffs[i + 1]
+            s = self.__strs[i] = sys.intern(
+                self.__map[start:end].decode("utf-8")
+            )
+        return s
+
+    def types(self):
+        """Returns the names of the action types in the manifest."""
+
+        return list(self.__types)
+
+    def __gen_records(self, atype):
+        """A generator function that yields tuples of (key kind, key
+        string index, words, index) for each action record of type
+        'atype', where 'words' holds the records and 'index' is the
+        position of the record's hash word within it."""
+
+        start, nwords = self.__types[atype]
+        words = struct.unpack_from("<{0:d}I".format(nwords), self.__map, start)
+        i = 0
+        while i < nwords:
+            yield words[i + 1], words[i + 2], words, i + 3
+            i += 1 + words[i]
+
+    def __attrs(self, words, i):
+        """Returns a tuple of (hash, attrs) for the action record in
+        'words' whose hash word is at index 'i'."""
+
+        hsid = words[i]
+        ahash = None if hsid == _NO_STR else self.__str(hsid)
+        attrs = {}
+        i += 2
+        for n in range(words[i - 1]):
+            k = self.__str(words[i])
+            nvals = words[i + 1]
+            if nvals == _SCALAR:
+                attrs[k] = self.__str(words[i + 2])
+                i += 3
+            else:
+                attrs[k] = [
+                    self.__str(w) for w in words[i + 2 : i + 2 + nvals]
+                ]
+                i += 2 + nvals
+        return ahash, attrs
+
+    def gen_actions(self, atype):
+        """A generator function that yields an Action object for each of
+        the actions of type 'atype'."""
+
+        cls = actions.types[atype]
+        for kind, ksid, words, i in self.__gen_records(atype):
+            ahash, attrs = self.__attrs(words, i)
+            a = cls(None, **attrs)
+            if ahash is not None:
+                a.hash = ahash
+            yield a
+
+    def gen_key_attribute_values(self, atype):
+        """A generator function that yields the value of the key
+        attribute of each of the actions of type 'atype' without creating
+        Action objects."""
+
+        key_attr = actions.types[atype].key_attr
+        for kind, ksid, words, i in self.__gen_records(atype):
+            if kind == _KEY_STR:
+                yield self.__str(ksid)
+            elif kind == _KEY_LIST:
+                yield self.__attrs(words, i)[1][key_attr]
+            else:
+                yield None
+
+    def __contains__(self, atype):
+        return atype in self.__types
+
+
 class FactoredManifest(Manifest):
     """This class serves as a wrapper for the Manifest class for callers
     that need efficient access to package data on a per-action type basis.
@@ -1618,6 +1852,10 @@ class FactoredManifest(Manifest):
         Manifest.__init__(self, fmri)
         self.__cache_root = cache_root
         self.__pathname = pathname
+        # The compiled manifest cache is opened once, when first
+        # needed, and kept until the cache files are rewritten.
+        self.__compiled = None
+        self.__compiled_opened = False
         # Make sure that either no excludes were provided or 2+ excludes
         # were.
         assert len(self.excludes) != 1
@@ -1704,6 +1942,7 @@ class FactoredManifest(Manifest):
         # so that empty cache files are created if no action of that
         # type exists for the package (avoids full manifest loads
         # later).
+        bytype = dict(self.actions_bytype)
         for n, acts in self.actions_bytype.items():
             t_prefix = "manifest.{0}.".format(n)
 
@@ -1722,7 +1961,11 @@ class FactoredManifest(Manifest):
                     # retrieved manifest, but that's ok.
                     # Signature verification is done using
                     # the raw manifest.
-                    f.writelines(self._gen_attrs_to_str())
+                    supplemental = list(self._gen_attrs_to_str())
+                    f.writelines(supplemental)
+                    bytype[n] = acts + [
+                        actions.fromstr(l.rstrip()) for l in supplemental
+                    ]
             except EnvironmentError as e:
                 raise apx._convert_error(e)
             finally:
@@ -1734,16 +1977,26 @@ class FactoredManifest(Manifest):
             except EnvironmentError as e:
                 raise apx._convert_error(e)
 
-        def create_cache(name, refs):
+        def create_cache(name, refs, mode="w"):
             try:
                 fd, fn = tempfile.mkstemp(dir=t_dir, prefix=name + ".")
-                with os.fdopen(fd, "w") as f:
+                with os.fdopen(fd, mode) as f:
                     f.writelines(refs())
                 os.chmod(fn, PKG_FILE_MODE)
                 portable.rename(fn, self.__cache_path(name))
             except EnvironmentError as e:
                 raise apx._convert_error(e)
 
+        # The compiled form of the per-type caches is written first, as
+        # the presence of the directory cache indicates that all of the
+        # others are present.
+        create_cache(
+            "manifest.compiled", lambda: [_compile_actions(bytype)], mode="wb"
+        )
+        # Any mapping of the previous compiled cache may still be in use
+        # by a generator, so it is left to be released once unused.
+        self.__compiled = None
+        self.__compiled_opened = False
         create_cache("manifest.dircache", self._gen_dirs_to_str)
         create_cache("manifest.mediatorcache", self._gen_mediators_to_str)
 
@@ -1815,6 +2068,27 @@ class FactoredManifest(Manifest):
             self.__load()
         assert self.loaded
 
+    def __open_compiled(self):
+        """Returns a _CompiledManifest for the compiled manifest cache,
+        or None if it isn't available.  It is only opened the first time
+        this is called after the cache files have been written."""
+
+        if self.__compiled_opened:
+            return self.__compiled
+        try:
+            self.__compiled = _CompiledManifest(
+                self.__cache_path("manifest.compiled")
+            )
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise apx._convert_error(e)
+        except ValueError:
+            # Cache file is malformed or from an incompatible
+            # version; the per-type caches are used instead.
+            pass
+        self.__compiled_opened = True
+        return self.__compiled
+
     def get_directories(self, excludes):
         """return a list of directories implicitly or explicitly
         referenced by this object
@@ -1869,6 +2143,24 @@ class FactoredManifest(Manifest):
         if attr_match:
             attr_match = _compile_fnpats(attr_match)
 
+        cm = self.__open_compiled()
+        if cm is not None:
+            if atype not in cm:
+                self._absent_cache.append(atype)
+                return
+            for a in cm.gen_actions(atype):
+                if excludes and not a.include_this(
+                    excludes, publisher=self.publisher
+                ):
+                    continue
+                # These conditions are split by
+                # performance.
+                if not attr_match:
+                    yield a
+                elif _attr_matches(a, attr_match):
+                    yield a
+            return
+
         try:
             with open(mpath, "r") as f:
                 for l in f:
@@ -1927,13 +2219,18 @@ class FactoredManifest(Manifest):
         mpath = self.__cache_path("manifest.set")
         if not os.path.exists(mpath):
             return False
-        with open(mpath, "r") as f:
-            for l in f:
-                a = actions.fromstr(l.rstrip())
-                if not self.excludes or a.include_this(
-                    self.excludes, publisher=self.publisher
-                ):
-                    self.fill_attributes(a)
+
+        cm = self.__open_compiled()
+        if cm is not None and "set" in cm:
+            acts = list(cm.gen_actions("set"))
+        else:
+            with open(mpath, "r") as f:
+                acts = [actions.fromstr(l.rstrip()) for l in f]
+        for a in acts:
+            if not self.excludes or a.include_this(
+                self.excludes, publisher=self.publisher
+            ):
+                self.fill_attributes(a)
 
         return True
 
@@ -1997,6 +2294,32 @@ class FactoredManifest(Manifest):
             self.__load()
         return Manifest.__str__(self)
 
+    def gen_key_attribute_value_by_type(self, atype, excludes=EmptyI):
+        """Generate the value of the key attribute for each action
+        of type "type" in the manifest; uses the compiled manifest cache
+        to avoid creating the actions if no content is excluded."""
+
+        if (
+            self.loaded
+            or excludes
+            or self.excludes
+            or atype in self._absent_cache
+            or not os.path.exists(self.__cache_path("manifest.dircache"))
+        ):
+            return Manifest.gen_key_attribute_value_by_type(
+                self, atype, excludes=excludes
+            )
+
+        cm = self.__open_compiled()
+        if cm is None:
+            return Manifest.gen_key_attribute_value_by_type(
+                self, atype, excludes=excludes
+            )
+        if atype not in cm:
+            self._absent_cache.append(atype)
+            return iter(())
+        return iter(list(cm.gen_key_attribute_values(atype)))
+
     def duplicates(self, excludes=EmptyI):
         if not self.loaded:
             self.__load()
@@ -33,6 +33,7 @@ from __future__ import print_function
 import OpenSSL.crypto as osc
 import calendar
 import collections
+import concurrent.futures
 import datetime
 import errno
 import fnmatch
@@ -46,6 +47,7 @@ import resource
 import shutil
 import signal
 import socket
+import sqlite3
 import struct
 import sys
 import threading
@@ -82,7 +84,7 @@ from stat import (
     S_IXOTH,
 )
 
-from urllib.parse import urlsplit, urlparse, urlunparse
+from urllib.parse import quote, urlsplit, urlparse, urlunparse
 from urllib.request import pathname2url, url2pathname
 
 import pkg.client.api_errors as api_errors
@@ -767,6 +769,76 @@ class _GZWriteWrapper(object):
             self._chashes[chash_attr].update(data)  # pylint: disable=E1101
 
 
+def _new_chashes(chash_attrs=None, chash_algs=None):
+    """Returns a dictionary mapping each of the chash attributes in
+    'chash_attrs' to a new object computing it, as described for
+    compute_compressed_attrs()."""
+
+    if chash_attrs is None:
+        chash_attrs = digest.DEFAULT_CHASH_ATTRS
+    if chash_algs is None:
+        chash_algs = digest.CHASH_ALGS
+
+    chashes = {}
+    for chash_attr in chash_attrs:
+        # "pkg.content-hash" is provided by default and doesn't
+        # indicate the hash_alg to be used, so when we want to
+        # calculate the content hash, we'll specify the
+        # hash_attrs explicitly, such as "gzip:sha512t_256".
+        if chash_attr == "pkg.content-hash":
+            chashes[chash_attr] = chash_algs[
+                "{0}:{1}".format(digest.EXTRACT_GZIP, digest.PREFERRED_HASH)
+            ]()
+        else:
+            chashes[chash_attr] = chash_algs[chash_attr]()
+    return chashes
+
+
+def _finish_chashes(chashes):
+    """Replaces the hash objects in the dictionary 'chashes' returned by
+    _new_chashes() with their values and returns it."""
+
+    for attr in chashes:
+        if attr == "pkg.content-hash":
+            chashes[attr] = "{0}:{1}:{2}".format(
+                digest.EXTRACT_GZIP,
+                digest.PREFERRED_HASH,
+                chashes[attr].hexdigest(),
+            )
+        else:
+            chashes[attr] = chashes[attr].hexdigest()
+    return chashes
+
+
+class GzipCompressor(object):
+    """Compresses the data written to it in the format used for content
+    in a repository, computing the size and hashes of the compressed data
+    as it is written.  This allows content to be compressed while it is
+    being read for some other purpose (such as computing the hashes of
+    the uncompressed data) instead of being read again.
+
+    If 'path' is None, the compressed data is discarded once its size and
+    hashes have been computed.  'chash_attrs' and 'chash_algs' are as for
+    compute_compressed_attrs()."""
+
+    def __init__(self, path, chash_attrs=None, chash_algs=None):
+        self.__chashes = _new_chashes(chash_attrs, chash_algs)
+        self.__fobj = _GZWriteWrapper(path, self.__chashes)
+        self.__ofile = PkgGzipFile(mode="wb", fileobj=self.__fobj)
+
+    def write(self, data):
+        """Compress and write 'data'."""
+        self.__ofile.write(data)
+
+    def close(self):
+        """Finish writing the compressed data and return a tuple of
+        (csize, chashes) as compute_compressed_attrs() does."""
+
+        self.__ofile.close()
+        self.__fobj.close()
+        return str(self.__fobj.size), _finish_chashes(self.__chashes)
+
+
 def compute_compressed_attrs(
     fname,
     file_path=None,
@@ -787,24 +859,6 @@ def compute_compressed_attrs(
     algorithms used to compute them.
     """
 
-    if chash_attrs is None:
-        chash_attrs = digest.DEFAULT_CHASH_ATTRS
-    if chash_algs is None:
-        chash_algs = digest.CHASH_ALGS
-
-    chashes = {}
-    for chash_attr in chash_attrs:
-        # "pkg.content-hash" is provided by default and doesn't
-        # indicate the hash_alg to be used, so when we want to
-        # calculate the content hash, we'll specify the
-        # hash_attrs explicitly, such as "gzip:sha512t_256".
-        if chash_attr == "pkg.content-hash":
-            chashes[chash_attr] = chash_algs[
-                "{0}:{1}".format(digest.EXTRACT_GZIP, digest.PREFERRED_HASH)
-            ]()
-        else:
-            chashes[chash_attr] = chash_algs[chash_attr]()
-
     #
     # This check prevents compressing a file which is already compressed.
     # This takes CPU load off the depot on large imports of mostly-the-same
@@ -827,8 +881,9 @@ def compute_compressed_attrs(
         else:
             opath = None
 
-        fobj = _GZWriteWrapper(opath, chashes)
-        ofile = PkgGzipFile(mode="wb", fileobj=fobj)
+        ofile = GzipCompressor(
+            opath, chash_attrs=chash_attrs, chash_algs=chash_algs
+        )
 
         if isinstance(data, (str, bytes)):
             # caller passed data in string
@@ -851,25 +906,14 @@ def compute_compressed_attrs(
                     break
                 ofile.write(chunk)
 
-        ofile.close()
-        fobj.close()
-        csize = str(fobj.size)
-        for attr in chashes:
-            if attr == "pkg.content-hash":
-                chashes[attr] = "{0}:{1}:{2}".format(
-                    digest.EXTRACT_GZIP,
-                    digest.PREFERRED_HASH,
-                    chashes[attr].hexdigest(),
-                )
-            else:
-                chashes[attr] = chashes[attr].hexdigest()
-        return csize, chashes
+        return ofile.close()
 
     # Compute the SHA hash of the compressed file.  In order for this to
     # work correctly, we have to use the PkgGzipFile class.  It omits
     # filename and timestamp information from the gzip header, allowing us
     # to generate deterministic hashes for different files with identical
     # content.
+    chashes = _new_chashes(chash_attrs, chash_algs)
     fs = os.stat(opath)
     csize = str(fs.st_size)
     with open(opath, "rb") as cfile:
@@ -881,18 +925,7 @@ def compute_compressed_attrs(
             for chash_attr in chashes:
                 chashes[chash_attr].update(cdata)  # pylint: disable=E1101
 
-    # The returned dictionary can now be populated with the hexdigests
-    # instead of the hash objects themselves.
-    for attr in chashes:
-        if attr == "pkg.content-hash":
-            chashes[attr] = "{0}:{1}:{2}".format(
-                digest.EXTRACT_GZIP,
-                digest.PREFERRED_HASH,
-                chashes[attr].hexdigest(),
-            )
-        else:
-            chashes[attr] = chashes[attr].hexdigest()
-    return csize, chashes
+    return csize, _finish_chashes(chashes)
 
 
 class ProcFS(object):
@@ -2872,6 +2905,269 @@ class AsyncCall(object):
         return self.rv
 
 
+class BoundedExecutor(object):
+    """A thread pool which limits the number of outstanding work items.
+
+    Callers block in submit() once 'bound' items are queued or running,
+    so that a producer walking a large amount of work (e.g. every file
+    of every installed package) never holds more than 'bound' pending
+    results (and the I/O associated with them) at once."""
+
+    def __init__(self, workers, bound=None):
+        assert workers > 0
+        if bound is None:
+            bound = workers * 4
+        self.workers = workers
+        self.__sem = threading.BoundedSemaphore(max(bound, workers))
+        self.__pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        # If we're unwinding because of an error, don't bother
+        # running any work that hasn't been started yet.
+        self.shutdown(cancel=exc_type is not None)
+        return False
+
+    def __release(self, fut):
+        self.__sem.release()
+
+    def submit(self, cb, *args, **kwargs):
+        """Schedule cb(*args, **kwargs) to be run by the pool and
+        return a concurrent.futures.Future for its result; blocks
+        while the pool is at its bound."""
+
+        self.__sem.acquire()
+        try:
+            fut = self.__pool.submit(cb, *args, **kwargs)
+        except Exception:
+            self.__sem.release()
+            raise
+        fut.add_done_callback(self.__release)
+        return fut
+
+    def shutdown(self, cancel=False):
+        """Wait for all outstanding work to complete and release the
+        pool's threads.  If 'cancel' is True, work which has not yet
+        started is discarded."""
+
+        self.__pool.shutdown(wait=True, cancel_futures=cancel)
+
+    @staticmethod
+    def completed(value):
+        """Return a Future which has already completed with 'value';
+        used to interleave work done inline with pool results."""
+
+        fut = concurrent.futures.Future()
+        fut.set_result(value)
+        return fut
+
+
+def stat_signature(st, content_only=False):
+    """Return a tuple of the fields of 'st', the result of os.stat() for
+    a file, which must be unchanged for anything recorded about the
+    file's content to remain valid: its device, inode, size and
+    modification and change times.  If 'content_only' is True, only its
+    size and modification time are included, which suffices for files
+    that are replaced rather than modified or relinked in place."""
+
+    if content_only:
+        return (st.st_size, st.st_mtime_ns)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+class SQLiteDB(object):
+    """Base class for the sqlite3 databases kept alongside repository
+    stores and images to avoid repeating work.
+
+    The database at 'path' is created on first use if possible, using
+    the statements in 'schema'; if 'read_only' is True, or it cannot be
+    written, any existing content is still used for queries.  If 'path'
+    is None, or there is no usable database, queries find nothing.
+
+    Subclasses provide 'schema', 'schema_version' and 'description'
+    (used in error messages), and may set 'synchronous' to the value
+    of the sqlite synchronous pragma to use when writing.  Connections
+    may be used from any thread; subclasses must hold '_lock' while
+    using '_open()' or '_execute()'."""
+
+    schema = []
+    schema_version = 1
+    description = "database"
+    synchronous = None
+
+    # The number of host variables used per statement when binding a
+    # large set of values. sqlite guarantees at least 999.
+    chunk_size = 500
+
+    def __init__(self, path, read_only=False):
+        self._path = path
+        self._read_only = read_only
+        self._lock = threading.Lock()
+        self._con = None
+        self._rw = False
+        self._opened = False
+
+    @property
+    def pathname(self):
+        return self._path
+
+    @property
+    def usable(self):
+        """A boolean indicating whether the database could be opened."""
+
+        with self._lock:
+            return self._open() is not None
+
+    @property
+    def writable(self):
+        """A boolean indicating whether the database can be updated."""
+
+        with self._lock:
+            return self._can_write()
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._con:
+            try:
+                self._con.close()
+            except sqlite3.Error:
+                pass
+        self._con = None
+        self._rw = False
+        self._opened = False
+
+    def __connect(self, mode):
+        con = sqlite3.connect(
+            "file:{0}?mode={1}".format(quote(self._path), mode),
+            uri=True,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        uv = con.execute("PRAGMA user_version").fetchone()[0]
+        if uv == 0 and mode != "ro":
+            con.execute("BEGIN IMMEDIATE")
+            for ddl in self.schema:
+                con.execute(ddl)
+            con.execute(
+                "PRAGMA user_version = {0:d}".format(self.schema_version)
+            )
+            con.execute("COMMIT")
+            os.chmod(self._path, PKG_FILE_MODE)
+        elif uv != self.schema_version:
+            con.close()
+            raise sqlite3.DatabaseError(
+                "unsupported {0} version {1:d}".format(self.description, uv)
+            )
+        return con
+
+    def _open(self):
+        """Return a connection to the database, creating it if
+        possible, or None if there is no usable database.  The caller
+        must hold the lock."""
+
+        if self._opened:
+            return self._con
+        self._opened = True
+        if not self._path:
+            return None
+
+        if not self._read_only:
+            try:
+                pdir = os.path.dirname(self._path)
+                if not os.path.exists(pdir):
+                    os.makedirs(pdir)
+                self._con = self.__connect("rwc")
+                if self.synchronous:
+                    self._con.execute(
+                        "PRAGMA synchronous = {0}".format(self.synchronous)
+                    )
+                self._rw = True
+                return self._con
+            except EnvironmentError as e:
+                if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                    raise
+            except sqlite3.DatabaseError:
+                # Read-only or corrupt database; try a read-only
+                # connection below, which will fail for the latter.
+                pass
+
+        try:
+            self._con = self.__connect("ro")
+        except sqlite3.DatabaseError:
+            self._con = None
+        return self._con
+
+    def _can_write(self):
+        """Return a boolean indicating whether the database can be
+        updated.  The caller must hold the lock."""
+
+        return self._open() is not None and self._rw
+
+    def _query(self, sql, args=()):
+        """Return the rows resulting from the query 'sql', or an empty
+        list if there is no usable database."""
+
+        with self._lock:
+            con = self._open()
+            if con is None:
+                return []
+            return con.execute(sql, args).fetchall()
+
+    @classmethod
+    def delete_statements(cls, table, column, values):
+        """Return a list of (sql, args) tuples that delete the rows of
+        'table' whose 'column' is one of 'values', binding at most
+        'chunk_size' values per statement, suitable for _execute()."""
+
+        values = tuple(values)
+        statements = []
+        for i in range(0, len(values), cls.chunk_size):
+            chunk = values[i : i + cls.chunk_size]
+            statements.append(
+                (
+                    "DELETE FROM {0} WHERE {1} IN ({2})".format(
+                        table, column, ",".join("?" * len(chunk))
+                    ),
+                    chunk,
+                )
+            )
+        return statements
+
+    def _execute(self, statements):
+        """Execute each of the (sql, args) tuples in the iterable
+        'statements' in a single transaction; if 'args' is a list, the
+        statement is executed once for each of its items.  The caller
+        must hold the lock.
+
+        If the database can't be written, or a statement fails, the
+        transaction is rolled back and sqlite3.DatabaseError raised."""
+
+        if not self._can_write():
+            raise sqlite3.OperationalError(
+                "{0} {1} is not writable".format(self.description, self._path)
+            )
+        con = self._con
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, args in statements:
+                if isinstance(args, list):
+                    con.executemany(sql, args)
+                else:
+                    con.execute(sql, args)
+            con.execute("COMMIT")
+        except:
+            try:
+                con.execute("ROLLBACK")
+            except sqlite3.DatabaseError:
+                pass
+            raise
+
+
 def get_runtime_proxy(proxy, uri):
     """Given a proxy string and a URI we want to access using it, determine
     whether any OS environment variables should override that value.
@@ -24,7 +24,9 @@
 # Copyright (c) 2009, 2025, Oracle and/or its affiliates.
 #
 
+import concurrent.futures
 import copy
+import gettext
 import itertools
 import os
 import re
@@ -76,6 +78,13 @@ LinkInfo = namedtuple(
 # 'variant-combination' is the combination of variants under which the link is
 # satisfied.  'via-links' contains the links used to reach 'path.'
 
+# The minimum number of manifests to resolve for worker processes to be used.
+MIN_PARALLEL_MANIFESTS = 100
+
+# The files and links which file dependencies are resolved against in a
+# worker process; see _init_resolve_worker.
+_resolve_index = None
+
 
 class DependencyError(Exception):
     """The parent class for all dependency exceptions."""
@@ -1830,6 +1839,81 @@ def add_fmri_path_mapping(
         )
 
 
+def _get_default_workers():
+    """Returns the number of worker processes to use when resolving
+    dependencies, from $PKG_DEPEND_WORKERS if set, otherwise one per
+    CPU."""
+
+    try:
+        workers = int(os.environ.get("PKG_DEPEND_WORKERS", 0))
+    except ValueError:
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _init_resolve_worker(files, links, use_system):
+    """Initializer for the worker processes used by _find_packages; the
+    arguments are those of find_package."""
+
+    global _resolve_index
+
+    import builtins
+
+    if not hasattr(builtins, "_"):
+        gettext.install("pkg", "/usr/share/locale")
+    _resolve_index = (files, links, use_system)
+
+
+def _find_packages(task):
+    """Resolves the file dependencies of one manifest using find_package.
+    This is run in a worker process.
+
+    'task' is a tuple of the list of (file dependency, variants) tuples to
+    resolve and the variants the package was published against.
+
+    Returns a list of the results of find_package for each file
+    dependency."""
+
+    files, links, use_system = _resolve_index
+    ds, pkg_vars = task
+    return [
+        find_package(files, links, d, d_vars, pkg_vars, use_system)
+        for d, d_vars in ds
+    ]
+
+
+def __find_all_packages(tasks, files, links, use_system, workers):
+    """Returns a list of the results of _find_packages for each task in
+    'tasks', in order, using 'workers' processes if more than one."""
+
+    if workers <= 1:
+        return [
+            [
+                find_package(files, links, d, d_vars, pkg_vars, use_system)
+                for d, d_vars in ds
+            ]
+            for ds, pkg_vars in tasks
+        ]
+
+    # The files and links are only sent to each worker once, and the
+    # results are collected in order so that they don't depend on which
+    # worker finished first.
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_resolve_worker,
+        initargs=(files, links, use_system),
+    ) as pool:
+        return list(
+            pool.map(
+                _find_packages,
+                tasks,
+                chunksize=max(1, len(tasks) // (workers * 4)),
+            )
+        )
+
+
 def __safe_fmri_parse(txt):
     dep_name = None
     try:
@@ -1839,7 +1923,9 @@ def __safe_fmri_parse(txt):
     return dep_name
 
 
-def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
+def resolve_deps(
+    manifest_paths, api_inst, system_patterns, prune_attrs=False, workers=None
+):
     """For each manifest given, resolve the file dependencies to package
     dependencies. It returns a mapping from manifest_path to a list of
     dependencies and a list of unresolved dependencies.
@@ -1852,7 +1938,11 @@ def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
     packages that are resolved against.
 
     'prune_attrs' is a boolean indicating whether debugging
-    attributes should be stripped from returned actions."""
+    attributes should be stripped from returned actions.
+
+    'workers' is the number of worker processes to resolve the file
+    dependencies of the manifests with.  If None, worker processes are
+    only used if there are many manifests to resolve."""
 
     # The variable 'manifests' is a list of 5-tuples. The first element
     # of the tuple is the path to the manifest. The second is the name of
@@ -1982,20 +2072,17 @@ def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
         add_fmri_path_mapping(files.delivered, links, pfmri, mfst, distro_vars)
         res_fmris.add(pfmri.pkg_name)
 
-    pkg_deps = {}
-    errs = []
-    warnings = []
-    external_deps = set()
+    # Gather the file dependencies of all of the manifests, so that they
+    # can be resolved at once.
+    file_deps = []
     for mp, (name, pfmri), mfst, pkg_vars, manifest_errs in manifests:
-        name_to_use = pfmri or name
         # The add_fmri_path_mapping function moved the actions it found
         # into the distro_vars universe of variants, so we need to move
         # pkg_vars (and by extension the variants on depend actions)
         # into that universe too.
         pkg_vars.merge_unknown(distro_vars)
-        errs.extend(manifest_errs)
         if mfst is None:
-            pkg_deps[mp] = None
+            file_deps.append(([], pkg_vars, {}))
             continue
         ds = []
         bad_ds = {}
@@ -2011,18 +2098,38 @@ def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
                 )
                 diff.type_diffs.update(e.diff.type_diffs)
                 diff.value_diffs.update(e.diff.value_diffs)
+        file_deps.append((ds, pkg_vars, bad_ds))
+
+    if workers is None:
+        if len(manifests) < MIN_PARALLEL_MANIFESTS:
+            workers = 1
+        else:
+            workers = _get_default_workers()
+    found = __find_all_packages(
+        [(ds, pkg_vars) for ds, pkg_vars, bad_ds in file_deps],
+        files,
+        links,
+        bool(system_patterns),
+        workers,
+    )
+
+    pkg_deps = {}
+    errs = []
+    warnings = []
+    external_deps = set()
+    for m, (ds, pkg_vars, bad_ds), pkg_found in zip(
+        manifests, file_deps, found
+    ):
+        mp, (name, pfmri), mfst, pkg_vars, manifest_errs = m
+        name_to_use = pfmri or name
+        errs.extend(manifest_errs)
+        if mfst is None:
+            pkg_deps[mp] = None
+            continue
         if bad_ds:
             errs.append(ExtraVariantedDependency(name_to_use, bad_ds, False))
 
-        pkg_res = [
-            (
-                d,
-                find_package(
-                    files, links, d, d_vars, pkg_vars, bool(system_patterns)
-                ),
-            )
-            for d, d_vars in ds
-        ]
+        pkg_res = list(zip((d for d, d_vars in ds), pkg_found))
 
         # Seed the final results with those dependencies defined
         # manually.
@@ -28,6 +28,8 @@
 repository.  Note that only the Transaction class should be used directly,
 though the other classes can be referred to for documentation purposes."""
 
+import collections
+import io
 import os
 import shutil
 from urllib.parse import quote, unquote, urlparse, urlunparse
@@ -49,6 +51,7 @@ import pkg.misc as misc
 import pkg.portable.util as os_util
 import pkg.server.repository as sr
 import pkg.client.api_errors as apx
+from pkg.client import global_settings
 
 
 class TransactionError(Exception):
@@ -253,6 +256,13 @@ class TransportTransaction(object):
         self.__local = False
         self.__uploaded = 0
         self.__uploads = {}
+        self.__executor = None
+        self.__pending = collections.deque()
+        # The number of files whose compressed content was needed
+        # (because the repository didn't have them, or couldn't provide
+        # their compressed hashes) and the number whose content wasn't.
+        self.__compress_used = 0
+        self.__compress_unused = 0
         self.__transactions = {}
         self._tmpdir = None
         self._append_mode = False
@@ -327,7 +337,6 @@ class TransportTransaction(object):
                 raise TransactionOperationError(
                     "add", trans_id=self.trans_id, msg=msg
                 )
-            self.__transactions[self.trans_id] = man + str(action) + "\n"
             return
 
         # Fallback to older logic.
@@ -344,62 +353,27 @@ class TransportTransaction(object):
                 "add", trans_id=self.trans_id, msg=msg
             )
 
-    def __get_elf_attrs(self, action, fname, size):
-        """Helper function to get the ELF information."""
-
-        # This currently uses the presence of "elfhash" to indicate the
-        # need for *any* content hashes to be added. This will work as
-        # expected until elfhash is no longer generated by default, and
-        # then this logic will need to be updated accordingly.
-        need_elf_info = False
-        need_elfhash = False
-
-        bufsz = misc.PKG_FILE_BUFSIZ
-        if bufsz > size:
-            bufsz = size
-
-        f = action.data()
-        magic = f.read(4)
-        if haveelf and magic == b"\x7fELF":
-            need_elf_info = (
-                "elfarch" not in action.attrs or "elfbits" not in action.attrs
-            )
-            need_elfhash = "elfhash" not in action.attrs
-        if not need_elf_info or not need_elfhash:
-            f.close()
-            return misc.EmptyDict
-
-        elf_name = os.path.join(self._tmpdir, ".temp-{0}".format(fname))
-        with open(elf_name, "wb") as elf_file:
-            elf_file.write(magic)
-            while True:
-                data = f.read(bufsz)
-                if not data:
-                    break
-                elf_file.write(data)
-        f.close()
+    @staticmethod
+    def __get_elf_attrs(elf_name):
+        """Helper function to get the ELF information for the file at
+        'elf_name'."""
 
         attrs = {}
-        if need_elf_info:
-            try:
-                elf_info = elf.get_info(elf_name)
-            except elf.ElfError as e:
-                raise TransactionError(e)
-            attrs["elfbits"] = str(elf_info["bits"])
-            attrs["elfarch"] = elf_info["arch"]
+        try:
+            elf_info = elf.get_info(elf_name)
+        except elf.ElfError as e:
+            raise TransactionError(e)
+        attrs["elfbits"] = str(elf_info["bits"])
+        attrs["elfarch"] = elf_info["arch"]
 
         # Check which content checksums to compute and add to the action
-        get_elfhash = (
-            need_elfhash and "elfhash" in digest.DEFAULT_GELF_HASH_ATTRS
-        )
+        get_elfhash = "elfhash" in digest.DEFAULT_GELF_HASH_ATTRS
         get_sha256 = (
-            need_elfhash
-            and not digest.sha512_supported
+            not digest.sha512_supported
             and "pkg.content-hash" in digest.DEFAULT_GELF_HASH_ATTRS
         )
         get_sha512t_256 = (
-            need_elfhash
-            and digest.sha512_supported
+            digest.sha512_supported
             and "pkg.content-hash" in digest.DEFAULT_GELF_HASH_ATTRS
         )
 
@@ -415,10 +389,72 @@ class TransportTransaction(object):
                 )
             except elf.ElfError:
                 pass
-
-        os.unlink(elf_name)
         return attrs
 
+    def __read_payload(self, f, size, hash_attrs, want_elf, compress):
+        """Reads the content of a file from the file object 'f', which
+        is closed afterwards, computing everything needed to publish it
+        from that one read.  This is run by the worker threads.
+
+        'size' is the size of the content, 'hash_attrs' the list of hash
+        attributes to compute, 'want_elf' whether ELF information should
+        be gathered if the content is an ELF object and 'compress'
+        whether the content should be compressed ready for upload.
+
+        Returns a tuple of (hashes, elf_attrs, cpath, cattrs), where
+        'hashes' is a dictionary of the computed hash values, 'cpath'
+        the path of the compressed content and 'cattrs' a tuple of its
+        (csize, chashes); the latter two are None if the content wasn't
+        compressed."""
+
+        hashers = dict(
+            (attr, digest.HASH_ALGS[attr]())
+            for attr in hash_attrs
+            if attr != "pkg.content-hash"
+        )
+        elf_attrs = EmptyDict
+        elf_file = elf_name = None
+        ofile = cpath = cattrs = None
+        try:
+            if compress:
+                fd, cpath = tempfile.mkstemp(dir=self._tmpdir)
+                os.close(fd)
+                ofile = misc.GzipCompressor(cpath)
+
+            first = True
+            while size > 0:
+                data = f.read(min(misc.PKG_FILE_BUFSIZ, size))
+                if not data:
+                    break
+                if first:
+                    first = False
+                    if want_elf and data[:4] == b"\x7fELF":
+                        # The ELF routines need a file to work on.
+                        fd, elf_name = tempfile.mkstemp(dir=self._tmpdir)
+                        elf_file = os.fdopen(fd, "wb")
+                for h in hashers.values():
+                    h.update(data)
+                if elf_file:
+                    elf_file.write(data)
+                if ofile:
+                    ofile.write(data)
+                size -= len(data)
+        finally:
+            f.close()
+            if elf_file:
+                elf_file.close()
+
+        if ofile:
+            cattrs = ofile.close()
+        if elf_name:
+            try:
+                elf_attrs = self.__get_elf_attrs(elf_name)
+            finally:
+                os.unlink(elf_name)
+
+        hashes = dict((attr, h.hexdigest()) for attr, h in hashers.items())
+        return hashes, elf_attrs, cpath, cattrs
+
     def __get_compressed_attrs(self, fhash):
         """Given a fhash of a file, returns a tuple
         of (csize, chashes) where 'csize' is the size of the file
@@ -451,9 +487,30 @@ class TransportTransaction(object):
                     break
         return csize, chashes
 
+    @staticmethod
+    def __content_hash_attr(action):
+        """Returns the hash attribute used to compute the file
+        content-hash of 'action', or None if it shouldn't have one."""
+
+        # Add file content-hash when preferred_hash is SHA2 or higher.
+        if action.name != "signature" and digest.PREFERRED_HASH != "sha1":
+            return "{0}:{1}".format(digest.EXTRACT_FILE, digest.PREFERRED_HASH)
+        return None
+
+    def __get_executor(self):
+        """Returns the pool used to read file content."""
+
+        if self.__executor is None:
+            workers = global_settings.client_publish_concurrency
+            if not workers or workers < 1:
+                workers = os.cpu_count() or 1
+            self.__executor = misc.BoundedExecutor(workers)
+        return self.__executor
+
     def _process_action(self, action, exact=False, path=None):
-        """Adds all expected attributes to the provided action and
-        upload the file for the action if needed.
+        """Arranges for all expected attributes to be added to the
+        provided action and the file for the action to be uploaded if
+        needed, and for the action to then be added to the manifest.
 
         If 'exact' is True and 'path' is 'None', the action won't
         be modified and no file will be uploaded.
@@ -461,6 +518,11 @@ class TransportTransaction(object):
         If 'exact' is True and a 'path' is provided, the file of that
         path will be uploaded as-is (it is assumed that the file is
         already in repository format).
+
+        The content of files is read by a pool of worker threads, so the
+        processing of an action may not be complete until a later action
+        is added or the transaction is closed; actions are always added
+        to the manifest in the order provided.
         """
 
         if self._append_mode and action.name != "signature":
@@ -472,42 +534,124 @@ class TransportTransaction(object):
             # XXX hack for empty files
             action.data = lambda: open(os.devnull, "rb")
 
-        if action.data is None:
-            return
-
-        if exact:
-            if path:
+        if action.data is None or exact:
+            if action.data is not None and path:
                 self.add_file(
                     path, basename=action.hash, progtrack=self.progtrack
                 )
+            self.__pending.append(
+                (action, 0, None, misc.BoundedExecutor.completed(None))
+            )
+            self.__finish_pending()
             return
 
-        # Get all hashes for this action.
-        hashes, dummy = misc.get_data_digest(
-            action.data(),
-            length=size,
-            hash_attrs=digest.DEFAULT_HASH_ATTRS,
-            hash_algs=digest.HASH_ALGS,
+        hash_attrs = list(digest.DEFAULT_HASH_ATTRS)
+        content_attr = self.__content_hash_attr(action)
+        if content_attr:
+            hash_attrs.append(content_attr)
+
+        # This currently uses the presence of "elfhash" to indicate the
+        # need for *any* content hashes to be added. This will work as
+        # expected until elfhash is no longer generated by default, and
+        # then this logic will need to be updated accordingly.
+        want_elf = (
+            haveelf
+            and ("elfarch" not in action.attrs or "elfbits" not in action.attrs)
+            and "elfhash" not in action.attrs
+        )
+
+        f = action.data()
+        source = None
+        if type(f) is io.BufferedReader and isinstance(f.name, str):
+            # The content is in a file of its own, so can be read by
+            # the pool, and read again later if needed.
+            source = f.name
+
+        # Compress the content while it is being read unless the
+        # repository has usually had the content already, in which case
+        # compression is only done for the files which turn out to need
+        # it once their hash is known.
+        compress = (
+            source is None or self.__compress_used >= self.__compress_unused
         )
+
+        args = (f, size, hash_attrs, want_elf, compress)
+        if source is not None:
+            fut = self.__get_executor().submit(self.__read_payload, *args)
+        else:
+            # Content from archives and other streams must be read in
+            # the order that the actions were provided.
+            fut = misc.BoundedExecutor.completed(self.__read_payload(*args))
+        self.__pending.append((action, size, source, fut))
+        self.__finish_pending()
+
+    def __finish_pending(self, wait=False):
+        """Completes the processing of queued actions in the order they
+        were added, uploading file content as needed and adding the
+        actions to the manifest.  If 'wait' is False, this stops at the
+        first action whose content is still being read, unless too many
+        actions are queued."""
+
+        limit = self.__executor.workers * 4 if self.__executor else 0
+        while self.__pending:
+            action, size, source, fut = self.__pending[0]
+            if not wait and not fut.done() and len(self.__pending) <= limit:
+                break
+            self.__pending.popleft()
+            try:
+                result = fut.result()
+                if result is not None:
+                    self.__add_payload_attrs(action, size, source, *result)
+            except apx.TransportError as e:
+                msg = str(e)
+                raise TransactionOperationError(
+                    "add", trans_id=self.trans_id, msg=msg
+                )
+            except TransactionError:
+                raise
+            except Exception as e:
+                # The content may have been read while a later action
+                # was being added, so the failed action is named.
+                name = (
+                    action.attrs.get("path")
+                    or getattr(action, "hash", None)
+                    or str(action)
+                )
+                msg = "{0}: {1}".format(name, e)
+                raise TransactionOperationError(
+                    "add", trans_id=self.trans_id, msg=msg
+                )
+            self.__transactions[self.trans_id] += str(action) + "\n"
+
+    def __discard_pending(self):
+        """Discards any queued actions without processing them."""
+
+        self.__pending.clear()
+        if self.__executor:
+            self.__executor.shutdown(cancel=True)
+            self.__executor = None
+
+    def __add_payload_attrs(
+        self, action, size, source, hashes, elf_attrs, cpath, cattrs
+    ):
+        """Adds the attributes computed for the content of 'action' by
+        __read_payload() to it, along with those of the content as
+        stored in the repository, uploading the content if the
+        repository doesn't have it.  'source' is the path of the file
+        the content was read from; it is only read again if the content
+        wasn't compressed."""
+
         # Set the hash member for backwards compatibility and
         # remove it from the dictionary.
-        action.hash = hashes.pop("hash", None)
-        action.attrs.update(hashes)
+        action.hash = hashes.get("hash")
+        for attr in digest.DEFAULT_HASH_ATTRS:
+            if attr not in ("hash", "pkg.content-hash"):
+                action.attrs[attr] = hashes[attr]
 
-        # Add file content-hash when preferred_hash is SHA2 or higher.
-        if action.name != "signature" and digest.PREFERRED_HASH != "sha1":
-            hash_attr = "{0}:{1}".format(
-                digest.EXTRACT_FILE, digest.PREFERRED_HASH
-            )
-            file_content_hash, dummy = misc.get_data_digest(
-                action.data(),
-                length=size,
-                return_content=False,
-                hash_attrs=[hash_attr],
-                hash_algs=digest.HASH_ALGS,
-            )
+        content_attr = self.__content_hash_attr(action)
+        if content_attr:
             action.attrs["pkg.content-hash"] = "{0}:{1}".format(
-                hash_attr, file_content_hash[hash_attr]
+                content_attr, hashes[content_attr]
             )
 
         # Now set the hash value that will be used for storing the file
@@ -522,35 +666,46 @@ class TransportTransaction(object):
             # We haven't processed this file before, determine if
             # it needs to be uploaded and what information the
             # repository knows about it.
-            elf_attrs = self.__get_elf_attrs(action, fname, size)
             csize, chashes = self.__get_compressed_attrs(fname)
 
             # 'csize' indicates that if file needs to be uploaded.
             fileneeded = csize is None
             if fileneeded:
-                fpath = os.path.join(self._tmpdir, fname)
-                csize, chashes = misc.compute_compressed_attrs(
-                    fname,
-                    data=action.data(),
-                    size=size,
-                    compress_dir=self._tmpdir,
-                )
+                if cattrs is None:
+                    cpath = os.path.join(self._tmpdir, fname)
+                    with open(source, "rb") as f:
+                        cattrs = misc.compute_compressed_attrs(
+                            fname,
+                            data=f,
+                            size=size,
+                            compress_dir=self._tmpdir,
+                        )
+                csize, chashes = cattrs
                 # Upload the compressed file for each action.
-                self.add_file(fpath, basename=fname, progtrack=self.progtrack)
-                os.unlink(fpath)
+                self.add_file(cpath, basename=fname, progtrack=self.progtrack)
                 self.__uploaded += 1
+                self.__compress_used += 1
             elif not chashes:
                 # If not fileneeded, and repository can't
                 # provide desired hashes, call
                 # compute_compressed_attrs() in a way that
                 # avoids writing the file to get the attributes
                 # we need.
-                csize, chashes = misc.compute_compressed_attrs(
-                    fname, data=action.data(), size=size
-                )
+                if cattrs is None:
+                    with open(source, "rb") as f:
+                        cattrs = misc.compute_compressed_attrs(
+                            fname, data=f, size=size
+                        )
+                csize, chashes = cattrs
+                self.__compress_used += 1
+            else:
+                self.__compress_unused += 1
 
             self.__uploads[fname] = (elf_attrs, csize, chashes)
 
+        if cpath:
+            os.unlink(cpath)
+
         for k, v in elf_attrs.items():
             if isinstance(v, list):
                 action.attrs[k] = v + action.attrlist(k)
@@ -642,6 +797,7 @@ class TransportTransaction(object):
         """
 
         if abandon:
+            self.__discard_pending()
             self.__transactions.pop(self.trans_id, None)
             try:
                 state, fmri = self.transport.publish_abandon(
@@ -656,6 +812,19 @@ class TransportTransaction(object):
                 self._cleanup_upload()
 
         else:
+            if self.trans_id in self.__transactions:
+                try:
+                    self.__finish_pending(wait=True)
+                except Exception:
+                    # The package can't be published without all of
+                    # its content, so discard the transaction.
+                    try:
+                        self.close(abandon=True)
+                    except TransactionError:
+                        pass
+                    raise
+                self.__discard_pending()
+
             man = self.__transactions.get(self.trans_id)
             if man is not None:
                 # upload manifest here
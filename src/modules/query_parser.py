@@ -1122,7 +1122,7 @@ class TermQuery(object):
         # Setup default global dictionary for this index path.
         gdd[path] = {
             "manf": ss.IndexStoreDict(ss.MANIFEST_LIST),
-            "token_byte_offset": ss.IndexStoreDictMutable(ss.BYTE_OFFSET_FILE),
+            "token_byte_offset": ss.IndexStoreTokenOffsets(ss.BYTE_OFFSET_FILE),
             "fmri_offsets": ss.InvertedDict(ss.FMRI_OFFSETS_FILE, None),
         }
 
@@ -1248,6 +1248,25 @@ class TermQuery(object):
         tq_gdd = self._get_gdd(self._dir_path)
         try:
             self._data_main_dict = ss.IndexStoreMainDict(ss.MAIN_FILE)
+            # Indexes which haven't been updated since the sorted token
+            # byte offset file was introduced only have the older,
+            # unsorted one, which has to be read into memory.
+            tok_name = ss.BYTE_OFFSET_FILE
+            if not os.path.exists(
+                os.path.join(self._dir_path, tok_name)
+            ) and os.path.exists(
+                os.path.join(self._dir_path, ss.BYTE_OFFSET_FILE_V1)
+            ):
+                tok_name = ss.BYTE_OFFSET_FILE_V1
+            if tq_gdd["token_byte_offset"].get_file_name() != tok_name:
+                if tok_name == ss.BYTE_OFFSET_FILE_V1:
+                    tq_gdd["token_byte_offset"] = ss.IndexStoreDictMutable(
+                        tok_name
+                    )
+                else:
+                    tq_gdd["token_byte_offset"] = ss.IndexStoreTokenOffsets(
+                        tok_name
+                    )
             if "fmri_offsets" not in tq_gdd:
                 tq_gdd["fmri_offsets"] = ss.InvertedDict(
                     ss.FMRI_OFFSETS_FILE, None
@@ -1456,10 +1475,8 @@ class TermQuery(object):
             # If the term has at least one non-wildcard character
             # in it, do the glob search.
             if TermQuery.has_non_wildcard_character.match(term):
-                keys = self._data_token_offset.get_keys()
-                matches = choose(keys, term, case_sensitive)
-                offsets = set(
-                    [self._data_token_offset.get_id(match) for match in matches]
+                offsets = self._data_token_offset.get_matching_ids(
+                    term, case_sensitive
                 )
         elif self._data_token_offset.has_entity(term):
             offsets = set([self._data_token_offset.get_id(term)])
@@ -26,6 +26,7 @@
 
 import os
 import errno
+import mmap
 import time
 import hashlib
 from urllib.parse import quote, unquote
@@ -33,6 +34,7 @@ from urllib.parse import quote, unquote
 import pkg.fmri as fmri
 import pkg.search_errors as search_errors
 import pkg.portable as portable
+from pkg.choose import choose
 from pkg.misc import PKG_FILE_BUFSIZ, force_bytes
 from pkg._misc import fast_quote
 
@@ -41,7 +43,9 @@ FAST_REMOVE = "fast_remove.v1"
 MANIFEST_LIST = "manf_list.v1"
 FULL_FMRI_FILE = "full_fmri_list"
 MAIN_FILE = "main_dict.ascii.v2"
-BYTE_OFFSET_FILE = "token_byte_offset.v1"
+BYTE_OFFSET_FILE = "token_byte_offset.v2"
+# The unsorted token byte offset file used by older indexes.
+BYTE_OFFSET_FILE_V1 = "token_byte_offset.v1"
 FULL_FMRI_HASH_FILE = "full_fmri_list.hash"
 FMRI_OFFSETS_FILE = "fmri_offsets.v1"
 
@@ -560,6 +564,15 @@ class IndexStoreDictMutable(IndexStoreBase):
     def get_keys(self):
         return list(self._dict.keys())
 
+    def get_matching_ids(self, pattern, case_sensitive):
+        """Returns the set of ids of the entities matching the glob
+        'pattern'."""
+
+        return set(
+            self._dict[k]
+            for k in choose(self._dict.keys(), pattern, case_sensitive)
+        )
+
     @staticmethod
     def __quote(str):
         if " " in str:
@@ -612,6 +625,192 @@ class IndexStoreDictMutable(IndexStoreBase):
         return 0
 
 
+class IndexStoreTokenOffsets(IndexStoreBase):
+    """Maps tokens to the byte offsets of their entries in the main
+    dictionary.  Entries are stored one per line, as for
+    IndexStoreDictMutable, but sorted case-insensitively so that the file
+    can be searched in place through mmap rather than read into memory.
+    Looking up a token is a binary search over the lines of the file, and
+    a pattern which starts with literal characters only requires a scan
+    of the entries sharing that prefix."""
+
+    def __init__(self, file_name):
+        IndexStoreBase.__init__(self, file_name)
+        self._map = None
+        self._start = 0
+        self._entries = None
+
+    @staticmethod
+    def _sort_key(token):
+        return token.lower(), token
+
+    @staticmethod
+    def __quote(token):
+        if " " in token or "\n" in token:
+            return "1" + quote(token)
+        return "0" + token
+
+    def read_dict_file(self):
+        """Maps the file into memory; nothing is read until it is
+        searched.  The mapping is kept once the file handle is closed,
+        as that happens as soon as a search has been set up.  It is
+        never closed here, as copies of this object made to read the
+        file again share it with searches still in progress; it is
+        released once nothing refers to it."""
+
+        with open(self._file_path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        # Skip the version line.
+        self._start = self._map.find(b"\n") + 1
+        IndexStoreBase.read_dict_file(self)
+
+    @staticmethod
+    def __entry(m, pos):
+        """Returns a tuple of (token, offset, next) for the entry
+        starting at byte 'pos' of the mapping 'm', where 'next' is the
+        position of the following entry."""
+
+        end = m.find(b"\n", pos)
+        if end < 0:
+            end = len(m)
+        token, offset = m[pos:end].decode("utf-8").split(" ")
+        if token[0] == "1":
+            token = unquote(token[1:])
+        else:
+            token = token[1:]
+        return token, int(offset), end + 1
+
+    def __bisect(self, m, key):
+        """Returns the position of the first entry of the mapping 'm'
+        whose sort key is not less than 'key'."""
+
+        lo, hi = self._start, len(m)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            # Find the start of the entry containing 'mid'; 'lo' is
+            # always the start of an entry.
+            pos = m.rfind(b"\n", lo, mid) + 1 or lo
+            token, offset, nxt = self.__entry(m, pos)
+            if self._sort_key(token) < key:
+                lo = nxt
+            else:
+                hi = pos
+        return lo
+
+    def __entries(self, m, pos=None):
+        """Yields (token, offset) for each entry of the mapping 'm' from
+        byte 'pos' to the end of the file.  The mapping is passed in,
+        rather than found each time, as the file may be read again
+        while this is in use."""
+
+        if m is None:
+            return
+        if pos is None:
+            pos = self._start
+        while pos < len(m):
+            token, offset, pos = self.__entry(m, pos)
+            yield token, offset
+
+    def __find(self, entity):
+        m = self._map
+        if m is None:
+            return None
+        key = self._sort_key(entity)
+        pos = self.__bisect(m, key)
+        if pos >= len(m):
+            return None
+        token, offset, nxt = self.__entry(m, pos)
+        if token != entity:
+            return None
+        return offset
+
+    def has_entity(self, entity):
+        return self.__find(entity) is not None
+
+    def get_id(self, entity):
+        offset = self.__find(entity)
+        if offset is None:
+            raise KeyError(entity)
+        return offset
+
+    def get_keys(self):
+        return [token for token, offset in self.__entries(self._map)]
+
+    def get_matching_ids(self, pattern, case_sensitive):
+        """Returns the set of ids of the entities matching the glob
+        'pattern'.  If the pattern starts with one or more literal
+        characters, only the entries starting with them are examined."""
+
+        prefix = pattern
+        for c in "*?[":
+            prefix = prefix.split(c, 1)[0]
+        # Case-insensitive matching of non-ASCII characters doesn't
+        # necessarily agree with str.lower(), so fall back to a full
+        # scan for those.
+        m = self._map
+        if not prefix or not prefix.isascii() or m is None:
+            entries = self.__entries(m)
+        else:
+            prefix = prefix.lower()
+
+            def entries():
+                for token, offset in self.__entries(
+                    m, self.__bisect(m, (prefix, ""))
+                ):
+                    if not token.lower().startswith(prefix):
+                        break
+                    yield token, offset
+
+            entries = entries()
+
+        offsets = {}
+        for token, offset in entries:
+            offsets[token] = offset
+        return set(offsets[k] for k in choose(offsets, pattern, case_sensitive))
+
+    def open_out_file(self, use_dir, version_num):
+        """Opens the output file for this class and prepares it
+        to be written via write_entity.  Entities are written to the
+        file, in order, when the file handle is closed.
+        """
+        self.write_dict_file(use_dir, version_num)
+        self._file_handle = open(
+            os.path.join(use_dir, self._name), "a", buffering=PKG_FILE_BUFSIZ
+        )
+        self._entries = []
+
+    def write_entity(self, entity, my_id):
+        """Adds the entity to those to be written with my_id"""
+        assert self._entries is not None
+        self._entries.append((str(entity), my_id))
+
+    def close_file_handle(self):
+        if self._entries is not None:
+            # The file has been rewritten, so any mapping of its
+            # previous content is stale.
+            self._map = None
+            entries = self._entries
+            self._entries = None
+            entries.sort(key=lambda e: self._sort_key(e[0]))
+            self._file_handle.writelines(
+                "{0} {1}\n".format(self.__quote(token), my_id)
+                for token, my_id in entries
+            )
+        IndexStoreBase.close_file_handle(self)
+
+    def write_dict_file(self, path, version_num):
+        """Writes the version information; the entities themselves
+        are written via open_out_file and write_entity.
+        """
+        IndexStoreBase._protected_write_dict_file(self, path, version_num, [])
+
+    def count_entries_removed_during_partial_indexing(self):
+        """Returns the number of entries removed during a second phase
+        of indexing.
+        """
+        return 0
+
+
 class IndexStoreSetHash(IndexStoreBase):
     def __init__(self, file_name):
         IndexStoreBase.__init__(self, file_name)
@@ -0,0 +1,178 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The compressed-content attribute cache.
+
+This module maintains a per-repository-store sqlite3 database recording,
+for each file in the store, the compressed size and compressed content
+hashes ("pkg.csize" and "chash" etc.) of its content, so that they do not
+have to be computed again each time they are requested (as happens for
+every HEAD request made to the depot's file/2 operation).  A bounded
+in-memory LRU sits in front of the database.
+
+Each entry also records the size and modification time of the stored
+file from which the attributes were computed, and is only used while
+they still match, so a file which is replaced in the store (e.g. by
+'pkgrepo fix' or by republishing client-compressed content) does not
+yield stale attributes.
+
+"""
+
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+
+import pkg.misc as misc
+
+CACHE_BASENAME = "cattrs.sqlite"
+
+SCHEMA_VERSION = 1
+
+# The maximum number of entries kept in memory.
+LRU_SIZE = 16384
+
+_SCHEMA = [
+    """CREATE TABLE attrs (
+        hash     TEXT PRIMARY KEY,
+        size     INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        csize    TEXT NOT NULL,
+        chashes  TEXT NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+
+class CompressedAttrCache(misc.SQLiteDB):
+    """Manages the compressed-content attribute cache for a repository
+    store.
+
+    The cache may be used from any thread.  If 'read_only' is True, or
+    the database cannot be written, any existing content is still used
+    for lookups and new entries are only kept in memory.  If 'path' is
+    None, no database is used at all."""
+
+    schema = _SCHEMA
+    schema_version = SCHEMA_VERSION
+    description = "attribute cache"
+    synchronous = "NORMAL"
+
+    def __init__(self, path, read_only=False, size=LRU_SIZE):
+        misc.SQLiteDB.__init__(self, path, read_only=read_only)
+        self.__size = size
+        self.__lru = OrderedDict()
+
+    def close(self):
+        with self._lock:
+            self._close()
+            self.__lru.clear()
+
+    def __remember(self, fhash, entry):
+        """Add an entry to the in-memory LRU.  The caller must hold the
+        lock."""
+
+        self.__lru[fhash] = entry
+        self.__lru.move_to_end(fhash)
+        while len(self.__lru) > self.__size:
+            self.__lru.popitem(last=False)
+
+    def get(self, fhash, st):
+        """Return a tuple of (csize, chashes) for the file named
+        'fhash' or None if it is not known.  'st' is the stat
+        information for the stored file."""
+
+        sig = misc.stat_signature(st, content_only=True)
+        with self._lock:
+            entry = self.__lru.get(fhash)
+            if entry is not None:
+                self.__lru.move_to_end(fhash)
+            else:
+                con = self._open()
+                if con is None:
+                    return None
+                try:
+                    row = con.execute(
+                        "SELECT size, mtime_ns, csize, chashes"
+                        " FROM attrs WHERE hash = ?",
+                        (fhash,),
+                    ).fetchone()
+                except sqlite3.DatabaseError:
+                    return None
+                if row is None:
+                    return None
+                try:
+                    entry = (tuple(row[:2]), row[2], json.loads(row[3]))
+                except ValueError:
+                    return None
+                self.__remember(fhash, entry)
+
+        if entry[0] != sig:
+            return None
+        return entry[1], dict(entry[2])
+
+    def add(self, fhash, st, csize, chashes):
+        """Record the compressed size 'csize' and the dictionary of
+        compressed hashes 'chashes' for the file named 'fhash'.  'st'
+        is the stat information for the stored file."""
+
+        self.update([(fhash, st, csize, chashes)])
+
+    def update(self, entries):
+        """Record each of the (fhash, st, csize, chashes) tuples in
+        'entries' as add() does, using a single transaction."""
+
+        rows = []
+        with self._lock:
+            for fhash, st, csize, chashes in entries:
+                entry = (
+                    misc.stat_signature(st, content_only=True),
+                    str(csize),
+                    dict(chashes),
+                )
+                self.__remember(fhash, entry)
+                rows.append(
+                    (fhash,)
+                    + entry[0]
+                    + (entry[1], json.dumps(entry[2], sort_keys=True))
+                )
+            if not rows or not self._can_write():
+                return
+            try:
+                self._execute(
+                    [("INSERT OR REPLACE INTO attrs VALUES (?,?,?,?,?)", rows)]
+                )
+            except sqlite3.DatabaseError:
+                # The cache is purely an optimisation; failing to
+                # write to it only means the attributes are computed
+                # again.
+                pass
+
+    def discard(self, fhashes):
+        """Forget any attributes recorded for the files named in
+        'fhashes'."""
+
+        fhashes = sorted(set(fhashes))
+        with self._lock:
+            for fhash in fhashes:
+                self.__lru.pop(fhash, None)
+            if not fhashes or not os.path.exists(self._path or ""):
+                return
+            if not self._can_write():
+                return
+            try:
+                self._execute(self.delete_statements("attrs", "hash", fhashes))
+            except sqlite3.DatabaseError:
+                pass
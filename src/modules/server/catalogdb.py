@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The repository catalog database.
+
+This module maintains a per-repository-store sqlite3 database of the
+packages in the store, so that questions such as which packages match a
+set of patterns, or whether a package has already been published, can be
+answered without loading the catalog parts (which, for large
+repositories, means parsing hundreds of megabytes of JSON).
+
+Packages are recorded in the database as they are published.  Those which
+have not yet been written to the catalog are also recorded in a queue of
+pending operations; this allows writing the catalog to be deferred until
+its content is next needed (for example, to satisfy a catalog/1 request)
+so that publishing a series of packages only rewrites it once.
+
+The database records the last-modified time of the catalog it was last
+synchronised with.  If the catalog is changed by other means (such as by
+an older version of the software), the recorded packages no longer match
+and must be reloaded from the catalog using populate().
+
+"""
+
+import pkg.fmri as fmri
+import pkg.misc as misc
+
+DB_BASENAME = "catalog.sqlite"
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = [
+    """CREATE TABLE packages (
+        stem     TEXT NOT NULL,
+        pub      TEXT NOT NULL,
+        version  TEXT NOT NULL,
+        PRIMARY KEY (stem, pub, version)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE pending (
+        seq      INTEGER PRIMARY KEY,
+        fmri     TEXT NOT NULL,
+        replace  INTEGER NOT NULL
+    )""",
+    """CREATE TABLE state (
+        name     TEXT PRIMARY KEY,
+        value    TEXT NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+
+class CatalogDB(misc.SQLiteDB):
+    """Manages the catalog database for a repository store.
+
+    The database may be used from any thread.  If 'read_only' is True, or
+    the database cannot be written, any existing content is still used
+    for queries, but nothing can be recorded; callers should check
+    'writable' before relying on record operations."""
+
+    schema = _SCHEMA
+    schema_version = SCHEMA_VERSION
+    description = "catalog database"
+
+    def __write(self, statements):
+        """Execute each of the (sql, args) tuples in the iterable
+        'statements' in a single transaction.  Unlike the content of a
+        cache, the pending operations are not recorded anywhere else,
+        so failures are raised to the caller."""
+
+        with self._lock:
+            self._execute(statements)
+
+    @property
+    def stamp(self):
+        """The last-modified time, as a string, of the catalog the
+        database was last synchronised with, or None if unknown."""
+
+        rows = self._query("SELECT value FROM state WHERE name = 'catalog'")
+        if not rows:
+            return None
+        return rows[0][0]
+
+    def __set_stamp(self, stamp):
+        return (
+            "INSERT OR REPLACE INTO state VALUES ('catalog', ?)",
+            (stamp,),
+        )
+
+    def populate(self, pfmris, stamp, clear_pending=False):
+        """Replace the recorded packages with those in the iterable of
+        FMRI objects 'pfmris', the content of the catalog last modified
+        at 'stamp'.  Packages with pending operations remain recorded
+        unless 'clear_pending' is True, in which case the operations
+        are discarded."""
+
+        rows = [(f.pkg_name, f.publisher, str(f.version)) for f in pfmris]
+        statements = [("DELETE FROM packages", ())]
+        if clear_pending:
+            statements.append(("DELETE FROM pending", ()))
+        else:
+            rows.extend(
+                (f.pkg_name, f.publisher, str(f.version))
+                for seq, f, replace in self.pending()
+            )
+        statements.append(
+            ("INSERT OR IGNORE INTO packages VALUES (?,?,?)", rows)
+        )
+        statements.append(self.__set_stamp(stamp))
+        self.__write(statements)
+
+    def add(self, pfmri, replace=False):
+        """Record the package 'pfmri' and queue an operation to add it
+        to the catalog (or, if 'replace' is True, to replace its
+        existing catalog entry)."""
+
+        self.__write(
+            [
+                (
+                    "INSERT OR IGNORE INTO packages VALUES (?,?,?)",
+                    (pfmri.pkg_name, pfmri.publisher, str(pfmri.version)),
+                ),
+                (
+                    "INSERT INTO pending (fmri, replace) VALUES (?,?)",
+                    (pfmri.get_fmri(anarchy=False), int(replace)),
+                ),
+            ]
+        )
+
+    def remove(self, pfmris, stamp):
+        """Forget the packages in the list of FMRI objects 'pfmris',
+        which have been removed from the catalog last modified at
+        'stamp'."""
+
+        self.__write(
+            [
+                (
+                    "DELETE FROM packages"
+                    " WHERE stem = ? AND pub = ? AND version = ?",
+                    [(f.pkg_name, f.publisher, str(f.version)) for f in pfmris],
+                ),
+                self.__set_stamp(stamp),
+            ]
+        )
+
+    def pending(self):
+        """Return a list of the pending catalog operations in the order
+        they were queued, as tuples of the form (seq, pfmri, replace)."""
+
+        return [
+            (seq, fmri.PkgFmri(sfmri), bool(replace))
+            for seq, sfmri, replace in self._query(
+                "SELECT seq, fmri, replace FROM pending ORDER BY seq"
+            )
+        ]
+
+    def has_pending(self):
+        """Return a boolean indicating whether any catalog operations
+        are pending."""
+
+        return bool(self._query("SELECT 1 FROM pending LIMIT 1"))
+
+    def clear_pending(self, seq, stamp):
+        """Discard the pending operations up to and including 'seq',
+        which have been applied to the catalog last modified at
+        'stamp'."""
+
+        self.__write(
+            [
+                ("DELETE FROM pending WHERE seq <= ?", (seq,)),
+                self.__set_stamp(stamp),
+            ]
+        )
+
+    def has_package(self, pfmri):
+        """Return a boolean indicating whether the package 'pfmri' is
+        recorded."""
+
+        return bool(
+            self._query(
+                "SELECT 1 FROM packages"
+                " WHERE stem = ? AND pub = ? AND version = ?",
+                (pfmri.pkg_name, pfmri.publisher, str(pfmri.version)),
+            )
+        )
+
+    def names(self):
+        """Return a set of the names of the recorded packages."""
+
+        return set(
+            r[0] for r in self._query("SELECT DISTINCT stem FROM packages")
+        )
+
+    def entries_by_version(self, name):
+        """A generator function that produces tuples of (version,
+        entries) for the package 'name' in ascending version order, as
+        Catalog.entries_by_version() does; the metadata in each of the
+        (fmri, metadata) tuples in entries is always empty."""
+
+        versions = {}
+        entries = {}
+        for pub, sver in self._query(
+            "SELECT pub, version FROM packages WHERE stem = ?", (name,)
+        ):
+            pfmri = fmri.PkgFmri(name=name, publisher=pub, version=sver)
+            versions[sver] = pfmri.version
+            entries.setdefault(sver, []).append((pfmri, {}))
+
+        for sver, ver in sorted(versions.items(), key=lambda i: i[1]):
+            yield ver, entries[sver]
+
+    def fmris(self):
+        """A generator function that produces an FMRI object for each of
+        the recorded packages."""
+
+        for stem, pub, sver in self._query(
+            "SELECT stem, pub, version FROM packages"
+        ):
+            yield fmri.PkgFmri(name=stem, publisher=pub, version=sver)
@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The repository content reference database.
+
+This module maintains a per-repository-store sqlite3 database recording,
+for each file in the store, the number of package manifests which
+reference it.  This allows the files which are no longer needed once a
+set of packages has been removed to be determined by reading only the
+manifests of those packages, rather than every manifest in the store.
+
+Each manifest which has been counted is recorded along with a signature
+of the manifest file (its size and modification time), so that manifests
+added, replaced or removed by other means can be detected.  Manifests
+which are not yet recorded can simply be counted; if a recorded manifest
+has changed or disappeared, the references it held can't be determined
+and the database must be reloaded using populate().  Checking every
+manifest is as costly as reading the store, so a stamp identifying the
+state of the store when the database was last brought up to date is
+also recorded; the manifests only need to be checked if it has changed.
+
+Files whose reference count has dropped to zero are kept in the database
+until they have been removed from the store, so that garbage left behind
+(for example, by replacing a manifest using an append transaction) can
+be found without scanning the store.
+
+"""
+
+import pkg.misc as misc
+
+DB_BASENAME = "content.sqlite"
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = [
+    """CREATE TABLE manifests (
+        path     TEXT PRIMARY KEY,
+        sig      TEXT NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE refs (
+        hash     TEXT PRIMARY KEY,
+        refcount INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE state (
+        name     TEXT PRIMARY KEY,
+        value    TEXT NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+
+def manifest_sig(st):
+    """Return the signature recorded for a manifest file, given the
+    result of os.stat() for it."""
+
+    return ":".join(str(v) for v in misc.stat_signature(st, content_only=True))
+
+
+class ContentDB(misc.SQLiteDB):
+    """Manages the content reference database for a repository store.
+
+    The database may be used from any thread.  If 'read_only' is True, or
+    the database cannot be written, nothing can be recorded; callers
+    should check 'writable' before relying on it.
+
+    Manifests are identified by their path relative to the manifest root
+    of the store, and files by the name (hash) they are stored under."""
+
+    schema = _SCHEMA
+    schema_version = SCHEMA_VERSION
+    description = "content database"
+
+    def __write(self, statements):
+        """Execute each of the (sql, args) tuples in the iterable
+        'statements' in a single transaction.  Files are removed based
+        on the recorded counts, so failures are raised to the caller."""
+
+        with self._lock:
+            self._execute(statements)
+
+    @staticmethod
+    def __incref(hashes):
+        rows = [(h,) for h in hashes]
+        return [
+            ("INSERT OR IGNORE INTO refs VALUES (?, 0)", rows),
+            ("UPDATE refs SET refcount = refcount + 1 WHERE hash = ?", rows),
+        ]
+
+    @staticmethod
+    def __decref(path, hashes):
+        # References are only dropped for manifests which were counted.
+        return (
+            "UPDATE refs SET refcount = refcount - 1 WHERE hash = ? AND"
+            " EXISTS (SELECT 1 FROM manifests WHERE path = ?)",
+            [(h, path) for h in hashes],
+        )
+
+    @property
+    def populated(self):
+        """A boolean indicating whether every manifest in the store has
+        been counted."""
+
+        return bool(self._query("SELECT 1 FROM state WHERE name = 'populated'"))
+
+    def populate(self, entries):
+        """Replace the recorded manifests and references with those in
+        the iterable 'entries' of tuples of the form (path, sig, hashes),
+        where 'hashes' is the set of files referenced by the manifest at
+        'path', which should include every manifest in the store.  Files
+        which are no longer referenced are kept with a count of zero."""
+
+        counts = {}
+        manifests = []
+        for path, sig, hashes in entries:
+            manifests.append((path, sig))
+            for h in hashes:
+                counts[h] = counts.get(h, 0) + 1
+
+        self.__write(
+            [
+                ("DELETE FROM manifests", ()),
+                ("UPDATE refs SET refcount = 0", ()),
+                ("INSERT INTO manifests VALUES (?,?)", manifests),
+                (
+                    "INSERT OR REPLACE INTO refs VALUES (?,?)",
+                    list(counts.items()),
+                ),
+                ("INSERT OR REPLACE INTO state VALUES ('populated', '1')", ()),
+            ]
+        )
+
+    @property
+    def stamp(self):
+        """The stamp recorded by set_stamp(), or None."""
+
+        rows = self._query("SELECT value FROM state WHERE name = 'stamp'")
+        if not rows:
+            return None
+        return rows[0][0]
+
+    def set_stamp(self, stamp):
+        """Record the string 'stamp' as identifying the state of the
+        store in which every manifest has been counted, or forget any
+        stamp if it is None."""
+
+        if stamp is None:
+            self.__write([("DELETE FROM state WHERE name = 'stamp'", ())])
+            return
+        self.__write(
+            [("INSERT OR REPLACE INTO state VALUES ('stamp', ?)", (stamp,))]
+        )
+
+    def manifests(self):
+        """Return a dictionary mapping the path of each recorded
+        manifest to its signature."""
+
+        return dict(self._query("SELECT path, sig FROM manifests"))
+
+    def add(self, path, sig, hashes, old_hashes=()):
+        """Count the references to the set of files 'hashes' made by the
+        manifest at 'path' with signature 'sig'.  If a manifest at
+        'path' has already been counted, 'old_hashes' is the set of
+        files it referenced, which are no longer referenced by it."""
+
+        statements = [self.__decref(path, old_hashes)]
+        statements.extend(self.__incref(hashes))
+        statements.append(
+            ("INSERT OR REPLACE INTO manifests VALUES (?,?)", (path, sig))
+        )
+        self.__write(statements)
+
+    def remove(self, entries):
+        """Drop the references made by the manifests in the iterable
+        'entries' of tuples of the form (path, hashes), which are being
+        removed from the store."""
+
+        statements = []
+        paths = []
+        for path, hashes in entries:
+            statements.append(self.__decref(path, hashes))
+            paths.append((path,))
+        statements.append(("DELETE FROM manifests WHERE path = ?", paths))
+        self.__write(statements)
+
+    def refcount(self, fhash):
+        """Return the number of counted manifests which reference the
+        file 'fhash'."""
+
+        rows = self._query("SELECT refcount FROM refs WHERE hash = ?", (fhash,))
+        if not rows:
+            return 0
+        return rows[0][0]
+
+    def unreferenced(self):
+        """Return a list of the files which are no longer referenced by
+        any manifest, but haven't been discarded."""
+
+        return [
+            r[0]
+            for r in self._query("SELECT hash FROM refs WHERE refcount <= 0")
+        ]
+
+    def discard(self, hashes):
+        """Forget the files in the iterable 'hashes', which have been
+        removed from the store, unless they have since been referenced
+        again."""
+
+        self.__write(
+            [
+                (
+                    "DELETE FROM refs WHERE hash = ? AND refcount <= 0",
+                    [(h,) for h in hashes],
+                )
+            ]
+        )
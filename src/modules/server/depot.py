@@ -84,6 +84,11 @@ import pkg.version
 
 from pkg.server.query_parser import Query, ParseError, BooleanQueryException
 
+# The maximum number of files which may be requested at once using the
+# filelist operation, and the size of the reads used to send them.
+FILELIST_MAX = 1024
+FILELIST_BUFSZ = 128 * 1024
+
 
 class Dummy(object):
     """Dummy object used for dispatch method mapping."""
@@ -109,6 +114,7 @@ class DepotHTTP(_Depot):
         "info",
         "manifest",
         "file",
+        "filelist",
         "open",
         "append",
         "close",
@@ -128,6 +134,7 @@ class DepotHTTP(_Depot):
         "info",
         "manifest",
         "file",
+        "filelist",
         "p5i",
         "publisher",
         "status",
@@ -136,6 +143,7 @@ class DepotHTTP(_Depot):
     REPO_OPS_MIRROR = [
         "versions",
         "file",
+        "filelist",
         "publisher",
         "status",
     ]
@@ -321,6 +329,16 @@ class DepotHTTP(_Depot):
             return req_pub
         return None
 
+    @staticmethod
+    def __accepts_gzip():
+        """Returns a boolean value indicating whether the client making
+        the current request accepts gzip-encoded responses."""
+
+        for enc in cherrypy.request.headers.elements("Accept-Encoding"):
+            if enc.value.lower() in ("gzip", "x-gzip"):
+                return enc.qvalue > 0
+        return False
+
     def __set_response_expires(self, op_name, expires, max_age=None):
         """Used to set expiration headers on a response dynamically
         based on the name of the operation.
@@ -702,6 +720,13 @@ class DepotHTTP(_Depot):
 
         try:
             fpath = self.repo.catalog_1(name, pub=self._get_req_pub())
+            # Catalog parts can be large, so send a compressed copy
+            # to clients that accept one if the repository has it.
+            gzpath = None
+            if self.__accepts_gzip():
+                gzpath = self.repo.catalog_1_compressed(
+                    name, pub=self._get_req_pub()
+                )
         except srepo.RepositoryError as e:
             # Treat any remaining repository error as a 404, but
             # log the error and include the real failure
@@ -710,6 +735,10 @@ class DepotHTTP(_Depot):
             raise cherrypy.HTTPError(http.client.NOT_FOUND, str(e))
 
         self.__set_response_expires("catalog", 86400, 86400)
+        cherrypy.response.headers["Vary"] = "Accept-Encoding"
+        if gzpath:
+            cherrypy.response.headers["Content-Encoding"] = "gzip"
+            return serve_file(gzpath, "text/plain; charset=utf-8")
         return serve_file(fpath, "text/plain; charset=utf-8")
 
     catalog_1._cp_config = {"response.stream": True}
@@ -858,6 +887,72 @@ class DepotHTTP(_Depot):
         "response.stream": True,
     }
 
+    def filelist_0(self, *tokens, **params):
+        """Request data contains application/x-www-form-urlencoded
+        entries naming the requested files by hash.  The files are
+        output to the client as a single tar stream, each named by its
+        hash; any which the repository does not have are omitted."""
+
+        fhashes = []
+        for val in params.values():
+            if isinstance(val, list):
+                fhashes.extend(val)
+            else:
+                fhashes.append(val)
+        if len(fhashes) > FILELIST_MAX:
+            raise cherrypy.HTTPError(
+                http.client.BAD_REQUEST,
+                _("At most {0:d} files may be requested at once.").format(
+                    FILELIST_MAX
+                ),
+            )
+
+        pub = self._get_req_pub()
+        files = []
+        for fhash in fhashes:
+            try:
+                fpath = self.repo.file(fhash, pub=pub)
+                st = os.stat(fpath)
+            except (srepo.RepositoryError, EnvironmentError):
+                # The client retrieves any files not included in
+                # the stream individually.
+                continue
+            files.append((fhash, fpath, st))
+
+        def output():
+            for fhash, fpath, st in files:
+                ti = tarfile.TarInfo(fhash)
+                ti.size = st.st_size
+                ti.mtime = int(st.st_mtime)
+                ti.mode = misc.PKG_FILE_MODE
+                yield ti.tobuf(format=tarfile.USTAR_FORMAT)
+
+                remaining = ti.size
+                with open(fpath, "rb") as f:
+                    while remaining > 0:
+                        data = f.read(min(remaining, FILELIST_BUFSZ))
+                        if not data:
+                            # The file shrank; the stream can
+                            # no longer be made consistent.
+                            raise EOFError(fpath)
+                        remaining -= len(data)
+                        yield data
+
+                pad = -ti.size % tarfile.BLOCKSIZE
+                if pad:
+                    yield tarfile.NUL * pad
+            yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+        return output()
+
+    filelist_0._cp_config = {
+        "response.stream": True,
+        "tools.response_headers.on": True,
+        "tools.response_headers.headers": [
+            ("Content-Type", "application/x-tar")
+        ],
+    }
+
     def file_2(self, *tokens):
         """Outputs the contents of the file, named by the SHA hash
         name in the request path, directly to the client."""
@@ -870,7 +965,9 @@ class DepotHTTP(_Depot):
                 fhash = None
 
             try:
-                fpath = self.repo.file(fhash, pub=self._get_req_pub())
+                fpath, csize, chashes = self.repo.compressed_attrs(
+                    fhash, pub=self._get_req_pub()
+                )
             except srepo.RepositoryFileNotFoundError as e:
                 raise cherrypy.HTTPError(http.client.NOT_FOUND, str(e))
             except srepo.RepositoryError as e:
@@ -880,9 +977,6 @@ class DepotHTTP(_Depot):
                 cherrypy.log("Request failed: {0}".format(str(e)))
                 raise cherrypy.HTTPError(http.client.NOT_FOUND, str(e))
 
-            csize, chashes = misc.compute_compressed_attrs(
-                fhash, file_path=fpath
-            )
             response = cherrypy.response
             for i, attr in enumerate(chashes):
                 response.headers["X-Ipkg-Attr-{0}".format(i)] = (
@@ -1546,29 +1640,21 @@ License:
             return ""
 
         try:
-            cat = rstore.catalog
+            mdict = rstore.get_matching_fmris([pfmri], strict=False)[0]
         except (
             srepo.RepositoryMirrorError,
             srepo.RepositoryUnsupportedOperationError,
         ):
             return ""
-
-        try:
-            matches = [
-                fmri
-                for fmri, states, attrs in cat.gen_packages(
-                    patterns=[pfmri], return_fmris=True
-                )
-            ]
-
         except Exception as e:
             # If this fails, it's ok to raise an exception since bad
             # input was likely provided.
             cherrypy.log("Request failed: {0}".format(e))
             raise cherrypy.HTTPError(http.client.BAD_REQUEST, str(e))
 
-        if not matches:
+        if not mdict:
             return ""
+        matches = [f for flist in mdict.values() for f in flist]
 
         if "@" not in pfmri or "*" in pfmri:
             # When using wildcards or exact name match, trim the
@@ -1576,7 +1662,9 @@ License:
             matches = sorted(set([m.pkg_name for m in matches]))
         else:
             # Ensure all fmris are output without publisher prefix
-            # and without scheme.
+            # and without scheme, newest versions first.
+            matches.sort(key=lambda m: m.version, reverse=True)
+            matches.sort(key=lambda m: m.pkg_name)
             matches = [
                 m.get_fmri(anarchy=True, include_scheme=False) for m in matches
             ]
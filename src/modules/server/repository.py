@@ -22,8 +22,11 @@
 # Copyright 2024 OmniOS Community Edition (OmniOSce) Association.
 # Copyright (c) 2008, 2025, Oracle and/or its affiliates.
 
+import collections
+import concurrent.futures
 import datetime
 import errno
+import gettext
 import logging
 import os
 import os.path
@@ -56,9 +59,14 @@ import pkg.misc as misc
 import pkg.nrlock
 import pkg.search_errors as se
 import pkg.query_parser as qp
+import pkg.server.attrcache as attrcache
 import pkg.server.catalog as old_catalog
+import pkg.server.catalogdb as catalogdb
+import pkg.server.contentdb as contentdb
 import pkg.server.query_parser as sqp
+import pkg.server.searchcache as searchcache
 import pkg.server.transaction as trans
+import pkg.server.verifydb as verifydb
 import pkg.version
 
 from pkg.pkggzip import PkgGzipFile
@@ -82,6 +90,16 @@ REPO_FIX_ITEM = 0
 REPO_FIX_FAILED = 1
 
 VERIFY_DEPENDENCY = "dependency"
+
+# The minimum number of packages to verify for worker processes to be used.
+MIN_PARALLEL_VERIFY = 100
+
+# The number of packages whose files may be verified ahead of the package
+# whose results are being reported, per worker.
+VERIFY_WINDOW = 16
+
+# The number of files verified between each checkpoint of a verification.
+VERIFY_CHECKPOINT = 1000
 verify_default_checks = frozenset(
     [
         VERIFY_DEPENDENCY,
@@ -397,6 +415,102 @@ class RepositorySigNoTrustAnchorDirError(RepositoryError):
         return _("Unable to find trust anchor directory {0}").format(self.data)
 
 
+def _compressed_catalog_path(path, st=None):
+    """Returns the pathname of the gzip-compressed copy of the catalog
+    file 'path' if it exists and was made from the file's current
+    content, or None otherwise.  'st' is the optional stat information
+    for the file."""
+
+    gzpath = path + ".gz"
+    try:
+        if st is None:
+            st = os.stat(path)
+        gst = os.stat(gzpath)
+    except EnvironmentError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+    if gst.st_mtime_ns != st.st_mtime_ns:
+        return None
+    return gzpath
+
+
+def _get_default_workers():
+    """Returns the number of worker processes to use when verifying the
+    files in a repository, from $PKG_VERIFY_WORKERS if set, otherwise one
+    per CPU."""
+
+    try:
+        workers = int(os.environ.get("PKG_VERIFY_WORKERS", 0))
+    except ValueError:
+        workers = 0
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _get_min_parallel():
+    """Returns the minimum number of packages to verify for worker
+    processes to be used, from $PKG_VERIFY_MIN_PARALLEL if set,
+    otherwise MIN_PARALLEL_VERIFY."""
+
+    try:
+        return int(os.environ["PKG_VERIFY_MIN_PARALLEL"])
+    except (KeyError, ValueError):
+        return MIN_PARALLEL_VERIFY
+
+
+def _init_verify_worker():
+    """Initializer for the worker processes used by _verify_payload."""
+
+    import builtins
+
+    if not hasattr(builtins, "_"):
+        gettext.install("pkg", "/usr/share/locale")
+
+
+def _verify_payload(path, h, alg):
+    """Check that the gzip file at 'path' in the repository can be read
+    and that its uncompressed content has the hash 'h' when computed
+    using the hash function 'alg'.  This may be run in a worker process.
+
+    Returns None if the file is intact, otherwise a tuple of the form
+    (error_code, reason), where 'reason' doesn't yet name the package
+    referencing the file, since it may be referenced by many."""
+
+    try:
+        st = os.stat(path)
+        # if it's a directory, we'll try to list it
+        if stat.S_ISDIR(st.st_mode):
+            os.listdir(path)
+    except OSError as e:
+        if e.errno in [errno.EPERM, errno.EACCES]:
+            return (REPO_VERIFY_PERM, {"hash": h, "err": str(e)})
+        return (REPO_VERIFY_NOFILE, {"hash": h, "err": str(e)})
+
+    gzf = None
+    try:
+        gzf = PkgGzipFile(fileobj=open(path, "rb"))
+        fhash = alg()
+        while True:
+            data = gzf.read(misc.PKG_FILE_BUFSIZ)
+            if not data:
+                break
+            fhash.update(data)
+        actual = fhash.hexdigest()
+        if actual != h:
+            return (REPO_VERIFY_BADHASH, {"actual": actual, "hash": h})
+    except (ValueError, EOFError, zlib.error) as e:
+        return (REPO_VERIFY_BADGZIP, {"hash": h})
+    except IOError as e:
+        if e.errno in [errno.EACCES, errno.EPERM]:
+            return (REPO_VERIFY_PERM, {"err": str(e), "hash": h})
+        return (REPO_VERIFY_BADGZIP, {"hash": h})
+    finally:
+        if gzf:
+            gzf.close()
+
+
 class _RepoStore(object):
     """The _RepoStore object provides an interface for performing operations
     on a set of package data contained within a repository.  This class is
@@ -414,13 +528,18 @@ class _RepoStore(object):
         read_only=False,
         root=None,
         catalogue_format="utf8",
+        defer_catalog=False,
         sort_file_max_size=indexer.SORT_FILE_MAX_SIZE,
         writable_root=None,
     ):
         """Prepare the repository for use."""
 
+        self.__attr_cache = None
         self.__catalog = None
+        self.__catalog_db = None
         self.__catalog_root = None
+        self.__catalog_stamp_cache = (None, None)
+        self.__content_db = None
         # FileManager supports multiple layouts, but realistically, it
         # is desirable to only support one per repository format
         # version.
@@ -429,10 +548,12 @@ class _RepoStore(object):
         self.__in_flight_trans = {}
         self.__read_only = read_only
         self.__root = None
+        self.__search_cache = searchcache.SearchCache()
         self.__sort_file_max_size = sort_file_max_size
         self.__tmp_root = None
         self.__writable_root = None
         self.__catalogue_format = catalogue_format
+        self.__defer_catalog = defer_catalog
         self.cache_store = None
         self.catalog_version = -1
         self.manifest_root = None
@@ -484,6 +605,12 @@ class _RepoStore(object):
         self.__read_only = value
         if self.__catalog:
             self.__catalog.read_only = value
+        if self.__catalog_db:
+            self.__catalog_db.close()
+            self.__catalog_db = None
+        if self.__content_db:
+            self.__content_db.close()
+            self.__content_db = None
         if self.cache_store:
             self.cache_store.readonly = value
         if old_ro and not self.__read_only:
@@ -522,7 +649,7 @@ class _RepoStore(object):
 
         if not manifest:
             manifest = self._get_manifest(pfmri, sig=True)
-        c = self.catalog
+        c = self.__load_catalog()
         c.add_package(pfmri, manifest=manifest)
 
     def __replace_package(self, pfmri, manifest=None):
@@ -531,7 +658,7 @@ class _RepoStore(object):
 
         if not manifest:
             manifest = self._get_manifest(pfmri, sig=True)
-        c = self.catalog
+        c = self.__load_catalog()
         c.remove_package(pfmri)
         c.add_package(pfmri, manifest=manifest)
 
@@ -696,6 +823,7 @@ class _RepoStore(object):
             "package-count": pkg_count,
             "package-version-count": pkg_ver_count,
             "last-catalog-update": lcat_update,
+            "search-cache": self.__search_cache.get_status(),
             "status": rstatus,
         }
 
@@ -793,19 +921,20 @@ class _RepoStore(object):
         if build_catalog:
             if not incremental:
                 self.__destroy_catalog()
+            c = self.__load_catalog()
             default_pub = self.publisher
             if self.read_only:
                 # Temporarily mark catalog as not read-only so
                 # that it can be modified.
-                self.catalog.read_only = False
+                c.read_only = False
 
             # Set batch_mode for catalog to speed up rebuild.
-            self.catalog.batch_mode = True
+            c.batch_mode = True
 
             # Pointless to log incremental updates since a new
             # catalog is being built.  This also helps speed up
             # rebuild.
-            self.catalog.log_updates = incremental
+            c.log_updates = incremental
 
             def add_package(f):
                 m = self._get_manifest(f, sig=True)
@@ -815,6 +944,14 @@ class _RepoStore(object):
                     f.publisher = default_pub
                 self.__add_package(f, manifest=m)
                 self.__log(str(f))
+                return m
+
+            # The references made by every manifest are counted again
+            # as they're read, unless this is an incremental rebuild.
+            counted = None
+            if not incremental:
+                counted = []
+                stamp = self.__manifest_stamp()
 
             # XXX eschew os.walk in favor of another os.listdir
             # here?
@@ -825,7 +962,18 @@ class _RepoStore(object):
                 for fname in os.listdir(pkgpath[0]):
                     try:
                         f = self.__fmri_from_path(pkgpath[0], fname)
-                        add_package(f)
+                        m = add_package(f)
+                        if counted is not None:
+                            mpath = os.path.join(pkgpath[0], fname)
+                            counted.append(
+                                (
+                                    "/".join(
+                                        (os.path.basename(pkgpath[0]), fname)
+                                    ),
+                                    contentdb.manifest_sig(os.stat(mpath)),
+                                    self.__get_payload_hashes(m),
+                                )
+                            )
                     except (
                         apx.InvalidPackageErrors,
                         actions.ActionError,
@@ -852,12 +1000,26 @@ class _RepoStore(object):
             # Private add_package doesn't automatically save catalog
             # so that operations can be batched (there is
             # significant overhead in writing the catalog).
-            self.catalog.batch_mode = False
-            self.catalog.log_updates = True
-            self.catalog.read_only = self.read_only
-            self.catalog.finalize()
+            c.batch_mode = False
+            c.log_updates = True
+            c.read_only = self.read_only
+            c.finalize()
             self.__save_catalog(lm=lm)
 
+            # Every package with a manifest in the repository is now
+            # in the catalog, including those with pending catalog
+            # operations.
+            db = self.__open_catalog_db()
+            if db is not None and db.writable:
+                db.populate(
+                    c.fmris(), self.__catalog_stamp(), clear_pending=True
+                )
+
+            cdb = self.__open_content_db()
+            if counted is not None and cdb is not None:
+                cdb.populate(counted)
+                cdb.set_stamp(stamp)
+
         if not incremental:
             # Only discard search data if this isn't an incremental
             # rebuild.
@@ -877,9 +1039,10 @@ class _RepoStore(object):
         if self.read_only and not self.writable_root:
             raise RepositoryReadOnlyError()
 
-        cat = self.catalog
         self.__index_log("Checking for updated package data.")
-        fmris_to_index = indexer.Indexer.check_for_updates(self.index_root, cat)
+        fmris_to_index = indexer.Indexer.check_for_updates(
+            self.index_root, self.__packages()
+        )
 
         if fmris_to_index:
             return self.__run_update_index()
@@ -922,7 +1085,11 @@ class _RepoStore(object):
         # catalog, as opposed to missing one entirely (which could
         # easily happen with multiple origins).  This must be done
         # before the search checks below.
-        if not self.read_only and self.catalog_root and not self.catalog.exists:
+        if (
+            not self.read_only
+            and self.catalog_root
+            and not self.__load_catalog().exists
+        ):
             self.__save_catalog()
 
         self.__check_search()
@@ -986,7 +1153,7 @@ class _RepoStore(object):
             # and proceed.
             shutil.rmtree(writ_cat_root, True)
             writ_cat_root = None
-            if os.path.exists(v0_attrs) and not self.catalog.exists:
+            if os.path.exists(v0_attrs) and not self.__load_catalog().exists:
                 # A v0 catalog exists, but no v1 catalog exists;
                 # this can happen when a repository that was
                 # previously run with writable-root and
@@ -1007,7 +1174,7 @@ class _RepoStore(object):
 
         if need_transform:
             # v1 catalog should be destroyed if it exists already.
-            self.catalog.destroy()
+            self.__load_catalog().destroy()
 
             # Create the transformed catalog.
             self.__log(
@@ -1052,7 +1219,7 @@ class _RepoStore(object):
                 self.catalog_version = 0
         else:
             try:
-                if self.catalog.exists:
+                if self.__load_catalog().exists:
                     self.catalog_version = 1
             except apx.CatalogError as e:
                 if not allow_invalid:
@@ -1072,7 +1239,7 @@ class _RepoStore(object):
             # publisher in this repository store's catalog.
             # (This is reasonably safe since there should only
             # ever be one.)
-            pubs = list(p for p in self.catalog.publishers())
+            pubs = list(p for p in self.__load_catalog().publishers())
             if pubs:
                 self.publisher = pubs[0]
 
@@ -1123,8 +1290,9 @@ class _RepoStore(object):
         # Save the new catalog data in the temporary location.
         self.__set_catalog_root(tmp_cat_root)
         if lm:
-            self.catalog.last_modified = lm
-        self.catalog.save(fmt=self.__catalogue_format)
+            self.__load_catalog().last_modified = lm
+        self.__load_catalog().save(fmt=self.__catalogue_format)
+        self.__compress_catalog(tmp_cat_root)
 
         orig_cat_root = None
         if os.path.exists(old_cat_root):
@@ -1143,14 +1311,475 @@ class _RepoStore(object):
             shutil.rmtree(orig_cat_root)
 
         # Set catalog version.
-        self.catalog_version = self.catalog.version
+        self.catalog_version = self.__load_catalog().version
+
+    def __compress_catalog(self, root):
+        """Private helper function that writes a gzip-compressed copy of
+        each file in the catalog directory 'root' which doesn't already
+        have an up-to-date one, and removes the copies of any files that
+        no longer exist.  The copies are served to clients that accept
+        compressed content instead of the files themselves.  Each copy
+        is given the modification time of the file it was made from so
+        that stale copies can be detected."""
+
+        try:
+            names = set(os.listdir(root))
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".gz"):
+                    if name[:-3] not in names:
+                        portable.remove(path)
+                    continue
+                if not name.startswith("catalog.") and not name.startswith(
+                    "update."
+                ):
+                    continue
+                if name.endswith(".idx") or name.endswith(".new"):
+                    # Local catalog part indexes aren't served.
+                    continue
+
+                st = os.stat(path)
+                if _compressed_catalog_path(path, st):
+                    continue
+
+                tmp_file = path + ".gz.new"
+                with (
+                    open(path, "rb") as src,
+                    PkgGzipFile(tmp_file, "wb") as dst,
+                ):
+                    shutil.copyfileobj(src, dst, 128 * 1024)
+                os.chmod(tmp_file, misc.PKG_FILE_MODE)
+                os.utime(tmp_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+                portable.rename(tmp_file, path + ".gz")
+        except EnvironmentError as e:
+            # The compressed copies are only an optimisation; the
+            # uncompressed files are served if they can't be written.
+            if e.errno not in (errno.EACCES, errno.EROFS, errno.EPERM):
+                raise
+
+    def __open_catalog_db(self):
+        """Return the catalog database for this storage object, or None
+        if it isn't available.  The content of the database may not
+        reflect the current catalog; see __get_catalog_db()."""
+
+        if self.mirror or self.catalog_version < 1:
+            return None
+        if self.__catalog_db is None:
+            root = self.__writable_root or self.__root
+            if not root:
+                return None
+            self.__catalog_db = catalogdb.CatalogDB(
+                os.path.join(root, catalogdb.DB_BASENAME),
+                read_only=self.read_only and not self.__writable_root,
+            )
+        if not self.__catalog_db.usable:
+            return None
+        return self.__catalog_db
+
+    def __catalog_stamp(self):
+        """Return the last-modified time of the stored catalog as a
+        string, or an empty string if there is no stored catalog."""
+
+        path = os.path.join(self.catalog_root, "catalog.attrs")
+        try:
+            st = os.stat(path)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return ""
+
+        # The catalog is always replaced rather than modified in place,
+        # so the attributes only need to be read when the file changes.
+        sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if self.__catalog_stamp_cache[0] != sig:
+            lm = catalog.CatalogAttrs(meta_root=self.catalog_root).last_modified
+            self.__catalog_stamp_cache = (sig, catalog.datetime_to_ts(lm))
+        return self.__catalog_stamp_cache[1]
+
+    def __get_catalog_db(self):
+        """Return the catalog database for this storage object if it is
+        available and reflects the current catalog, or None.  If the
+        catalog has been changed without updating the database, the
+        database is reloaded from it if possible."""
+
+        db = self.__open_catalog_db()
+        if db is None:
+            return None
+        stamp = self.__catalog_stamp()
+        if db.stamp != stamp:
+            if not db.writable:
+                return None
+            cat = catalog.Catalog(meta_root=self.catalog_root, read_only=True)
+            db.populate(cat.fmris(), stamp)
+        return db
+
+    def __flush_catalog(self):
+        """Private helper function that applies the operations pending
+        in the catalog database to the catalog and saves it; caller
+        responsible for repository locking."""
+
+        db = self.__get_catalog_db()
+        if db is None or not db.writable:
+            return
+        ops = db.pending()
+        if not ops:
+            return
+
+        if self.__catalog is not None and self.__catalog_stamp() != (
+            catalog.datetime_to_ts(self.__catalog.last_modified)
+        ):
+            # The catalog has been changed by another process since it
+            # was loaded.
+            self.__catalog = None
+        c = self.__load_catalog()
+
+        c.batch_mode = True
+        changed = []
+        for seq, pfmri, replace in ops:
+            try:
+                m = self._get_manifest(pfmri, sig=True)
+                if replace:
+                    try:
+                        c.remove_package(pfmri)
+                    except apx.UnknownCatalogEntry:
+                        pass
+                c.add_package(pfmri, manifest=m)
+            except apx.DuplicateCatalogEntry:
+                # The operation was applied before the catalog
+                # database could be updated.
+                continue
+            except (
+                apx.InvalidPackageErrors,
+                actions.ActionError,
+                RepositoryManifestNotFoundError,
+            ) as e:
+                # Don't let one bad package prevent the catalog
+                # from being updated.
+                self.__log(
+                    _("Skipping {name}: {error}").format(name=pfmri, error=e)
+                )
+                continue
+            changed.append(pfmri)
+        c.batch_mode = False
+        if changed:
+            c.finalize(pfmris=changed)
+            self.__save_catalog()
+        db.clear_pending(ops[-1][0], self.__catalog_stamp())
+
+    def __open_content_db(self):
+        """Return the content database for this storage object, or None
+        if it isn't available or can't be updated.  The database may not
+        account for every manifest in the store; see
+        __get_content_db()."""
+
+        if self.mirror or not self.manifest_root:
+            return None
+        if self.__content_db is None:
+            root = self.__writable_root or self.__root
+            if not root:
+                return None
+            read_only = self.read_only and not self.__writable_root
+            path = os.path.join(root, contentdb.DB_BASENAME)
+            self.__content_db = contentdb.ContentDB(path, read_only=read_only)
+            if not read_only and not self.__content_db.usable:
+                # The database is corrupt; as everything in it can be
+                # found from the manifests in the store, start again.
+                try:
+                    portable.remove(path)
+                except EnvironmentError as e:
+                    if e.errno not in (
+                        errno.EACCES,
+                        errno.EISDIR,
+                        errno.ENOENT,
+                        errno.EPERM,
+                        errno.EROFS,
+                    ):
+                        raise
+                else:
+                    self.__content_db = contentdb.ContentDB(path)
+        if not self.__content_db.writable:
+            return None
+        return self.__content_db
+
+    @staticmethod
+    def __get_payload_hashes(m):
+        """Given a Manifest object, return a set of the hashes of the
+        files it references, as they are named in the repository."""
+
+        hashes = set()
+        for a in m.gen_actions():
+            if not a.has_payload:
+                # Nothing to archive.
+                continue
+
+            # Action payload.
+            hattr, hval, hfunc = digest.get_least_preferred_hash(a)
+            hashes.add(hval)
+
+            # Signature actions have additional payloads.
+            if a.name == "signature":
+                for c in a.get_chain_certs(least_preferred=True):
+                    hashes.add(c)
+        return hashes
+
+    def __read_payload_hashes(self, mpath):
+        """Return a set of the hashes of the files referenced by the
+        manifest at 'mpath'."""
+
+        m = pkg.manifest.Manifest()
+        m.set_content(pathname=mpath)
+        return self.__get_payload_hashes(m)
+
+    def __gen_manifests(self):
+        """A generator function that produces a tuple of the form (path,
+        mpath) for each manifest in the store, where 'path' is its path
+        relative to the manifest root and 'mpath' its absolute path."""
+
+        if not os.path.isdir(self.manifest_root):
+            return
+        for name in os.listdir(self.manifest_root):
+            pdir = os.path.join(self.manifest_root, name)
+            try:
+                vers = os.listdir(pdir)
+            except EnvironmentError as e:
+                if e.errno != errno.ENOTDIR:
+                    raise
+                # Assume the result of an unexpected file in the
+                # directory; just skip it and drive on.
+                continue
+            for ver in vers:
+                yield "/".join((name, ver)), os.path.join(pdir, ver)
+
+    def __manifest_stamp(self):
+        """Return a string identifying the state of the manifest root,
+        or None if it doesn't exist.  It changes whenever a package is
+        added to or removed from the store; every change made to the
+        manifests through this object records the new stamp in the
+        content database."""
+
+        try:
+            st = os.stat(self.manifest_root)
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return None
+        return ":".join(str(v) for v in misc.stat_signature(st))
+
+    def __restamp_content_db(self, stamp):
+        """Record the current state of the manifest root in the content
+        database after changing the manifests in the store, if 'stamp'
+        is the state recorded before the change; caller responsible for
+        repository locking."""
+
+        db = self.__open_content_db()
+        if db is None or not db.populated or db.stamp != stamp:
+            return
+        db.set_stamp(self.__manifest_stamp())
+
+    def __get_content_db(self, progtrack, check=False):
+        """Return the content database for this storage object, after
+        counting any manifests which have been added to the store by
+        other means, or None if it isn't available; caller responsible
+        for repository locking.  If any counted manifests have since
+        been changed or removed by other means, all of the manifests in
+        the store are counted again.
+
+        The manifests are only checked if the state of the manifest root
+        differs from that recorded, or 'check' is True.  Manifests added
+        to, replaced in or removed from the directory of an existing
+        package by other means are only found if 'check' is True, or
+        once the repository has been rebuilt."""
+
+        db = self.__open_content_db()
+        if db is None:
+            return None
+
+        stamp = self.__manifest_stamp()
+        if not check and db.populated and db.stamp == stamp:
+            return db
+
+        stale = not db.populated
+        recorded = {}
+        if not stale:
+            recorded = db.manifests()
+
+        found = []
+        added = []
+        for path, mpath in self.__gen_manifests():
+            sig = contentdb.manifest_sig(os.stat(mpath))
+            found.append((path, mpath, sig))
+            rsig = recorded.pop(path, None)
+            if rsig is None:
+                added.append((path, mpath, sig))
+            elif rsig != sig:
+                stale = True
+        if recorded:
+            stale = True
+
+        if stale:
+            added = found
+        entries = []
+        if added:
+            progtrack.job_start(
+                progtrack.JOB_REPO_ANALYZE_REPO, goal=len(added)
+            )
+            for path, mpath, sig in added:
+                entries.append((path, sig, self.__read_payload_hashes(mpath)))
+                progtrack.job_add_progress(progtrack.JOB_REPO_ANALYZE_REPO)
+            progtrack.job_done(progtrack.JOB_REPO_ANALYZE_REPO)
+
+        if stale:
+            db.populate(entries)
+        else:
+            for path, sig, hashes in entries:
+                db.add(path, sig, hashes)
+        db.set_stamp(stamp)
+        return db
+
+    @staticmethod
+    def __rmdir(d):
+        """rmdir; but ignores non-empty directories."""
+
+        try:
+            os.rmdir(d)
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+
+    def __find_unreferenced(self, removed, progtrack):
+        """Return a set of the hashes of the files referenced by the
+        packages being removed that no other manifest in the store
+        references, by reading every other manifest.  This is used
+        when the content database isn't available; caller responsible
+        for repository locking.
+
+        'removed' is a dictionary of the sets of hashes referenced by
+        each package being removed, keyed by manifest path relative to
+        the manifest root."""
+
+        pfiles = set()
+        for hashes in removed.values():
+            pfiles.update(hashes)
+        if not pfiles:
+            # If the packages being removed don't have any
+            # payloads, there's no need to check the others.
+            return pfiles
+
+        remaining = [
+            mpath
+            for path, mpath in self.__gen_manifests()
+            if path not in removed
+        ]
+        progtrack.job_start(
+            progtrack.JOB_REPO_ANALYZE_REPO, goal=len(remaining)
+        )
+        for mpath in remaining:
+            # Any files in use by another package can't be
+            # removed; once none are left, there's nothing more
+            # to read, but progress is still updated.
+            if pfiles:
+                pfiles -= self.__read_payload_hashes(mpath)
+            progtrack.job_add_progress(progtrack.JOB_REPO_ANALYZE_REPO)
+        progtrack.job_done(progtrack.JOB_REPO_ANALYZE_REPO)
+        return pfiles
+
+    def __find_garbage(self, progtrack):
+        """Return a set of the hashes of the files in the store which
+        aren't referenced by any manifest in the store, by reading every
+        manifest.  This is used when the content database isn't
+        available; caller responsible for repository locking."""
+
+        # The files in the store are found first; the manifest of a
+        # package being published is put in place before its files are,
+        # so any file found will be accounted for below.
+        garbage = set()
+        try:
+            for h in self.cache_store.walk():
+                garbage.add(h)
+        except file_manager.UnrecognizedFilePaths:
+            # Anything which isn't a file in the store is left
+            # alone.
+            pass
+
+        manifests = [mpath for path, mpath in self.__gen_manifests()]
+        progtrack.job_start(
+            progtrack.JOB_REPO_ANALYZE_REPO, goal=len(manifests)
+        )
+        for mpath in manifests:
+            garbage -= self.__read_payload_hashes(mpath)
+            progtrack.job_add_progress(progtrack.JOB_REPO_ANALYZE_REPO)
+        progtrack.job_done(progtrack.JOB_REPO_ANALYZE_REPO)
+        return garbage
+
+    def __remove_unreferenced(self, progtrack, db=None, pfiles=None):
+        """Remove any files which are no longer referenced by a package
+        from the store; caller responsible for repository locking.
+
+        If 'db' is provided, the files are those the content database
+        has no references for, along with any in the set of hashes
+        'pfiles'; otherwise, 'pfiles' must be a set of their hashes."""
+
+        if db is not None:
+            pfiles = set(pfiles or ()).union(db.unreferenced())
+        progtrack.job_start(progtrack.JOB_REPO_RM_FILES, goal=len(pfiles))
+        for h in pfiles:
+            # File might already be gone (don't care if
+            # it is).
+            fpath = self.cache_store.lookup(h)
+            if fpath is not None:
+                portable.remove(fpath)
+            progtrack.job_add_progress(progtrack.JOB_REPO_RM_FILES)
+        self.__get_attr_cache().discard(pfiles)
+        if db is not None:
+            db.discard(pfiles)
+        progtrack.job_done(progtrack.JOB_REPO_RM_FILES)
+
+        if pfiles and self.file_root:
+            # Tidy up any directories left empty.
+            try:
+                for entry in os.listdir(self.file_root):
+                    self.__rmdir(os.path.join(self.file_root, entry))
+            except EnvironmentError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+    def __packages(self):
+        """Return the catalog database if it is available and current, or
+        otherwise the catalog, to answer queries about the packages in
+        the repository without writing any pending catalog operations
+        to the catalog."""
+
+        db = self.__get_catalog_db()
+        if db is not None:
+            return db
+        return self.__load_catalog()
+
+    def __sync_catalog(self):
+        """Private helper function that applies any operations pending
+        in the catalog database to the catalog, if possible, acquiring
+        the repository lock if the caller doesn't hold it."""
+
+        if self.read_only or self.mirror or self.catalog_version < 1:
+            return
+        db = self.__get_catalog_db()
+        if db is None or not db.writable or not db.has_pending():
+            return
+
+        if self.__lock.locked:
+            self.__flush_catalog()
+            return
+        self.__lock_rstore(blocking=True)
+        try:
+            self.__flush_catalog()
+        finally:
+            self.__unlock_rstore()
 
     def __set_catalog_root(self, root):
         self.__catalog_root = root
         if self.__catalog:
             # If the catalog is loaded already, then reset
             # its meta_root.
-            self.catalog.meta_root = root
+            self.__catalog.meta_root = root
 
     def __set_root(self, root):
         if root:
@@ -1221,6 +1850,29 @@ class _RepoStore(object):
                 self.__index_log("Search Available")
             self.__search_available = True
 
+    def __remove_from_searchdb(self, fmris):
+        """Removes the packages in the list of FMRIs 'fmris' from the
+        search data, so that the remaining packages don't need to be
+        indexed again.  If the search data isn't consistent, it's
+        discarded instead.  Caller responsible for repository locking.
+        """
+
+        if not self.index_root or not os.path.exists(self.index_root):
+            return
+
+        ind = indexer.Indexer(
+            self.index_root,
+            self._get_manifest,
+            self.manifest,
+            log=self.__index_log,
+            sort_file_max_size=self.__sort_file_max_size,
+        )
+        try:
+            if ind.check_index_existence():
+                ind.server_update_index([], removed=fmris)
+        except se.InconsistentIndexException:
+            self.__purge_search_index()
+
     def abandon(self, trans_id):
         """Aborts a transaction with the specified Transaction ID.
         Returns the current package state."""
@@ -1342,8 +1994,21 @@ class _RepoStore(object):
 
         self.__lock_rstore(blocking=True)
         try:
-            self.__add_package(pfmri)
-            self.__save_catalog()
+            db = self.__get_catalog_db()
+            if db is None or not db.writable:
+                self.__add_package(pfmri)
+                self.__save_catalog()
+            else:
+                # Check that the package can be added before queueing
+                # the operation, as adding it to the catalog would.
+                self._get_manifest(pfmri, sig=True)
+                if db.has_package(pfmri):
+                    raise apx.DuplicateCatalogEntry(
+                        pfmri, operation="add", catalog_name=db.pathname
+                    )
+                db.add(pfmri)
+                if not self.__defer_catalog:
+                    self.__flush_catalog()
         finally:
             self.__unlock_rstore()
 
@@ -1360,14 +2025,30 @@ class _RepoStore(object):
 
         self.__lock_rstore(blocking=True)
         try:
-            self.__replace_package(pfmri)
-            self.__save_catalog()
+            db = self.__get_catalog_db()
+            if db is None or not db.writable:
+                self.__replace_package(pfmri)
+                self.__save_catalog()
+            else:
+                self._get_manifest(pfmri, sig=True)
+                db.add(pfmri, replace=True)
+                if not self.__defer_catalog:
+                    self.__flush_catalog()
         finally:
             self.__unlock_rstore()
 
     @property
     def catalog(self):
-        """Returns the Catalog object for the repository's catalog."""
+        """Returns the Catalog object for the repository's catalog.  Any
+        operations pending in the catalog database are applied to it
+        first, if possible."""
+
+        self.__sync_catalog()
+        return self.__load_catalog()
+
+    def __load_catalog(self):
+        """Private version; returns the Catalog object for the
+        repository's catalog as currently stored."""
 
         if self.__catalog:
             # Already loaded.
@@ -1440,12 +2121,20 @@ class _RepoStore(object):
             raise RepositoryUnsupportedOperationError()
 
         assert name
+        self.__sync_catalog()
         return os.path.normpath(os.path.join(self.catalog_root, name))
 
+    def catalog_1_compressed(self, name):
+        """Returns the absolute pathname of a gzip-compressed copy of the
+        named catalog file, or None if there is no up-to-date copy."""
+
+        return _compressed_catalog_path(self.catalog_1(name))
+
     def reset_search(self):
         """Discards currently loaded search data so that it will be
         reloaded the next a search is performed.
         """
+        self.__search_cache.clear()
         if not self.index_root:
             # Nothing to do.
             return
@@ -1503,6 +2192,122 @@ class _RepoStore(object):
             return fp
         raise RepositoryFileNotFoundError(fhash)
 
+    def __get_attr_cache(self):
+        """Return the compressed-content attribute cache for this
+        storage object, creating it if needed."""
+
+        if self.__attr_cache is None:
+            root = self.__writable_root or self.__root
+            path = None
+            if root:
+                path = os.path.join(root, attrcache.CACHE_BASENAME)
+            self.__attr_cache = attrcache.CompressedAttrCache(
+                path, read_only=self.read_only and not self.__writable_root
+            )
+        return self.__attr_cache
+
+    def add_compressed_attrs(self, entries):
+        """Record the compressed size and compressed hashes of files in
+        the repository, so that compressed_attrs() need not compute
+        them.  'entries' is an iterable of tuples of the form (fhash,
+        csize, chashes), where 'csize' is the compressed size and
+        'chashes' is a dictionary of compressed hash attributes and
+        values."""
+
+        rows = []
+        for fhash, csize, chashes in entries:
+            fpath = self.cache_store.lookup(fhash)
+            if fpath is None:
+                continue
+            try:
+                st = os.stat(fpath)
+            except EnvironmentError:
+                continue
+            rows.append((fhash, st, csize, chashes))
+        self.__get_attr_cache().update(rows)
+
+    def __record_manifest(self, pfmri, mpath, stamp):
+        """Record the references made by the manifest at 'mpath', which
+        is about to replace any existing manifest for 'pfmri', in the
+        content database; 'stamp' is the current state of the manifest
+        root.  This must be done before the manifest and the files it
+        references are added to the repository, so that the files can't
+        be considered unreferenced in the meantime; caller responsible
+        for repository locking."""
+
+        db = self.__open_content_db()
+        if db is None:
+            return
+        if not db.populated:
+            if any(self.__gen_manifests()):
+                # The manifest will be counted when the database
+                # is next brought up to date.
+                return
+            # Nothing has been published yet, so there's nothing
+            # else to count.
+            db.populate([])
+            db.set_stamp(stamp)
+
+        old_hashes = set()
+        try:
+            old_hashes = self.__read_payload_hashes(self.manifest(pfmri))
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        db.add(
+            pfmri.get_dir_path(),
+            contentdb.manifest_sig(os.stat(mpath)),
+            self.__read_payload_hashes(mpath),
+            old_hashes=old_hashes,
+        )
+
+    def publish_manifest(self, pfmri, mpath, files):
+        """Move the manifest at 'mpath' into place as the manifest for
+        'pfmri', replacing any existing manifest, and the files it
+        references into the store.  'files' is an iterable of tuples of
+        the form (fhash, src_path) for each file to add to the store.
+
+        Packages can't be removed from the store while this is done,
+        so files being published can't be considered unreferenced."""
+
+        self.__lock_rstore(blocking=True)
+        try:
+            stamp = self.__manifest_stamp()
+            self.__record_manifest(pfmri, mpath, stamp)
+            dest_mpath = self.manifest(pfmri)
+            misc.makedirs(os.path.dirname(dest_mpath))
+            portable.rename(mpath, dest_mpath)
+            for fhash, src_path in files:
+                self.cache_store.insert(fhash, src_path)
+            self.__restamp_content_db(stamp)
+        finally:
+            self.__unlock_rstore()
+
+    def compressed_attrs(self, fhash):
+        """Returns a tuple of the form (fpath, csize, chashes) for the
+        file specified by the provided SHA-n hash name, where 'fpath'
+        is as returned by file(), 'csize' is the compressed size of
+        the file's content and 'chashes' is a dictionary of its
+        compressed hash attributes and values.
+
+        Attributes are computed once and then cached."""
+
+        fpath = self.file(fhash)
+        try:
+            st = os.stat(fpath)
+        except EnvironmentError as e:
+            if e.errno == errno.ENOENT:
+                raise RepositoryFileNotFoundError(fhash)
+            raise apx._convert_error(e)
+
+        ac = self.__get_attr_cache()
+        attrs = ac.get(fhash, st)
+        if attrs is None:
+            attrs = misc.compute_compressed_attrs(fhash, file_path=fpath)
+            ac.add(fhash, st, *attrs)
+        csize, chashes = attrs
+        return fpath, csize, chashes
+
     def file(self, fhash):
         """Returns the absolute pathname of the file specified by the
         provided SHA-n hash name. (At present, the repository format
@@ -1685,36 +2490,16 @@ class _RepoStore(object):
         if not progtrack:
             progtrack = progress.NullProgressTracker()
 
-        def get_hashes(pfmri):
-            """Given an FMRI, return a set of tuples containing all
-            of the hashes of the files its manifest references.
-            Each tuple is of the form (hash value, hash function)"""
-
-            m = self._get_manifest(pfmri)
-            hashes = set()
-            for a in m.gen_actions():
-                if not a.has_payload:
-                    # Nothing to archive.
-                    continue
-
-                # Action payload.
-                hattr, hval, hfunc = digest.get_least_preferred_hash(a)
-                hashes.add(hval)
-
-                # Signature actions have additional payloads.
-                if a.name == "signature":
-                    for c in a.get_chain_certs(least_preferred=True):
-                        hashes.add(c)
-            return hashes
-
         self.__lock_rstore()
-        c = self.catalog
         try:
-            # First, dump all search data as it will be invalidated
-            # as soon as the catalog is updated.
+            c = self.catalog
+            db = self.__get_catalog_db()
+
+            # First, remove the packages from the search data as it
+            # will be invalidated as soon as the catalog is updated.
             progtrack.job_start(progtrack.JOB_REPO_DELSEARCH)
             progtrack.job_add_progress(progtrack.JOB_REPO_DELSEARCH)
-            self.__purge_search_index()
+            self.__remove_from_searchdb(packages)
             progtrack.job_add_progress(progtrack.JOB_REPO_DELSEARCH)
             progtrack.job_done(progtrack.JOB_REPO_DELSEARCH)
 
@@ -1742,98 +2527,39 @@ class _RepoStore(object):
                 # package had to be removed from it.
                 c.finalize(pfmris=packages)
                 c.save()
+                self.__compress_catalog(self.catalog_root)
+                if db is not None and db.writable:
+                    db.remove(packages, self.__catalog_stamp())
 
             progtrack.job_done(progtrack.JOB_REPO_UPDATE_CAT)
 
-            # Next, build a list of all of the hashes for the files
-            # that can potentially be removed from the repository.
-            # This will also indirectly abort the operation should
-            # any of the packages not actually have a manifest in
-            # the repository.
-            pfiles = set()
+            # Next, build a list of the hashes of the files referenced
+            # by each of the packages.  This will also indirectly abort
+            # the operation should any of the packages not actually
+            # have a manifest in the repository.
+            removed = {}
             progtrack.job_start(
                 progtrack.JOB_REPO_ANALYZE_RM, goal=len(packages)
             )
             for pfmri in packages:
-                pfiles.update(get_hashes(pfmri))
+                removed[pfmri.get_dir_path()] = self.__get_payload_hashes(
+                    self._get_manifest(pfmri)
+                )
                 progtrack.job_add_progress(progtrack.JOB_REPO_ANALYZE_RM)
             progtrack.job_done(progtrack.JOB_REPO_ANALYZE_RM)
 
-            # Now for the slow part; iterate over every manifest in
-            # the repository (excluding the ones being removed) and
-            # remove any hashes in use from the list to be removed.
-            # However, if the package being removed doesn't have any
-            # payloads, then we can skip checking all of the
-            # packages in the repository for files in use.
-            if pfiles:
-                # Number of packages to check is total found in
-                # repo minus number to be removed.
-                slist = os.listdir(self.manifest_root)
-                remaining = sum(
-                    1
-                    for s in slist
-                    for v in os.listdir(os.path.join(self.manifest_root, s))
-                )
-
-                progtrack.job_start(
-                    progtrack.JOB_REPO_ANALYZE_REPO, goal=remaining
-                )
-                for name in slist:
-                    # Stem must be decoded before use.
-                    try:
-                        pname = unquote(name)
-                    except Exception:
-                        # Assume error is result of
-                        # unexpected file in directory;
-                        # just skip it and drive on.
-                        continue
-
-                    pdir = os.path.join(self.manifest_root, name)
-                    for ver in os.listdir(pdir):
-                        if not pfiles:
-                            # Skip remaining entries
-                            # since no files are
-                            # safe to remove, but
-                            # update progress.
-                            progtrack.job_add_progress(
-                                progtrack.JOB_REPO_ANALYZE_REPO
-                            )
-                            continue
-
-                        # Version must be decoded before
-                        # use.
-                        pver = unquote(ver)
-                        try:
-                            pfmri = fmri.PkgFmri(
-                                "@".join((pname, pver)),
-                                publisher=self.publisher,
-                            )
-                        except Exception:
-                            # Assume error is result
-                            # of unexpected file in
-                            # directory; just skip
-                            # it and drive on.
-                            progtrack.job_add_progress(
-                                progtrack.JOB_REPO_ANALYZE_REPO
-                            )
-                            continue
-
-                        if pfmri in packages:
-                            # Package is one of
-                            # those queued for
-                            # removal.
-                            progtrack.job_add_progress(
-                                progtrack.JOB_REPO_ANALYZE_REPO
-                            )
-                            continue
-
-                        # Any files in use by another
-                        # package can't be removed.
-                        pfiles -= get_hashes(pfmri)
-                        progtrack.job_add_progress(
-                            progtrack.JOB_REPO_ANALYZE_REPO
-                        )
-                progtrack.job_done(progtrack.JOB_REPO_ANALYZE_REPO)
+            # The files which are still in use by other packages are
+            # found using the content database, which only needs to
+            # read the manifests of any packages it hasn't yet seen.
+            # If it can't be updated, every other manifest in the
+            # repository has to be read instead.
+            pfiles = None
+            cdb = self.__get_content_db(progtrack)
+            if cdb is not None:
+                stamp = cdb.stamp
+                cdb.remove(removed.items())
+            else:
+                pfiles = self.__find_unreferenced(removed, progtrack)
 
             # Next, remove the manifests of the packages to be
             # removed.  (This is done before removing the files
@@ -1848,37 +2574,15 @@ class _RepoStore(object):
 
             # Next, remove any package files that are not
             # referenced by other packages.
-            progtrack.job_start(progtrack.JOB_REPO_RM_FILES, goal=len(pfiles))
-            for h in pfiles:
-                # File might already be gone (don't care if
-                # it is).
-                fpath = self.cache_store.lookup(h)
-                if fpath is not None:
-                    portable.remove(fpath)
-                progtrack.job_add_progress(progtrack.JOB_REPO_RM_FILES)
-            progtrack.job_done(progtrack.JOB_REPO_RM_FILES)
+            self.__remove_unreferenced(progtrack, db=cdb, pfiles=pfiles)
 
             # Finally, tidy up repository structure by discarding
             # unused package data directories for any packages
             # removed.
-            def rmdir(d):
-                """rmdir; but ignores non-empty directories."""
-                try:
-                    os.rmdir(d)
-                except OSError as e:
-                    if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
-                        raise
-
             for name in set(f.get_dir_path(stemonly=True) for f in packages):
-                rmdir(os.path.join(self.manifest_root, name))
-
-            if self.file_root:
-                try:
-                    for entry in os.listdir(self.file_root):
-                        rmdir(os.path.join(self.file_root, entry))
-                except EnvironmentError as e:
-                    if e.errno != errno.ENOENT:
-                        raise
+                self.__rmdir(os.path.join(self.manifest_root, name))
+            if cdb is not None:
+                self.__restamp_content_db(stamp)
         except EnvironmentError as e:
             raise apx._convert_error(e)
         finally:
@@ -1887,6 +2591,42 @@ class _RepoStore(object):
             c.batch_mode = False
             self.__unlock_rstore()
 
+    def gc(self, progtrack=None):
+        """Removes any files from the repository store which are no
+        longer referenced by a package, such as those replaced by an
+        append transaction.  No other modifying operations may be
+        performed until complete.
+
+        'progtrack' is an optional ProgressTracker object.
+        """
+
+        if self.mirror:
+            raise RepositoryMirrorError()
+        if self.read_only:
+            raise RepositoryReadOnlyError()
+        if not self.manifest_root or not self.file_root:
+            raise RepositoryUnsupportedOperationError()
+        if not progtrack:
+            progtrack = progress.NullProgressTracker()
+
+        self.__lock_rstore()
+        try:
+            # If the content database can't be updated, or has only
+            # just been created and so doesn't know of any files left
+            # behind before then, every manifest in the repository has
+            # to be read instead.
+            pfiles = None
+            cdb = self.__open_content_db()
+            scan = cdb is None or not cdb.populated
+            cdb = self.__get_content_db(progtrack, check=True)
+            if scan:
+                pfiles = self.__find_garbage(progtrack)
+            self.__remove_unreferenced(progtrack, db=cdb, pfiles=pfiles)
+        except EnvironmentError as e:
+            raise apx._convert_error(e)
+        finally:
+            self.__unlock_rstore()
+
     def rebuild(self, build_catalog=True, build_index=False):
         """Rebuilds the repository catalog and search indexes using the
         package manifests currently in the repository.
@@ -1926,8 +2666,9 @@ class _RepoStore(object):
         if not self.index_root or self.catalog_version < 1:
             raise RepositoryUnsupportedOperationError()
 
-        c = self.catalog
-        fmris_to_index = indexer.Indexer.check_for_updates(self.index_root, c)
+        fmris_to_index = indexer.Indexer.check_for_updates(
+            self.index_root, self.__packages()
+        )
 
         if fmris_to_index:
             self.__index_log("Updating search indexes")
@@ -1959,12 +2700,36 @@ class _RepoStore(object):
         if not self.search_available:
             raise RepositorySearchUnavailableError()
 
+        # Cached results are discarded once the index (or catalog) they
+        # were found in has been replaced.
+        cache = self.__search_cache
+        generation = cache.validate(
+            (
+                searchcache.index_generation(self.index_root),
+                self.__catalog_stamp(),
+            )
+        )
+
         def _search(q):
             assert self.index_root
             l = sqp.QueryLexer()
             l.build()
             qqp = sqp.QueryParser(l)
             query = qqp.parse(q.text)
+
+            # The parsed query is used for the key so that queries
+            # which differ only in their formatting share results.
+            key = (
+                str(query),
+                q.return_type,
+                q.case_sensitive,
+                q.num_to_return,
+                q.start_point,
+            )
+            res = cache.get(key)
+            if res is not None:
+                return res
+
             query.set_info(
                 num_to_return=q.num_to_return,
                 start_point=q.start_point,
@@ -1974,7 +2739,9 @@ class _RepoStore(object):
             )
             if q.return_type == sqp.Query.RETURN_PACKAGES:
                 query.propagate_pkg_return()
-            return query.search(self.catalog.fmris)
+            return cache.wrap(
+                key, generation, query.search(self.__packages().fmris)
+            )
 
         query_lst = []
         try:
@@ -2180,40 +2947,6 @@ class _RepoStore(object):
         except apx.PermissionsException as e:
             return (REPO_VERIFY_PERM, path, {"err": str(e), "pkg": pfmri})
 
-    def __verify_hash(self, path, pfmri, h, alg=digest.DEFAULT_HASH_FUNC):
-        """Perform hash verification on the given gzip file.
-        'path' is the full path to the file in the repository. 'pfmri'
-        is the package that we're verifying. 'h' is the expected hash
-        of the path. 'alg' is the hash function used to compute the
-        hash."""
-
-        gzf = None
-        try:
-            gzf = PkgGzipFile(fileobj=open(path, "rb"))
-            fhash = alg()
-            fhash.update(gzf.read())
-            actual = fhash.hexdigest()
-            if actual != h:
-                return (
-                    REPO_VERIFY_BADHASH,
-                    path,
-                    {"actual": actual, "hash": h, "pkg": pfmri},
-                )
-        except (ValueError, EOFError, zlib.error) as e:
-            return (REPO_VERIFY_BADGZIP, path, {"hash": h, "pkg": pfmri})
-        except IOError as e:
-            if e.errno in [errno.EACCES, errno.EPERM]:
-                return (
-                    REPO_VERIFY_PERM,
-                    path,
-                    {"err": str(e), "hash": h, "pkg": pfmri},
-                )
-            else:
-                return (REPO_VERIFY_BADGZIP, path, {"hash": h, "pkg": pfmri})
-        finally:
-            if gzf:
-                gzf.close()
-
     def __verify_perm(self, path, pfmri, h):
         """Check that we don't get any permissions errors when
         trying to stat the given path."""
@@ -2349,11 +3082,62 @@ class _RepoStore(object):
                     return False, pth
         return True, None
 
+    def __get_verify_db(self):
+        """Return a VerifyDB object for the repository store, or None
+        if the store has no root."""
+
+        root = self.__writable_root or self.__root
+        if not root:
+            return None
+        return verifydb.VerifyDB(
+            os.path.join(root, verifydb.DB_BASENAME),
+            read_only=self.read_only and not self.__writable_root,
+        )
+
+    def __gen_verify_manifest(
+        self, path, pfmri, pub, trust_anchors, sig_required_names, use_crls
+    ):
+        """Verify the manifest at 'path' for 'pfmri' and return a tuple
+        of the form (errors, hashes), where 'errors' is a list of the
+        errors found, in the form accepted by __build_verify_error, and
+        'hashes' is a sorted list of the (file_name, hash_value,
+        hash_func) tuples of the files it references.  The files
+        themselves are not checked."""
+
+        err = self.__verify_manifest(path, pfmri)
+        if err:
+            # with a bad manifest, we can go no further
+            return [err], []
+
+        hashes, errors = self.__get_hashes(path, pfmri)
+
+        # verify manifest signatures
+        errors.extend(
+            self.__verify_signature(
+                path, pfmri, pub, trust_anchors, sig_required_names, use_crls
+            )
+        )
+        return errors, sorted(hashes, key=lambda t: t[:2])
+
     def __gen_verify(
-        self, progtrack, pub, trust_anchors, sig_required_names, use_crls
+        self,
+        progtrack,
+        pub,
+        trust_anchors,
+        sig_required_names,
+        use_crls,
+        workers=None,
+        resume=False,
+        skip_unchanged=False,
     ):
         """A generator that produces verify errors, each a tuple
-        of the form (error_code, path, message, details)"""
+        of the form (error_code, path, message, details)
+
+        Packages are verified in order of their stem and version, and
+        the errors for each are produced in the same order however many
+        worker processes are used.  Each file in the repository is only
+        verified once, however many packages reference it."""
+
         # We may not have a manifest_root directory if no
         # packages have ever been published for this publisher.
         if not os.path.exists(self.manifest_root):
@@ -2366,7 +3150,7 @@ class _RepoStore(object):
 
         # Build a list of all of the manifests that must be
         # verified.
-        mflist = os.listdir(self.manifest_root)
+        mflist = sorted(os.listdir(self.manifest_root))
         goal = len(mflist)
 
         # If there is more than one version in the manifest dir,
@@ -2402,116 +3186,199 @@ class _RepoStore(object):
             )
         progtrack.repo_verify_end_pkg(None)
 
-        for name in mflist:
-            pdir = os.path.join(self.manifest_root, name)
-            err = self.__verify_perm(pdir, None, None)
-            if err:
-                yield self.__build_verify_error(*err)
-                continue
+        if workers is None:
+            workers = _get_default_workers()
+        pool = None
+        if workers > 1 and goal > _get_min_parallel():
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_verify_worker
+            )
 
-            # Stem must be decoded before use.
+        vdb = self.__get_verify_db()
+        resumed = False
+        if vdb:
+            resumed = vdb.begin(resume=resume)
+
+        # The result of verifying each (file_name, hash_value) pair
+        # seen so far; a Future until its result has been reported.
+        results = {}
+        # The signature of each file when its verification started.
+        sigs = {}
+        # Packages whose errors have yet to be reported, in order, each
+        # a tuple of (pfmri, errors, payload).
+        window = collections.deque()
+        verified = []
+        damaged = []
+
+        def check_payload(fname, h, alg):
+            """Start verifying the file 'fname' unless it has already
+            been, returning a tuple of (path, key)."""
+
+            key = (fname, h)
             try:
-                pname = unquote(name)
-            except Exception as err:
-                # Assume error is result of an
-                # unexpected file in the directory. We
-                # don't know the FMRI here, so use None.
-                progtrack.repo_verify_start_pkg(None)
-                progtrack.repo_verify_add_progress(None)
-                yield self.__build_verify_error(
-                    REPO_VERIFY_UNKNOWN, pdir, {"err": str(err)}
-                )
-                progtrack.repo_verify_end_pkg(None)
-                continue
+                path = self.cache_store.lookup(fname, check_existence=False)
+            except apx.PermissionsException:
+                return None, key
+            if key in results:
+                return path, key
 
-            for ver in os.listdir(pdir):
-                path = os.path.join(pdir, ver)
-                # Version must be decoded before
-                # use.
-                pver = unquote(ver)
-                try:
-                    pfmri = fmri.PkgFmri(
-                        "@".join((pname, pver)), publisher=self.publisher
-                    )
-                    if not os.path.isfile(path):
-                        raise Exception("{0} is not a file".format(path))
-                except Exception as e:
-                    # Assume the error is result of an
-                    # unexpected file in the directory. We
-                    # don't know the FMRI here, so use None.
-                    progtrack.repo_verify_start_pkg(None)
-                    progtrack.repo_verify_add_progress(None)
-                    yield self.__build_verify_error(
-                        REPO_VERIFY_UNKNOWN, path, {"err": str(e)}
-                    )
-                    progtrack.repo_verify_end_pkg(None)
-                    continue
+            sig = None
+            try:
+                sig = verifydb.file_sig(os.stat(path))
+            except OSError:
+                pass
+            if (
+                vdb
+                and sig
+                and (resumed or skip_unchanged)
+                and vdb.verified(fname, h, sig, resume=not skip_unchanged)
+            ):
+                results[key] = None
+                return path, key
 
+            if pool:
+                fut = pool.submit(_verify_payload, path, h, alg)
+            else:
+                fut = concurrent.futures.Future()
+                fut.set_result(_verify_payload(path, h, alg))
+            results[key] = fut
+            sigs[key] = sig
+            return path, key
+
+        def gen_report(limit):
+            """Report the errors for the packages at the head of the
+            window until no more than 'limit' remain."""
+
+            while len(window) > limit:
+                pfmri, errors, payload = window.popleft()
                 progtrack.repo_verify_start_pkg(pfmri)
-                err = self.__verify_manifest(path, pfmri)
-                if err:
-                    # with a bad manifest, we can go no
-                    # further
-                    yield self.__build_verify_error(*err)
-                    progtrack.repo_verify_end_pkg(None)
-                    continue
-
-                hashes, errors = self.__get_hashes(path, pfmri)
+                progtrack.repo_verify_add_progress(pfmri)
                 for err in errors:
                     yield self.__build_verify_error(*err)
 
-                # verify manifest signatures
-                errs = self.__verify_signature(
-                    path,
-                    pfmri,
-                    pub,
-                    trust_anchors,
-                    sig_required_names,
-                    use_crls,
-                )
-                for err in errs:
-                    yield self.__build_verify_error(*err)
-
-                # verify payload delivered by this pkg
-                errors = []
-                for fname, h, alg in hashes:
-                    try:
-                        path = self.cache_store.lookup(
-                            fname, check_existence=False
-                        )
-                    except apx.PermissionsException as e:
+                for fname, h, path, key in payload:
+                    if path is None:
                         # if we can't even get the path
                         # within the repository, then
                         # we'll do the best we can to
                         # report the problem.
-                        errors.append(
-                            (
-                                REPO_VERIFY_PERM,
-                                pfmri,
-                                {
-                                    "hash": fname,
-                                    "err": _("Permission denied.", "path", h),
-                                },
-                            )
+                        yield self.__build_verify_error(
+                            REPO_VERIFY_PERM,
+                            pfmri,
+                            {
+                                "hash": fname,
+                                "err": _("Permission denied."),
+                            },
                         )
                         continue
 
-                    err = self.__verify_perm(path, pfmri, h)
-                    if err:
+                    res = results[key]
+                    if isinstance(res, concurrent.futures.Future):
+                        sig = sigs.pop(key)
+                        res = results[key] = res.result()
+                        if res:
+                            damaged.append(fname)
+                        elif sig:
+                            verified.append((fname, h, sig))
+                    if res:
+                        err, reason = res
+                        reason = dict(reason)
+                        reason["pkg"] = pfmri
                         # For backward compatibility,
                         # store the SHA1 file name for
                         # file retrieval.
-                        err[2]["fname"] = fname
-                        errors.append(err)
+                        reason["fname"] = fname
+                        yield self.__build_verify_error(err, path, reason)
+                progtrack.repo_verify_end_pkg(pfmri)
+
+                if vdb and len(verified) + len(damaged) >= VERIFY_CHECKPOINT:
+                    vdb.record(verified)
+                    vdb.forget(damaged)
+                    del verified[:], damaged[:]
+
+        limit = VERIFY_WINDOW * (workers if pool else 1)
+        completed = False
+        try:
+            for name in mflist:
+                pdir = os.path.join(self.manifest_root, name)
+                err = self.__verify_perm(pdir, None, None)
+                if err:
+                    window.append((None, [err], []))
+                    continue
+
+                # Stem must be decoded before use.
+                try:
+                    pname = unquote(name)
+                except Exception as err:
+                    # Assume error is result of an
+                    # unexpected file in the directory. We
+                    # don't know the FMRI here, so use None.
+                    window.append(
+                        (
+                            None,
+                            [(REPO_VERIFY_UNKNOWN, pdir, {"err": str(err)})],
+                            [],
+                        )
+                    )
+                    continue
+
+                for ver in sorted(os.listdir(pdir)):
+                    path = os.path.join(pdir, ver)
+                    # Version must be decoded before
+                    # use.
+                    pver = unquote(ver)
+                    try:
+                        pfmri = fmri.PkgFmri(
+                            "@".join((pname, pver)), publisher=self.publisher
+                        )
+                        if not os.path.isfile(path):
+                            raise Exception("{0} is not a file".format(path))
+                    except Exception as e:
+                        # Assume the error is result of an
+                        # unexpected file in the directory. We
+                        # don't know the FMRI here, so use None.
+                        window.append(
+                            (
+                                None,
+                                [(REPO_VERIFY_UNKNOWN, path, {"err": str(e)})],
+                                [],
+                            )
+                        )
                         continue
-                    err = self.__verify_hash(path, pfmri, h, alg=alg)
-                    if err:
-                        err[2]["fname"] = fname
-                        errors.append(err)
-                for err in errors:
-                    yield self.__build_verify_error(*err)
 
-                progtrack.repo_verify_end_pkg(fmri)
+                    errors, hashes = self.__gen_verify_manifest(
+                        path,
+                        pfmri,
+                        pub,
+                        trust_anchors,
+                        sig_required_names,
+                        use_crls,
+                    )
+
+                    # verify payload delivered by this pkg
+                    payload = []
+                    for fname, h, alg in hashes:
+                        fpath, key = check_payload(fname, h, alg)
+                        payload.append((fname, h, fpath, key))
+                    window.append((pfmri, errors, payload))
+
+                    for err in gen_report(limit):
+                        yield err
+
+            for err in gen_report(0):
+                yield err
+            completed = True
+        finally:
+            if pool:
+                pool.shutdown(wait=True, cancel_futures=True)
+            if vdb:
+                # Keep what has been verified so far, so that an
+                # interrupted verification can be resumed.
+                vdb.record(verified)
+                vdb.forget(damaged)
+                if completed:
+                    vdb.finish()
+                vdb.close()
         progtrack.job_done(progtrack.JOB_REPO_VERIFY_REPO)
 
     def verify(
@@ -2521,6 +3388,9 @@ class _RepoStore(object):
         trust_anchor_dir=None,
         sig_required_names=None,
         use_crls=False,
+        workers=None,
+        resume=False,
+        skip_unchanged=False,
     ):
         """A generator which verifies the contents of the repository
         store, checking for several different types of errors.
@@ -2537,6 +3407,16 @@ class _RepoStore(object):
         'use_crls' is set in the repository configuration and
         corresponds to the image property of the same name.
 
+        'workers' is the number of processes used to verify files; if
+        not provided, $PKG_VERIFY_WORKERS or the number of CPUs is used.
+
+        'resume' is a boolean indicating whether to continue the last
+        verification if it was interrupted, skipping the files which
+        it found to be intact.
+
+        'skip_unchanged' is a boolean indicating whether to skip any
+        file which is unchanged since it was last found to be intact.
+
         The generator yields tuples of the form:
 
         (error_code, path, message, reason) where
@@ -2569,7 +3449,14 @@ class _RepoStore(object):
         self.__lock_rstore()
         try:
             for err in self.__gen_verify(
-                progtrack, pub, trust_anchors, sig_required_names, use_crls
+                progtrack,
+                pub,
+                trust_anchors,
+                sig_required_names,
+                use_crls,
+                workers=workers,
+                resume=resume,
+                skip_unchanged=skip_unchanged,
             ):
                 yield err
         except (Exception, EnvironmentError) as e:
@@ -2589,6 +3476,7 @@ class _RepoStore(object):
         trust_anchor_dir=None,
         sig_required_names=None,
         use_crls=False,
+        workers=None,
     ):
         """Verify, then quarantine any packages in the repository that
         were found to be faulty, according to self.verify(..).
@@ -2625,6 +3513,7 @@ class _RepoStore(object):
             trust_anchor_dir=trust_anchor_dir,
             sig_required_names=sig_required_names,
             use_crls=use_crls,
+            workers=workers,
         ):
             if verify_callback:
                 verify_callback(progtrack, (error, path, message, reason))
@@ -2718,6 +3607,35 @@ class _RepoStore(object):
         if broken_items:
             self.rebuild()
 
+    def get_matching_fmris(self, patterns, strict=True):
+        """Returns the result of Catalog.get_matching_fmris() for the
+        list of package patterns 'patterns' and the packages in the
+        repository.  If 'strict' is False, patterns without wildcards
+        may also match multiple packages."""
+
+        if self.mirror:
+            raise RepositoryMirrorError()
+        if not self.catalog_root:
+            raise RepositoryUnsupportedOperationError()
+
+        return catalog.Catalog.match_fmris(
+            self.__packages(), patterns, strict=strict
+        )
+
+    def has_package(self, pfmri):
+        """Returns a boolean indicating whether the package 'pfmri' is in
+        the repository's catalog, or is pending addition to it."""
+
+        if self.mirror:
+            raise RepositoryMirrorError()
+        if not self.catalog_root:
+            raise RepositoryUnsupportedOperationError()
+
+        db = self.__get_catalog_db()
+        if db is not None:
+            return db.has_package(pfmri)
+        return self.catalog.get_entry(pfmri) is not None
+
     def valid_new_fmri(self, pfmri):
         """Check that the FMRI supplied as an argument would be valid
         to add to the repository catalog.  This checks to make sure
@@ -2733,9 +3651,7 @@ class _RepoStore(object):
         if not pfmri.version:
             return False
 
-        c = self.catalog
-        entry = c.get_entry(pfmri)
-        return entry is None
+        return not self.has_package(pfmri)
 
     def valid_append_fmri(self, pfmri):
         if self.mirror:
@@ -2749,9 +3665,7 @@ class _RepoStore(object):
         if not pfmri.version.timestr:
             return False
 
-        c = self.catalog
-        entry = c.get_entry(pfmri)
-        return entry is not None
+        return self.has_package(pfmri)
 
     catalog_root = property(lambda self: self.__catalog_root)
     file_layout = property(lambda self: self.__file_layout)
@@ -2770,6 +3684,7 @@ class Repository(object):
         allow_invalid=False,
         cfgpathname=None,
         create=False,
+        defer_catalog=False,
         file_root=None,
         log_obj=None,
         mirror=False,
@@ -2779,7 +3694,13 @@ class Repository(object):
         sort_file_max_size=indexer.SORT_FILE_MAX_SIZE,
         writable_root=None,
     ):
-        """Prepare the repository for use."""
+        """Prepare the repository for use.
+
+        If 'defer_catalog' is True, packages added to the repository are
+        recorded in the catalog database of each repository store and
+        only written to the catalog when it is next needed (such as when
+        catalog_1() is called); this is intended for consumers, such as
+        the depot server, that serve the catalog themselves."""
 
         # This lock is used to protect the repository from multiple
         # threads modifying it at the same time.  This must be set
@@ -2808,6 +3729,7 @@ class Repository(object):
         # Initialize.
         self.__cfgpathname = cfgpathname
         self.__cfg = None
+        self.__defer_catalog = defer_catalog
         self.__mirror = mirror
         self.__read_only = read_only
         self.__rstores = None
@@ -2964,6 +3886,7 @@ class Repository(object):
                 mirror=self.mirror,
                 read_only=self.read_only,
                 catalogue_format=fmt,
+                defer_catalog=self.__defer_catalog,
             )
             self.__rstores[rstore.publisher] = rstore
 
@@ -2991,6 +3914,7 @@ class Repository(object):
                 root=self.root,
                 writable_root=self.writable_root,
                 catalogue_format=fmt,
+                defer_catalog=self.__defer_catalog,
             )
             self.__rstores[rstore.publisher] = rstore
 
@@ -3166,6 +4090,7 @@ class Repository(object):
             sort_file_max_size=self.__sort_file_max_size,
             writable_root=writ_root,
             catalogue_format=fmt,
+            defer_catalog=self.__defer_catalog,
         )
         self.__rstores[pub] = rstore
         return rstore
@@ -3350,6 +4275,22 @@ class Repository(object):
         rstore = self.get_pub_rstore(pub)
         return rstore.catalog_1(name)
 
+    def catalog_1_compressed(self, name, pub=None):
+        """Returns the absolute pathname of a gzip-compressed copy of the
+        named catalog file, or None if there is no up-to-date copy.
+
+        'pub' is the prefix of the publisher to return catalog data for.
+        If not specified, the default publisher will be used.  If no
+        default publisher has been configured, an AssertionError will be
+        raised.
+
+        This does not count as a catalog request; callers are expected
+        to have already retrieved the file using catalog_1().
+        """
+
+        rstore = self.get_pub_rstore(pub)
+        return rstore.catalog_1_compressed(name)
+
     def close(self, trans_id, add_to_catalog=True):
         """Closes the transaction specified by 'trans_id'.
 
@@ -3361,6 +4302,32 @@ class Repository(object):
         rstore = self.get_trans_rstore(trans_id)
         return rstore.close(trans_id, add_to_catalog=add_to_catalog)
 
+    def compressed_attrs(self, fhash, pub=None):
+        """Returns a tuple of the form (fpath, csize, chashes) for the
+        file specified by the provided SHA1-hash name, where 'fpath' is
+        its absolute pathname, 'csize' is the compressed size of its
+        content and 'chashes' is a dictionary of its compressed hash
+        attributes and values.
+
+        'pub' is the prefix of the publisher to return file data for.
+        If not specified, every repository store will be tried.
+        """
+
+        self.inc_file()
+        if pub:
+            rstore = self.get_pub_rstore(pub)
+            return rstore.compressed_attrs(fhash)
+
+        for rstore in self.rstores:
+            try:
+                return rstore.compressed_attrs(fhash)
+            except RepositoryFileNotFoundError:
+                # Ignore and try next repository store.
+                pass
+
+        # Not found in any repository store.
+        raise RepositoryFileNotFoundError(fhash)
+
     def file(self, fhash, pub=None):
         """Returns the absolute pathname of the file specified by the
         provided SHA1-hash name.
@@ -3663,9 +4630,7 @@ class Repository(object):
 
             # Get matching items from target catalog and then
             # merge the result.
-            mdict, mrefs, munmatched = rstore.catalog.get_matching_fmris(
-                patterns
-            )
+            mdict, mrefs, munmatched = rstore.get_matching_fmris(patterns)
             merge(mdict, matching)
             merge(mrefs, references)
             if unmatched is None:
@@ -3771,6 +4736,22 @@ class Repository(object):
 
         rstore.remove_packages(packages, progtrack=progtrack)
 
+    def gc(self, progtrack=None, pub=None):
+        """Removes any files which are no longer referenced by a package
+        from the repository.
+
+        'progtrack' is an optional ProgressTracker object.
+
+        'pub' is an optional publisher prefix to limit the operation to.
+        """
+
+        for rstore in self.rstores:
+            if not rstore.publisher:
+                continue
+            if pub and rstore.publisher != pub:
+                continue
+            rstore.gc(progtrack=progtrack)
+
     def add_content(self, pub=None, refresh_index=False):
         """Looks for packages added to the repository that are not in
         the catalog, adds them, and then updates search data by default.
@@ -3893,6 +4874,8 @@ class Repository(object):
         force_dep_check=False,
         ignored_dep_files=[],
         progtrack=None,
+        resume=False,
+        skip_unchanged=False,
     ):
         """A generator that verifies that repository content matches
         expected state for all or specified publishers.
@@ -3911,6 +4894,12 @@ class Repository(object):
         'ignored_dep_files' is a list of files which contain
         ignored dependencies.
 
+        'resume' is a boolean indicating whether to continue the last
+        verification of each publisher's content if it was interrupted.
+
+        'skip_unchanged' is a boolean indicating whether to skip any
+        file which is unchanged since it was last found to be intact.
+
         The generator yields tuples of the form:
 
         (error_code, path, message, details) where
@@ -3945,6 +4934,8 @@ class Repository(object):
                 trust_anchor_dir=trust_anchor_dir,
                 sig_required_names=sig_required_names,
                 use_crls=use_crls,
+                resume=resume,
+                skip_unchanged=skip_unchanged,
             ):
                 yield verify_tuple
 
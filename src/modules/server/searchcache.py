@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The search result cache.
+
+This module provides a bounded, in-memory cache of the results of the
+queries made against a repository store's search index, so that repeated
+identical queries (as made by many clients searching for the same thing
+between index updates) don't have to search the index each time.
+
+Results are only kept for the generation of the search index (and of
+the catalog) they were found in; when the indexer replaces the index,
+whether in this process or another, every cached result is discarded.
+Results also expire after a fixed time, and the results of queries
+which match a great many actions are not kept at all.
+
+"""
+
+import errno
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pkg.search_storage as ss
+
+# The maximum number of query results kept.
+CACHE_SIZE = 256
+
+# The number of seconds for which the results of a query are kept.
+CACHE_TTL = 3600
+
+# The maximum number of results kept for a single query.
+MAX_RESULTS = 10000
+
+
+def index_generation(index_root):
+    """Return a value identifying the generation of the search index at
+    'index_root', or None if there is no index.  The indexer replaces
+    the main dictionary each time the index is updated, so a new value
+    is returned for each update."""
+
+    try:
+        st = os.stat(os.path.join(index_root, ss.MAIN_FILE))
+    except EnvironmentError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class SearchCache(object):
+    """Caches the results of queries made against a search index.
+
+    The cache may be used from any thread.  Queries are identified by a
+    key which must include everything that determines their results,
+    other than the generation of the index they were made against."""
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL, max_results=MAX_RESULTS):
+        self.__size = size
+        self.__ttl = ttl
+        self.__max_results = max_results
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__generation = None
+        self.__hits = 0
+        self.__misses = 0
+
+    def clear(self):
+        """Discard all cached results."""
+
+        with self.__lock:
+            self.__entries.clear()
+
+    def validate(self, generation):
+        """Discard all cached results unless 'generation' identifies
+        the index they were found in.  Results are only cached for the
+        last generation validated.  Returns 'generation', which should
+        be passed to wrap() for the results of queries made against
+        it."""
+
+        with self.__lock:
+            if generation != self.__generation:
+                self.__entries.clear()
+                self.__generation = generation
+        return generation
+
+    def get(self, key):
+        """Return an iterator over the cached results of the query
+        identified by 'key', or None if they aren't cached."""
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.__entries[key]
+                entry = None
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+        return iter(entry[1])
+
+    def __add(self, key, generation, results):
+        with self.__lock:
+            if generation != self.__generation:
+                # The index was replaced while searching.
+                return
+            self.__entries[key] = (time.monotonic() + self.__ttl, results)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__size:
+                self.__entries.popitem(last=False)
+
+    def wrap(self, key, generation, results):
+        """Return a generator yielding each of the results of the query
+        identified by 'key' from the iterable 'results', which caches
+        them once all of them have been yielded, as long as 'generation'
+        (as returned by validate()) is still that of the index."""
+
+        def gen():
+            kept = []
+            for r in results:
+                if kept is not None:
+                    if len(kept) < self.__max_results:
+                        kept.append(r)
+                    else:
+                        kept = None
+                yield r
+            if kept is not None:
+                self.__add(key, generation, tuple(kept))
+
+        return gen()
+
+    def get_status(self):
+        """Return a dictionary of statistics about the cache."""
+
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "hits": self.__hits,
+                "misses": self.__misses,
+            }
@@ -155,6 +155,9 @@ class Transaction(object):
         self.types_found = set()
         self.append_trans = False
         self.remaining_payload_cnt = 0
+        # Compressed attributes of content written to the transaction
+        # directory, recorded in the repository store on publication.
+        self.compressed_attrs = {}
 
     def get_basename(self):
         assert self.open_time
@@ -225,8 +228,7 @@ class Transaction(object):
             while 1:
                 self.open_time = datetime.datetime.now(datetime.UTC)
                 self.fmri.set_timestamp(self.open_time)
-                cat = rstore.catalog
-                if not cat.get_entry(self.fmri):
+                if not rstore.has_package(self.fmri):
                     break
                 time.sleep(0.25)
 
@@ -547,6 +549,8 @@ class Transaction(object):
             for attr in chashes:
                 action.attrs[attr] = chashes[attr]
             action.attrs["pkg.csize"] = csize
+            if dst_path is None:
+                self.compressed_attrs[fname] = (csize, chashes)
 
         self.remaining_payload_cnt = len(
             action.attrs.get("chain.sizes", "").split()
@@ -645,6 +649,10 @@ class Transaction(object):
             if not fileneeded:
                 return
 
+            # Any attributes already computed for this content
+            # don't apply to the client-compressed file.
+            self.compressed_attrs.pop(basename, None)
+
             if isinstance(f, str):
                 portable.copyfile(f, dst_path)
                 return
@@ -687,7 +695,7 @@ class Transaction(object):
                 raise
             dst_path = None
 
-        misc.compute_compressed_attrs(
+        attrs = misc.compute_compressed_attrs(
             fname,
             dst_path,
             data,
@@ -696,6 +704,8 @@ class Transaction(object):
             chash_attrs=digest.DEFAULT_CHASH_ATTRS,
             chash_algs=digest.CHASH_ALGS,
         )
+        if dst_path is None:
+            self.compressed_attrs[fname] = attrs
 
         self.remaining_payload_cnt -= 1
 
@@ -866,21 +876,23 @@ class Transaction(object):
         shall supply a fmri, repo store, and transaction in fmri,
         rstore, and trans, respectively."""
 
-        pkg_name = self.fmri.pkg_name
-
-        # mv manifest to pkg_name / version
+        # mv manifest to pkg_name / version, and move each file to
+        # file_root, with appropriate directory structure.
         src_mpath = os.path.join(self.dir, "manifest")
-        dest_mpath = self.rstore.manifest(self.fmri)
-        misc.makedirs(os.path.dirname(dest_mpath))
-        portable.rename(src_mpath, dest_mpath)
-
-        # Move each file to file_root, with appropriate directory
-        # structure.
-        for f in os.listdir(self.dir):
-            if f == "append":
-                continue
-            src_path = os.path.join(self.dir, f)
-            self.rstore.cache_store.insert(f, src_path)
+        self.rstore.publish_manifest(
+            self.fmri,
+            src_mpath,
+            (
+                (f, os.path.join(self.dir, f))
+                for f in os.listdir(self.dir)
+                if f not in ("append", "manifest")
+            ),
+        )
+
+        self.rstore.add_compressed_attrs(
+            (f, csize, chashes)
+            for f, (csize, chashes) in self.compressed_attrs.items()
+        )
 
 
 # Vim hints
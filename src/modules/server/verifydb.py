@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""The repository verification database.
+
+This module maintains a per-repository-store sqlite3 database recording
+each file in the store which 'pkgrepo verify' found to be intact, along
+with the hash it was verified against and a signature of the stored file
+(its device, inode, size, and modification and change times) taken
+before it was read.
+
+Each verification is a numbered run.  Files are recorded against the run
+which verified them in batches as it progresses, so that if it is
+interrupted, a later verification can resume the run by skipping the
+files it has already verified.  Alternatively, any file whose signature
+is unchanged since it was last verified can be skipped.
+
+The database is purely an optimisation; if it cannot be written, files
+are simply verified again.
+
+"""
+
+import sqlite3
+
+import pkg.misc as misc
+
+DB_BASENAME = "verify.sqlite"
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = [
+    """CREATE TABLE files (
+        name     TEXT PRIMARY KEY,
+        hash     TEXT NOT NULL,
+        sig      TEXT NOT NULL,
+        run      INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+    """CREATE TABLE state (
+        name     TEXT PRIMARY KEY,
+        value    INTEGER NOT NULL
+    ) WITHOUT ROWID""",
+]
+
+
+def file_sig(st):
+    """Return the signature recorded for a stored file, given the
+    result of os.stat() for it."""
+
+    return ":".join(str(v) for v in misc.stat_signature(st))
+
+
+class VerifyDB(misc.SQLiteDB):
+    """Manages the verification database for a repository store.
+
+    The database may be used from any thread.  If 'read_only' is True, or
+    the database cannot be written, any existing content is still used
+    for lookups but nothing new is recorded."""
+
+    schema = _SCHEMA
+    schema_version = SCHEMA_VERSION
+    description = "verification database"
+    synchronous = "NORMAL"
+
+    def __init__(self, path, read_only=False):
+        misc.SQLiteDB.__init__(self, path, read_only=read_only)
+        self.__run = 0
+
+    @property
+    def run(self):
+        """The number of the current run, as set by begin()."""
+
+        return self.__run
+
+    def __state(self, con, name):
+        row = con.execute(
+            "SELECT value FROM state WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return 0
+        return row[0]
+
+    def __write(self, statements):
+        """Execute each of the (sql, args) tuples in the iterable
+        'statements' in a single transaction, if the database can be
+        written.  The caller must hold the lock."""
+
+        if not self._can_write():
+            return
+        try:
+            self._execute(statements)
+        except sqlite3.DatabaseError:
+            # Failing to record anything only means the files
+            # are verified again.
+            pass
+
+    def begin(self, resume=False):
+        """Start a verification run, returning True if it resumes an
+        earlier run which wasn't completed.  If 'resume' is False, or
+        the last run was completed, a new run is started."""
+
+        with self._lock:
+            con = self._open()
+            last = complete = 0
+            if con is not None:
+                try:
+                    last = self.__state(con, "run")
+                    complete = self.__state(con, "complete")
+                except sqlite3.DatabaseError:
+                    pass
+
+            if resume and last > complete:
+                self.__run = last
+                return True
+
+            self.__run = last + 1
+            self.__write(
+                [
+                    (
+                        "INSERT OR REPLACE INTO state VALUES ('run', ?)",
+                        (self.__run,),
+                    )
+                ]
+            )
+            return False
+
+    def verified(self, name, fhash, sig, resume=False):
+        """Return True if the file 'name' was found to have the hash
+        'fhash' when it had the signature 'sig'.  If 'resume' is True,
+        only files verified by the current run are considered."""
+
+        with self._lock:
+            con = self._open()
+            if con is None:
+                return False
+            try:
+                row = con.execute(
+                    "SELECT hash, sig, run FROM files WHERE name = ?", (name,)
+                ).fetchone()
+            except sqlite3.DatabaseError:
+                return False
+        if row is None or row[0] != fhash or row[1] != sig:
+            return False
+        return not resume or row[2] == self.__run
+
+    def record(self, entries):
+        """Record each of the (name, fhash, sig) tuples in 'entries' as
+        having been verified by the current run."""
+
+        rows = [(name, fhash, sig, self.__run) for name, fhash, sig in entries]
+        if not rows:
+            return
+        with self._lock:
+            self.__write(
+                [("INSERT OR REPLACE INTO files VALUES (?,?,?,?)", rows)]
+            )
+
+    def forget(self, names):
+        """Forget the files in the iterable 'names', which were found
+        to be damaged or missing."""
+
+        rows = [(name,) for name in names]
+        if not rows:
+            return
+        with self._lock:
+            self.__write([("DELETE FROM files WHERE name = ?", rows)])
+
+    def finish(self):
+        """Mark the current run as completed, so that it can't be
+        resumed."""
+
+        with self._lock:
+            self.__write(
+                [
+                    (
+                        "INSERT OR REPLACE INTO state VALUES ('complete', ?)",
+                        (self.__run,),
+                    )
+                ]
+            )
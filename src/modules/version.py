@@ -103,11 +103,20 @@ class DotSequence(list):
         if len(self) == 0:
             raise IllegalDotSequence("Empty DotSequence")
 
+        # The sequence as a tuple, shared by the comparison keys of all
+        # of the Versions that use this (pooled) DotSequence.
+        self._key = tuple(self)
+
     def __str__(self):
         return self.__version_str
 
     def __hash__(self):
-        return hash(tuple(self))
+        return hash(self._key)
+
+    def __reduce__(self):
+        # Recreate pickled DotSequences from their string form, so that
+        # they are pooled as well.
+        return (self.__class__, (str(self),))
 
     def set_version_string(self, dotstring):
         self.__version_str = dotstring
@@ -175,6 +184,8 @@ class MatchingDotSequence(DotSequence):
         if len(self) == 0:
             raise IllegalDotSequence("Empty MatchingDotSequence")
 
+        self._key = tuple(self)
+
     def __ne__(self, other):
         if not isinstance(other, DotSequence):
             return True
@@ -256,7 +267,7 @@ class Version(object):
     v2 is a later release or branch.  The build_release DotSequence records
     the system on which the package binaries were constructed."""
 
-    __slots__ = ["release", "branch", "build_release", "timestr"]
+    __slots__ = ["release", "branch", "build_release", "timestr", "__key"]
 
     def __init__(self, version_string, build_string=None):
         # XXX If illegally formatted, raise exception.
@@ -348,6 +359,26 @@ class Version(object):
         else:
             self.timestr = None
 
+        self.__key = None
+
+    def __cmp_key(self):
+        """Returns a tuple whose ordering is that defined by the rich
+        comparison methods below; it is built on first use and then
+        kept, and shares its release and branch tuples with all other
+        Versions using the same DotSequences.  A missing branch or
+        timestamp is represented by an empty value, which orders before
+        any present one."""
+
+        key = self.__key
+        if key is None:
+            branch = self.branch
+            self.__key = key = (
+                self.release._key,
+                branch._key if branch is not None else (),
+                self.timestr or "",
+            )
+        return key
+
     @staticmethod
     def getstate(obj, je_state=None):
         """Returns the serialized state of this object in a format
@@ -396,6 +427,7 @@ class Version(object):
         assert type(timestamp) == datetime.datetime
         assert timestamp.tzname() is None or timestamp.tzname() == "UTC"
         self.timestr = timestamp.strftime("%Y%m%dT%H%M%SZ")
+        self.__key = None
 
     def get_timestamp(self):
         if not self.timestr:
@@ -404,6 +436,8 @@ class Version(object):
         return datetime.datetime.fromtimestamp(calendar.timegm(t), datetime.UTC)
 
     def __ne__(self, other):
+        if type(other) is Version:
+            return self.__cmp_key() != other.__cmp_key()
         if not isinstance(other, Version):
             return True
 
@@ -416,6 +450,8 @@ class Version(object):
         return True
 
     def __eq__(self, other):
+        if type(other) is Version:
+            return self.__cmp_key() == other.__cmp_key()
         if not isinstance(other, Version):
             return False
 
@@ -434,6 +470,8 @@ class Version(object):
         then that version is less than the other.  The same applies to
         the branch and timestamp components.
         """
+        if type(other) is Version:
+            return self.__cmp_key() < other.__cmp_key()
         if not isinstance(other, Version):
             return False
 
@@ -467,6 +505,8 @@ class Version(object):
         then that version is less than the other.  The same applies to
         the branch and timestamp components.
         """
+        if type(other) is Version:
+            return self.__cmp_key() > other.__cmp_key()
         if not isinstance(other, Version):
             return True
 
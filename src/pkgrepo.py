@@ -35,6 +35,7 @@ try:
     import errno
     import getopt
     import gettext
+    import hashlib
     import locale
     import logging
     import os
@@ -92,6 +93,9 @@ PLUS = 1
 COMMON = 0
 diff_type_f = {MINUS: "- ", PLUS: "+ ", COMMON: ""}
 
+# The catalog part listing the packages of a repository.
+CATALOG_BASE_PART = "catalog.base.C"
+
 # globals
 tmpdirs = []
 
@@ -185,16 +189,20 @@ Subcommands:
      pkgrepo remove [-n] [-p publisher ...] [-d YYYYMMDD] -s repo_uri_or_path
          pkg_fmri_pattern ...
 
+     pkgrepo gc [-p publisher ...] -s repo_uri_or_path
+
      pkgrepo set [-p publisher ...] -s repo_uri_or_path
          section/property[+|-]=[value] ... or
          section/property[+|-]=([value]) ...
 
      pkgrepo verify [-d] [-p publisher ...] [-i ignored_dep_file ...]
-         [--disable verification ...] -s repo_uri_or_path
+         [--disable verification ...] [--resume] [--skip-unchanged]
+         -s repo_uri_or_path
 
      pkgrepo fix [-v] [-p publisher ...] -s repo_uri_or_path
 
-     pkgrepo diff [-vq] [--strict] [--parsable] [-p publisher ...]
+     pkgrepo diff [-vq] [--strict] [--parsable] [--cache-dir dir]
+         [-p publisher ...]
          -s first_repo_uri_or_path [--key ssl_key ... --cert ssl_cert ...]
          -s second_repo_uri_or_path [--key ssl_key ... --cert ssl_cert ...]
 
@@ -305,6 +313,59 @@ def subcmd_remove(conf, args):
     return EXIT_OK
 
 
+def subcmd_gc(conf, args):
+    """Remove files which are no longer referenced by any package from
+    the repository."""
+
+    subcommand = "gc"
+
+    opts, pargs = getopt.getopt(args, "p:s:")
+
+    pubs = set()
+    for opt, arg in opts:
+        if opt == "-p":
+            pubs.add(arg)
+        elif opt == "-s":
+            conf["repo_uri"] = parse_uri(arg)
+
+    if pargs:
+        usage(_("command does not take operands"), cmd=subcommand)
+
+    # Get repository object.
+    if not conf.get("repo_uri", None):
+        usage(
+            _("A package repository location must be provided using -s."),
+            cmd=subcommand,
+        )
+    repo = get_repo(conf, read_only=False, subcommand=subcommand)
+
+    if "all" in pubs:
+        pubs = set()
+
+    rpubs = set(repo.publishers)
+    if not pubs:
+        found = rpubs
+    else:
+        found = rpubs & pubs
+    notfound = pubs - found
+
+    rval = EXIT_OK
+    if found and notfound:
+        rval = EXIT_PARTIAL
+    elif pubs and not found:
+        error(_("no matching publishers found"), cmd=subcommand)
+        return EXIT_OOPS
+
+    progtrack = get_tracker()
+    for pub in sorted(found):
+        logger.info(
+            _("Removing unreferenced files for publisher {0} ...").format(pub)
+        )
+        repo.gc(progtrack=progtrack, pub=pub)
+
+    return rval
+
+
 def get_repo(conf, allow_invalid=False, read_only=True, subcommand=None):
     """Return the repository object for current program configuration.
 
@@ -1887,9 +1948,13 @@ def subcmd_verify(conf, args):
     subcommand = "verify"
     __load_verify_msgs()
 
-    opts, pargs = getopt.getopt(args, "dp:s:i:", ["disable="])
+    opts, pargs = getopt.getopt(
+        args, "dp:s:i:", ["disable=", "resume", "skip-unchanged"]
+    )
     allowed_checks = set(sr.verify_default_checks)
     force_dep_check = False
+    resume = False
+    skip_unchanged = False
     ignored_dep_files = []
     pubs = set()
     for opt, arg in opts:
@@ -1919,6 +1984,10 @@ def subcmd_verify(conf, args):
                 )
         elif opt == "-i":
             ignored_dep_files.append(arg)
+        elif opt == "--resume":
+            resume = True
+        elif opt == "--skip-unchanged":
+            skip_unchanged = True
 
     if pargs:
         usage(_("command does not take operands"), cmd=subcommand)
@@ -1985,6 +2054,8 @@ def subcmd_verify(conf, args):
         force_dep_check=force_dep_check,
         ignored_dep_files=ignored_dep_files,
         progtrack=progtrack,
+        resume=resume,
+        skip_unchanged=skip_unchanged,
     ):
         report_error(verify_tuple)
 
@@ -2126,19 +2197,112 @@ def subcmd_fix(conf, args):
     return EXIT_OK
 
 
-def __get_pub_fmris(pub, xport, tmp_dir):
+def __get_pub_catalog(pub, xport, tmp_dir, cache_dir=None):
+    """Returns the catalog for publisher 'pub', retrieving it if that
+    hasn't been done already.  If 'cache_dir' is provided, the catalog
+    is kept in a directory beneath it named for the repository and
+    publisher, so that later retrievals only need the catalog updates
+    made since."""
+
     if not pub.meta_root:
-        # Create a temporary directory for catalog.
-        cat_dir = tempfile.mkdtemp(prefix="pkgrepo-diff.", dir=tmp_dir)
+        if cache_dir:
+            origin = str(pub.repository.origins[0].uri)
+            cat_dir = os.path.join(
+                cache_dir,
+                hashlib.sha1(origin.encode("utf-8")).hexdigest(),
+                pub.prefix,
+            )
+        else:
+            # Create a temporary directory for catalog.
+            cat_dir = tempfile.mkdtemp(prefix="pkgrepo-diff.", dir=tmp_dir)
         pub.meta_root = cat_dir
         pub.transport = xport
-        pub.refresh(full_refresh=True, immediate=True)
+        pub.refresh(full_refresh=not cache_dir, immediate=True)
+    return pub.catalog
+
 
-    pkgs, fmris, unmatched = pub.catalog.get_matching_fmris("*")
+def __get_pub_fmris(pub, xport, tmp_dir, cache_dir=None):
+    cat = __get_pub_catalog(pub, xport, tmp_dir, cache_dir=cache_dir)
+    pkgs, fmris, unmatched = cat.get_matching_fmris("*")
     fmris = [f for f in fmris]
     return fmris, pkgs
 
 
+def __get_pub_attrs(pub, xport, tmp_dir):
+    """Returns the attributes of the catalog for publisher 'pub',
+    retrieving only the catalog.attrs file, or None if the repository
+    doesn't provide one."""
+
+    attrs_dir = tempfile.mkdtemp(prefix="pkgrepo-diff.", dir=tmp_dir)
+    try:
+        xport.get_catalog1(pub, ["catalog.attrs"], path=attrs_dir)
+    except apx.UnsupportedRepositoryOperation:
+        return None
+    return pkg.catalog.CatalogAttrs(meta_root=attrs_dir)
+
+
+def __same_catalog_pkgs(attrs, rattrs):
+    """Returns True if the catalog attributes 'attrs' and 'rattrs' show
+    that both catalogs contain exactly the same packages."""
+
+    if attrs is None or rattrs is None:
+        return False
+    if attrs.package_version_count == rattrs.package_version_count == 0:
+        return True
+    sig = attrs.parts.get(CATALOG_BASE_PART, {}).get("signature-sha-1")
+    rsig = rattrs.parts.get(CATALOG_BASE_PART, {}).get("signature-sha-1")
+    return sig is not None and sig == rsig
+
+
+def __gen_pub_stem_diff(pub, rpub):
+    """A generator function that compares the packages in the retrieved
+    catalogs of publishers 'pub' and 'rpub' one package stem at a time,
+    in stem order, producing tuples of the form (stem, minus, plus,
+    common) where 'minus' and 'plus' are the sets of FMRI strings only
+    found for 'pub' and for 'rpub' respectively and 'common' is the
+    number of versions found for both.
+
+    Stems whose catalog entries are identical are compared using the
+    digests of their entries without loading them, so only the stems
+    which differ are expanded into FMRIs."""
+
+    part = pkg.catalog.CatalogPart(
+        CATALOG_BASE_PART, meta_root=pub.catalog_root, indexed=True
+    )
+    rpart = pkg.catalog.CatalogPart(
+        CATALOG_BASE_PART, meta_root=rpub.catalog_root, indexed=True
+    )
+
+    def get_fmris(cpart, prefix, stem):
+        return set(
+            str(f)
+            for ver, entries in cpart.entries_by_version(stem, pubs=[prefix])
+            for f, entry in entries
+        )
+
+    stems = part.stem_digests(pub.prefix)
+    rstems = rpart.stem_digests(rpub.prefix)
+    cur = next(stems, None)
+    rcur = next(rstems, None)
+    while cur or rcur:
+        if not rcur or (cur and cur[0] < rcur[0]):
+            yield cur[0], get_fmris(part, pub.prefix, cur[0]), set(), 0
+            cur = next(stems, None)
+        elif not cur or rcur[0] < cur[0]:
+            yield rcur[0], set(), get_fmris(rpart, rpub.prefix, rcur[0]), 0
+            rcur = next(rstems, None)
+        else:
+            stem = cur[0]
+            if cur[1] == rcur[1]:
+                yield stem, set(), set(), cur[2]
+            else:
+                fmris = get_fmris(part, pub.prefix, stem)
+                rfmris = get_fmris(rpart, rpub.prefix, stem)
+                yield stem, fmris - rfmris, rfmris - fmris, len(fmris & rfmris)
+            cur = next(stems, None)
+            rcur = next(rstems, None)
+
+
 def __format_diff(diff_type, subject):
     """formatting diff output.
     diff_type: can be MINUS, PLUS or COMMON.
@@ -2183,8 +2347,15 @@ def __repo_diff(
     compare_ts,
     compare_cat,
     parsable,
+    cache_dir=None,
 ):
-    """Determine the differences between two repositories."""
+    """Determine the differences between two repositories.
+
+    The packages of publishers in both repositories are only retrieved
+    if their catalog attributes show that they differ, and are then
+    compared one package stem at a time.  If 'cache_dir' is provided,
+    the catalogs retrieved are kept there so that later comparisons
+    only retrieve the catalog updates made since."""
 
     same_repo = True
     if conf["repo_uri"].scheme == "file":
@@ -2243,16 +2414,28 @@ def __repo_diff(
 
     verbose_res_dict = {"plus_pubs": [], "minus_pubs": [], "common_pubs": []}
 
-    def __diff_pub_helper(pub, symbol):
-        fmris, pkgs = __get_pub_fmris(pub, xport, tmp_dir)
+    def __diff_pub_helper(pub, pxport, symbol):
+        # Only the catalog attributes are needed for the package counts.
+        attrs = __get_pub_attrs(pub, pxport, tmp_dir)
+        if attrs is not None:
+            npkgs = attrs.package_count
+            nvers = attrs.package_version_count
+        else:
+            fmris, pkgs = __get_pub_fmris(
+                pub, pxport, tmp_dir, cache_dir=cache_dir
+            )
+            npkgs = len(pkgs)
+            nvers = len(fmris)
+            del fmris, pkgs
+
         # Summary level.
         if not verbose:
             td_row = [
                 pub.prefix,
-                {"packages": len(pkgs), "versions": len(fmris)},
+                {"packages": npkgs, "versions": nvers},
                 None,
                 {"packages": 0, "versions": 0},
-                {"packages": len(pkgs), "versions": len(fmris)},
+                {"packages": npkgs, "versions": nvers},
             ]
             if symbol == PLUS:
                 td_row[1], td_row[2] = td_row[2], td_row[1]
@@ -2266,8 +2449,8 @@ def __repo_diff(
             verbose_res_dict[key_name].append(
                 {
                     "publisher": pub.prefix,
-                    "packages": len(pkgs),
-                    "versions": len(fmris),
+                    "packages": npkgs,
+                    "versions": nvers,
                 }
             )
             return
@@ -2276,49 +2459,77 @@ def __repo_diff(
         __emit_msg(
             symbol,
             _("({0:d} package(s) with {1:d} different version(s))").format(
-                len(pkgs), len(fmris)
+                npkgs, nvers
             ),
         )
 
     for pub in minus_pubs:
-        __diff_pub_helper(pub, MINUS)
+        __diff_pub_helper(pub, xport, MINUS)
 
     for pub in plus_pubs:
-        __diff_pub_helper(pub, PLUS)
+        __diff_pub_helper(pub, rxport, PLUS)
 
     for pub, rpub in zip(common_pubs, common_rpubs):
         # Indicates whether those two pubs have same pkgs.
         same_pkgs = True
         same_cat = True
-        fmris, pkgs = __get_pub_fmris(pub, xport, tmp_dir)
-        rfmris, rpkgs = __get_pub_fmris(rpub, rxport, tmp_dir)
-        fmris_str = set([str(f) for f in fmris])
-        rfmris_str = set([str(f) for f in rfmris])
-        del fmris, rfmris
-
-        minus_fmris = __sorted(fmris_str - rfmris_str)
-        plus_fmris = __sorted(rfmris_str - fmris_str)
-        if minus_fmris or plus_fmris:
-            same_repo = False
-            same_pkgs = False
-            if quiet:
-                return EXIT_DIFF
+
+        # The catalog attributes are retrieved first, as they show
+        # whether the catalogs contain the same packages without
+        # retrieving the catalogs themselves.
+        attrs = __get_pub_attrs(pub, xport, tmp_dir)
+        rattrs = __get_pub_attrs(rpub, rxport, tmp_dir)
+        if __same_catalog_pkgs(attrs, rattrs):
+            stems = ()
+        else:
+            __get_pub_catalog(pub, xport, tmp_dir, cache_dir=cache_dir)
+            __get_pub_catalog(rpub, rxport, tmp_dir, cache_dir=cache_dir)
+            stems = __gen_pub_stem_diff(pub, rpub)
+
+        # Only the packages which differ are kept, and only when they
+        # are to be listed.
+        minus_fmris = []
+        plus_fmris = []
+        minus_pkg_vers = {"packages": 0, "versions": 0}
+        plus_pkg_vers = {"packages": 0, "versions": 0}
+        com_pkg_vers = {"packages": 0, "versions": 0}
+        for stem, minus, plus, common in stems:
+            if minus or plus:
+                same_repo = False
+                same_pkgs = False
+                if quiet:
+                    return EXIT_DIFF
+
+            if common or (minus and plus):
+                com_pkg_vers["packages"] += 1
+            elif minus:
+                minus_pkg_vers["packages"] += 1
+            else:
+                plus_pkg_vers["packages"] += 1
+            com_pkg_vers["versions"] += common
+            minus_pkg_vers["versions"] += len(minus)
+            plus_pkg_vers["versions"] += len(plus)
+            if verbose:
+                minus_fmris.extend(minus)
+                plus_fmris.extend(plus)
+        minus_fmris.sort()
+        plus_fmris.sort()
 
         cat_lm_pub = None
         cat_lm_rpub = None
         if compare_cat:
-            cat_lm_pub = pkg.catalog.datetime_to_ts(pub.catalog.last_modified)
-            cat_lm_rpub = pkg.catalog.datetime_to_ts(rpub.catalog.last_modified)
+            if attrs is not None and rattrs is not None:
+                cat_lm_pub = attrs.last_modified
+                cat_lm_rpub = rattrs.last_modified
+            else:
+                cat_lm_pub = pub.catalog.last_modified
+                cat_lm_rpub = rpub.catalog.last_modified
+            cat_lm_pub = pkg.catalog.datetime_to_ts(cat_lm_pub)
+            cat_lm_rpub = pkg.catalog.datetime_to_ts(cat_lm_rpub)
             same_cat = same_repo = cat_lm_pub == cat_lm_rpub
             if not same_cat and quiet:
                 return EXIT_DIFF
 
-        common_fmris = fmris_str & rfmris_str
-        pkg_set = set(pkgs.keys())
-        rpkg_set = set(rpkgs.keys())
-        del pkgs, rpkgs
-        common_pkgs = pkg_set & rpkg_set
-
         # Print summary.
         if not verbose:
             if not same_cat:
@@ -2329,33 +2540,10 @@ def __repo_diff(
             # Add to the table only if there are differences
             # for this publisher.
             if not same_pkgs:
-                minus_pkgs = pkg_set - rpkg_set
-                minus_pkg_vers = {
-                    "packages": len(minus_pkgs),
-                    "versions": len(minus_fmris),
-                }
-                del minus_pkgs, minus_fmris
-
-                plus_pkgs = rpkg_set - pkg_set
-                plus_pkg_vers = {
-                    "packages": len(plus_pkgs),
-                    "versions": len(plus_fmris),
-                }
-                del plus_pkgs, plus_fmris
-
-                total_pkgs = pkg_set | rpkg_set
-                total_fmris = fmris_str | rfmris_str
-                total_pkg_vers = {
-                    "packages": len(total_pkgs),
-                    "versions": len(total_fmris),
-                }
-                del total_pkgs, total_fmris
-
-                com_pkg_vers = {
-                    "packages": len(common_pkgs),
-                    "versions": len(common_fmris),
-                }
-
+                total_pkg_vers = dict(
+                    (k, minus_pkg_vers[k] + plus_pkg_vers[k] + com_pkg_vers[k])
+                    for k in ("packages", "versions")
+                )
                 res_dict["table_data"].append(
                     [
                         pub.prefix,
@@ -2365,7 +2553,6 @@ def __repo_diff(
                         total_pkg_vers,
                     ]
                 )
-            del common_pkgs, common_fmris, pkg_set, rpkg_set
             continue
 
         com_pub_info = {}
@@ -2405,18 +2592,14 @@ def __repo_diff(
 
         if not same_pkgs:
             if parsable:
-                com_pub_info["common"] = {
-                    "packages": len(common_pkgs),
-                    "versions": len(common_fmris),
-                }
+                com_pub_info["common"] = com_pkg_vers
             else:
                 msg(
                     _(
                         "        ({0:d} pkg(s) with {1:d} "
                         "version(s) are in both repositories.)"
-                    ).format(len(common_pkgs), len(common_fmris))
+                    ).format(com_pkg_vers["packages"], com_pkg_vers["versions"])
                 )
-        del common_pkgs, common_fmris, pkg_set, rpkg_set
 
         if com_pub_info:
             verbose_res_dict["common_pubs"].append(com_pub_info)
@@ -2503,7 +2686,9 @@ def subcmd_diff(conf, args):
     """Compare two repositories."""
 
     opts, pargs = getopt.getopt(
-        args, "vqp:s:", ["strict", "parsable", "key=", "cert="]
+        args,
+        "vqp:s:",
+        ["strict", "parsable", "key=", "cert=", "cache-dir="],
     )
     subcommand = "diff"
     pubs = set()
@@ -2512,6 +2697,7 @@ def subcmd_diff(conf, args):
     compare_ts = True
     compare_cat = False
     parsable = False
+    cache_dir = None
 
     def key_cert_conf_helper(conf_type, arg):
         """Helper function for collecting key and cert."""
@@ -2557,6 +2743,8 @@ def subcmd_diff(conf, args):
             key_cert_conf_helper("key", arg)
         elif opt == "--cert":
             key_cert_conf_helper("cert", arg)
+        elif opt == "--cache-dir":
+            cache_dir = arg
 
     if len(pargs) > 0:
         usage(_("command does not take any operands"), cmd=subcommand)
@@ -2623,6 +2811,7 @@ def subcmd_diff(conf, args):
         compare_ts,
         compare_cat,
         parsable,
+        cache_dir=cache_dir,
     )
 
 
@@ -29,6 +29,7 @@ try:
 
     pkg.site_paths.init()
     import calendar
+    import collections
     import errno
     import getopt
     import gettext
@@ -38,6 +39,8 @@ try:
     import subprocess
     import sys
     import tempfile
+    import threading
+    import time
     import traceback
     import warnings
 
@@ -111,6 +114,7 @@ Usage:
             [-m match] [--mog-file file_path ...] [--raw]
             [--key src_key --cert src_cert]
             [--dkey dest_key --dcert dest_cert]
+            [--jobs jobs] [--max-bandwidth rate] [--checkpoint file]
             (fmri|pattern) ...
         pkgrecv [-s src_repo_uri] --newest
         pkgrecv [-nv] [-s src_repo_uri] [-d path] [-p publisher ...]
@@ -160,6 +164,13 @@ Options:
         -s src_repo_uri A URI representing the location of a pkg(7)
                         repository to retrieve package data from.
 
+        --checkpoint file
+                        Record each package in the named file once it has
+                        been transferred, and skip the packages it lists, so
+                        that an interrupted transfer can be resumed.  The
+                        file is removed once all packages are transferred.
+                        Can not be used with -a or --clone.
+
         --clone         Make an exact copy of the source repository. By default,
                         the clone operation will only succeed if publishers in
                         the  source  repository  are  also  present  in  the
@@ -171,6 +182,18 @@ Options:
                         Cloning will leave the destination repository altered in
                         case of an error.
 
+        --jobs jobs     Retrieve the content of up to the given number of
+                        packages concurrently while earlier packages are
+                        republished; manifests are also retrieved
+                        concurrently beforehand.  The default is 1.  Can
+                        not be used with -a or --clone.
+
+        --max-bandwidth rate
+                        Limit the average rate at which package content is
+                        retrieved to the given number of bytes per second.
+                        The suffixes k, M and G may be used.  Can not be
+                        used with -a or --clone.
+
         --mog-file      Specifies the path to a file containing pkgmogrify(1)
                         transforms to be applied to every package before it is
                         copied to the destination. A path of '-' can be
@@ -366,6 +389,283 @@ def add_hashes_to_multi(mfst, multi):
             hashes.add(a.hash)
 
 
+def parse_rate(arg):
+    """Returns the number of bytes per second specified by 'arg', which may
+    have a suffix of k, M or G, or None if it isn't valid."""
+
+    mult = 1
+    if arg and arg[-1] in "kKmMgG":
+        mult = 1024 ** ("kmg".index(arg[-1].lower()) + 1)
+        arg = arg[:-1]
+    try:
+        rate = int(float(arg) * mult)
+    except ValueError:
+        return None
+    if rate <= 0:
+        return None
+    return rate
+
+
+class LockedTracker(object):
+    """Wraps a progress tracker so that it can be used from several
+    threads at once; each call is made with a lock held."""
+
+    def __init__(self, tracker):
+        self.__tracker = tracker
+        self.__lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attr = getattr(self.__tracker, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self.__lock:
+                return attr(*args, **kwargs)
+
+        return locked
+
+
+class RateLimiter(object):
+    """Limits the average rate at which package content is retrieved by
+    delaying the start of each package's retrieval until the content of
+    the packages before it would have been retrieved at that rate."""
+
+    def __init__(self, rate):
+        self.__rate = rate
+        self.__lock = threading.Lock()
+        self.__start = None
+        self.__reserved = 0
+
+    def reserve(self, nbytes):
+        """Wait until 'nbytes' more bytes may be retrieved."""
+
+        with self.__lock:
+            now = time.time()
+            if self.__start is not None:
+                delay = self.__start + self.__reserved / self.__rate - now
+            if self.__start is None or delay < 0:
+                # Time spent idle doesn't allow a later burst.
+                self.__start = now
+                self.__reserved = 0
+                delay = 0
+            self.__reserved += nbytes
+        if delay > 0:
+            time.sleep(delay)
+
+
+class StageStats(object):
+    """Records the packages and data handled by each stage of a transfer
+    and the time spent, so that a throughput summary can be displayed."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__stages = collections.OrderedDict()
+
+    def record(self, stage, start, npkgs=1, nbytes=0):
+        """Record that the stage named 'stage' handled 'npkgs' packages
+        containing 'nbytes' bytes of data, starting at time 'start' and
+        finishing now."""
+
+        end = time.time()
+        with self.__lock:
+            st = self.__stages.setdefault(stage, [0, 0, start, end])
+            st[0] += npkgs
+            st[1] += nbytes
+            st[2] = min(st[2], start)
+            st[3] = max(st[3], end)
+
+    def display(self):
+        """Display the throughput of each stage; the time for each stage
+        is from when it first started to when it last finished."""
+
+        if not self.__stages:
+            return
+        msg(_("\nTransfer summary:"))
+        for stage, (npkgs, nbytes, start, end) in self.__stages.items():
+            secs = max(end - start, 0.001)
+            line = _("{stage:>12}: {npkgs:d} package(s) in {secs:.1f}s").format(
+                stage=stage, npkgs=npkgs, secs=secs
+            )
+            if nbytes:
+                line += _(", {nbytes} ({rate}/s)").format(
+                    nbytes=misc.bytes_to_str(nbytes),
+                    rate=misc.bytes_to_str(nbytes / secs),
+                )
+            msg(line)
+
+
+class Checkpoint(object):
+    """Records the packages which have been transferred in the file
+    'path', so that they are skipped if the transfer is restarted after
+    being interrupted."""
+
+    def __init__(self, path):
+        self.__path = path
+        self.__done = set()
+        try:
+            with open(path) as f:
+                self.__done.update(l.strip() for l in f if l.strip())
+            self.__file = open(path, "a")
+        except EnvironmentError as e:
+            if e.errno != errno.ENOENT:
+                raise apx._convert_error(e)
+            try:
+                self.__file = open(path, "a")
+            except EnvironmentError as e:
+                raise apx._convert_error(e)
+
+    def __contains__(self, pfmri):
+        return str(pfmri) in self.__done
+
+    def add(self, pfmri):
+        """Record that the package 'pfmri' has been transferred."""
+
+        self.__done.add(str(pfmri))
+        try:
+            self.__file.write(str(pfmri) + "\n")
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+        except EnvironmentError as e:
+            raise apx._convert_error(e)
+
+    def close(self, remove=False):
+        """Close the checkpoint file, removing it if 'remove' is True."""
+
+        self.__file.close()
+        if remove:
+            try:
+                os.unlink(self.__path)
+            except EnvironmentError as e:
+                if e.errno != errno.ENOENT:
+                    raise apx._convert_error(e)
+
+
+class ContentFetcher(object):
+    """Retrieves the content of packages for transfer_pkgs().
+
+    If 'jobs' is greater than one, the content of that many packages is
+    retrieved at once by a pool of threads, ahead of the package being
+    requested by get().  Each thread uses a transport of its own (with
+    its own connections and download directories), as a transport only
+    performs one operation at a time; 'tracker' must then be safe to use
+    from those threads (see LockedTracker)."""
+
+    def __init__(
+        self,
+        src_pub,
+        pkgs,
+        fmappings,
+        sizes,
+        keep_compressed,
+        tracker,
+        jobs,
+        limiter,
+        stats,
+    ):
+        self.__src_pub = src_pub
+        self.__pkgs = collections.deque(pkgs)
+        self.__fmappings = fmappings
+        self.__sizes = sizes
+        self.__keep_compressed = keep_compressed
+        self.__tracker = tracker
+        self.__limiter = limiter
+        self.__stats = stats
+        self.__pool = None
+        self.__pending = collections.deque()
+        self.__local = threading.local()
+        if jobs > 1:
+            self.__pool = misc.BoundedExecutor(jobs)
+
+    def __get_transport(self):
+        """Returns the transport, and the directories to empty after
+        each package, to use for the calling thread."""
+
+        if not self.__pool:
+            return xport, []
+
+        local = self.__local
+        if not hasattr(local, "xport"):
+            local.xport, wcfg = transport.setup_transport()
+            wdir = tempfile.mkdtemp(
+                dir=temp_root, prefix=global_settings.client_name + "-"
+            )
+            tmpdirs.append(wdir)
+            local.dirs = [os.path.join(wdir, "incoming")]
+            wcfg.incoming_root = local.dirs[0]
+            if cache_dir in tmpdirs:
+                local.dirs.append(os.path.join(wdir, "cache"))
+                misc.makedirs(local.dirs[1])
+                wcfg.add_cache(local.dirs[1], readonly=False)
+            else:
+                # Content is kept in a cache directory provided
+                # by the user.
+                wcfg.add_cache(cache_dir, readonly=False)
+            wcfg.pkg_root = xport_cfg.pkg_root
+            wcfg.add_publisher(self.__src_pub)
+        return local.xport, local.dirs
+
+    def __fetch(self, pfmri):
+        global download_start
+
+        nbytes = self.__sizes[pfmri]
+        if self.__limiter:
+            self.__limiter.reserve(nbytes)
+        start = time.time()
+
+        txport, dirs = self.__get_transport()
+        mfile = txport.multi_file_ni(
+            self.__src_pub,
+            xport_cfg.get_pkg_dir(pfmri),
+            not self.__keep_compressed,
+            self.__tracker,
+        )
+        add_hashes_to_multi(self.__fmappings[pfmri], mfile)
+        if mfile:
+            download_start = True
+            mfile.wait_files()
+
+        # Content has been copied to the package directory, so the
+        # thread's own download directories can be emptied.
+        for d in dirs:
+            shutil.rmtree(d, ignore_errors=True)
+            misc.makedirs(d)
+        self.__stats.record(_("Download"), start, nbytes=nbytes)
+
+    def __fill(self):
+        """Start retrieving the content of packages until enough are
+        queued to keep the pool busy."""
+
+        while self.__pkgs and len(self.__pending) < self.__pool.workers * 2:
+            pfmri = self.__pkgs.popleft()
+            self.__pending.append(
+                (pfmri, self.__pool.submit(self.__fetch, pfmri))
+            )
+
+    def get(self, pfmri):
+        """Wait until the content of the package 'pfmri' has been
+        retrieved.  Packages must be requested in the order they were
+        provided."""
+
+        if not self.__pool:
+            self.__pkgs.popleft()
+            self.__fetch(pfmri)
+            return
+
+        self.__fill()
+        pending, fut = self.__pending.popleft()
+        assert pending == pfmri
+        fut.result()
+        self.__fill()
+
+    def close(self):
+        """Stop retrieving content."""
+
+        if self.__pool:
+            self.__pool.shutdown(cancel=True)
+            self.__pool = None
+
+
 def prune(fmri_list, all_versions, all_timestamps):
     """Returns a filtered version of fmri_list based on the provided
     parameters."""
@@ -433,7 +733,7 @@ def fetch_catalog(
         tracker.refresh_end_pub(src_pub)
         tracker.refresh_done()
 
-    return src_pub.catalog
+    return catalog.Catalog(meta_root=src_pub.catalog_root, read_only=True)
 
 
 def main_func():
@@ -457,6 +757,9 @@ def main_func():
     publishers = []
     clone = False
     verbose = False
+    jobs = None
+    max_bandwidth = None
+    checkpoint = None
 
     temp_root = misc.config_temp_root()
 
@@ -478,6 +781,9 @@ def main_func():
                 "raw",
                 "debug=",
                 "clone",
+                "jobs=",
+                "max-bandwidth=",
+                "checkpoint=",
             ],
         )
     except getopt.GetoptError as e:
@@ -547,6 +853,19 @@ def main_func():
             dkey = arg
         elif opt == "--dcert":
             dcert = arg
+        elif opt == "--jobs":
+            try:
+                jobs = int(arg)
+                if jobs < 1:
+                    raise ValueError(arg)
+            except ValueError:
+                usage(_("Illegal option value -- {0}").format(arg))
+        elif opt == "--max-bandwidth":
+            max_bandwidth = parse_rate(arg)
+            if not max_bandwidth:
+                usage(_("Illegal option value -- {0}").format(arg))
+        elif opt == "--checkpoint":
+            checkpoint = arg
 
     if not list_newest and not target:
         usage(_("a destination must be provided"))
@@ -592,6 +911,18 @@ def main_func():
     if mog_files and clone:
         usage(_("--mog-file can not be used with --clone.\n"))
 
+    for opt, val in (
+        ("--jobs", jobs),
+        ("--max-bandwidth", max_bandwidth),
+        ("--checkpoint", checkpoint),
+    ):
+        if val is None:
+            continue
+        if clone:
+            usage(_("{0} can not be used with --clone.\n").format(opt))
+        if archive:
+            usage(_("{0} can not be used with -a.\n").format(opt))
+
     incoming_dir = tempfile.mkdtemp(
         dir=temp_root, prefix=global_settings.client_name + "-"
     )
@@ -651,7 +982,12 @@ def main_func():
         return archive_pkgs(*args)
 
     # Normal package transfer allows operations on a per-package basis.
-    return transfer_pkgs(*args)
+    return transfer_pkgs(
+        *args,
+        jobs=jobs or 1,
+        max_bandwidth=max_bandwidth,
+        checkpoint=checkpoint,
+    )
 
 
 def check_processed(any_matched, any_unmatched, total_processed):
@@ -1508,9 +1844,17 @@ def transfer_pkgs(
     dkey,
     dcert,
     mog_files,
+    jobs=1,
+    max_bandwidth=None,
+    checkpoint=None,
 ):
     """Retrieve source package data and optionally republish it as each
     package is retrieved.
+
+    'jobs' is the number of packages whose content is retrieved at once,
+    'max_bandwidth' the maximum average number of bytes per second to
+    retrieve and 'checkpoint' the path of a file in which to record the
+    packages transferred so far.
     """
 
     global cache_dir, download_start, xport, xport_cfg, dest_xport, targ_pub
@@ -1524,8 +1868,19 @@ def transfer_pkgs(
     if mog_files:
         do_mog = True
 
+    stats = StageStats()
+    limiter = None
+    if max_bandwidth:
+        limiter = RateLimiter(max_bandwidth)
+    if checkpoint:
+        checkpoint = Checkpoint(checkpoint)
+
     for src_pub in xport_cfg.gen_publishers():
         tracker = get_tracker()
+        if jobs > 1:
+            # The tracker is shared with the threads retrieving
+            # package content.
+            tracker = LockedTracker(tracker)
         if list_newest:
             # Make sure the prog tracker knows we're doing a listing
             # operation so that it suppresses irrelevant output.
@@ -1626,6 +1981,18 @@ def transfer_pkgs(
             # No matches at all; nothing to do for this publisher.
             continue
 
+        resumed = 0
+        if checkpoint:
+            resumed = len(matches)
+            matches = [f for f in matches if f not in checkpoint]
+            resumed -= len(matches)
+            if resumed:
+                msg(
+                    _(
+                        "Skipping {0:d} package(s) transferred previously."
+                    ).format(resumed)
+                )
+
         def get_basename(pfmri):
             open_time = pfmri.get_timestamp()
             return "{0:d}_{1}".format(
@@ -1644,12 +2011,28 @@ def transfer_pkgs(
                 _("Retrieving and evaluating {0:d} package(s)...").format(npkgs)
             )
 
+        start = time.time()
+        if jobs > 1:
+            # Retrieve the manifests in bulk first for faster,
+            # parallel transport. Retryable errors during prefetch
+            # are ignored and manifests are retrieved again below.
+            xport.prefetch_manifests(
+                [
+                    (f, None)
+                    for f in matches
+                    if not os.path.exists(xport_cfg.get_pkg_pathname(f))
+                ],
+                progtrack=progress.NullProgressTracker(),
+            )
+
         tracker.manifest_fetch_start(npkgs)
 
         pkgs_to_get = []
         new_targ_cats = {}
         new_targ_pubs = {}
         fmappings = {}
+        srcmappings = {}
+        sizes = {}
 
         while matches:
             f = matches.pop()
@@ -1745,6 +2128,8 @@ def transfer_pkgs(
             # Store a mapping between new fmri and new manifest for
             # future use.
             fmappings[nf] = nm
+            srcmappings[nf] = f
+            sizes[nf] = getb
             pkgs_to_get.append(nf)
 
             get_bytes += getb
@@ -1754,6 +2139,7 @@ def transfer_pkgs(
                 _rm_temp_raw_files(nf, xport_cfg, ignore_errors=True)
             tracker.manifest_fetch_progress(completion=True)
         tracker.manifest_fetch_done()
+        stats.record(_("Manifests"), start, npkgs=npkgs)
         # Next, retrieve and store the content for each package.
         tracker.republish_set_goal(len(pkgs_to_get), get_bytes, send_bytes)
 
@@ -1799,129 +2185,143 @@ def transfer_pkgs(
             keep_compressed, hashes = dest_xport.get_transfer_info(
                 new_targ_pubs[pkgs_to_get[0].publisher]
             )
-        for nf in pkgs_to_get:
-            tracker.republish_start_pkg(nf)
-            # Processing republish.
-            nm = fmappings[nf]
-            pkgdir = xport_cfg.get_pkg_dir(nf)
-            mfile = xport.multi_file_ni(
-                src_pub, pkgdir, not keep_compressed, tracker
-            )
-            add_hashes_to_multi(nm, mfile)
-            if mfile:
-                download_start = True
-                mfile.wait_files()
-
-            if not republish:
-                # Nothing more to do for this package.
-                tracker.republish_end_pkg(nf)
-                continue
-
-            use_scheme = True
-            # Check whether to include scheme based on new
-            # manifest.
-            if not any(
-                a.name == "set" and str(a).find("pkg:/") >= 0
-                for a in nm.gen_actions()
-            ):
-                use_scheme = False
+        fetcher = ContentFetcher(
+            src_pub,
+            pkgs_to_get,
+            fmappings,
+            sizes,
+            keep_compressed,
+            tracker,
+            jobs,
+            limiter,
+            stats,
+        )
+        try:
+            for nf in pkgs_to_get:
+                tracker.republish_start_pkg(nf)
+                # Processing republish.
+                nm = fmappings[nf]
+                pkgdir = xport_cfg.get_pkg_dir(nf)
+                fetcher.get(nf)
+                start = time.time()
+
+                if not republish:
+                    # Nothing more to do for this package.
+                    if checkpoint:
+                        checkpoint.add(srcmappings[nf])
+                    tracker.republish_end_pkg(nf)
+                    continue
 
-            pkg_name = nf.get_fmri(include_scheme=use_scheme)
+                use_scheme = True
+                # Check whether to include scheme based on new
+                # manifest.
+                if not any(
+                    a.name == "set" and str(a).find("pkg:/") >= 0
+                    for a in nm.gen_actions()
+                ):
+                    use_scheme = False
+
+                pkg_name = nf.get_fmri(include_scheme=use_scheme)
+
+                # Use the new fmri for constructing a transaction id.
+                # This is needed so any previous failures for a package
+                # can be aborted.
+                trans_id = get_basename(nf)
+                try:
+                    t = trans.Transaction(
+                        target,
+                        pkg_name=pkg_name,
+                        trans_id=trans_id,
+                        xport=dest_xport,
+                        pub=new_targ_pubs[nf.publisher],
+                        progtrack=tracker,
+                    )
 
-            # Use the new fmri for constructing a transaction id.
-            # This is needed so any previous failures for a package
-            # can be aborted.
-            trans_id = get_basename(nf)
-            try:
-                t = trans.Transaction(
-                    target,
-                    pkg_name=pkg_name,
-                    trans_id=trans_id,
-                    xport=dest_xport,
-                    pub=new_targ_pubs[nf.publisher],
-                    progtrack=tracker,
-                )
+                    # Remove any previous failed attempt to
+                    # to republish this package.
+                    try:
+                        t.close(abandon=True)
+                    except:
+                        # It might not exist already.
+                        pass
+
+                    t.open()
+                    for a in nm.gen_actions():
+                        if a.name == "set" and a.attrs.get("name", "") in (
+                            "fmri",
+                            "pkg.fmri",
+                        ):
+                            # To be consistent with the
+                            # server, the fmri can't be
+                            # added to the manifest.
+                            continue
+
+                        fname = None
+                        fhash = None
+                        if a.has_payload:
+                            fhash = a.hash
+                            fname = os.path.join(pkgdir, fhash)
+
+                            a.data = lambda: open(fname, "rb")
+
+                        if fhash in hashes and fhash not in uploads:
+                            # If the payload will be
+                            # transferred and not have been
+                            # uploaded, upload it...
+                            t.add(a, exact=True, path=fname)
+                            uploads.add(fhash)
+                        else:
+                            # ...otherwise, just add the
+                            # action to the transaction.
+                            t.add(a, exact=True)
+
+                        if a.name == "signature" and not do_mog:
+                            # We always store content in the
+                            # repository by the least-
+                            # preferred hash.
+                            for fp in a.get_chain_certs(least_preferred=True):
+                                fname = os.path.join(pkgdir, fp)
+                                if keep_compressed:
+                                    t.add_file(fname, basename=fp)
+                                else:
+                                    t.add_file(fname)
+                    # Always defer catalog update.
+                    t.close(add_to_catalog=False)
+                except trans.TransactionError as e:
+                    abort(err=e)
 
-                # Remove any previous failed attempt to
-                # to republish this package.
+                # Dump data retrieved so far after each successful
+                # republish to conserve space.
                 try:
-                    t.close(abandon=True)
-                except:
-                    # It might not exist already.
-                    pass
-
-                t.open()
-                for a in nm.gen_actions():
-                    if a.name == "set" and a.attrs.get("name", "") in (
-                        "fmri",
-                        "pkg.fmri",
-                    ):
-                        # To be consistent with the
-                        # server, the fmri can't be
-                        # added to the manifest.
-                        continue
-
-                    fname = None
-                    fhash = None
-                    if a.has_payload:
-                        fhash = a.hash
-                        fname = os.path.join(pkgdir, fhash)
-
-                        a.data = lambda: open(fname, "rb")
-
-                    if fhash in hashes and fhash not in uploads:
-                        # If the payload will be
-                        # transferred and not have been
-                        # uploaded, upload it...
-                        t.add(a, exact=True, path=fname)
-                        uploads.add(fhash)
-                    else:
-                        # ...otherwise, just add the
-                        # action to the transaction.
-                        t.add(a, exact=True)
-
-                    if a.name == "signature" and not do_mog:
-                        # We always store content in the
-                        # repository by the least-
-                        # preferred hash.
-                        for fp in a.get_chain_certs(least_preferred=True):
-                            fname = os.path.join(pkgdir, fp)
-                            if keep_compressed:
-                                t.add_file(fname, basename=fp)
-                            else:
-                                t.add_file(fname)
-                # Always defer catalog update.
-                t.close(add_to_catalog=False)
-            except trans.TransactionError as e:
-                abort(err=e)
-
-            # Dump data retrieved so far after each successful
-            # republish to conserve space.
-            try:
-                shutil.rmtree(dest_xport_cfg.incoming_root)
-                shutil.rmtree(pkgdir)
-                if cache_dir in tmpdirs:
-                    # If cache_dir is listed in tmpdirs,
-                    # then it's safe to dump cache contents.
-                    # Otherwise, it's a user cache directory
-                    # and shouldn't be dumped.
-                    shutil.rmtree(cache_dir)
-                    misc.makedirs(cache_dir)
-            except EnvironmentError as e:
-                raise apx._convert_error(e)
-            misc.makedirs(dest_xport_cfg.incoming_root)
+                    shutil.rmtree(dest_xport_cfg.incoming_root)
+                    shutil.rmtree(pkgdir)
+                    if cache_dir in tmpdirs:
+                        # If cache_dir is listed in tmpdirs,
+                        # then it's safe to dump cache contents.
+                        # Otherwise, it's a user cache directory
+                        # and shouldn't be dumped.
+                        shutil.rmtree(cache_dir)
+                        misc.makedirs(cache_dir)
+                except EnvironmentError as e:
+                    raise apx._convert_error(e)
+                misc.makedirs(dest_xport_cfg.incoming_root)
 
-            processed += 1
-            tracker.republish_end_pkg(nf)
+                processed += 1
+                stats.record(_("Republish"), start, nbytes=sizes[nf])
+                if checkpoint:
+                    checkpoint.add(srcmappings[nf])
+                tracker.republish_end_pkg(nf)
+        finally:
+            fetcher.close()
 
         tracker.republish_done()
         tracker.reset()
 
-        if processed > 0:
+        if republish and (processed > 0 or resumed > 0):
             # If any packages were published, trigger an update of
             # the catalog.
-            total_processed += processed
             dest_xport.publish_refresh_packages(targ_pub)
+        total_processed += processed + resumed
 
         # Prevent further use.
         targ_pub = None
@@ -1932,6 +2332,12 @@ def transfer_pkgs(
 
     # Dump all temporary data.
     cleanup()
+    if checkpoint:
+        # Everything has now been transferred, unless this was a dry
+        # run, in which case the checkpoint is still needed.
+        checkpoint.close(remove=not (invalid_manifests or dry_run))
+    if verbose and not dry_run:
+        stats.display()
     if invalid_manifests:
         error(
             _("One or more packages could not be retrieved:\n\n{0}").format(
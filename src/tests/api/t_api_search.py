@@ -41,10 +41,12 @@ from urllib.request import urlopen
 import pkg.client.api as api
 import pkg.client.api_errors as api_errors
 import pkg.client.query_parser as query_parser
+import pkg.client.searchdb as searchdb
 import pkg.fmri as fmri
 import pkg.indexer as indexer
 import pkg.portable as portable
 import pkg.search_storage as ss
+from pkg.client.debugvalues import DebugValues
 from pkg.misc import force_str
 
 
@@ -935,6 +937,11 @@ close
             self._restore_dir_preserve_hash,
         ]
         self.make_misc_files(self.misc_files)
+        DebugValues.pop("no-search-db", None)
+
+    def tearDown(self):
+        DebugValues.pop("no-search-db", None)
+        pkg5unittest.SingleDepotTestCase.tearDown(self)
 
     def _check(self, proposed_answer, correct_answer):
         if correct_answer == proposed_answer:
@@ -1150,14 +1157,17 @@ close
         self, api_obj, query, test_value, return_actions
     ):
         search_func = api_obj.local_search
-        tmp = search_func(query)
+        # Slow search is only used if the search database can't be.
+        DebugValues["no-search-db"] = 1
         res = []
         ssu = False
         try:
-            for i in tmp:
+            for i in search_func(query):
                 res.append(i)
         except api_errors.SlowSearchUsed:
             ssu = True
+        finally:
+            DebugValues.pop("no-search-db", None)
         self.assertTrue(ssu)
         if return_actions:
             res = self._extract_action_from_res(res)
@@ -2185,6 +2195,70 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
 
         self._run_degraded_local_tests(api_obj)
 
+    def test_035_search_db(self):
+        """Check that the search database is maintained as packages
+        are installed and removed, and used instead of slow search when
+        the index is missing, out of date or inconsistent."""
+
+        durl = self.dc.get_depot_url()
+        api_obj = self.image_create(durl)
+
+        self._api_install(api_obj, ["example_pkg@1.0"])
+        db_path = os.path.join(
+            self.img_path(), "var", "pkg", "cache", searchdb.DB_BASENAME
+        )
+        self.assertTrue(os.path.exists(db_path))
+
+        index_dir = os.path.join(
+            self.img_path(), "var", "pkg", "cache", "index"
+        )
+        shutil.rmtree(index_dir)
+
+        # Searches which would otherwise use slow search don't raise
+        # SlowSearchUsed.
+        self._run_local_tests(api_obj)
+        self._search_op(api_obj, False, "e* AND *path", self.res_local_path)
+        self._search_op(api_obj, False, "OpEnS*", self.res_local_openssl)
+        self._search_op(api_obj, False, "FOOO", self.res_local_foo, True)
+        self._search_op(api_obj, False, "fooo", set(), True)
+
+        # The database is updated while there's no index.
+        self._api_uninstall(api_obj, ["example_pkg"])
+        self._run_local_empty_tests(api_obj)
+        self._api_install(api_obj, ["example_pkg"])
+        self._run_local_tests(api_obj)
+
+        # An out of date index isn't reported.
+        api_obj.rebuild_search_index()
+        index_dir_tmp = index_dir + "TMP"
+        shutil.copytree(index_dir, index_dir_tmp)
+        self._api_uninstall(api_obj, ["example_pkg"])
+        self._restore_dir(index_dir, index_dir_tmp)
+        self._run_local_empty_tests(api_obj)
+
+        # Search doesn't update the database, so if it's out of date
+        # as well, the index is reported.
+        api_obj.rebuild_search_index()
+        self._api_install(api_obj, ["example_pkg"], update_index=False)
+        self.assertRaises(
+            api_errors.IncorrectIndexFileHash,
+            self._search_op,
+            api_obj,
+            False,
+            "example_pkg",
+            set(),
+        )
+
+        # Nor is an inconsistent index, once both are up to date.
+        api_obj.rebuild_search_index()
+        for d in query_parser.TermQuery._get_gdd(index_dir).values():
+            orig_path = os.path.join(index_dir, d.get_file_name())
+            portable.rename(orig_path, orig_path + "TMP")
+            self._search_op(
+                api_obj, False, "exam:::example_pkg", self.res_local_pkg
+            )
+            portable.rename(orig_path + "TMP", orig_path)
+
     def test_040_repeated_install_uninstall(self):
         """Install and uninstall a package. Checking search both
         after each change to the image."""
@@ -2221,6 +2295,8 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
     def test_060_missing_files(self):
         """Test to check for stack trace when files missing.
         Bug 2753"""
+        # The search database would be used instead of the index.
+        DebugValues["no-search-db"] = 1
         durl = self.dc.get_depot_url()
         api_obj = self.image_create(durl)
 
@@ -2250,7 +2326,9 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
             if first:
                 # Run the shell version once to check that no
                 # stack trace happens.
-                self.pkg("search -l 'exam:::example_pkg'", exit=1)
+                self.pkg(
+                    "-D no-search-db=1 search -l 'exam:::example_pkg'", exit=1
+                )
                 first = False
             portable.rename(dest_path, orig_path)
             self._search_op(
@@ -2260,6 +2338,8 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
     def test_070_mismatched_versions(self):
         """Test to check for stack trace when files missing.
         Bug 2753"""
+        # The search database would be used instead of the index.
+        DebugValues["no-search-db"] = 1
         durl = self.dc.get_depot_url()
         api_obj = self.image_create(durl)
         self._api_install(api_obj, ["example_pkg@1.0"])
@@ -2290,7 +2370,9 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
             if first:
                 # Run the shell version once to check that no
                 # stack trace happens.
-                self.pkg("search -l 'exam:::example_pkg'", exit=1)
+                self.pkg(
+                    "-D no-search-db=1 search -l 'exam:::example_pkg'", exit=1
+                )
                 first = False
             portable.rename(dest_path, orig_path)
             self._search_op(api_obj, False, "example_pkg", self.res_local_pkg)
@@ -2329,7 +2411,7 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
             set(),
         )
         # Run the shell version of the test to check for a stack trace.
-        self.pkg("search -l 'exam:::example_pkg'", exit=1)
+        self.pkg("-D no-search-db=1 search -l 'exam:::example_pkg'", exit=1)
         portable.rename(dest_path, ffh_path)
         self._search_op(api_obj, False, "example_pkg", self.res_local_pkg)
         self._overwrite_hash(ffh_path)
@@ -2472,6 +2554,8 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
 
     def test_bug_2863(self):
         """Check that disabling indexing works as expected"""
+        # The search database would be used instead of the index.
+        DebugValues["no-search-db"] = 1
         durl = self.dc.get_depot_url()
         api_obj = self.image_create(durl)
 
@@ -2851,6 +2935,50 @@ class TestApiSearchBasicsP(TestApiSearchBasics):
         self.assertEqual(new_tok_len, tok_len + 1)
         self.assertEqual(new_main_len, main_len + 1)
 
+    def test_token_offset_upgrade(self):
+        """Check that an index using the older, unsorted token byte
+        offset file is converted to the sorted format and can still be
+        searched."""
+
+        durl = self.dc.get_depot_url()
+        self.pkgsend_bulk(durl, self.example_pkg10)
+        api_obj = self.image_create(durl)
+
+        ind_dir = self._get_repo_index_dir()
+        new_file = os.path.join(ind_dir, ss.BYTE_OFFSET_FILE)
+        old_file = os.path.join(ind_dir, ss.BYTE_OFFSET_FILE_V1)
+
+        # The sorted file is searched in place.
+        toks = ss.IndexStoreTokenOffsets(ss.BYTE_OFFSET_FILE)
+        version = toks.open(ind_dir)
+        toks.read_dict_file()
+        toks.close_file_handle()
+        keys = toks.get_keys()
+        self.assertEqual(keys, sorted(keys, key=lambda k: (k.lower(), k)))
+        self.assertTrue(toks.has_entity("example_path"))
+        self.assertEqual(
+            toks.get_matching_ids("EXAMPLE_P*", False),
+            set([toks.get_id("example_path")]),
+        )
+
+        # Replace it with the older format.
+        self.dc.stop()
+        old = ss.IndexStoreDictMutable(ss.BYTE_OFFSET_FILE_V1)
+        old.open_out_file(ind_dir, version)
+        for k in sorted(keys):
+            old.write_entity(k, toks.get_id(k))
+        old.close_file_handle()
+        portable.remove(new_file)
+
+        ind = indexer.Indexer(ind_dir, None, None)
+        self.assertTrue(ind.check_index_existence())
+        self.assertTrue(os.path.exists(new_file))
+        self.assertFalse(os.path.exists(old_file))
+        self.dc.start()
+
+        self._search_op(api_obj, True, "example_path", self.res_remote_path)
+        self._search_op(api_obj, True, "example*", self.res_remote_wildcard)
+
     def test_bug_983(self):
         """Test for known bug 983."""
         durl = self.dc.get_depot_url()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+
+if __name__ == "__main__":
+    testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.digest as digest
+import pkg.misc as misc
+import pkg.server.attrcache as attrcache
+import pkg.server.repository as sr
+
+
+class TestCompressedAttrCache(pkg5unittest.Pkg5TestCase):
+    """Tests for the repository compressed-content attribute cache."""
+
+    def setUp(self):
+        pkg5unittest.Pkg5TestCase.setUp(self)
+        self.dbpath = os.path.join(
+            self.test_root, "cache", attrcache.CACHE_BASENAME
+        )
+        self.fpath = os.path.join(self.test_root, "file")
+        with open(self.fpath, "w") as f:
+            f.write("content")
+
+    def test_get_add(self):
+        """Entries persist, are bounded in memory and are only returned
+        while the stored file is unchanged."""
+
+        ac = attrcache.CompressedAttrCache(self.dbpath, size=1)
+        st = os.stat(self.fpath)
+        self.assertEqual(ac.get("abc", st), None)
+
+        ac.add("abc", st, 10, {"chash": "123"})
+        ac.add("def", st, 20, {"chash": "456"})
+        self.assertEqual(ac.get("abc", st), ("10", {"chash": "123"}))
+        self.assertEqual(ac.get("def", st), ("20", {"chash": "456"}))
+        ac.close()
+
+        ac = attrcache.CompressedAttrCache(self.dbpath)
+        self.assertEqual(ac.get("abc", st), ("10", {"chash": "123"}))
+
+        with open(self.fpath, "a") as f:
+            f.write("more")
+        self.assertEqual(ac.get("abc", os.stat(self.fpath)), None)
+
+        ac.discard(["abc"])
+        self.assertEqual(ac.get("abc", st), None)
+        self.assertEqual(ac.get("def", st), ("20", {"chash": "456"}))
+        ac.close()
+
+        # A read-only cache uses, but doesn't change, the database.
+        ac = attrcache.CompressedAttrCache(self.dbpath, read_only=True)
+        ac.add("ghi", st, 30, {"chash": "789"})
+        self.assertEqual(ac.get("ghi", st), ("30", {"chash": "789"}))
+        self.assertEqual(ac.get("def", st), ("20", {"chash": "456"}))
+        ac.close()
+        ac = attrcache.CompressedAttrCache(self.dbpath)
+        self.assertEqual(ac.get("ghi", st), None)
+        ac.close()
+
+    def test_repository(self):
+        """Attributes returned by the repository match those computed
+        directly from the stored file, both when computed lazily and
+        when recorded at publication time."""
+
+        repo_path = os.path.join(self.test_root, "repo")
+        repo = self.create_repo(
+            repo_path, properties={"publisher": {"prefix": "test"}}
+        )
+
+        hashes, data = misc.get_data_digest(
+            self.fpath,
+            return_content=True,
+            hash_attrs=digest.DEFAULT_HASH_ATTRS,
+            hash_algs=digest.HASH_ALGS,
+        )
+        fhash = hashes[digest.get_least_preferred_hash(None)[0]]
+
+        t_id = repo.open(None, "pkg://test/foo@1.0")
+        repo.add_file(t_id, self.fpath, size=os.stat(self.fpath).st_size)
+        repo.close(t_id)
+
+        rstore = repo.get_pub_rstore("test")
+        dbpath = os.path.join(rstore.root, attrcache.CACHE_BASENAME)
+        self.assertTrue(os.path.exists(dbpath))
+
+        fpath, csize, chashes = repo.compressed_attrs(fhash)
+        self.assertEqual(
+            (csize, chashes),
+            misc.compute_compressed_attrs(fhash, file_path=fpath),
+        )
+
+        os.unlink(dbpath)
+        repo = sr.Repository(root=repo_path)
+        self.assertEqual(
+            repo.compressed_attrs(fhash, pub="test"),
+            (fpath, csize, chashes),
+        )
+        self.assertTrue(os.path.exists(dbpath))
+
+        self.assertRaises(
+            sr.RepositoryFileNotFoundError, repo.compressed_attrs, "missing"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# Vim hints
+# vim:ts=4:sw=4:et:fdm=marker
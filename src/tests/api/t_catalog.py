@@ -1180,6 +1180,59 @@ class TestCatalog(pkg5unittest.Pkg5TestCase):
                 fname.startswith("catalog.") or fname.startswith("update.")
             )
 
+    def test_11_indexed(self):
+        """Verify that a read-only catalog provides the same data as one
+        that loads its parts, without loading them, and that the part
+        indexes it uses are kept current."""
+
+        cpath = self.create_test_dir("test-11")
+        nc = catalog.Catalog(meta_root=cpath)
+        for f in self.c.fmris():
+            nc.add_package(f, manifest=self.__gen_manifest(f))
+        nc.save()
+
+        def contents(cat):
+            return (
+                list(cat.fmris(ordered=True)),
+                list(cat.fmris(last=True)),
+                list(
+                    cat.entries(
+                        info_needed=[cat.DEPENDENCY, cat.SUMMARY],
+                        locales=["C", "th"],
+                    )
+                ),
+                sorted(cat.names()),
+                list(cat.get_package_counts_by_pub()),
+            )
+
+        expected = contents(catalog.Catalog(meta_root=cpath))
+
+        # The indexes are created on first use and then reused.
+        for i in range(2):
+            rc = catalog.Catalog(meta_root=cpath, read_only=True)
+            self.assertEqual(contents(rc), expected)
+            for name in rc.parts:
+                part = rc.get_part(name)
+                self.assertFalse(part.loaded)
+                self.assertTrue(os.path.exists(part.pathname + ".idx"))
+
+        # Any change to a part causes its index to be rebuilt.
+        f = fmri.PkgFmri(
+            "pkg://opensolaris.org/" "new@1.0,5.11-1:20000101T120000Z"
+        )
+        nc.add_package(f, manifest=self.__gen_manifest(f))
+        nc.save()
+        rc = catalog.Catalog(meta_root=cpath, read_only=True)
+        self.assertTrue(f in list(rc.fmris()))
+        self.assertEqual(
+            contents(rc), contents(catalog.Catalog(meta_root=cpath))
+        )
+
+        # Destroying the catalog also removes the indexes.
+        nc.destroy()
+        for fname in os.listdir(cpath):
+            self.assertFalse(fname.endswith(".idx"))
+
     def test_legacy_description(self):
         """Test that gen_packages does not traceback when a package
         uses the legacy style of declaring package description metadata."""
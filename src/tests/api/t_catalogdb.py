@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+
+if __name__ == "__main__":
+    testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.catalog as catalog
+import pkg.client.api_errors as apx
+import pkg.fmri as fmri
+import pkg.server.catalogdb as catalogdb
+import pkg.server.repository as sr
+
+
+class TestCatalogDB(pkg5unittest.Pkg5TestCase):
+    """Tests for the repository catalog database."""
+
+    def setUp(self):
+        pkg5unittest.Pkg5TestCase.setUp(self)
+        self.dbpath = os.path.join(
+            self.test_root, "store", catalogdb.DB_BASENAME
+        )
+        self.fmris = [
+            fmri.PkgFmri(s)
+            for s in (
+                "pkg://test/network/ping@1.0,5.11-0.1:20200101T000000Z",
+                "pkg://test/network/ping@1.1,5.11-0.1:20200101T000000Z",
+                "pkg://test/foo/ping@1.0,5.11-0.1:20200101T000000Z",
+                "pkg://test/zfs-extras@1.0,5.11-0.1:20200101T000000Z",
+            )
+        ]
+
+    def test_record_query(self):
+        """Recorded packages can be queried and matched as catalog
+        entries can, and pending operations are kept until cleared."""
+
+        db = catalogdb.CatalogDB(self.dbpath)
+        self.assertTrue(db.writable)
+        self.assertEqual(db.stamp, None)
+
+        db.populate(self.fmris[:3], "1")
+        self.assertEqual(db.stamp, "1")
+        self.assertFalse(db.has_pending())
+        db.add(self.fmris[3])
+        db.add(self.fmris[0], replace=True)
+        self.assertEqual(
+            [(str(f), r) for seq, f, r in db.pending()],
+            [(str(self.fmris[3]), False), (str(self.fmris[0]), True)],
+        )
+        for f in self.fmris:
+            self.assertTrue(db.has_package(f))
+        self.assertEqual(
+            db.names(),
+            set(["network/ping", "foo/ping", "zfs-extras"]),
+        )
+        self.assertEqual(
+            [str(v) for v, entries in db.entries_by_version("network/ping")],
+            [str(self.fmris[0].version), str(self.fmris[1].version)],
+        )
+
+        # Matching gives the same results as for a catalog.
+        cat = catalog.Catalog()
+        for f in self.fmris:
+            cat.add_package(f)
+        for pats in (["zfs*"], ["network/ping@latest"], ["pkg:/foo/ping"]):
+            self.assertEqual(
+                catalog.Catalog.match_fmris(db, pats)[0],
+                cat.get_matching_fmris(pats)[0],
+            )
+        self.assertRaises(
+            apx.PackageMatchErrors, catalog.Catalog.match_fmris, db, ["ping"]
+        )
+        self.assertEqual(
+            sorted(catalog.Catalog.match_fmris(db, ["ping"], strict=False)[0]),
+            ["foo/ping", "network/ping"],
+        )
+
+        # Packages with pending operations survive repopulation.
+        db.populate(self.fmris[1:2], "2")
+        self.assertEqual(
+            sorted(str(f) for f in db.fmris()),
+            sorted(
+                str(f) for f in (self.fmris[0], self.fmris[1], self.fmris[3])
+            ),
+        )
+        seq = db.pending()[0][0]
+        db.clear_pending(seq, "3")
+        self.assertEqual(len(db.pending()), 1)
+        db.remove([self.fmris[3]], "4")
+        self.assertFalse(db.has_package(self.fmris[3]))
+        db.close()
+
+        # A read-only database can be queried but not changed.
+        db = catalogdb.CatalogDB(self.dbpath, read_only=True)
+        self.assertFalse(db.writable)
+        self.assertEqual(db.stamp, "4")
+        self.assertTrue(db.has_package(self.fmris[1]))
+        self.assertRaises(Exception, db.add, self.fmris[3])
+        db.close()
+
+    def __publish(self, repo, pfmri):
+        t_id = repo.open(None, pfmri)
+        repo.close(t_id)
+
+    def __catalog_names(self, rstore):
+        cat = catalog.Catalog(meta_root=rstore.catalog_root, read_only=True)
+        return sorted(f.pkg_name for f in cat.fmris())
+
+    def test_repository(self):
+        """Packages published with deferral are matched at once, and
+        only written to the catalog when it is requested."""
+
+        repo_path = os.path.join(self.test_root, "repo")
+        self.create_repo(
+            repo_path, properties={"publisher": {"prefix": "test"}}
+        )
+
+        repo = sr.Repository(root=repo_path, defer_catalog=True)
+        self.__publish(repo, "pkg://test/foo@1.0")
+        rstore = repo.get_pub_rstore("test")
+        self.assertTrue(
+            os.path.exists(os.path.join(rstore.root, catalogdb.DB_BASENAME))
+        )
+        self.assertEqual(self.__catalog_names(rstore), [])
+        matching, refs = repo.get_matching_fmris(["foo"])
+        self.assertEqual(list(matching), ["foo"])
+        self.assertTrue(rstore.has_package(list(refs)[0]))
+
+        # Other consumers see the package too.
+        ro_repo = sr.Repository(root=repo_path, read_only=True)
+        self.assertEqual(list(ro_repo.get_matching_fmris(["foo"])[0]), ["foo"])
+
+        # Requesting the catalog writes it.
+        repo.catalog_1("catalog.attrs")
+        self.assertEqual(self.__catalog_names(rstore), ["foo"])
+
+        # Without deferral, the catalog is written at once.
+        repo = sr.Repository(root=repo_path)
+        self.__publish(repo, "pkg://test/bar@1.0")
+        rstore = repo.get_pub_rstore("test")
+        self.assertEqual(self.__catalog_names(rstore), ["bar", "foo"])
+
+        # The database is reloaded if the catalog is changed by other
+        # means.
+        cat = catalog.Catalog(meta_root=rstore.catalog_root, log_updates=True)
+        for f in list(cat.fmris()):
+            if f.pkg_name == "foo":
+                cat.remove_package(f)
+        cat.save()
+        self.assertRaises(
+            apx.PackageMatchErrors, repo.get_matching_fmris, ["foo"]
+        )
+
+        # Rebuilding discards any pending operations.
+        repo = sr.Repository(root=repo_path, defer_catalog=True)
+        self.__publish(repo, "pkg://test/baz@1.0")
+        repo.rebuild()
+        rstore = repo.get_pub_rstore("test")
+        self.assertEqual(self.__catalog_names(rstore), ["bar", "baz", "foo"])
+        db = catalogdb.CatalogDB(
+            os.path.join(rstore.root, catalogdb.DB_BASENAME)
+        )
+        self.assertFalse(db.has_pending())
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# Vim hints
+# vim:ts=4:sw=4:et:fdm=marker
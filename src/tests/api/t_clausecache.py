@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+
+if __name__ == "__main__":
+    testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.client.clausecache as clausecache
+import pkg.fmri as fmri
+
+
+class TestClauseCache(pkg5unittest.Pkg5TestCase):
+    """Tests for the solver clause cache."""
+
+    def setUp(self):
+        pkg5unittest.Pkg5TestCase.setUp(self)
+        self.cdir = os.path.join(self.test_root, "solver")
+        self.fmris = [
+            fmri.PkgFmri("pkg://test/a@1.0,5.11-0:20260101T000000Z"),
+            fmri.PkgFmri("pkg://test/a@2.0,5.11-0:20260101T000000Z"),
+            fmri.PkgFmri("pkg://test/b@1.0,5.11-0:20260101T000000Z"),
+        ]
+        self.clauses = [[-1, -2], [-3, 1, 2], [-1, -3]]
+
+    def test_get_put(self):
+        """Clauses are only returned for the same context, the same
+        possible packages in the same order and the same avoided and
+        rejected packages."""
+
+        cc = clausecache.ClauseCache(self.cdir, ["20260101T000000Z", [], []])
+        self.assertEqual(cc.get(self.fmris), None)
+        cc.put(self.fmris, self.clauses, set(["a"]), True)
+        self.assertEqual(cc.get(self.fmris), (self.clauses, ["a"], True))
+        self.assertEqual(cc.get(self.fmris[:2]), None)
+        self.assertEqual(cc.get(list(reversed(self.fmris))), None)
+
+        cc = clausecache.ClauseCache(self.cdir, ["20260101T000000Z", [], []])
+        self.assertEqual(cc.get(self.fmris), (self.clauses, ["a"], True))
+        cc = clausecache.ClauseCache(self.cdir, ["20260102T000000Z", [], []])
+        self.assertEqual(cc.get(self.fmris), None)
+
+        # Group dependencies on avoided or rejected packages are
+        # ignored, so clauses are specific to those sets too.
+        cc = clausecache.ClauseCache(self.cdir, ["20260101T000000Z", [], []])
+        self.assertEqual(cc.get(self.fmris, avoids=set(["b"])), None)
+        self.assertEqual(cc.get(self.fmris, rejects=set(["b"])), None)
+        cc.put(self.fmris, [], set(), False, avoids=set(["b", "a"]))
+        self.assertEqual(
+            cc.get(self.fmris, avoids=set(["a", "b"])), ([], [], False)
+        )
+        self.assertEqual(cc.get(self.fmris), (self.clauses, ["a"], True))
+
+        # An empty clause set is still a valid entry.
+        cc = clausecache.ClauseCache(self.cdir, ["20260102T000000Z", [], []])
+        cc.put(self.fmris, [], set(), False)
+        self.assertEqual(cc.get(self.fmris), ([], [], False))
+
+    def test_prune_corrupt(self):
+        """Only the most recent entries are kept, and damaged entries
+        are ignored."""
+
+        for i in range(clausecache.MAX_ENTRIES + 2):
+            cc = clausecache.ClauseCache(self.cdir, [str(i), [], []])
+            cc.put(self.fmris, self.clauses, set(), False)
+        self.assertEqual(len(os.listdir(self.cdir)), clausecache.MAX_ENTRIES)
+        self.assertEqual(cc.get(self.fmris), (self.clauses, [], False))
+
+        cdir = os.path.join(self.test_root, "other")
+        cc = clausecache.ClauseCache(cdir, ["0", [], []])
+        cc.put(self.fmris, self.clauses, set(), False)
+        (path,) = [os.path.join(cdir, n) for n in os.listdir(cdir)]
+        with open(path, "rb+") as f:
+            f.truncate(os.path.getsize(path) - 2)
+        self.assertEqual(cc.get(self.fmris), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# Vim hints
+# vim:ts=4:sw=4:et:fdm=marker
@@ -286,6 +286,27 @@ class TestFMRI(pkg5unittest.Pkg5TestCase):
         a[self.n10] = 1
         self.assertTrue(a[self.n11] == 1)
 
+    def testintern(self):
+        """Verify that interned FMRIs are shared while referenced."""
+
+        s = "pkg://test/SUNWbcp@0.5.11,5.11-0.72:20070921T203926Z"
+        f1 = fmri.intern_fmri(s)
+        self.assertEqual(str(f1), s)
+        self.assertTrue(fmri.intern_fmri(s) is f1)
+        self.assertTrue(fmri.intern_fmri(fmri.PkgFmri(s)) is f1)
+
+        # An FMRI object is copied, so changing it later doesn't
+        # affect the interned FMRI.
+        f2 = fmri.PkgFmri("pkg://test/SUNWbcp@0.5.12")
+        f3 = fmri.intern_fmri(f2)
+        self.assertTrue(f3 is not f2)
+        self.assertEqual(f3, f2)
+        fs = str(f2)
+        self.assertTrue(fmri.intern_fmri(fs) is f3)
+        f2.set_publisher("other")
+        self.assertEqual(str(f3), fs)
+        self.assertTrue(fmri.intern_fmri(fs) is f3)
+
     def testpartial(self):
         """Verify that supported operations on a partial FMRI
         function properly."""
@@ -25,6 +25,7 @@ import unittest
 
 import pkg.catalog as catalog
 import pkg.client.imagecatalog as imagecatalog
+import pkg.client.pkgdefs as pkgdefs
 import pkg.fmri
 from pkg.client.debugvalues import DebugValues
 
@@ -268,6 +269,13 @@ class TestImageCatalogImage(pkg5unittest.SingleDepotTestCase):
             add dir mode=0755 owner=root group=bin path=etc
             close """
 
+    amber30 = """
+            open amber@3.0,5.11-0
+            add set name=pkg.summary value="newest amber"
+            add set name=pkg.renamed value=true
+            add depend fmri=pkg:/bronze@1.0 type=require
+            close """
+
     def setUp(self):
         pkg5unittest.SingleDepotTestCase.setUp(self)
         self.pkgsend_bulk(
@@ -432,6 +440,63 @@ class TestImageCatalogImage(pkg5unittest.SingleDepotTestCase):
                     DebugValues.pop("no-image-state-db", None)
                 self.assertEqual(jsl, dbl, (ltype, kw))
 
+    def __snapshot(self, img):
+        """Return the content of the state database, less its
+        timestamps."""
+
+        db = imagecatalog.ImageCatalog(self.__db_path(img))
+        try:
+            entries = []
+            for t, entry, astrs in db.entry_actions((DEP, SUMM)):
+                mdata = dict(entry.get("metadata", {}))
+                states = sorted(mdata.pop("states", []))
+                entries.append((t, states, mdata, sorted(astrs)))
+            return sorted(entries), db.catalog_stamps()
+        finally:
+            db.close()
+
+    def test_04_incremental(self):
+        """Refreshing applies catalog changes to the database in place,
+        giving the same result as a full rebuild."""
+
+        api_inst = self.image_create(self.rurl)
+        self._api_install(api_inst, ["amber@1.0"])
+        img = api_inst.img
+        old_lm = img.get_publisher("test").catalog.last_modified
+        self.assertEqual(
+            self.__snapshot(img)[1],
+            {"test": catalog.datetime_to_basic_ts(old_lm)},
+        )
+
+        # A newer package is added and an installed one removed.
+        self.pkgsend_bulk(self.rurl, self.amber30)
+        self.pkgrepo("remove -s {0} bronze@1.0".format(self.rurl))
+        api_inst.refresh(immediate=True)
+        img = api_inst.img
+        self.assertEqual(img.get_publisher("test").catalog_updates[0], old_lm)
+        self.__assert_matches(img)
+        incremental = self.__snapshot(img)
+
+        states = dict((t[1:3], s) for t, s, m, a in incremental[0])
+        amber30 = [v for s, v in states if s == "amber" and v.startswith("3")]
+        self.assertEqual(len(amber30), 1)
+        self.assertTrue(
+            pkgdefs.PKG_STATE_RENAMED in states[("amber", amber30[0])]
+        )
+        for (stem, ver), s in states.items():
+            self.assertEqual(
+                pkgdefs.PKG_STATE_UPGRADABLE in s,
+                stem == "amber" and ver != amber30[0],
+                (stem, ver),
+            )
+        bronze = [s for (stem, ver), s in states.items() if stem == "bronze"]
+        self.assertEqual(len(bronze), 1)
+        self.assertTrue(pkgdefs.PKG_STATE_INSTALLED in bronze[0])
+        self.assertFalse(pkgdefs.PKG_STATE_KNOWN in bronze[0])
+
+        api_inst.refresh(immediate=True, full_refresh=True)
+        self.assertEqual(self.__snapshot(api_inst.img), incremental)
+
 
 if __name__ == "__main__":
     unittest.main()
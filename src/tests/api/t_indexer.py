@@ -23,14 +23,47 @@
 # Copyright (c) 2009, 2016, Oracle and/or its affiliates. All rights reserved.
 
 from . import testutils
+    def test_token_offsets_reread(self):
+        """Verify that reading the token offset file again using a copy
+        of the store, as is done when setting up a query, doesn't affect
+        searches still using the original."""
+
+        toks = ss.IndexStoreTokenOffsets(ss.BYTE_OFFSET_FILE)
+        toks.open_out_file(self.test_root, 0)
+        names = ["tok{0:03d}".format(i) for i in range(100)]
+        for i, name in enumerate(names):
+            toks.write_entity(name, i)
+        toks.close_file_handle()
+
+        orig = ss.IndexStoreTokenOffsets(ss.BYTE_OFFSET_FILE)
+        orig.open(self.test_root)
+        orig.read_dict_file()
+        orig.close_file_handle()
+        entries = orig._IndexStoreTokenOffsets__entries(orig._map)
+        self.assertEqual(next(entries), (names[0], 0))
+
+        new = copy.copy(orig)
+        new.open(self.test_root)
+        new.read_dict_file()
+        new.close_file_handle()
+
+        self.assertEqual(
+            list(entries), [(name, i) for i, name in enumerate(names)][1:]
+        )
+        self.assertEqual(orig.get_id(names[50]), 50)
+        self.assertEqual(new.get_keys(), names)
+
 
 if __name__ == "__main__":
     testutils.setup_environment("../../../proto")
 import pkg5unittest
 
+import copy
 import unittest
+import pkg.fmri as fmri
 import pkg.indexer as indexer
 import pkg.search_errors as se
+import pkg.search_storage as ss
 
 import os
 import sys
@@ -122,6 +155,77 @@ class TestIndexer(pkg5unittest.Pkg5TestCase):
                 len(open(os.path.join(ind._tmp_dir, file)).readlines()) <= 1
             )
 
+    def test_sharded_rebuild(self):
+        """Verify that an index built using worker processes is the
+        same as one built serially."""
+
+        mdir = os.path.join(self.test_root, "manifests")
+        os.mkdir(mdir)
+        fmris = []
+        for i in range(12):
+            pfmri = fmri.PkgFmri(
+                "pkg://test/pkg{0:d}@1.{1:d},5.11-0:20200101T000000Z".format(
+                    i % 5, i
+                )
+            )
+            with open(os.path.join(mdir, str(i)), "w") as fh:
+                fh.write(
+                    "set name=pkg.fmri value={0}\n"
+                    "set name=pkg.summary value='package {1:d} Summary'\n"
+                    "dir group=bin mode=0755 owner=root "
+                    "path=usr/share/dir{2:d}\n".format(pfmri, i, i % 3)
+                )
+            fmris.append(pfmri)
+        paths = dict(
+            (f, os.path.join(mdir, str(i))) for i, f in enumerate(fmris)
+        )
+
+        def build(workers):
+            index_dir = os.path.join(
+                self.test_root, "index.{0:d}".format(workers)
+            )
+            os.mkdir(index_dir)
+            ind = indexer.Indexer(index_dir, None, paths.get, workers=workers)
+            ind.rebuild_index_from_scratch(fmris)
+            return index_dir
+
+        orig_min = indexer.MIN_SHARDED_PKGS
+        indexer.MIN_SHARDED_PKGS = 1
+        try:
+            serial = build(1)
+            sharded = build(3)
+        finally:
+            indexer.MIN_SHARDED_PKGS = orig_min
+
+        def read_main_dict(index_dir):
+            # The order in which packages are listed for each token
+            # depends on how the temporary files were split.
+            res = {}
+            with open(os.path.join(index_dir, ss.MAIN_FILE)) as fh:
+                fh.readline()
+                for line in fh:
+                    tok, entries = ss.IndexStoreMainDict.parse_main_dict_line(
+                        line
+                    )
+                    res[tok] = sorted(
+                        (at, st, fv, p_id, offsets)
+                        for at, st_list in entries
+                        for st, fv_list in st_list
+                        for fv, p_list in fv_list
+                        for p_id, offsets in p_list
+                    )
+            return res
+
+        self.assertEqual(read_main_dict(serial), read_main_dict(sharded))
+        for name in (ss.MANIFEST_LIST, ss.FULL_FMRI_FILE):
+            with open(os.path.join(serial, name)) as fh:
+                expected = sorted(fh.readlines())
+            with open(os.path.join(sharded, name)) as fh:
+                self.assertEqual(expected, sorted(fh.readlines()))
+        self.assertEqual(
+            sorted(os.listdir(serial)), sorted(os.listdir(sharded))
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -584,6 +584,88 @@ dir owner=root path=fm group=bin mode=0755 facet.multi=true \\
         do_get_dirs()
         self.assertTrue(os.path.isfile(cfile_path))
 
+    def test_compiled_cache(self):
+        """Verify that actions retrieved from the compiled manifest cache
+        are identical to those parsed from the per-type caches, and that
+        the per-type caches are used if it is unusable."""
+
+        contents = """\
+                    set name=pkg.fmri value=pkg:/bar@1
+                    set name=variant.foo value=one value=two
+                    set name=pkg.description value="a \\"quoted\\" value"
+                    dir path=one group=sys owner=root variant.foo=one
+                    dir path="two words" group=sys owner=root variant.foo=two
+                    file 12345 path=a/b group=sys owner=root mode=0644 \\
+                        pkg.size=10 pkg.csize=5 chash=abc
+                    depend fmri=pkg:/a fmri=pkg:/b type=require-any
+                    depend fmri=pkg:/c type=require
+                """
+        m1 = manifest.FactoredManifest(
+            "bar@1", self.cache_dir, contents=contents
+        )
+        cpath = os.path.join(self.cache_dir, "manifest.compiled")
+        self.assertTrue(os.path.isfile(cpath))
+
+        def parsed(atype):
+            with open(os.path.join(self.cache_dir, "manifest." + atype)) as f:
+                return [actions.fromstr(l.rstrip()) for l in f]
+
+        def check(m):
+            for atype in ("set", "dir", "file", "depend"):
+                expected = parsed(atype)
+                acts = list(m.gen_actions_by_type(atype))
+                self.assertEqual(
+                    [str(a) for a in expected], [str(a) for a in acts]
+                )
+                self.assertEqual(
+                    [getattr(a, "hash", None) for a in expected],
+                    [getattr(a, "hash", None) for a in acts],
+                )
+                self.assertEqual(
+                    [a.attrs.get(a.key_attr) for a in expected],
+                    list(m.gen_key_attribute_value_by_type(atype)),
+                )
+            self.assertEqual(list(m.gen_actions_by_type("link")), [])
+            self.assertEqual(m["pkg.description"], 'a "quoted" value')
+
+        check(m1)
+        check(manifest.FactoredManifest("bar@1", self.cache_dir))
+
+        # Only included actions are returned.
+        v = variant.Variants({"variant.foo": "one"})
+        m1 = manifest.FactoredManifest(
+            "bar@1",
+            self.cache_dir,
+            excludes=[v.allow_action, lambda x, publisher: True],
+        )
+        self.assertEqual(
+            [a.attrs["path"] for a in m1.gen_actions_by_type("dir")], ["one"]
+        )
+        self.assertEqual(
+            list(m1.gen_key_attribute_value_by_type("dir")), ["one"]
+        )
+
+        # The compiled cache is only opened once for each manifest.
+        m2 = manifest.FactoredManifest("bar@1", self.cache_dir)
+        self.assertEqual(m2["pkg.fmri"], "pkg:/bar@1")
+        portable.rename(cpath, cpath + ".moved")
+        try:
+            check(m2)
+        finally:
+            portable.rename(cpath + ".moved", cpath)
+
+        # Strings are interned however they were first looked up.
+        with manifest._CompiledManifest(cpath) as cm:
+            keys = list(cm.gen_key_attribute_values("dir"))
+            for k, a in zip(keys, cm.gen_actions("dir")):
+                self.assertTrue(a.attrs["path"] is k)
+                self.assertTrue(k is sys.intern(k))
+
+        # A malformed compiled cache is ignored.
+        with open(cpath, "r+b") as f:
+            f.truncate(16)
+        check(manifest.FactoredManifest("bar@1", self.cache_dir))
+
     def test_clear_cache(self):
         """Verify that FactoredManifest.clear_cache() works as
         expected."""
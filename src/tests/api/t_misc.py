@@ -38,6 +38,8 @@ import stat
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import unittest
 
 import pkg.misc as misc
@@ -115,6 +117,66 @@ class TestMisc(pkg5unittest.Pkg5TestCase):
         libc = ctypes.CDLL("libc.so")
         self.assertEqual(psinfo.pr_zoneid, libc.getzoneid())
 
+    def test_bounded_executor(self):
+        """Verify that BoundedExecutor never has more than its bound
+        of work outstanding and that results are returned intact."""
+
+        lock = threading.Lock()
+        state = {"cur": 0, "max": 0}
+
+        def work(i):
+            with lock:
+                state["cur"] += 1
+                state["max"] = max(state["max"], state["cur"])
+            time.sleep(0.001)
+            with lock:
+                state["cur"] -= 1
+            return i * 2
+
+        with misc.BoundedExecutor(4, bound=6) as ex:
+            futures = [ex.submit(work, i) for i in range(100)]
+            self.assertEqual(
+                [f.result() for f in futures], [i * 2 for i in range(100)]
+            )
+        self.assertTrue(state["max"] <= 4)
+
+        fut = misc.BoundedExecutor.completed("done")
+        self.assertTrue(fut.done())
+        self.assertEqual(fut.result(), "done")
+
+        # Exceptions raised by the work are returned to the caller.
+        with misc.BoundedExecutor(2) as ex:
+            fut = ex.submit(int, "not a number")
+            self.assertRaises(ValueError, fut.result)
+
+    def test_gzip_compressor(self):
+        """Verify that GzipCompressor produces the same content and
+        attributes as compute_compressed_attrs."""
+
+        data = b"".join(
+            "line {0:d}\n".format(i).encode("utf-8") for i in range(100000)
+        )
+        tmpdir = tempfile.mkdtemp(dir=self.test_root)
+        expected = misc.compute_compressed_attrs(
+            "expected", data=data, size=len(data), compress_dir=tmpdir
+        )
+
+        cpath = os.path.join(tmpdir, "actual")
+        ofile = misc.GzipCompressor(cpath)
+        for i in range(0, len(data), 4096):
+            ofile.write(data[i : i + 4096])
+        self.assertEqual(ofile.close(), expected)
+        with (
+            open(cpath, "rb") as f1,
+            open(os.path.join(tmpdir, "expected"), "rb") as f2,
+        ):
+            self.assertEqual(f1.read(), f2.read())
+
+        # Without a path, only the attributes are computed.
+        ofile = misc.GzipCompressor(None)
+        ofile.write(data)
+        self.assertEqual(ofile.close(), expected)
+
 
 if __name__ == "__main__":
     unittest.main()
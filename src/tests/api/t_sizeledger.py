@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+
+if __name__ == "__main__":
+    testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.client.sizeledger as sizeledger
+import pkg.misc as misc
+
+
+class TestSizeLedger(pkg5unittest.Pkg5TestCase):
+    """Tests for the directory size ledger."""
+
+    def setUp(self):
+        pkg5unittest.Pkg5TestCase.setUp(self)
+        self.cdir = os.path.join(self.test_root, "cache")
+        self.sdir = os.path.join(self.test_root, "state")
+        os.makedirs(os.path.join(self.sdir, "sub"))
+        self.__write("a", 10)
+        self.__write("sub/b", 20)
+
+    def __write(self, name, size):
+        path = os.path.join(self.sdir, name)
+        tmp = path + ".new"
+        with open(tmp, "w") as f:
+            f.write("x" * size)
+        os.rename(tmp, path)
+
+    def test_get(self):
+        """Sizes are recorded, persist, and are found again once the
+        directory changes."""
+
+        sl = sizeledger.SizeLedger(self.cdir)
+        self.assertEqual(sl.get(self.sdir), 30)
+        self.assertTrue(os.path.exists(sl.pathname))
+
+        # A recorded size is used while the directory is unchanged,
+        # even by a new ledger.
+        sl = sizeledger.SizeLedger(self.cdir)
+        with open(os.path.join(self.sdir, "sub", "b"), "a") as f:
+            f.write("y" * 5)
+        self.assertEqual(sl.get(self.sdir), 30)
+
+        # Replacing a file at the top level is noticed.
+        self.__write("a", 15)
+        self.assertEqual(sl.get(self.sdir), 40)
+        self.assertEqual(sl.get(self.sdir), misc.get_dir_size(self.sdir))
+
+        # Old entries are reconciled with the directory.
+        with open(os.path.join(self.sdir, "sub", "b"), "a") as f:
+            f.write("y" * 5)
+        self.assertEqual(sl.get(self.sdir), 40)
+        sizeledger.RECONCILE_INTERVAL, interval = (
+            0,
+            sizeledger.RECONCILE_INTERVAL,
+        )
+        try:
+            self.assertEqual(sl.get(self.sdir), 45)
+        finally:
+            sizeledger.RECONCILE_INTERVAL = interval
+
+        self.assertEqual(sl.get(os.path.join(self.test_root, "none")), 0)
+
+    def test_record_adjust(self):
+        """Writers can record the size of a directory they have
+        changed, or the amount by which they changed it."""
+
+        sl = sizeledger.SizeLedger(self.cdir)
+        # Nothing is recorded for unknown directories.
+        sl.adjust(self.sdir, 100)
+        self.assertEqual(sl.get(self.sdir), 30)
+
+        # The adjusted size is used rather than walking the directory.
+        self.__write("a", 25)
+        sl.adjust(self.sdir, 14)
+        self.assertEqual(sl.get(self.sdir), 44)
+
+        with open(os.path.join(self.sdir, "sub", "b"), "w") as f:
+            f.write("z")
+        self.assertEqual(sl.record(self.sdir), 26)
+        sl = sizeledger.SizeLedger(self.cdir)
+        self.assertEqual(sl.get(self.sdir), 26)
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# Vim hints
+# vim:ts=4:sw=4:et:fdm=marker
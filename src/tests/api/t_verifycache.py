@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+#
+# This file and its contents are supplied under the terms of the
+# Common Development and Distribution License ("CDDL"), version 1.0.
+# You may only use this file in accordance with the terms of version
+# 1.0 of the CDDL.
+#
+# A full copy of the text of the CDDL should have accompanied this
+# source. A copy of the CDDL is also available via the Internet at
+# http://www.illumos.org/license/CDDL.
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+
+if __name__ == "__main__":
+    testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import sqlite3
+import unittest
+
+import pkg.client.verifycache as verifycache
+
+
+class TestVerifyCache(pkg5unittest.Pkg5TestCase):
+    """Tests for the stat-keyed verified-content cache."""
+
+    def setUp(self):
+        pkg5unittest.Pkg5TestCase.setUp(self)
+        self.cdir = os.path.join(self.test_root, "cache")
+        self.fpath = os.path.join(self.test_root, "file")
+        with open(self.fpath, "w") as f:
+            f.write("content")
+
+    def test_lookup_record(self):
+        """Records are only returned for matching stat signatures and
+        hashes, and only persist once flushed."""
+
+        vc = verifycache.VerifyCache(self.cdir)
+        st = os.lstat(self.fpath)
+        self.assertFalse(vc.lookup("file", st, "hash", "abc"))
+
+        vc.record("file", st, "hash", "abc", self.fpath)
+        # Not yet visible until written.
+        self.assertFalse(vc.lookup("file", st, "hash", "abc"))
+        vc.flush()
+        self.assertTrue(vc.lookup("file", st, "hash", "abc"))
+        self.assertFalse(vc.lookup("file", st, "hash", "def"))
+        self.assertFalse(vc.lookup("file", st, "pkg.content-hash", "abc"))
+        vc.close()
+
+        # Survives reopening.
+        vc = verifycache.VerifyCache(self.cdir)
+        self.assertTrue(vc.lookup("file", st, "hash", "abc"))
+
+        # Any change to the file invalidates the record.
+        with open(self.fpath, "a") as f:
+            f.write("more")
+        self.assertFalse(vc.lookup("file", os.lstat(self.fpath), "hash", "abc"))
+
+        # A file modified between the stat and the record is ignored.
+        vc.record("file", st, "hash", "abc", self.fpath)
+        vc.flush()
+        con = sqlite3.connect(vc.pathname)
+        self.assertEqual(
+            con.execute("SELECT COUNT(*) FROM verified").fetchone()[0], 1
+        )
+        con.close()
+        vc.close()
+
+    def test_invalidate(self):
+        """Invalidated paths are removed from the database and from any
+        records which have not yet been written."""
+
+        vc = verifycache.VerifyCache(self.cdir)
+        st = os.lstat(self.fpath)
+        vc.record("file", st, "hash", "abc", self.fpath)
+        vc.record("other", st, "hash", "abc", self.fpath)
+        vc.flush()
+        vc.record("pending", st, "hash", "abc", self.fpath)
+
+        vc.invalidate(["file", "pending", "unknown"])
+        vc.flush()
+        self.assertFalse(vc.lookup("file", st, "hash", "abc"))
+        self.assertFalse(vc.lookup("pending", st, "hash", "abc"))
+        self.assertTrue(vc.lookup("other", st, "hash", "abc"))
+
+        vc.clear()
+        self.assertFalse(os.path.exists(vc.pathname))
+        self.assertFalse(vc.lookup("other", st, "hash", "abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+# Vim hints
+# vim:ts=4:sw=4:et:fdm=marker
@@ -497,6 +497,16 @@ class TestVersion(pkg5unittest.Pkg5TestCase):
         self.v1.set_timestamp(d)
         self.assertTrue(self.v1.get_timestamp() == d)
 
+    def testversionsettimecmp(self):
+        """Verify that comparisons reflect a changed timestamp."""
+
+        v1 = version.Version("1.0-0.1:20050101T000000Z")
+        v2 = version.Version("1.0-0.1:20100101T000000Z")
+        self.assertTrue(v1 < v2)
+        v1.set_timestamp(datetime.datetime(2020, 1, 1, tzinfo=datetime.UTC))
+        self.assertTrue(v1 > v2)
+        self.assertTrue(v1 != v2)
+
     def testsplit(self):
         """Verify that split() works as expected."""
 
@@ -294,6 +294,19 @@ class TestPkgAvoid(pkg5unittest.SingleDepotTestCase):
         self.pkg("verify F@2.0")
         self.__assertAvoids(avoid=frozenset(["A", "B"]))
 
+    def test_group_avoid_same_catalog(self):
+        """Make sure avoiding a package is honoured by a plan made
+        against the same catalog as an earlier one, when the solver's
+        clauses may be reused."""
+        self.image_create(self.rurl)
+        self.pkg("install F@1.0")
+        self.pkg("update -n F@2.0")
+        self.pkg("avoid B")
+        self.pkg("update F@2.0")
+        self.pkg("verify F@2.0 A")
+        self.pkg("verify B", exit=1)
+        self.__assertAvoids(avoid=frozenset(["B"]))
+
     def test_group_obsolete_ok(self):
         """Make sure we're down w/ obsoletions, and that
         they are automatically placed on the avoid list"""
@@ -30,6 +30,7 @@ import pkg5unittest
 
 import unittest
 import os
+import shutil
 
 import pkg.fmri as pfmri
 
@@ -402,6 +403,36 @@ class TestPkgContentsPerTestRepo(pkg5unittest.SingleDepotTestCase):
         self.pkg("contents -r -m nopathA")
         self.assertTrue("signature" in self.output)
 
+    def test_contents_parent_manifest(self):
+        """Test that manifests retrieved by a parent image are reused
+        by the images it operates on, and only if they verify."""
+
+        self.image_create(self.rurl)
+        self.pkg("contents -r -m nopathA")
+        expected = self.output
+
+        # Move the cached manifests somewhere laid out like the image
+        # directory of a parent image.
+        imgdir = self.get_img_api_obj().img.imgdir
+        pimgdir = os.path.join(self.test_root, "parent")
+        os.makedirs(os.path.join(pimgdir, "publisher", "test"))
+        mdir = os.path.join("publisher", "test", "pkg")
+        shutil.move(os.path.join(imgdir, mdir), os.path.join(pimgdir, mdir))
+
+        self.dc.stop()
+        self.pkg("contents -r -m nopathA", exit=1)
+        env = {"PKG_PARENT_IMGDIR": pimgdir}
+        self.pkg("contents -r -m nopathA", env_arg=env)
+        self.assertEqualDiff(expected, self.output)
+
+        # A parent manifest which doesn't match the catalog is ignored.
+        shutil.rmtree(os.path.join(imgdir, mdir))
+        for dirpath, dirnames, filenames in os.walk(pimgdir):
+            for f in filenames:
+                with open(os.path.join(dirpath, f), "a") as fh:
+                    fh.write("set name=pkg.summary value=bogus\n")
+        self.pkg("contents -r -m nopathA", env_arg=env, exit=1)
+
 
 if __name__ == "__main__":
     unittest.main()
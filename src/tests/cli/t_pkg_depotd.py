@@ -31,19 +31,27 @@ if __name__ == "__main__":
 import pkg5unittest
 
 import datetime
+import gzip
 import http.client
+import io
 import os
 import shutil
 import sys
+import tarfile
 import tempfile
 import time
 import unittest
 
 from urllib.error import HTTPError, URLError
-from urllib.parse import quote, urljoin
-from urllib.request import urlopen
+from urllib.parse import quote, urlencode, urljoin
+from urllib.request import Request, urlopen
 
+import pkg.client.api_errors as api_errors
+import pkg.client.progress as progress
 import pkg.client.publisher as publisher
+import pkg.client.transport.engine as engine
+import pkg.client.transport.repo as trepo
+import pkg.client.transport.transport as transport
 import pkg.depotcontroller as dc
 import pkg.fmri as fmri
 import pkg.manifest as man
@@ -324,6 +332,120 @@ class TestPkgDepot(pkg5unittest.SingleDepotTestCase):
         self.assertEqual(info_dic["FMRI"], fmri_content)
         os.environ["LC_ALL"] = "en_US.UTF-8"
 
+    def test_filelist(self):
+        """Verify that the filelist operation returns the requested
+        files as a single tar stream, omitting unknown ones."""
+
+        depot_url = self.dc.get_depot_url()
+        verdata = misc.force_str(
+            urlopen(urljoin(depot_url, "versions/0/")).read()
+        )
+        self.assertTrue("filelist 0" in verdata.splitlines())
+
+        plist = self.pkgsend_bulk(depot_url, self.quux10)
+        content = misc.force_str(
+            urlopen(
+                urljoin(depot_url, "manifest/0/{0}".format(plist[0]))
+            ).read()
+        )
+        m = man.Manifest()
+        m.set_content(content=content)
+        hashes = sorted(a.hash for a in m.gen_actions_by_type("file"))
+        self.assertEqual(len(hashes), 2)
+
+        data = urlencode(
+            [
+                ("File-Name-{0:d}".format(i), h)
+                for i, h in enumerate(hashes + ["0" * 40])
+            ]
+        ).encode()
+        resp = urlopen(urljoin(depot_url, "filelist/0/"), data)
+        received = {}
+        with tarfile.open(mode="r|", fileobj=io.BytesIO(resp.read())) as tar:
+            for ti in tar:
+                received[ti.name] = tar.extractfile(ti).read()
+
+        self.assertEqual(sorted(received), hashes)
+        for h in hashes:
+            expected = urlopen(urljoin(depot_url, "file/0/{0}".format(h)))
+            self.assertEqual(received[h], expected.read())
+
+    def test_filelist_transport(self):
+        """Verify that the transport retrieves more files than fit in a
+        single filelist request using several of them, and that the
+        retrieval can be cancelled."""
+
+        depot_url = self.dc.get_depot_url()
+        plist = self.pkgsend_bulk(depot_url, self.quux10)
+        content = misc.force_str(
+            urlopen(
+                urljoin(depot_url, "manifest/0/{0}".format(plist[0]))
+            ).read()
+        )
+        m = man.Manifest()
+        m.set_content(content=content)
+        hashes = sorted(a.hash for a in m.gen_actions_by_type("file"))
+        nbytes = sum(
+            int(a.attrs["pkg.csize"]) for a in m.gen_actions_by_type("file")
+        )
+
+        def get_repo():
+            xport, xport_cfg = transport.setup_transport()
+            repouri = publisher.TransportRepoURI(depot_url)
+            rstats = xport.stats.get_repostats([repouri])[0][0]
+            repo = trepo.HTTPRepo(
+                rstats, repouri, engine.CurlTransportEngine(xport)
+            )
+            repo.add_version_data({"filelist": [0], "file": [0]})
+            post_url = repo._post_url
+
+            def count_post(*args, **kwargs):
+                posts.append(args[0])
+                return post_url(*args, **kwargs)
+
+            repo._post_url = count_post
+            return repo, rstats
+
+        posts = []
+        dest = tempfile.mkdtemp(dir=self.test_root)
+        old_max = trepo.FILELIST_MAX
+        trepo.FILELIST_MAX = 1
+        try:
+            repo, rstats = get_repo()
+            progtrack = progress.NullProgressTracker()
+            progtrack.check_cancelation = lambda: False
+            progtrack.download_set_goal(1, len(hashes), nbytes)
+            progtrack.download_start_pkg(plist[0])
+            errors = repo.get_files(hashes, dest, progtrack, 0)
+            self.assertEqual(errors, [])
+            self.assertEqual(sorted(os.listdir(dest)), hashes)
+            for h in hashes:
+                expected = urlopen(urljoin(depot_url, "file/0/{0}".format(h)))
+                with open(os.path.join(dest, h), "rb") as f:
+                    self.assertEqual(f.read(), expected.read())
+            # One filelist request was made per file.
+            self.assertEqual(len(posts), len(hashes))
+            self.assertEqual(rstats.saved_requests, 0)
+
+            shutil.rmtree(dest)
+            os.mkdir(dest)
+            del posts[:]
+            repo, rstats = get_repo()
+            progtrack.check_cancelation = lambda: True
+            self.assertRaises(
+                api_errors.CanceledException,
+                repo.get_files,
+                hashes,
+                dest,
+                progtrack,
+                0,
+            )
+            self.assertEqual(os.listdir(dest), [])
+            self.assertEqual(posts, [])
+        finally:
+            trepo.FILELIST_MAX = old_max
+            shutil.rmtree(dest)
+
     def test_bug_5707(self):
         """Testing depotcontroller.refresh()."""
 
@@ -516,6 +638,34 @@ class TestPkgDepot(pkg5unittest.SingleDepotTestCase):
             url = urljoin(depot_url, "{0}/catalog/1/catalog.attrs".format(p))
             urlopen(url)
 
+    def test_catalog_compression(self):
+        """Verify that compressed catalog files are sent to clients that
+        accept them and that their content is unchanged."""
+
+        depot_url = self.dc.get_depot_url()
+        self.pkgsend_bulk(depot_url, self.foo10)
+
+        def get(req_path, encoding=None):
+            req = Request(urljoin(depot_url, req_path))
+            if encoding:
+                req.add_header("Accept-Encoding", encoding)
+            res = urlopen(req)
+            return res.info(), res.read()
+
+        for name in ("catalog.attrs", "catalog.base.C"):
+            req_path = "catalog/1/{0}".format(name)
+            hdrs, plain = get(req_path)
+            self.assertEqual(hdrs.get("Content-Encoding"), None)
+            self.assertEqual(hdrs.get("Vary"), "Accept-Encoding")
+
+            hdrs, data = get(req_path, "deflate, gzip")
+            self.assertEqual(hdrs.get("Content-Encoding"), "gzip")
+            self.assertEqual(gzip.decompress(data), plain)
+
+            hdrs, data = get(req_path, "gzip;q=0")
+            self.assertEqual(hdrs.get("Content-Encoding"), None)
+            self.assertEqual(data, plain)
+
 
 class TestDepotController(pkg5unittest.CliTestCase):
     def setUp(self):
@@ -430,6 +430,59 @@ class TestPkgInstallBasics(pkg5unittest.SingleDepotTestCase):
         self.basics_2_helper("install")
         self.basics_2_helper("exact-install")
 
+    def test_install_concurrency(self):
+        """Verify that writing file content using multiple threads
+        results in the same image as doing so serially."""
+
+        conc10 = """
+            open conc@1.0,5.11-0
+            add dir mode=0755 owner=root group=bin path=/conc
+            add file tmp/cat mode=0555 owner=root group=bin path=/conc/cat timestamp="20080731T024051Z"
+            add file tmp/baz mode=0644 owner=root group=bin path=/conc/baz
+            add file tmp/libc.so.1 mode=0555 owner=root group=bin path=/conc/sub/libc.so.1
+            add file tmp/truck1 mode=0755 owner=root group=bin path=/conc/truck
+            add hardlink path=/conc/cat.link target=cat
+            close """
+
+        conc11 = """
+            open conc@1.1,5.11-0
+            add dir mode=0755 owner=root group=bin path=/conc
+            add file tmp/cat mode=0444 owner=root group=bin path=/conc/cat timestamp="20080731T024051Z"
+            add file tmp/baz mode=0644 owner=root group=bin path=/conc/baz
+            add file tmp/libc.so.1 mode=0555 owner=root group=bin path=/conc/sub/libc.so.1
+            add file tmp/truck2 mode=0755 owner=root group=bin path=/conc/truck
+            add file tmp/truck1 mode=0755 owner=root group=bin path=/conc/truck1
+            add hardlink path=/conc/cat.link target=cat
+            close """
+
+        self.pkgsend_bulk(self.rurl, (conc10, conc11))
+        self.image_create(self.rurl)
+
+        def check(expected):
+            self.pkg("verify")
+            found = []
+            root = os.path.join(self.get_img_path(), "conc")
+            for dirpath, dirnames, filenames in os.walk(root):
+                found.extend(
+                    os.path.relpath(os.path.join(dirpath, f), root)
+                    for f in filenames
+                )
+            self.assertEqual(sorted(found), sorted(expected))
+            st = os.stat(os.path.join(root, "cat"))
+            self.assertEqual(st.st_mtime, self.foo11_timestamp)
+
+        self.pkg("install conc@1.0", env_arg={"PKG_INSTALL_CONCURRENCY": "4"})
+        check(["baz", "cat", "cat.link", "sub/libc.so.1", "truck"])
+
+        self.pkg("set-property install-concurrency 0")
+        self.pkg("update conc@1.1")
+        check(["baz", "cat", "cat.link", "sub/libc.so.1", "truck", "truck1"])
+
+        # Repairs must also be unaffected.
+        os.unlink(os.path.join(self.get_img_path(), "conc", "truck"))
+        self.pkg("fix conc")
+        check(["baz", "cat", "cat.link", "sub/libc.so.1", "truck", "truck1"])
+
     def basics_2_helper(self, install_cmd):
         # This test needs to use the depot to be able to test the
         # download cache.
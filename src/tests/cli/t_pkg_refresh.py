@@ -797,6 +797,40 @@ class TestPkgRefreshMulti(pkg5unittest.ManyDepotTestCase):
         self.pkg("install foo@latest")
         self.pkg("list foo@1.2")
 
+    def test_concurrent_refresh(self):
+        """Verify that refreshing several publishers with several
+        origins checks each origin for catalog updates once, and leaves
+        no temporary directories behind."""
+
+        self.image_create(self.durl1, prefix="test1")
+        self.pkg("set-publisher -g {0} test1".format(self.durl3))
+        self.pkg("set-publisher -O {0} test2".format(self.durl2))
+        self.pkgsend_bulk(self.durl1, self.foo10)
+        self.pkgsend_bulk(self.durl3, self.foo11)
+        self.pkgsend_bulk(self.durl2, self.foo12)
+
+        def attrs_requests():
+            counts = []
+            for i in (1, 2, 3):
+                entries = self.get_op_entries(self.dcs[i], "catalog", "1")
+                counts.append(
+                    len([e for e in entries if e.endswith("/catalog.attrs")])
+                )
+            return counts
+
+        before = attrs_requests()
+        self.pkg("refresh --full")
+        self.assertEqual(attrs_requests(), [n + 1 for n in before])
+        self.pkg("list -af foo@1.0 foo@1.1 foo@1.2")
+
+        before = attrs_requests()
+        self.pkg("refresh")
+        self.assertEqual(attrs_requests(), [n + 1 for n in before])
+
+        pub_root = os.path.join(self.img_path(), "var", "pkg", "publisher")
+        for dirpath, dirnames, filenames in os.walk(pub_root):
+            self.assertEqual([d for d in dirnames if d.startswith("tmp")], [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -32,6 +32,7 @@ import pkg5unittest
 import os
 import pkg.portable as portable
 import shutil
+import sqlite3
 import subprocess
 import tempfile
 import time
@@ -537,6 +538,68 @@ sys::3:root,bin,adm
         self.output.index("etc/preserved")
         self.output.index("editable file has been changed")
 
+    def test_verify_concurrency(self):
+        """Verify that checking content with multiple threads reports
+        the same results, in the same order, as doing so serially."""
+
+        self.pkgsend_bulk(self.rurl, (self.bar10, self.bla10))
+        self.image_create(self.rurl)
+        self.pkg("install foo bar bla")
+
+        for fname in ("usr/bin/bobcat", "etc/bronze1", "opt/mybin/test_perm"):
+            with open(os.path.join(self.get_img_path(), fname), "w") as f:
+                f.write("Bobcats are here")
+
+        self.pkg_verify("-v", exit=1)
+        expected = self.output
+
+        self.pkg_verify("-v", env_arg={"PKG_VERIFY_CONCURRENCY": "4"}, exit=1)
+        self.assertEqualDiff(expected, self.output)
+
+        self.pkg("set-property verify-concurrency 0")
+        self.pkg_verify("-v", exit=1)
+        self.assertEqualDiff(expected, self.output)
+
+        # Repairs must also be unaffected.
+        self.pkg("fix")
+        self.pkg_verify("-v")
+
+    def test_verify_cache(self):
+        """Verify that content verification results are cached, that
+        --deep bypasses the cache and that package operations
+        invalidate the results for the files they deliver."""
+
+        self.image_create(self.rurl)
+        self.pkg("install foo")
+
+        cpath = os.path.join(self.img_path(), "var/pkg/cache/verify.sqlite")
+        self.pkg_verify("--deep")
+        self.assertFalse(os.path.exists(cpath))
+
+        def cached():
+            con = sqlite3.connect(cpath)
+            try:
+                return set(
+                    r[0] for r in con.execute("SELECT path FROM verified")
+                )
+            finally:
+                con.close()
+
+        self.pkg_verify("")
+        self.assertTrue("usr/bin/bobcat" in cached())
+
+        # A file whose content changed is still detected.
+        fpath = os.path.join(self.get_img_path(), "usr/bin/bobcat")
+        with open(fpath, "w") as f:
+            f.write("Bobcats are here")
+        self.pkg_verify("", exit=1)
+        self.pkg("fix")
+        self.pkg_verify("")
+        self.pkg_verify("--deep")
+
+        self.pkg("uninstall foo")
+        self.assertFalse("usr/bin/bobcat" in cached())
+
     def test_verify_changed_manifest(self):
         """Test that running package verify won't change the manifest of
         an installed package even if it has changed in the repository.
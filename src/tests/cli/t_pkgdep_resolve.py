@@ -3059,6 +3059,41 @@ file NOHASH path=usr/bin/baz group=sys mode=0600 owner=root
                 self.assertEqual(d.attrs["type"], "require")
                 self.assertEqual(d.attrs[dependencies.type_prefix], "hardlink")
 
+    def test_parallel_resolve(self):
+        """Test that resolving dependencies using worker processes gives
+        the same results as resolving them in a single process."""
+
+        paths = [
+            self.make_manifest(m)
+            for m in (
+                self.bug_18315_var_link1_manf,
+                self.bug_18315_var_link2_manf,
+                self.bug_18315_var_link3_manf,
+                self.bug_18315_var_link4_manf,
+                self.bug_18315_var_link5_manf,
+                self.bug_18315_var_depender_manf,
+                self.bug_18315_var_dependee_manf,
+            )
+        ]
+
+        def resolve(workers):
+            pkg_deps, errs, warnings, unused_fmris, external_deps = (
+                dependencies.resolve_deps(
+                    paths, self.api_obj, [], workers=workers
+                )
+            )
+            return (
+                [sorted(str(d) for d in pkg_deps[p]) for p in paths],
+                [str(e) for e in errs],
+                [str(w) for w in warnings],
+                unused_fmris,
+                external_deps,
+            )
+
+        expected = resolve(1)
+        self.assertTrue(expected[0][5])
+        self.assertEqualDiff(expected, resolve(2))
+
     def test_bug_18359(self):
         """Test that if package A needs another package to provide a
         link so one of its files can depend on the other, that A doesn't
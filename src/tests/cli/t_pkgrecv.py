@@ -1786,6 +1786,65 @@ file elftest.so.1 mode=0755 owner=root group=bin path=bin/true
         # publishers.
         self.pkgrecv(self.durl1, "-d {0} '*'".format(self.durl2))
 
+    def test_18_jobs_checkpoint(self):
+        """Verify that packages can be transferred concurrently, at a
+        limited rate, and that a transfer can be resumed using a
+        checkpoint file."""
+
+        npath = tempfile.mkdtemp(dir=self.test_root)
+        self.pkgsend(
+            "file://{0}".format(npath),
+            "create-repository --set-property publisher.prefix=test1",
+        )
+        cpath = os.path.join(self.test_root, "checkpoint")
+
+        # Pretend an earlier transfer of the first package completed.
+        with open(cpath, "w") as cfile:
+            cfile.write("{0}\n".format(self.published[0]))
+
+        # A dry run doesn't transfer anything, so leaves the checkpoint
+        # as it was.
+        self.pkgrecv(
+            self.durl1,
+            "-n --checkpoint {0} -d file://{1} '*'".format(cpath, npath),
+        )
+        with open(cpath) as cfile:
+            self.assertEqual(cfile.read(), "{0}\n".format(self.published[0]))
+
+        self.pkgrecv(
+            self.durl1,
+            "-v --jobs 4 --max-bandwidth 100M --checkpoint {0} "
+            "-d file://{1} '*'".format(cpath, npath),
+        )
+        self.assertTrue("Skipping 1 package" in self.output)
+        self.assertTrue("Transfer summary:" in self.output)
+        self.assertFalse(os.path.exists(cpath))
+
+        # Every package but the one recorded in the checkpoint should
+        # have been republished.
+        self.pkgrepo("list -F tsv -H -s {0}".format(npath))
+        self.assertFalse(self.published[0] in self.output)
+        for pfmri in self.published[1:5]:
+            self.assertTrue(pfmri in self.output)
+
+        # The new options can't be used with archives or clones.
+        self.pkgrecv(
+            self.durl1,
+            "--jobs 2 -a -d {0} '*'".format(
+                os.path.join(self.test_root, "archive.p5p")
+            ),
+            exit=2,
+        )
+        self.pkgrecv(
+            self.durl1, "--clone --jobs 2 -d {0}".format(npath), exit=2
+        )
+        self.pkgrecv(self.durl1, "--jobs 0 -d {0} '*'".format(npath), exit=2)
+        self.pkgrecv(
+            self.durl1,
+            "--max-bandwidth fast -d {0} '*'".format(npath),
+            exit=2,
+        )
+
 
 class TestPkgrecvHTTPS(pkg5unittest.HTTPSTestClass):
     example_pkg10 = """
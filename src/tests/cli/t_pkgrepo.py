@@ -39,11 +39,15 @@ import pkg.depotcontroller as dc
 import pkg.fmri as fmri
 import pkg.json_wrapper as json
 import pkg.misc as misc
+import pkg.indexer as indexer
 import pkg.pkggzip
+import pkg.server.contentdb as contentdb
 import pkg.server.repository as sr
+import pkg.server.verifydb as verifydb
 import pkg.client.api_errors as apx
 import pkg.p5p
 import shutil
+import sqlite3
 import subprocess
 import tempfile
 import time
@@ -3876,6 +3880,236 @@ publisher\tprefix\t""
 
         self.pkgrepo(f"contents -s {repo_path}", env_arg=env)
 
+    def test_43_gc(self):
+        """Verify that file references are counted as packages are
+        published and removed, that the gc subcommand removes files
+        which are no longer referenced, and that removing packages
+        updates the search index rather than discarding it."""
+
+        repo_path = os.path.join(self.test_root, "gc-repo")
+        self.create_repo(repo_path)
+        self.pkgrepo("set -s {0} publisher/prefix=test".format(repo_path))
+        published = self.pkgsend_bulk(
+            repo_path, (self.tree10, self.truck10, self.truck20)
+        )
+        self.pkgrepo("refresh -s {0}".format(repo_path))
+
+        repo = self.get_repo(repo_path)
+        rstore = repo.get_pub_rstore("test")
+        cdb = contentdb.ContentDB(
+            os.path.join(rstore.root, contentdb.DB_BASENAME)
+        )
+        self.assertTrue(cdb.populated)
+        self.assertTrue(cdb.stamp)
+        self.assertEqual(cdb.refcount(self.fhashes["tmp/empty"]), 3)
+        self.assertEqual(cdb.refcount(self.fhashes["tmp/truck2"]), 1)
+
+        # Verify graceful exit if invalid options are specified.
+        self.pkgrepo("gc", exit=2)
+        self.pkgrepo("gc -s {0} extra".format(repo_path), exit=2)
+        self.pkgrepo("gc -s {0} -p nosuchpub".format(repo_path), exit=1)
+
+        # Nothing is removed while all files are referenced.
+        self.pkgrepo("gc -s {0}".format(repo_path))
+        for h in self.fhashes.values():
+            repo.file(h)
+
+        # Removing a package only removes the files it alone
+        # referenced, and the remaining packages stay indexed.
+        self.pkgrepo("remove -s {0} truck@2.0".format(repo_path))
+        self.assertEqual(cdb.refcount(self.fhashes["tmp/empty"]), 2)
+        self.assertRaises(
+            sr.RepositoryFileNotFoundError,
+            repo.file,
+            self.fhashes["tmp/truck2"],
+        )
+        self.assertTrue(os.path.exists(rstore.index_root))
+        self.assertEqual(
+            indexer.Indexer.check_for_updates(
+                rstore.index_root, repo.get_catalog(pub="test")
+            ),
+            set(),
+        )
+
+        # If a manifest is removed by other means, gc finds the files
+        # which are no longer referenced.
+        os.unlink(rstore.manifest(fmri.PkgFmri(published[1])))
+        self.pkgrepo("gc -s {0} -p test".format(repo_path))
+        repo.file(self.fhashes["tmp/empty"])
+        repo.file(self.fhashes["tmp/truck1"])
+        self.assertEqual(cdb.refcount(self.fhashes["tmp/empty"]), 1)
+
+        self.pkgrepo("remove -s {0} tree".format(repo_path))
+        self.pkgrepo("gc -s {0}".format(repo_path))
+        self.assertEqual(os.listdir(rstore.file_root), [])
+        self.assertEqual(cdb.unreferenced(), [])
+        cdb.close()
+
+        # A corrupt content database is recreated.
+        self.pkgsend_bulk(repo_path, (self.tree10, self.truck20))
+        with open(cdb.pathname, "w") as f:
+            f.write("not a database")
+        self.pkgrepo("remove -s {0} truck@2.0".format(repo_path))
+        repo.file(self.fhashes["tmp/empty"])
+        repo.file(self.fhashes["tmp/truck1"])
+        self.assertRaises(
+            sr.RepositoryFileNotFoundError,
+            repo.file,
+            self.fhashes["tmp/truck2"],
+        )
+        self.assertTrue(cdb.populated)
+        self.assertEqual(cdb.refcount(self.fhashes["tmp/empty"]), 1)
+        cdb.close()
+
+        # If the content database can't be used, removing packages
+        # reads every other manifest instead, and gc reads every
+        # manifest to find the files which are no longer referenced.
+        os.unlink(cdb.pathname)
+        os.mkdir(cdb.pathname)
+        self.pkgsend_bulk(repo_path, self.truck20)
+        self.pkgrepo("remove -s {0} truck@2.0".format(repo_path))
+        repo.file(self.fhashes["tmp/empty"])
+        repo.file(self.fhashes["tmp/truck1"])
+        self.assertRaises(
+            sr.RepositoryFileNotFoundError,
+            repo.file,
+            self.fhashes["tmp/truck2"],
+        )
+
+        published = self.pkgsend_bulk(repo_path, self.truck20)
+        os.unlink(rstore.manifest(fmri.PkgFmri(published[0])))
+        self.pkgrepo("gc -s {0}".format(repo_path))
+        repo.file(self.fhashes["tmp/empty"])
+        repo.file(self.fhashes["tmp/truck1"])
+        self.assertRaises(
+            sr.RepositoryFileNotFoundError,
+            repo.file,
+            self.fhashes["tmp/truck2"],
+        )
+
+    def test_44_verify_resume(self):
+        """Verify that files found to be intact are recorded, that they
+        can be skipped by later verifications if unchanged, and that an
+        interrupted verification can be resumed."""
+
+        repo_path = self.dc.get_repodir()
+        fmris = self.pkgsend_bulk(repo_path, (self.tree10, self.truck10))
+
+        # Files shared by several packages are only verified once, but
+        # errors are still reported for each package.
+        self.pkgrepo("-s {0} verify".format(repo_path), exit=0)
+        bad_path = self.__inject_badhash("tmp/truck1")
+        self.pkgrepo(
+            "-s {0} verify".format(repo_path),
+            env_arg={"PKG_VERIFY_WORKERS": "1"},
+            exit=1,
+        )
+        self.assertEqual(self.output.count("ERROR: Invalid file hash"), 2)
+        for f in fmris:
+            self.assertTrue(f in self.output)
+        first = self.output
+
+        # Errors are reported in the same order each time, whether or
+        # not worker processes are used.
+        self.pkgrepo(
+            "-s {0} verify".format(repo_path),
+            env_arg={
+                "PKG_VERIFY_WORKERS": "2",
+                "PKG_VERIFY_MIN_PARALLEL": "0",
+            },
+            exit=1,
+        )
+        self.assertEqualDiff(first, self.output)
+        self.pkgrepo("-s {0} verify".format(repo_path), exit=1)
+        self.assertEqualDiff(first, self.output)
+
+        # A damaged file is not recorded, so it is found even when
+        # skipping unchanged files.
+        self.pkgrepo("-s {0} verify --skip-unchanged".format(repo_path), exit=1)
+        self.assertTrue(bad_path in self.output)
+
+        rstore = self.get_repo(repo_path).get_pub_rstore("test")
+        db_path = os.path.join(rstore.root, verifydb.DB_BASENAME)
+        fname = self.fhashes["tmp/empty"]
+        con = sqlite3.connect(db_path)
+        rows = con.execute(
+            "SELECT name, hash FROM files WHERE name IN (?, ?)",
+            (fname, self.fhashes["tmp/truck1"]),
+        ).fetchall()
+        con.close()
+        self.assertEqual([r[0] for r in rows], [fname])
+        fhash = rows[0][1]
+
+        # Simulate damage which leaves the stat signature of a file
+        # unchanged; it is only found by a full verification.
+        vdb = verifydb.VerifyDB(db_path)
+        self.__repair_badhash("tmp/truck1")
+        bad_path = self.__inject_badhash("tmp/empty")
+        vdb.record([(fname, fhash, verifydb.file_sig(os.stat(bad_path)))])
+        self.pkgrepo("-s {0} verify --skip-unchanged".format(repo_path))
+        self.pkgrepo("-s {0} verify --resume".format(repo_path), exit=1)
+        self.assertTrue(bad_path in self.output)
+
+        # Interrupt a verification after the damaged file was recorded
+        # as intact; resuming it skips the file, but once it has been
+        # completed, another is started.
+        self.assertFalse(vdb.begin())
+        vdb.record([(fname, fhash, verifydb.file_sig(os.stat(bad_path)))])
+        vdb.close()
+        self.pkgrepo("-s {0} verify --resume".format(repo_path))
+        self.pkgrepo("-s {0} verify --resume".format(repo_path), exit=1)
+        self.assertTrue(bad_path in self.output)
+
+        self.pkgrepo("-s {0} verify --resume extra".format(repo_path), exit=2)
+        self.pkgrepo(
+            "-s {0} verify --skip-unchanged=1".format(repo_path), exit=2
+        )
+
+    def test_45_search_cache(self):
+        """Verify that search results are cached until the search index
+        is updated, and that the cache statistics are reported."""
+
+        repo_path = self.dc.get_repodir()
+        plist = self.pkgsend_bulk(repo_path, (self.amber10, self.tree10))
+        self.pkgrepo("refresh -s {0}".format(repo_path))
+        self.wait_repo(repo_path)
+
+        def search(repo, text):
+            query = Query(text, False, Query.RETURN_PACKAGES, None, None)
+            return sorted(
+                str(e[2]) for e in [r for r in repo.search([query])][0]
+            )
+
+        def cache_status(repo):
+            status = repo.get_status()["repository"]["publishers"]["test"]
+            return status["search-cache"]
+
+        repo = self.get_repo(repo_path, read_only=True)
+        self.assertEqualDiff([plist[1]], search(repo, "leafy"))
+        self.assertEqual(
+            {"entries": 1, "hits": 0, "misses": 1}, cache_status(repo)
+        )
+        self.assertEqualDiff([plist[1]], search(repo, "leafy"))
+        self.assertEqual(
+            {"entries": 1, "hits": 1, "misses": 1}, cache_status(repo)
+        )
+
+        # Results are discarded once the index has been updated, even
+        # if that's done by another process.
+        plist.extend(self.pkgsend_bulk(repo_path, self.truck10))
+        self.pkgrepo("refresh -s {0}".format(repo_path))
+        self.wait_repo(repo_path)
+        self.assertEqualDiff([plist[2]], search(repo, "truck"))
+        self.assertEqualDiff([plist[1]], search(repo, "leafy"))
+        self.assertEqual(
+            {"entries": 2, "hits": 1, "misses": 3}, cache_status(repo)
+        )
+
+        repo.reset_search()
+        self.assertEqual(
+            {"entries": 0, "hits": 1, "misses": 3}, cache_status(repo)
+        )
+
 
 class TestPkgrepoMultiRepo(pkg5unittest.ManyDepotTestCase):
     # Only start/stop the depot once (instead of for every test)
@@ -4285,6 +4519,65 @@ class TestPkgrepoMultiRepo(pkg5unittest.ManyDepotTestCase):
             f"--clone -d {self.rdir1} -p '*",
         )
 
+    def test_02_diff_cache_dir(self):
+        """Verify that diff works as expected when retrieved catalogs are
+        kept in a cache directory between runs."""
+
+        rdir1 = os.path.join(self.test_root, "diff_cache_repo1")
+        rdir2 = os.path.join(self.test_root, "diff_cache_repo2")
+        cache_dir = os.path.join(self.test_root, "diff_cache")
+        for rdir in (rdir1, rdir2):
+            self.create_repo(
+                rdir, properties={"publisher": {"prefix": "test1"}}
+            )
+        rurl1 = "file://{0}".format(rdir1)
+        rurl2 = "file://{0}".format(rdir2)
+
+        # Repositories with the same packages are the same without any
+        # catalog having been retrieved.
+        self.pkgsend_bulk(rurl1, (self.foo10, self.bar10))
+        self.pkgsend_bulk(rurl2, (self.foo10, self.bar10))
+        self.pkgrepo(
+            "diff -v --cache-dir {0} -s {1} -s {2}".format(
+                cache_dir, rurl1, rurl2
+            )
+        )
+        self.assertTrue(not self.output)
+
+        # Once they differ, the catalogs are retrieved into the cache
+        # and only the differing versions are reported.
+        self.pkgsend_bulk(rurl1, self.foo20t1)
+        self.pkgsend_bulk(rurl2, self.moo10)
+        self.pkgrepo(
+            "diff -v --cache-dir {0} -s {1} -s {2}".format(
+                cache_dir, rurl1, rurl2
+            ),
+            exit=10,
+        )
+        self.assertTrue(
+            "- pkg://test1/foo@2.0,5.11-0:20120804T203458Z" in self.output
+        )
+        self.assertTrue(
+            "+ pkg://test1/moo@1.0,5.11-0:20130804T203458Z" in self.output
+        )
+        self.assertTrue(
+            "(2 pkg(s) with 2 version(s) are in both "
+            "repositories.)" in self.output
+        )
+        self.assertTrue(os.listdir(cache_dir))
+
+        # The cached catalogs are updated for later changes.
+        self.pkgsend_bulk(rurl2, self.foo20t1)
+        self.pkgsend_bulk(rurl1, self.moo10)
+        self.pkgrepo(
+            "diff -v --cache-dir {0} -s {1} -s {2}".format(
+                cache_dir, rurl1, rurl2
+            )
+        )
+        self.assertTrue(not self.output)
+        self.pkgrepo("diff -v -s {0} -s {1}".format(rurl1, rurl2))
+        self.assertTrue(not self.output)
+
 
 class TestPkgrepoHTTPS(pkg5unittest.HTTPSTestClass):
     example_pkg10 = """
@@ -1666,6 +1666,50 @@ file elftest.so.1 mode=0755 owner=root group=bin path=bin/true pkg.size=ignored
         self.assertNotEqual(a.attrs["elfhash"], "ignored")
         self.assertNotEqual(a.attrs["pkg.content-hash"][0], "ignored")
 
+    def test_29_publish_concurrency(self):
+        """Verify that the attributes of published files don't depend
+        upon how many files are processed at once, including when
+        files have the same content or the repository already has it."""
+
+        srcdir = os.path.join(self.test_root, "concurrency")
+        os.mkdir(srcdir)
+        lines = []
+        for i in range(20):
+            with open(os.path.join(srcdir, "f{0:d}".format(i)), "w") as f:
+                f.write("content {0:d}\n".format(i % 7) * (i * 1000))
+            lines.append(
+                "file f{0:d} mode=0644 owner=root group=bin "
+                "path=f{0:d}".format(i)
+            )
+        lines.append(
+            "file elftest.so.1 mode=0755 owner=root group=bin path=bin/true"
+        )
+
+        repo = self.dc.get_repo()
+        published = []
+        for ver, conc in (("1.0", "1"), ("2.0", "8"), ("3.0", "0")):
+            mfpath = os.path.join(self.test_root, "conc{0}.p5m".format(ver))
+            with open(mfpath, "w") as mf:
+                mf.write(
+                    "set name=pkg.fmri value=pkg://test/conc@{0}\n".format(ver)
+                )
+                mf.write("\n".join(lines) + "\n")
+            ret, pfmri = self.pkgsend(
+                self.dc.get_depot_url(),
+                "publish -d {0} -d {1} {2}".format(
+                    srcdir, self.ro_data_root, mfpath
+                ),
+                env_arg={"PKG_PUBLISH_CONCURRENCY": conc},
+            )
+            rm = manifest.Manifest()
+            rm.set_content(pathname=repo.manifest(pfmri))
+            published.append(
+                sorted(str(a) for a in rm.gen_actions_by_type("file"))
+            )
+
+        self.assertEqualDiff(published[0], published[1])
+        self.assertEqualDiff(published[0], published[2])
+
 
 class TestPkgsendHardlinks(pkg5unittest.CliTestCase):
     def test_bundle_dir_hardlinks(self):
@@ -102,6 +102,32 @@ f1 = version.Version("5.11-0.72:20070921T203926Z", "0.5.11")""",
 f1 = version.Version("5.11-0.72", "0.5.11")""",
         """hash(f1)""",
     ],
+    [
+        "version cmp (v2 > v1)",
+        1000000,
+        """import pkg.version as version
+v1 = version.Version("5.11-0.72:20070921T203926Z", "0.5.11")
+v2 = version.Version("5.11-0.72:20070921T203927Z", "0.5.11")""",
+        """v2 > v1""",
+    ],
+    [
+        "version cmp (same)",
+        1000000,
+        """import pkg.version as version
+v1 = version.Version("5.11-0.72:20070921T203926Z", "0.5.11")
+v2 = version.Version("5.11-0.72:20070921T203926Z", "0.5.11")""",
+        """v1 == v2""",
+    ],
+    [
+        "version sort (100 versions)",
+        10000,
+        """import pkg.version as version
+vers = [
+    version.Version("5.11-0.{0:d}:20070921T203926Z".format(i % 10), "0.5.11")
+    for i in range(100, 0, -1)
+]""",
+        """sorted(vers)""",
+    ],
     [
         "fmri create (string)",
         50000,
@@ -132,6 +158,13 @@ f1 = version.Version("5.11-0.72", "0.5.11")""",
         """import pkg.fmri as fmri""",
         """f = fmri.PkgFmri("pkg:/SUNWlxml@2.6.31-0.90")""",
     ],
+    [
+        "fmri intern (string)",
+        100000,
+        """import pkg.fmri as fmri
+f1 = fmri.intern_fmri("pkg://origin/SUNWxwssu@0.5.11,5.11-0.72:20070921T203926Z")""",
+        """f = fmri.intern_fmri("pkg://origin/SUNWxwssu@0.5.11,5.11-0.72:20070921T203926Z")""",
+    ],
     [
         "fmri to string (no tstamp)",
         100000,
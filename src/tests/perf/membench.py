@@ -22,16 +22,22 @@
 
 #
 # Copyright (c) 2010, 2024, Oracle and/or its affiliates.
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
 #
 
 #
 # membench - benchmark memory usage of various objects
 #
 
+import pkg.actions as actions
+import pkg.catalog as catalog
 import pkg.fmri as fmri
+import pkg.manifest as manifest
 import pkg.version as version
+import shutil
 import sys
 import os
+import tempfile
 import pkg.misc as misc
 
 
@@ -67,8 +73,41 @@ def mfmri_different(num):
     )
 
 
+def mfmri_interned(num):
+    return fmri.intern_fmri(
+        "pkg:/SUNWttf-google-droid@0.5.11,5.11-0.121:20090816T233516Z"
+    )
+
+
+def action(num):
+    return actions.fromstr(
+        "file 1d5eac1aab628317f9c088d21e4afda9c754bb76 "
+        "chash=43dbb3e0bc142f399b61d171f926e8f91adcffe2 group=bin "
+        "mode=0755 owner=root path=usr/bin/ls pkg.csize=16198 "
+        "pkg.size=32976 variant.arch=i386"
+    )
+
+
+def action_different(num):
+    return actions.fromstr(
+        "file {0:0=40d} chash={0:0=40d} group=bin mode=0755 owner=root "
+        "path=usr/bin/f{0:d} pkg.csize={0:d} pkg.size={0:d} "
+        "variant.arch=i386".format(num)
+    )
+
+
 collection = []
-funcs = [dotseq, dotseq_different, vers, vers_different, mfmri, mfmri_different]
+funcs = [
+    dotseq,
+    dotseq_different,
+    vers,
+    vers_different,
+    mfmri,
+    mfmri_different,
+    mfmri_interned,
+    action,
+    action_different,
+]
 
 for func in funcs:
     print("#", func.__name__)
@@ -98,5 +137,73 @@ for func in funcs:
         os.wait()
 
 
+def mkcatalog(root, npkgs):
+    """Create a catalog in 'root' with dependency and summary data for
+    three versions each of 'npkgs' packages."""
+
+    cat = catalog.Catalog(batch_mode=True, meta_root=root)
+    for num in range(npkgs):
+        for ver in ("1.0", "1.1", "2.0"):
+            pfmri = fmri.PkgFmri(
+                "pkg://test/pkg{0:d}@{1},5.11-0.151:20090428T172804Z".format(
+                    num, ver
+                )
+            )
+            lines = [
+                "set name=pkg.summary value='Package {0:d}'".format(num),
+                "set name=pkg.description value='Package {0:d}, version "
+                "{1}, for benchmarking memory usage'".format(num, ver),
+                "set name=variant.arch value=i386 value=sparc",
+            ]
+            lines.extend(
+                "depend fmri=pkg:/pkg{0:d}@1.0 type=require".format(
+                    (num + d) % npkgs
+                )
+                for d in range(1, 6)
+            )
+            m = manifest.Manifest(pfmri)
+            m.set_content("\n".join(lines))
+            cat.add_package(pfmri, manifest=m)
+    cat.finalize()
+    cat.save()
+
+
+def catalog_entries(root, read_only):
+    """Read the dependency and summary data of every package in the
+    catalog in 'root', as 'pkg list -a' or 'pkgrecv' would; a read-only
+    catalog doesn't load whole catalog parts to do so."""
+
+    cat = catalog.Catalog(meta_root=root, read_only=read_only)
+    n = 0
+    for f, entry in cat.entries(
+        info_needed=[catalog.Catalog.DEPENDENCY, catalog.Catalog.SUMMARY]
+    ):
+        n += 1
+    return cat, n
+
+
+print("# catalog")
+cat_root = tempfile.mkdtemp()
+try:
+    mkcatalog(cat_root, 20000)
+    for read_only in (False, True):
+        pid = os.fork()
+        if pid == 0:
+            startusage = misc.__getvmusage()
+            cat, n = catalog_entries(cat_root, read_only)
+            endusage = misc.__getvmusage()
+            print(
+                "catalog_entries (read_only={0})".format(read_only),
+                "{0:d} entries, estimated memory used: {1}".format(
+                    n, misc.bytes_to_str(endusage - startusage)
+                ),
+            )
+            sys.exit(0)
+        else:
+            os.wait()
+finally:
+    shutil.rmtree(cat_root)
+
+
 # Vim hints
 # vim:ts=4:sw=4:et:fdm=marker